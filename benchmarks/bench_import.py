@@ -0,0 +1,76 @@
+"""
+grrmpyのインポート時間を計測する.
+
+| 各モジュールを新しいPythonプロセスでインポートし,その時間を計測する(キャッシュの影響を避けるため).
+| --importtimeを指定した場合, python -X importtime の結果から時間のかかるモジュールを表示する.
+
+Examples:
+
+    $ python benchmarks/bench_import.py
+    $ python benchmarks/bench_import.py grrmpy.network.network --repeat 10 --importtime
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+MODULES = ["grrmpy",
+           "grrmpy.io",
+           "grrmpy.command.read_irc",
+           "grrmpy.command.read_lup",
+           "grrmpy.network",
+           "grrmpy.io.archive",
+           "grrmpy.structure.structures",
+           "grrmpy.automate.auto_opt",
+           "grrmpy.network.network"]
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(ROOT),env.get("PYTHONPATH","")]).rstrip(os.pathsep)
+    return env
+
+def import_time(module,repeat=5):
+    """moduleのインポート時間(秒)のリストを返す"""
+    code = ("import time,warnings;warnings.simplefilter('ignore');"
+            f"t=time.perf_counter();import {module};print(time.perf_counter()-t)")
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable,"-c",code],env=_env(),
+                             capture_output=True,text=True,check=True)
+        times.append(float(out.stdout.split()[-1]))
+    return times
+
+def slowest_imports(module,n=10):
+    """-X importtimeの結果から累積時間の大きい順にn個の(モジュール名,秒)を返す"""
+    out = subprocess.run([sys.executable,"-X","importtime","-W","ignore","-c",f"import {module}"],
+                         env=_env(),capture_output=True,text=True,check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _,cumulative,name = line.split("|")
+        rows.append((name.strip(),int(cumulative)*1e-6))
+    rows = [row for row in rows if row[0] != module]
+    return sorted(rows,key=lambda x:x[1],reverse=True)[:n]
+
+def main():
+    parser = argparse.ArgumentParser(description="grrmpyのインポート時間を計測する")
+    parser.add_argument("modules",nargs="*",default=MODULES,help="計測するモジュール")
+    parser.add_argument("--repeat",type=int,default=5,help="計測回数")
+    parser.add_argument("--importtime",action="store_true",help="時間のかかるモジュールを表示する")
+    args = parser.parse_args()
+    width = max(len(m) for m in args.modules)
+    print(f"{'module':<{width}}  {'median[ms]':>10}  {'min[ms]':>8}")
+    for module in args.modules:
+        times = import_time(module,args.repeat)
+        print(f"{module:<{width}}  {statistics.median(times)*1e3:>10.1f}  {min(times)*1e3:>8.1f}")
+        if args.importtime:
+            for name,t in slowest_imports(module):
+                print(f"    {name:<{width}}  {t*1e3:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+grrmpyの主な処理の実行時間,力の計算回数,最大メモリ使用量を計測し,履歴と比較する.
+
+| pfp_calculatorの代わりにASEのEMTをcalc_funcに与えるため,オフラインで実行できる.
+| 各ケースは新しいPythonプロセスの一時フォルダで実行する(最大メモリ使用量を分けるため).
+| 準備(構造最適化,ファイルの作成等)は計測しない.
+| 結果はhistory.jsonに追加し,baselineの結果と比較した表を表示する.
+| --latencyを指定した場合,EMTをcalc_server.CalcServerで包み,遅延のある計算サーバーとして計算する.
+
+Examples:
+
+    $ python benchmarks/bench_suite.py --list
+    $ python benchmarks/bench_suite.py --label baseline
+    $ python benchmarks/bench_suite.py sneb irc --repeat 3 --baseline baseline
+    $ python benchmarks/bench_suite.py --report --baseline baseline   # 計測せずに最新の結果と比較する
+    $ python benchmarks/bench_suite.py singlepath --latency 0.05 --jitter 0.01 --server-trace calls.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import warnings
+from fnmatch import fnmatch
+from functools import partial
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HERE = Path(__file__).resolve().parent
+HISTORY = HERE/"history.json"
+#: 計算サーバーのアドレス(host:port)を子プロセスに渡す環境変数
+SERVER_ENV = "GRRMPY_BENCH_SERVER"
+
+#: {ケース名:(説明,準備を行ない計測する関数を返す関数)}
+CASES = {}
+
+def case(name,description):
+    """ケースを登録する
+
+    | 登録する関数はcalc_func(EMTを返す関数)を引数に取り,準備を行なって計測する処理(引数なしの関数)を返す.
+    """
+    def register(func):
+        CASES[name] = (description,func)
+        return func
+    return register
+
+@case("sneb_hop","SNEB.run: Al(100)上のAuの隣のhollowサイトへのhop")
+def sneb_hop(calc_func):
+    from ase.optimize import FIRE
+    from grrmpy.neb.auto_neb import SNEB
+    from systems import hop_endpoints, constraints
+    ini,fin = hop_endpoints(1)
+    def run():
+        sneb = SNEB(ini,fin,7,logfile=None,parallel=False,calc_func=calc_func,
+                    optimizer=FIRE,constraints=constraints(ini))
+        sneb.run(nimages=[7,7],maxstep=[0.1,0.1,0.1],fmax=[0.1,0.07,0.05],steps=[300,300,500],threshold=[30,30])
+    return run
+
+@case("sneb_diffusion","SNEB.run: 2つ隣のhollowサイトへの拡散(途中に中間体がある)")
+def sneb_diffusion(calc_func):
+    from ase.optimize import FIRE
+    from grrmpy.neb.auto_neb import SNEB
+    from systems import hop_endpoints, constraints
+    ini,fin = hop_endpoints(2)
+    def run():
+        sneb = SNEB(ini,fin,9,logfile=None,parallel=False,calc_func=calc_func,
+                    optimizer=FIRE,constraints=constraints(ini))
+        sneb.run(nimages=[9,7],maxstep=[0.1,0.1,0.1],fmax=[0.1,0.07,0.05],steps=[300,300,500],threshold=[30,30])
+    return run
+
+def _single_path(ini,fin,nimages,calc_func):
+    from ase.optimize import FIRE
+    from grrmpy.automate import SinglePath
+    from systems import constraints
+    sp = SinglePath(ini,fin,nimages,parallel=False,calc_func=calc_func,constraints=constraints(ini))
+    param = sp.default_param
+    param["SNEB"].update({"optimizer":FIRE,"nimages":[nimages,7,7],"fmax":[0.1,0.07,0.05],"steps":[300,300,500]})
+    param["IRC"].update({"optimizer1":FIRE,"optimizer2":FIRE,"fmax":0.01,"steps":2000})
+    param["General"]["stopping_criterion"] = 4
+    return sp,param
+
+@case("singlepath_hop","SinglePath.run: 隣のhollowサイトへのhop(SNEB,振動計算,IRC)")
+def singlepath_hop(calc_func):
+    from systems import hop_endpoints
+    ini,fin = hop_endpoints(1)
+    def run():
+        sp,param = _single_path(ini,fin,7,calc_func)
+        sp.run(param)
+    return run
+
+@case("singlepath_diffusion","SinglePath.run: 2つ隣のhollowサイトへの拡散(中間体を経由する)")
+def singlepath_diffusion(calc_func):
+    from systems import hop_endpoints
+    ini,fin = hop_endpoints(2)
+    def run():
+        sp,param = _single_path(ini,fin,9,calc_func)
+        sp.run(param)
+    return run
+
+@case("irc_legs","SinglePath.irun_irc: bridgeサイトのTSから両方向のIRC")
+def irc_legs(calc_func):
+    from ase.calculators.emt import EMT
+    from grrmpy.vibrations.lanczos import lowest_modes
+    from grrmpy.vibrations.mode_scan import scan_mode
+    from systems import hop_endpoints, bridge_ts, constraints
+    ini,fin = hop_endpoints(1)
+    ts = bridge_ts()
+    ts.calc = EMT()
+    mode = lowest_modes(ts).get_mode(0)
+    scan = scan_mode(ts,mode,calc_func=EMT)
+    def run():
+        sp,param = _single_path(ini,fin,7,calc_func)
+        sp.iter_count = 0
+        sp.optimizer1 = sp.optimizer2 = param["IRC"]["optimizer1"]
+        sp.irc_maxstep,sp.irc_fmax,sp.irc_steps = param["IRC"]["maxstep"],param["IRC"]["fmax"],param["IRC"]["steps"]
+        for name,start,newton in [("reverse",scan.reverse,scan.reverse_newton),
+                                  ("forward",scan.forward,scan.forward_newton)]:
+            atoms = start.copy()
+            atoms.calc = calc_func()
+            atoms.set_constraint(constraints(atoms))
+            sp.irun_irc(atoms,newton,name)
+    return run
+
+@case("vib_lowest_modes","lowest_modes: hollow,bridge,topサイトの虚振動の数(Vibrationsと一致しない場合は失敗)")
+def vib_lowest_modes(calc_func):
+    import numpy as np
+    from ase.calculators.emt import EMT
+    from ase.vibrations import Vibrations
+    from grrmpy.vibrations.lanczos import lowest_modes, _moving_indices
+    from systems import adatom, bridge_ts, top_site
+    threshold = 10.0
+    systems = []
+    for name,atoms in [("hollow",adatom()),("bridge",bridge_ts()),("top",top_site())]:
+        atoms.calc = EMT()
+        vib = Vibrations(atoms,_moving_indices(atoms),name=f"vib_{name}")
+        vib.run()
+        freq = vib.get_frequencies()
+        freq = np.sort(np.where(np.abs(freq.imag) > 0,-np.abs(freq),freq.real))
+        z,x = np.zeros((len(atoms),3)),np.zeros((len(atoms),3))
+        z[-1,2] = x[-1,0] = 1 # Auのz方向(接線と直交),x方向(bridgeの接線)
+        systems.append((name,atoms,min(int((freq<-threshold).sum()),2),freq[0],[z,x,None]))
+    def run():
+        for name,atoms,n_imag,lowest,guesses in systems:
+            for guess in guesses:
+                for seed in range(3):
+                    ts = atoms.copy()
+                    ts.calc = calc_func()
+                    modes = lowest_modes(ts,guess=guess,threshold=threshold,seed=seed)
+                    if modes.n_imag is None:
+                        continue # SinglePathではVibrationsで計算し直す
+                    # 虚振動が2つ以上の場合は,Ritz値が収束する前に確定する
+                    if modes.n_imag != n_imag or (n_imag < 2 and abs(modes.frequencies[0]-lowest) > 2.0):
+                        raise AssertionError(f"{name}(seed={seed}): n_imag={modes.n_imag},{modes.frequencies}"
+                                             f" (Vibrations: n_imag={n_imag},{lowest:.1f})")
+    return run
+
+@case("auto_opt_status","AutoOpt.run,ReCalcGRRMのEQのタスク: 3構造の最適化(ステップ数の上限で止めた場合に収束と判定すると失敗)")
+def auto_opt_status(calc_func):
+    from ase.optimize import LBFGS
+    from grrmpy.automate.auto_opt import AutoOpt
+    from grrmpy.automate.recalc_grrm import _opt_task
+    from systems import adatom
+    atoms_list = [adatom((x,0.1),fmax=1) for x in (0.1,0.3,0.45)]
+    def run():
+        truncated = AutoOpt([a.copy() for a in atoms_list],calc_func=calc_func,logfile=False,
+                            save_foldername="truncated").run(maxstep_list=[0.05],steps_list=[2],fmax=0.01,quiet=True)
+        full = AutoOpt([a.copy() for a in atoms_list],calc_func=calc_func,logfile=False,
+                       save_foldername="full").run(maxstep_list=[0.05,0.2],steps_list=[2,500],fmax=0.05,quiet=True)
+        if set(truncated.values()) != {"not converged"} or set(full.values()) != {"converged"}:
+            raise AssertionError(f"steps=2: {truncated}, steps=500: {full}")
+        params = {"optimizer":LBFGS,"calc_func":calc_func,"maxstep_list":[0.05],"steps_list":[2],
+                  "maxstep_dict":None,"fmax":0.01,"logfile":False,"trajectory":False,
+                  "log_foldername":".","traj_foldername":".","save_foldername":"truncated"}
+        try:
+            _opt_task(atoms_list[0].copy(),"EQ0",params)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("_opt_task: ステップ数の上限で止めた構造を収束とした")
+    return run
+
+@case("parse_log2atoms","log2atoms: 20000構造のEQ_list.log(comファイルのFrozen Atoms,POSCARを含む)")
+def parse_log2atoms(calc_func):
+    from grrmpy.io.read_listlog import log2atoms
+    from synthetic import generate
+    generate(".","bench",n_eq=20000,n_ts=0,n_pt=0)
+    return lambda:log2atoms("bench_EQ_list.log","bench.com","POSCAR")
+
+@case("parse_structures","EQList,TSList,PTList: 5000EQ,10000TS,2500PTのlist.log(ReEnergy)")
+def parse_structures(calc_func):
+    from grrmpy.structure.structures import EQList, TSList, PTList
+    from synthetic import generate
+    generate(".","bench",n_eq=5000,reenergy=True)
+    def run():
+        eq_list = EQList("bench_EQ_list.log","bench.com")
+        ts_list = TSList("bench_TS_list.log","bench.com")
+        pt_list = PTList("bench_PT_list.log","bench.com")
+        eq_list.get_atoms_list(),ts_list.connections,pt_list.connections
+    return run
+
+@case("read_irc_lup","read_irc,read_lup: 200個のXXX_TSi.log(各方向50ステップ),XXX_PTi.logをアーカイブにする")
+def read_irc_lup(calc_func):
+    from grrmpy.command.read_irc import _read_ircs
+    from grrmpy.command.read_lup import _read_lups
+    from synthetic import generate
+    generate(".","bench",n_eq=400,n_irc=200,n_lup=200,irc_steps=50)
+    def run():
+        _read_ircs(name="bench",n_jobs=1,quiet=True)
+        _read_lups(name="bench",n_jobs=1,quiet=True)
+    return run
+
+@case("grouping_smiles","atomslist2smileses: 1000構造のSMILESとグループ分け")
+def grouping_smiles(calc_func):
+    from ase import Atoms
+    from grrmpy.conv.atoms2smiles import atomslist2smileses
+    from synthetic import SyntheticGRRM
+    synth = SyntheticGRRM(n_eq=1000)
+    atoms_list = [Atoms(synth.symbols,positions) for positions in synth.positions("EQ",0)]
+    def run():
+        smiles_list = atomslist2smileses(atoms_list)
+        unique = sorted(set(smiles_list),key=smiles_list.index)
+        return [unique.index(smiles) for smiles in smiles_list]
+    return run
+
+@case("netgraph_build","NetGraph: 500EQ,1000TSのlist.logから作成(SMILESによるグループ分けを含む)")
+def netgraph_build(calc_func):
+    from grrmpy.network import NetGraph
+    from synthetic import generate
+    synth = generate(".","bench",n_eq=500,n_ts=1000,n_pt=0)
+    return lambda:NetGraph("bench_EQ_list.log","bench_TS_list.log",comfile="bench.com",
+                           indices=list(range(len(synth.symbols))),calc_func=calc_func)
+
+@case("path_search","BottleneckIndex: 10^5 EQ,3×10^5 TSのネットワークの障壁と1000組のボトルネック")
+def path_search(calc_func):
+    import numpy as np
+    from grrmpy.network import BottleneckIndex
+    rng = np.random.default_rng(0)
+    n_eq,n_ts = 100000,300000
+    eq_e = rng.uniform(0,100,n_eq)
+    source = np.concatenate([rng.integers(0,np.arange(1,n_eq)),rng.integers(0,n_eq,n_ts-n_eq+1)])
+    target = np.concatenate([np.arange(1,n_eq),rng.integers(0,n_eq,n_ts-n_eq+1)])
+    ts_e = np.maximum(eq_e[source],eq_e[target])+rng.uniform(0,50,n_ts)
+    pairs = rng.integers(0,n_eq,(1000,2))
+    def run():
+        b = BottleneckIndex.from_arrays(eq_e,ts_e,source,target)
+        b.barriers_from(0)
+        return [b.bottleneck(i,j) for i,j in pairs]
+    return run
+
+def _minimax_reference(eq_e,ts_e,connections):
+    """networkxの最小全域木で求めた全てのEQ間の経路の最大エネルギーの最小値(連結していない場合はinf)"""
+    import numpy as np
+    import networkx as nx
+    graph = nx.Graph()
+    graph.add_nodes_from(range(len(eq_e)))
+    for (s,t),e in zip(connections,ts_e):
+        s,t = int(s),int(t)
+        if s == t:
+            continue
+        w = max(e,eq_e[s],eq_e[t])
+        if not graph.has_edge(s,t) or w < graph[s][t]["weight"]:
+            graph.add_edge(s,t,weight=w)
+    tree = nx.minimum_spanning_tree(graph)
+    ref = np.full((len(eq_e),len(eq_e)),np.inf)
+    for i in range(len(eq_e)):
+        ref[i,i] = eq_e[i]
+        for j,path in nx.single_source_shortest_path(tree,i).items():
+            if j != i:
+                ref[i,j] = max(tree[u][v]["weight"] for u,v in zip(path,path[1:]))
+    return ref
+
+def _random_networks(n_graphs,seed=0):
+    """EQより低いTSを含むランダムな小さいネットワーク[(eq_e,ts_e,connections),...]"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    networks = [([0.35,0.0,0.0],[0.1,0.26],[["0","1"],["1","2"]])] # TSが片方のEQより低い
+    for _ in range(n_graphs):
+        n_eq,n_ts = rng.integers(2,10),rng.integers(1,16)
+        connections = [[str(s),str(t)] for s,t in rng.integers(0,n_eq,(n_ts,2))]
+        networks.append((rng.random(n_eq).tolist(),rng.random(n_ts).tolist(),connections))
+    return networks
+
+@case("bottleneck_minimax","BottleneckIndex: 300個のランダムなネットワークのボトルネック(networkxと一致しない場合は失敗)")
+def bottleneck_minimax(calc_func):
+    import numpy as np
+    from grrmpy.network import BottleneckIndex
+    networks = [(network,_minimax_reference(*network)) for network in _random_networks(300)]
+    def run():
+        for k,((eq_e,ts_e,connections),ref) in enumerate(networks):
+            b = BottleneckIndex(eq_e,ts_e,connections)
+            n = len(eq_e)
+            result = b.bottleneck(*np.meshgrid(np.arange(n),np.arange(n),indexing="ij")).reshape(n,n)
+            from_rows = np.array([b.bottlenecks_from(i) for i in range(n)])
+            if not (np.allclose(result,ref) and np.allclose(from_rows,ref)):
+                raise AssertionError(f"network {k}: {result.tolist()} != {ref.tolist()}")
+    return run
+
+@case("disconnectivity_minimax","DisconnectivityGraph: 300個のランダムなネットワークの分岐の高さ(networkxと一致しない場合は失敗)")
+def disconnectivity_minimax(calc_func):
+    import numpy as np
+    from grrmpy.network import DisconnectivityGraph
+    networks = [(network,_minimax_reference(*network)) for network in _random_networks(300,seed=1)]
+    def branch_heights(dg):
+        """各EQの組の共通祖先の高さ(木が分かれている場合はinf)"""
+        ancestors = []
+        for leaf in range(dg.n_leaves):
+            path,node = [],leaf
+            while node >= 0:
+                path.append(node)
+                node = dg.parent[node]
+            ancestors.append(path)
+        heights = np.full((dg.n_leaves,dg.n_leaves),np.inf)
+        for i,path_i in enumerate(ancestors):
+            for j,path_j in enumerate(ancestors):
+                common = [node for node in path_i if node in set(path_j)]
+                if common:
+                    heights[i,j] = dg.height[common[0]]
+        return heights
+    def run():
+        for k,((eq_e,ts_e,connections),ref) in enumerate(networks):
+            for delta in (None,0.1):
+                dg = DisconnectivityGraph(eq_e,ts_e,connections,delta=delta)
+                expected = ref.copy()
+                if delta is not None:
+                    off_diag = ~np.eye(len(eq_e),dtype=bool)
+                    expected[off_diag] = np.ceil(ref[off_diag]/delta)*delta
+                heights = branch_heights(dg)
+                if not np.allclose(heights,expected) or np.any(dg.height[dg.parent>=0] > dg.height[dg.parent[dg.parent>=0]]):
+                    raise AssertionError(f"network {k} (delta={delta}): {heights.tolist()} != {expected.tolist()}")
+    return run
+
+def _run_case(name):
+    """子プロセスでnameのケースを1回実行し,結果を標準出力の最後の行にjsonで書き込む"""
+    warnings.simplefilter("ignore")
+    from ase.calculators.emt import EMT
+    from grrmpy.trace import Tracer
+    tracer = Tracer()
+    server = os.environ.get(SERVER_ENV)
+    if server:
+        from calc_server import RemoteCalculator
+        host,port = server.rsplit(":",1)
+        calc_func = tracer.wrap_calc_func(partial(RemoteCalculator,(host,int(port))))
+    else:
+        calc_func = tracer.wrap_calc_func(EMT)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        run = CASES[name][1](calc_func)
+        tracer.calls = 0
+        start,cpu = time.perf_counter(),time.process_time()
+        run()
+        wall,cpu = time.perf_counter()-start,time.process_time()-cpu
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024 # Linuxはkbyte単位
+    print(json.dumps({"wall_time":wall,"cpu_time":cpu,"calls":tracer.calls,"peak_rss_mb":rss/2**20}))
+
+def measure(name,repeat=1,server=None):
+    """nameのケースをrepeat回実行する(各回は新しいプロセス)
+
+    | serverにCalcServerを与えた場合,そのサーバーで計算する.
+
+    Returns:
+        dict: wall_time(中央値,s), wall_min(s), cpu_time(中央値,s), calls(力の計算回数), peak_rss_mb(最大値)
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(ROOT),str(HERE),env.get("PYTHONPATH","")]).rstrip(os.pathsep)
+    if server is not None:
+        env[SERVER_ENV] = "{}:{}".format(*server.address)
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable,str(Path(__file__).resolve()),"--child",name],
+                             env=env,capture_output=True,text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"{name}が失敗しました\n{out.stderr}")
+        runs.append(json.loads(out.stdout.splitlines()[-1]))
+    walls = [r["wall_time"] for r in runs]
+    return {"wall_time":statistics.median(walls),
+            "wall_min":min(walls),
+            "cpu_time":statistics.median(r["cpu_time"] for r in runs),
+            "calls":runs[0]["calls"],
+            "peak_rss_mb":max(r["peak_rss_mb"] for r in runs),
+            "repeat":repeat}
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git","rev-parse","--short","HEAD"],cwd=ROOT,capture_output=True,text=True)
+        dirty = subprocess.run(["git","status","--porcelain","--untracked-files=no"],cwd=ROOT,capture_output=True,text=True)
+        return out.stdout.strip()+("+dirty" if dirty.stdout.strip() else "")
+    except OSError:
+        return None
+
+def load_history(file=HISTORY):
+    if not Path(file).exists():
+        return []
+    with open(file) as f:
+        return json.load(f)
+
+def save_history(history,file=HISTORY):
+    with open(file,"w") as f:
+        json.dump(history,f,indent=1)
+
+def find_entry(history,baseline=None,exclude=None):
+    """labelまたはcommitがbaselineの最新の結果.baselineがNoneの場合はexclude以外の最新の結果"""
+    for entry in reversed(history):
+        if entry is exclude:
+            continue
+        if baseline is None or baseline in (entry.get("label"),entry.get("commit")):
+            return entry
+    return None
+
+def compare(current,baseline,threshold=0.1):
+    """2つの結果を比較した表(str)と,wall_time,calls,peak_rss_mbがthreshold以上増えたケースのリストを返す"""
+    def ratio(new,old):
+        return new/old if old else float("nan")
+    header = (f"{'case':<22}{'wall[s]':>9}{'base':>9}{'ratio':>7}"
+              f"{'calls':>8}{'base':>8}{'rss[MB]':>9}{'base':>8}")
+    lines = [f"baseline: {baseline.get('label')} ({baseline.get('commit')}, {baseline.get('date')})",
+             header,"-"*len(header)]
+    regressions = []
+    for name,new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            lines.append(f"{name:<22}{new['wall_time']:>9.2f}{'-':>9}{'-':>7}{new['calls']:>8}{'-':>8}"
+                         f"{new['peak_rss_mb']:>9.1f}{'-':>8}")
+            continue
+        worse = [key for key in ["wall_time","calls","peak_rss_mb"]
+                 if ratio(new[key],old[key]) > 1+threshold]
+        if worse:
+            regressions.append((name,worse))
+        lines.append(f"{name:<22}{new['wall_time']:>9.2f}{old['wall_time']:>9.2f}"
+                     f"{ratio(new['wall_time'],old['wall_time']):>7.2f}"
+                     f"{new['calls']:>8}{old['calls']:>8}"
+                     f"{new['peak_rss_mb']:>9.1f}{old['peak_rss_mb']:>8.1f}"
+                     f"{'  !'+','.join(worse) if worse else ''}")
+    return "\n".join(lines),regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="grrmpyのベンチマーク")
+    parser.add_argument("cases",nargs="*",help="実行するケース(ワイルドカード可,部分一致). 省略した場合は全て")
+    parser.add_argument("--list",action="store_true",help="ケースの一覧を表示する")
+    parser.add_argument("--repeat",type=int,default=1,help="各ケースの実行回数(wall_timeは中央値)")
+    parser.add_argument("--label",default=None,help="履歴に記録するラベル(例: baseline)")
+    parser.add_argument("--history",default=str(HISTORY),help="履歴のjsonファイル")
+    parser.add_argument("--baseline",default=None,help="比較するlabelまたはcommit. 省略した場合は1つ前の結果")
+    parser.add_argument("--threshold",type=float,default=0.1,help="この割合以上増えた場合に!を付ける")
+    parser.add_argument("--report",action="store_true",help="計測せずに最新の結果をbaselineと比較する")
+    parser.add_argument("--no-save",action="store_true",help="履歴に保存しない")
+    parser.add_argument("--fail-on-regression",action="store_true",help="悪化したケースがある場合,終了コードを1にする")
+    parser.add_argument("--latency",type=float,default=None,
+                        help="指定した場合,1回の要求あたりlatency秒の遅延がある計算サーバーで計算する")
+    parser.add_argument("--jitter",type=float,default=0.0,help="計算サーバーの遅延のゆらぎ(秒)")
+    parser.add_argument("--max-concurrency",type=int,default=1,help="計算サーバーが同時に計算できる要求の数")
+    parser.add_argument("--server-trace",default=None,help="計算サーバーの要求毎の記録(json lines)")
+    parser.add_argument("--child",help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _run_case(args.child)
+        return
+    if args.list:
+        for name,(description,_) in CASES.items():
+            print(f"{name:<22}{description}")
+        return
+    history = load_history(args.history)
+    if args.report:
+        if not history:
+            sys.exit("履歴がありません")
+        current = history[-1]
+    else:
+        names = [name for name in CASES
+                 if not args.cases or any(fnmatch(name,p) or p in name for p in args.cases)]
+        current = {"label":args.label,
+                   "commit":_git_commit(),
+                   "date":time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "python":platform.python_version(),
+                   "machine":platform.machine(),
+                   "cpu_count":os.cpu_count(),
+                   "results":{}}
+        server = None
+        if args.latency is not None:
+            from calc_server import CalcServer, summarize_trace
+            server = CalcServer(latency=args.latency,jitter=args.jitter,max_concurrency=args.max_concurrency,
+                                trace_file=args.server_trace).start()
+            current["server"] = {"latency":args.latency,"jitter":args.jitter,
+                                 "max_concurrency":args.max_concurrency}
+        try:
+            for name in names:
+                result = measure(name,args.repeat,server)
+                current["results"][name] = result
+                print(f"{name:<22}{result['wall_time']:>9.2f} s{result['calls']:>8} calls"
+                      f"{result['peak_rss_mb']:>9.1f} MB",flush=True)
+        finally:
+            if server is not None:
+                server.stop()
+        if args.server_trace and server is not None:
+            print(summarize_trace(args.server_trace))
+        if not args.no_save:
+            history.append(current)
+            save_history(history,args.history)
+    baseline = find_entry(history,args.baseline,exclude=current)
+    if baseline is None:
+        print("比較する結果がありません")
+        return
+    table,regressions = compare(current,baseline,args.threshold)
+    print(table)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+PFPのEstimatorを模したローカルの計算サーバー.
+
+| ローカルのASEのcalculator(デフォルトはEMT)をソケットのサーバーで包み,
+| 1回の要求あたりの遅延(ネットワークの往復),ゆらぎ,同時に計算できる数,1秒あたりの要求数の上限,
+| 失敗の注入を設定できるようにする. 1回の要求で複数の構造を計算できる(バッチ).
+| クライアントのRemoteCalculatorはpfp_calculatorが返すcalculatorと同じくASEのcalculatorであり,
+| calc_funcを引数に取る全てのクラス(SinglePath,SNEB,AutoOpt,NetGraph,ReactPath等)で使用できる.
+| 各要求の到着,計算開始,終了の時刻はtrace_fileにjson linesで記録する.
+
+要求の処理:
+
+    1. 到着(arrive). max_rpsを超える場合は待つ.
+    2. latency+N(0,jitter^2)秒待つ(ネットワークの往復,計算枠を占有しない).
+    3. 計算枠(max_concurrency個)が空くまで待つ(queue).
+    4. 計算(start~end). 実際の計算時間に加えて,per_structure×構造数 秒待つ.
+    5. failure_rateの確率でエラーを返す(失敗した場合も計算枠を占有する).
+
+Examples:
+
+    >>> server = CalcServer(latency=0.05, jitter=0.01, max_concurrency=4, trace_file="calls.jsonl")
+    >>> server.start()
+    >>> sp = SinglePath(ini, fin, calc_func=server.calc_func)  # RemoteCalculatorを返す関数
+    >>> batch_calc = server.calc_func().compute_batch          # BatchLBFGS等のbatch_calc
+    >>> server.stop()
+
+    $ python benchmarks/calc_server.py --port 6000 --latency 0.05 --max-concurrency 4
+    >>> calc = RemoteCalculator(("127.0.0.1", 6000))
+"""
+import os
+import json
+import time
+import argparse
+import threading
+import multiprocessing as mp
+from functools import partial
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from ase import Atoms
+from ase.calculators.calculator import Calculator, CalculationFailed, all_changes
+
+AUTHKEY = b"grrmpy"
+
+def _default_calculator():
+    from ase.calculators.emt import EMT
+    return EMT()
+
+class _RateLimiter():
+    """1秒あたりの要求数をmax_rps以下にする(トークンバケット)"""
+    def __init__(self,max_rps):
+        self.max_rps = max_rps
+        self.lock = threading.Lock()
+        self.next_time = time.perf_counter()
+
+    def wait(self):
+        if not self.max_rps:
+            return
+        with self.lock:
+            now = time.perf_counter()
+            self.next_time = max(self.next_time,now)
+            delay = self.next_time-now
+            self.next_time += 1/self.max_rps
+        if delay > 0:
+            time.sleep(delay)
+
+class _Server():
+    """サーバーのプロセスで動く本体"""
+    def __init__(self,calc_factory,latency,jitter,per_structure,max_concurrency,max_rps,
+                 failure_rate,seed,trace_file):
+        self.calc_factory = calc_factory
+        self.latency = latency
+        self.jitter = jitter
+        self.per_structure = per_structure
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.limiter = _RateLimiter(max_rps)
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.rng_lock = threading.Lock()
+        self.trace = open(trace_file,"a") if trace_file else None
+        self.trace_lock = threading.Lock()
+        self.n_requests = 0
+        self.t0 = time.perf_counter()
+
+    def _random(self):
+        with self.rng_lock:
+            return self.rng.normal(0,self.jitter) if self.jitter else 0.0,self.rng.random()
+
+    def _compute(self,calc,structures,properties):
+        results = []
+        for numbers,positions,cell,pbc in structures:
+            atoms = Atoms(numbers=numbers,positions=positions,cell=cell,pbc=pbc)
+            # 前の構造からの変更だけを伝える(EMT等は原子の種類が同じなら近接リストを作り直さない)
+            changes = all_changes if calc.atoms is None else calc.check_state(atoms)
+            calc.calculate(atoms,properties,changes)
+            results.append({p:calc.results[p] for p in properties if p in calc.results})
+        return results
+
+    def handle(self,request,calc,client):
+        with self.trace_lock:
+            self.n_requests += 1
+            request_id = self.n_requests
+        arrive = time.perf_counter()
+        self.limiter.wait()
+        noise,draw = self._random()
+        time.sleep(max(self.latency+noise,0.0))
+        queued = time.perf_counter()
+        with self.slots:
+            start = time.perf_counter()
+            failed = draw < self.failure_rate
+            if failed:
+                response = {"error":"injected failure"}
+            else:
+                try:
+                    response = {"results":self._compute(calc,request["structures"],request["properties"])}
+                except Exception as e:
+                    failed = True
+                    response = {"error":f"{type(e).__name__}: {e}"}
+            time.sleep(self.per_structure*len(request["structures"]))
+            end = time.perf_counter()
+        if self.trace:
+            record = {"id":request_id,"client":client,"n_structures":len(request["structures"]),
+                      "arrive":arrive-self.t0,"queued":queued-self.t0,"start":start-self.t0,"end":end-self.t0,
+                      "wait":start-queued,"service":end-start,"total":end-arrive,
+                      "status":"error" if failed else "ok"}
+            with self.trace_lock:
+                self.trace.write(json.dumps(record)+"\n")
+                self.trace.flush()
+        return response
+
+    def serve_client(self,conn,client):
+        calc = self.calc_factory() # 接続毎にcalculatorを作成する(スレッド間で共有しない)
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError,OSError):
+                    break
+                if request.get("op") == "close":
+                    break
+                conn.send(self.handle(request,calc,client))
+        finally:
+            conn.close()
+
+def _serve(address,authkey,params,ready,stop):
+    """サーバーのプロセスのエントリーポイント"""
+    server = _Server(**params)
+    with Listener(address,backlog=128,authkey=authkey) as listener: # 同時に接続するクライアントを待たせない
+        ready.send(listener.address)
+        ready.close()
+        n_clients = 0
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                continue
+            if stop is not None and stop.is_set():
+                conn.close()
+                break
+            n_clients += 1
+            threading.Thread(target=server.serve_client,args=(conn,n_clients),daemon=True).start()
+
+class CalcServer():
+    """ローカルの計算サーバー(別のプロセスで起動する)
+
+    Parameters:
+
+    calc_factory: callable
+        | calculatorを返す関数(クライアントの接続毎に呼び出す). デフォルトはEMT.
+    latency: float
+        1回の要求あたりの遅延(秒)
+    jitter: float
+        遅延のゆらぎ(正規分布の標準偏差,秒)
+    per_structure: float
+        1構造あたりに加える計算時間(秒)
+    max_concurrency: int
+        同時に計算できる要求の数
+    max_rps: float
+        1秒あたりの要求数の上限. Noneの場合は制限しない.
+    failure_rate: float
+        エラーを返す確率
+    seed: int
+        ゆらぎ,失敗の乱数のシード
+    trace_file: str
+        要求毎の記録(json lines)を追記するファイル. Noneの場合は記録しない.
+    address: tuple
+        (ホスト,ポート). ポートが0の場合は空いているポートを使う.
+    """
+    def __init__(self,calc_factory=_default_calculator,latency=0.05,jitter=0.0,per_structure=0.0,
+                 max_concurrency=1,max_rps=None,failure_rate=0.0,seed=0,trace_file=None,
+                 address=("127.0.0.1",0),authkey=AUTHKEY):
+        self.params = {"calc_factory":calc_factory,"latency":latency,"jitter":jitter,
+                       "per_structure":per_structure,"max_concurrency":max_concurrency,
+                       "max_rps":max_rps,"failure_rate":failure_rate,"seed":seed,
+                       "trace_file":str(trace_file) if trace_file else None}
+        self.address = address
+        self.authkey = authkey
+        self.process = None
+
+    def start(self):
+        """サーバーのプロセスを起動し,接続できるようになるまで待つ"""
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        receiver,sender = ctx.Pipe(duplex=False)
+        self._stop = ctx.Event()
+        self.process = ctx.Process(target=_serve,args=(self.address,self.authkey,self.params,sender,self._stop),
+                                   daemon=True)
+        self.process.start()
+        sender.close()
+        self.address = receiver.recv()
+        return self
+
+    def stop(self):
+        """サーバーのプロセスを終了する"""
+        if self.process is None:
+            return
+        self._stop.set()
+        try:
+            Client(self.address,authkey=self.authkey).close() # acceptを終わらせる
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+    @property
+    def calc_func(self):
+        """RemoteCalculatorを返す関数(プロセス間で受け渡せる)"""
+        return partial(RemoteCalculator,self.address,authkey=self.authkey)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*args):
+        self.stop()
+
+class RemoteCalculator(Calculator):
+    """CalcServerで計算するASEのcalculator
+
+    | 接続はcalculator毎に1つ(最初の計算時に接続する). forkしたプロセスでは接続し直す.
+
+    Parameters:
+
+    address: tuple
+        サーバーの(ホスト,ポート)
+    retries: int
+        | エラーの場合に再試行する回数. 再試行しても失敗した場合はCalculationFailedを送出する.
+    """
+    implemented_properties = ["energy","free_energy","forces","stress"]
+
+    def __init__(self,address,authkey=AUTHKEY,retries=0,**kwargs):
+        super().__init__(**kwargs)
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.retries = retries
+        self._conn = None
+        self._pid = None
+        #: サーバーへの要求の数
+        self.n_requests = 0
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = Client(self.address,authkey=self.authkey)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _request(self,atoms_list,properties):
+        structures = [(atoms.numbers,atoms.positions,np.array(atoms.cell),atoms.pbc) for atoms in atoms_list]
+        conn = self._connection()
+        for _ in range(self.retries+1):
+            self.n_requests += 1
+            conn.send({"op":"compute","structures":structures,"properties":list(properties)})
+            response = conn.recv()
+            if "results" in response:
+                return response["results"]
+        raise CalculationFailed(f"CalcServer: {response['error']}")
+
+    def calculate(self,atoms=None,properties=["energy"],system_changes=all_changes):
+        super().calculate(atoms,properties,system_changes)
+        properties = {"energy","forces"}|set(properties)
+        result = self._request([self.atoms],properties)[0]
+        if "energy" in result:
+            result.setdefault("free_energy",result["energy"])
+        self.results.update(result)
+
+    def compute_batch(self,atoms_list):
+        """複数の構造を1回の要求で計算する(grrmpy.optimize.batchのbatch_calcとして使える)
+
+        Returns:
+            tuple: (エネルギーの配列, forceのリスト)
+        """
+        results = self._request(atoms_list,["energy","forces"])
+        return np.array([r["energy"] for r in results]),[np.array(r["forces"]) for r in results]
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            try:
+                self._conn.send({"op":"close"})
+                self._conn.close()
+            except OSError:
+                pass
+        self._conn = None
+
+    def __del__(self):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+def summarize_trace(trace_file):
+    """trace_fileの集計
+
+    Returns:
+        dict: requests, structures, errors, mean_wait(s), mean_service(s), mean_total(s), p95_total(s), requests_per_second
+    """
+    with open(trace_file) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return {"requests":0}
+    total = np.array([r["total"] for r in records])
+    span = max(r["end"] for r in records)-min(r["arrive"] for r in records)
+    return {"requests":len(records),
+            "structures":sum(r["n_structures"] for r in records),
+            "errors":sum(r["status"] != "ok" for r in records),
+            "mean_wait":float(np.mean([r["wait"] for r in records])),
+            "mean_service":float(np.mean([r["service"] for r in records])),
+            "mean_total":float(total.mean()),
+            "p95_total":float(np.percentile(total,95)),
+            "requests_per_second":len(records)/span if span > 0 else float("nan")}
+
+def main():
+    parser = argparse.ArgumentParser(description="PFPのEstimatorを模したローカルの計算サーバー")
+    parser.add_argument("--host",default="127.0.0.1")
+    parser.add_argument("--port",type=int,default=6000)
+    parser.add_argument("--latency",type=float,default=0.05,help="1回の要求あたりの遅延(秒)")
+    parser.add_argument("--jitter",type=float,default=0.0,help="遅延のゆらぎ(標準偏差,秒)")
+    parser.add_argument("--per-structure",type=float,default=0.0,help="1構造あたりに加える計算時間(秒)")
+    parser.add_argument("--max-concurrency",type=int,default=1,help="同時に計算できる要求の数")
+    parser.add_argument("--max-rps",type=float,default=None,help="1秒あたりの要求数の上限")
+    parser.add_argument("--failure-rate",type=float,default=0.0,help="エラーを返す確率")
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--trace",default=None,help="要求毎の記録(json lines)のファイル")
+    args = parser.parse_args()
+    params = {"calc_factory":_default_calculator,"latency":args.latency,"jitter":args.jitter,
+              "per_structure":args.per_structure,"max_concurrency":args.max_concurrency,
+              "max_rps":args.max_rps,"failure_rate":args.failure_rate,"seed":args.seed,
+              "trace_file":args.trace}
+    receiver,sender = mp.Pipe(duplex=False)
+    threading.Thread(target=lambda:print(f"listening on {receiver.recv()}",flush=True),daemon=True).start()
+    try:
+        _serve((args.host,args.port),AUTHKEY,params,sender,None)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+GRRMの出力ファイルを模した入力を作成する(パーサー,ネットワークの大規模なベンチマーク用).
+
+| 作成するファイル(nameはXXX.comのXXXの部分):
+|     {name}.com          Frozen Atomsを含むcomファイル
+|     POSCAR              セル
+|     {name}_EQ_list.log, {name}_TS_list.log, {name}_PT_list.log
+|     {name}_TSi.log      IRC(grrmpy.command.read_ircで読み込める)
+|     {name}_PTi.log      LUPの経路(grrmpy.command.read_lupで読み込める)
+| 構造,エネルギー,CONNECTIONは乱数のシードから決まる(同じ引数で同じファイルになる).
+| 構造はchunk個ずつ作成して書き込むため,10^6個の構造でもファイルの内容をメモリに保持しない.
+
+CONNECTIONのモデル(model):
+
+    - 'random': 全EQを連結にする木(n_eq-1本)に,ランダムなEQの組を加える
+    - 'lattice': EQを幅widthの格子に並べ,隣り合うEQをつなぐ(表面拡散のネットワーク)
+    - 'scale_free': 次数に比例した確率でつなぐ(Barabási-Albert)
+
+Examples:
+
+    >>> generate("synth", "bench", n_eq=100000, model="scale_free", reenergy=True, n_irc=10)
+    >>> EQList("synth/bench_EQ_list.log", "synth/bench.com", "synth/POSCAR")
+
+    $ python benchmarks/synthetic.py synth --n-eq 1000000 --model lattice
+"""
+import argparse
+from pathlib import Path
+import numpy as np
+from ase import Atoms
+from ase.build import molecule
+from ase.io import write
+
+TITLES = {"EQ":"List of Equilibrium Structures",
+          "TS":"List of Transition Structures",
+          "PT":"List of Path Top (Approximate TS) Structures"}
+
+#: 乱数のシードに加える構造の種類の番号
+_KIND = {"EQ":0,"TS":1,"PT":2}
+
+def isomers(names=("CH3CH2OH","CH3OCH3")):
+    """原子の順序(原子番号順)を揃えた分子のリスト(全て同じ組成にする)"""
+    atoms_list = []
+    for name in names:
+        atoms = molecule(name)
+        atoms_list.append(atoms[np.argsort(atoms.numbers,kind="stable")])
+    if any(atoms.get_chemical_symbols() != atoms_list[0].get_chemical_symbols() for atoms in atoms_list):
+        raise ValueError("同じ組成の分子を指定してください")
+    return atoms_list
+
+def frozen_atoms(n_frozen=16,symbol="Al",spacing=2.86):
+    """分子の下に置く正方格子のFrozenAtoms"""
+    width = int(np.ceil(np.sqrt(n_frozen)))
+    positions = [((i%width)*spacing,(i//width)*spacing,0.0) for i in range(n_frozen)]
+    return Atoms([symbol]*n_frozen,positions)
+
+def connections(model,n_eq,n_edges,seed=0,unknown=0.01,dc=0.01,width=None):
+    """CONNECTIONを1つずつ返すジェネレーター
+
+    Parameters:
+
+    model: str
+        'random','lattice','scale_free'
+    n_eq: int
+        EQの数
+    n_edges: int
+        CONNECTIONの数
+    unknown, dc: float
+        CONNECTIONの片方を'??','DC'にする割合
+    width: int
+        'lattice'の格子の幅. Noneの場合はsqrt(n_eq).
+
+    Yields:
+        tuple: (int, int or str)
+    """
+    rng = np.random.default_rng([seed,3])
+    if model == "random":
+        def pair(i):
+            if i < n_eq-1:
+                return int(rng.integers(0,i+1)),i+1
+            return tuple(int(x) for x in rng.integers(0,n_eq,2))
+    elif model == "lattice":
+        width = width or max(1,int(np.sqrt(n_eq)))
+        neighbors = [1,width] # 右,下
+        def pair(i):
+            j = i%(2*n_eq)
+            a = j//2
+            b = a+neighbors[j%2]
+            if b >= n_eq or (j%2 == 0 and b%width == 0):
+                b = int(rng.integers(0,n_eq))
+            return a,b
+    elif model == "scale_free":
+        # 各エッジの両端を記録した配列から一様に選ぶと,次数に比例した確率になる
+        ends = np.zeros(2*n_edges,dtype=np.int64)
+        n_ends = 0
+        def pair(i):
+            nonlocal n_ends
+            if i < n_eq-1:
+                a = int(ends[rng.integers(0,n_ends)]) if n_ends else 0
+                b = i+1
+            else:
+                a,b = int(ends[rng.integers(0,n_ends)]),int(rng.integers(0,n_eq))
+            ends[n_ends:n_ends+2] = a,b
+            n_ends += 2
+            return a,b
+    else:
+        raise ValueError("modelは'random','lattice','scale_free'のいずれかです")
+    for i in range(n_edges):
+        a,b = pair(i)
+        r = rng.random()
+        if r < unknown:
+            b = "??"
+        elif r < unknown+dc:
+            b = "DC"
+        yield a,b
+
+class SyntheticGRRM():
+    """GRRMの出力を模したファイルを作成する
+
+    Parameters:
+
+    n_eq: int
+        EQの数
+    n_ts, n_pt: int
+        TS,PTの数. Noneの場合はそれぞれ2×n_eq,n_eq//2.
+    model: str
+        CONNECTIONのモデル('random','lattice','scale_free')
+    molecules: list of str
+        | 構造の元にする分子(ase.build.moleculeの名前,同じ組成). EQ i はmolecules[i%len(molecules)]になる.
+    noise: float
+        座標に加える乱数の標準偏差(Å)
+    n_frozen: int
+        FrozenAtomsの数
+    reenergy: bool
+        | Trueの場合,ReEnergyの計算のように各構造に'Energy    ='の行を2つ書き込む(1つ目が読み込まれる).
+    normal_modes: bool
+        Trueの場合,'Normal mode eigenvalues'の行を書き込む.
+    unknown, dc: float
+        TS,PTのCONNECTIONの片方を'??','DC'にする割合
+    seed: int
+        乱数のシード
+    chunk: int
+        一度に作成する構造の数
+    """
+    def __init__(self,n_eq=1000,n_ts=None,n_pt=None,model="random",molecules=("CH3CH2OH","CH3OCH3"),
+                 noise=0.02,n_frozen=16,reenergy=False,normal_modes=True,unknown=0.01,dc=0.01,
+                 seed=0,chunk=1000):
+        self.n = {"EQ":n_eq,
+                  "TS":2*n_eq if n_ts is None else n_ts,
+                  "PT":n_eq//2 if n_pt is None else n_pt}
+        self.model = model
+        self.isomers = isomers(molecules)
+        self.frozen = frozen_atoms(n_frozen)
+        center = self.frozen.positions.mean(axis=0) if n_frozen else np.zeros(3)
+        for atoms in self.isomers:
+            atoms.positions += center-atoms.positions.mean(axis=0)+[0,0,3.0]
+        self.symbols = self.isomers[0].get_chemical_symbols()
+        self.noise = noise
+        self.reenergy = reenergy
+        self.normal_modes = normal_modes
+        self.unknown = unknown
+        self.dc = dc
+        self.seed = seed
+        self.chunk = chunk
+        rng = np.random.default_rng([seed,4])
+        #: EQのエネルギー(Hartree). TSのエネルギーを決めるために全て保持する(n_eq個のfloat).
+        self.eq_energies = -154.9+rng.uniform(0,0.05,n_eq)
+        self._fmt = "".join(f"{s:<2}%23.12f%23.12f%23.12f\n" for s in self.symbols)
+        self._cache = (None,None,None)
+        n_mode = 3*len(self.symbols)-6
+        self._modes = {}
+        for kind in _KIND:
+            values = np.linspace(0.001 if kind == "EQ" else -0.002,0.9,n_mode)
+            self._modes[kind] = (f"Normal mode eigenvalues : nmode = {n_mode}\n"
+                                 +"".join("".join(f"{v:14.9f}" for v in values[j:j+5])+"\n"
+                                          for j in range(0,n_mode,5)))
+
+    def positions(self,kind,start):
+        """kindのstart番目からchunk個(最後は残りの数)の構造の座標(構造数,原子数,3)"""
+        i_chunk = start//self.chunk
+        if self._cache[:2] == (kind,i_chunk):
+            return self._cache[2]
+        lo = i_chunk*self.chunk
+        n = min(self.chunk,self.n[kind]-lo)
+        rng = np.random.default_rng([self.seed,_KIND[kind],i_chunk])
+        base = np.stack([atoms.positions for atoms in self.isomers])
+        noise = self.noise if kind == "EQ" else 2.5*self.noise
+        positions = base[(np.arange(lo,lo+n))%len(base)]+rng.normal(0,noise,(n,len(self.symbols),3))
+        self._cache = (kind,i_chunk,positions)
+        return positions
+
+    def get_positions(self,kind,i):
+        """kindのi番目の構造の座標"""
+        return self.positions(kind,i)[i%self.chunk]
+
+    def _connections(self,kind):
+        return connections(self.model,self.n["EQ"],self.n[kind],seed=self.seed+_KIND[kind],
+                           unknown=self.unknown,dc=self.dc)
+
+    def _ts_energy(self,a,b,rng):
+        e = self.eq_energies[a]
+        if isinstance(b,int):
+            e = max(e,self.eq_energies[b])
+        return e+rng.uniform(0.005,0.05)
+
+    def _block(self,kind,i,positions,energy,connection):
+        lines = [f"# Geometry of {kind} {i}, SYMMETRY = C1  \n",
+                 self._fmt%tuple(positions.ravel())]
+        if self.reenergy:
+            lines.append(f"Energy    = {energy:18.12f} ({energy:18.12f} :  0.000000000000)\n")
+            energy += 0.01
+        lines.append(f"Energy    = {energy:18.12f} ({energy:18.12f} :  0.000000000000)\n")
+        lines.append("Spin(**2) =    0.000000000000\n")
+        lines.append("ZPVE      =    0.078000000000\n")
+        if connection is not None:
+            lines.append(f"CONNECTION : {connection[0]} - {connection[1]}\n")
+        if self.normal_modes:
+            lines.append(self._modes[kind])
+        lines.append("\n")
+        return "".join(lines)
+
+    def write_list_log(self,file,kind):
+        """\*_list.logを書き込む
+
+        Returns:
+            int: 構造の数
+        """
+        rng = np.random.default_rng([self.seed,5,_KIND[kind]])
+        conn = self._connections(kind) if kind != "EQ" else None
+        with open(file,"w") as f:
+            f.write(f"{TITLES[kind]}\n\n")
+            for start in range(0,self.n[kind],self.chunk):
+                positions = self.positions(kind,start)
+                text = []
+                for j,pos in enumerate(positions):
+                    i = start+j
+                    if conn is None:
+                        connection,energy = None,self.eq_energies[i]
+                    else:
+                        connection = next(conn)
+                        energy = self._ts_energy(*connection,rng)
+                    text.append(self._block(kind,i,pos,energy,connection))
+                f.write("".join(text))
+        return self.n[kind]
+
+    def write_com(self,file):
+        """Frozen Atomsを含むcomファイルを書き込む"""
+        with open(file,"w") as f:
+            f.write("%link=non-supported\n# MIN/uB3LYP/6-31G\n\n0 1\n")
+            f.write(self._fmt%tuple(self.isomers[0].positions.ravel()))
+            f.write("Frozen Atoms\n")
+            for s,(x,y,z) in zip(self.frozen.get_chemical_symbols(),self.frozen.positions):
+                f.write(f"{s:<2}{x:23.12f}{y:23.12f}{z:23.12f}\n")
+            f.write("Options\nMaxStruc=1000000\nKeepSymmetry\n")
+
+    def write_poscar(self,file):
+        """FrozenAtomsを含むセルのPOSCARを書き込む"""
+        atoms = self.frozen.copy()
+        extent = atoms.positions.max(axis=0) if len(atoms) else np.zeros(3)
+        atoms.set_cell([extent[0]+2.86,extent[1]+2.86,20.0])
+        atoms.pbc = True
+        write(file,atoms,format="vasp")
+
+    def _path(self,a,b,ts,n):
+        """EQ a -> TS -> EQ bの2n+1個の座標(a,bが'??','DC'の場合はTSから離れる方向)"""
+        def end(eq,sign):
+            if isinstance(eq,int):
+                return self.get_positions("EQ",eq)
+            return ts+sign*0.5
+        ini,fin = end(a,-1),end(b,1)
+        t = np.linspace(0,1,n+1)[:,np.newaxis,np.newaxis]
+        forward = ts+(ini-ts)*t # TS -> ini
+        reverse = ts+(fin-ts)*t # TS -> fin
+        return forward,reverse
+
+    def write_irc_logs(self,name,n_irc,steps=20):
+        """最初のn_irc個のTSの{name}_TSi.logを書き込む(各方向steps個のIRCの構造)"""
+        rng = np.random.default_rng([self.seed,5,_KIND["TS"]])
+        for i,(a,b) in zip(range(n_irc),self._connections("TS")):
+            e_ts = self._ts_energy(a,b,rng)
+            ts = self.get_positions("TS",i)
+            forward,reverse = self._path(a,b,ts,steps)
+            def energy(j):
+                return e_ts-0.01*(1-np.cos(np.pi*j/steps))
+            with open(f"{name}_TS{i}.log","w") as f:
+                f.write(f"Geometry of TS {i}\n# Initial structure\n")
+                f.write(self._fmt%tuple(ts.ravel()))
+                f.write(f"ENERGY    = {e_ts:18.12f}  0.000000000000  0.000000000000\n\n")
+                for direction,path in [("FORWARD",forward),("BACKWARD",reverse)]:
+                    f.write(f"IRC following along the {direction} direction\n")
+                    f.write("Sphere optimization converged\n")
+                    for j in range(1,steps+1):
+                        f.write(f"# STEP {j}\n")
+                        f.write(self._fmt%tuple(path[j].ravel()))
+                        f.write(f"ENERGY    = {energy(j):18.12f}  0.000000000000  0.000000000000\n")
+                    f.write("\nEnergy profile along IRC was reached\nOptimized structure\n")
+                    f.write(self._fmt%tuple(path[-1].ravel()))
+                    f.write(f"ENERGY    = {energy(steps):18.12f}  0.000000000000  0.000000000000\n\n")
+
+    def write_lup_logs(self,name,n_lup,nodes=16):
+        """最初のn_lup個のPTの{name}_PTi.logを書き込む(nodes個のLUPの経路の構造)"""
+        rng = np.random.default_rng([self.seed,5,_KIND["PT"]])
+        half = nodes//2
+        for i,(a,b) in zip(range(n_lup),self._connections("PT")):
+            e_pt = self._ts_energy(a,b,rng)
+            forward,reverse = self._path(a,b,self.get_positions("PT",i),half)
+            path = np.concatenate([forward[::-1],reverse[1:]])
+            with open(f"{name}_PT{i}.log","w") as f:
+                f.write(f"Locally updated plane path of PT {i}\n\n")
+                for j,pos in enumerate(path):
+                    f.write(f"# NODE {j}\n")
+                    f.write(self._fmt%tuple(pos.ravel()))
+                    e = e_pt-0.01*(1-np.cos(np.pi*(j-half)/half))
+                    f.write(f"ENERGY    = {e:18.12f}\n\n")
+
+def generate(folder,name="synth",n_irc=0,n_lup=0,irc_steps=20,lup_nodes=16,**kwargs):
+    """folderに全てのファイルを作成する
+
+    Parameters:
+
+    folder: str or Path
+        出力先のフォルダ
+    name: str
+        XXX.comのXXXの部分
+    n_irc, n_lup: int
+        {name}_TSi.log,{name}_PTi.logを作成するTS,PTの数
+    irc_steps: int
+        IRCの片方向あたりの構造の数
+    lup_nodes: int
+        LUPの経路の構造の数
+    kwargs:
+        SyntheticGRRMの引数
+
+    Returns:
+        SyntheticGRRM
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True,exist_ok=True)
+    synth = SyntheticGRRM(**kwargs)
+    prefix = str(folder/name)
+    synth.write_com(f"{prefix}.com")
+    synth.write_poscar(folder/"POSCAR")
+    for kind in ["EQ","TS","PT"]:
+        synth.write_list_log(f"{prefix}_{kind}_list.log",kind)
+    synth.write_irc_logs(prefix,n_irc,irc_steps)
+    synth.write_lup_logs(prefix,n_lup,lup_nodes)
+    return synth
+
+def main():
+    parser = argparse.ArgumentParser(description="GRRMの出力を模したファイルを作成する")
+    parser.add_argument("folder",help="出力先のフォルダ")
+    parser.add_argument("--name",default="synth",help="XXX.comのXXXの部分")
+    parser.add_argument("--n-eq",type=int,default=1000,help="EQの数")
+    parser.add_argument("--n-ts",type=int,default=None,help="TSの数(省略した場合2×EQの数)")
+    parser.add_argument("--n-pt",type=int,default=None,help="PTの数(省略した場合EQの数/2)")
+    parser.add_argument("--model",default="random",choices=["random","lattice","scale_free"],
+                        help="CONNECTIONのモデル")
+    parser.add_argument("--n-irc",type=int,default=0,help="XXX_TSi.logを作成するTSの数")
+    parser.add_argument("--n-lup",type=int,default=0,help="XXX_PTi.logを作成するPTの数")
+    parser.add_argument("--n-frozen",type=int,default=16,help="FrozenAtomsの数")
+    parser.add_argument("--reenergy",action="store_true",help="Energyの行を2つ書き込む")
+    parser.add_argument("--seed",type=int,default=0,help="乱数のシード")
+    args = parser.parse_args()
+    generate(args.folder,args.name,n_irc=args.n_irc,n_lup=args.n_lup,n_eq=args.n_eq,n_ts=args.n_ts,
+             n_pt=args.n_pt,model=args.model,n_frozen=args.n_frozen,reenergy=args.reenergy,seed=args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+ベンチマーク用の構造と入力ファイル.
+
+| 反応はAl(100)表面上のAu原子のhollowサイト間の拡散(hop)で,ASEのEMTで計算できる(pfp不要).
+| GRRMの出力ファイルはsynthetic.pyで作成する.
+
+Examples:
+
+    >>> ini, fin = hop_endpoints()           # 隣り合うhollowサイト
+    >>> ts = bridge_ts()                      # bridgeサイト(TS)
+    >>> top = top_site()                      # topサイト(虚振動が2つの鞍点)
+"""
+from ase.build import fcc100, add_adsorbate
+from ase.calculators.emt import EMT
+from ase.constraints import FixAtoms, FixCartesian
+from ase.optimize import BFGS
+
+def constraints(atoms):
+    """最下層のAlを固定する"""
+    tags = atoms.get_tags()
+    return FixAtoms(mask=tags==tags.max())
+
+def adatom(offset=(0,0),size=(2,2,3),fmax=0.01,fix_x=False):
+    """Al(100)表面のhollowサイトにAuを置き,EMTで構造最適化した構造(calculatorなし)
+
+    Parameters:
+
+    offset: tuple of float
+        | hollowサイトからの位置(表面の単位格子の単位). (0.5,0)はbridgeサイト.
+    size: tuple of int
+        fcc100のsize
+    fmax: float
+        構造最適化の収束条件
+    fix_x: bool
+        Trueの場合,Auのx座標を固定して最適化する(bridgeサイトのTSを求めるため).
+    """
+    slab = fcc100("Al",size,vacuum=6.0)
+    add_adsorbate(slab,"Au",1.6,"hollow",offset=offset)
+    c = [constraints(slab)]
+    if fix_x:
+        c.append(FixCartesian(len(slab)-1,mask=(1,0,0)))
+    slab.set_constraint(c)
+    slab.calc = EMT()
+    BFGS(slab,logfile=None).run(fmax=fmax)
+    slab.calc = None
+    slab.set_constraint(constraints(slab))
+    return slab
+
+def hop_endpoints(distance=1):
+    """distance個隣のhollowサイトのAu(x方向の拡散)の始状態と終状態
+
+    | distance>=2の場合,最小イメージ規則で同じサイトにならないようx方向に2×distance+1個の表面にする.
+    """
+    size = (2,2,3) if distance == 1 else (2*distance+1,2,3)
+    return adatom((0,0),size),adatom((distance,0),size)
+
+def bridge_ts():
+    """hop_endpoints(1)の間のbridgeサイトの構造(鞍点)"""
+    return adatom((0.5,0),fix_x=True)
+
+def top_site():
+    """Al原子の真上(top)サイトのAu(x,y方向に縮退した2つの虚振動を持つ2次の鞍点)"""
+    return adatom((0.5,0.5))
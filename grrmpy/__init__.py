@@ -1,12 +1,23 @@
-from grrmpy import *
-from grrmpy.grrmdata import GrrmData
-from grrmpy.structure.series import Series
-from grrmpy.structure.structures import EQList,TSList,PTList
-from grrmpy.structure.comfile import COM
-from grrmpy.excel.workbook import Workbook
-from grrmpy.calculator import pfp_calculator
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "GrrmData":"grrmpy.grrmdata",
+    "Series":"grrmpy.structure.series",
+    "EQList":"grrmpy.structure.structures",
+    "TSList":"grrmpy.structure.structures",
+    "PTList":"grrmpy.structure.structures",
+    "COM":"grrmpy.structure.comfile",
+    "Workbook":"grrmpy.excel.workbook",
+    "pfp_calculator":"grrmpy.calculator",
+}
+
+_submodules = ["automate","command","constraints","conv","data","excel","geometry","io",
+               "neb","network","optimize","other_app","path","structure","vibrations","visualize",
+               "async_calc","calculator","functions","grrmdata","metrics","trace"]
 
 __all__ = ["GrrmData","Series",
            "EQList","TSList","PTList","COM",
            "Workbook",
-           "pfp_calculator"]
\ No newline at end of file
+           "pfp_calculator"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes, _submodules)
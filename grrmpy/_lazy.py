@@ -0,0 +1,66 @@
+"""
+パッケージの__init__.pyで用いる遅延インポート(PEP 562).
+
+| __init__.pyで全てのモジュールをインポートすると,rdkit,pandas,matplotlib,pyvisなどの
+| 重いライブラリが,使わない場合でも読み込まれる.
+| lazy_attributesで作成した__getattr__は,属性に初めてアクセスした時にモジュールをインポートする.
+
+Examples:
+
+    >>> # grrmpy/io/__init__.py
+    >>> from grrmpy._lazy import lazy_attributes
+    >>> _attributes = {"read_traj":"grrmpy.io.read_traj"}
+    >>> __all__ = list(_attributes)
+    >>> __getattr__, __dir__ = lazy_attributes(__name__, _attributes)
+"""
+import sys
+from types import ModuleType
+from importlib import import_module
+from importlib.util import find_spec
+
+class _LazyModule(ModuleType):
+    """サブモジュールをインポートした時に,同名の属性(関数など)がサブモジュールで上書きされないようにする
+
+    | 例えばgrrmpy.io.read_traj(モジュール)をインポートしても,
+    | grrmpy.io.read_trajは関数のままにする(全てをインポートしていた時と同じ動作).
+    """
+    def __setattr__(self,name,value):
+        if isinstance(value,ModuleType) and name in self.__dict__.get("_lazy_names",()):
+            return
+        super().__setattr__(name,value)
+
+def lazy_attributes(package,attributes,submodules=()):
+    """モジュールの__getattr__,__dir__を作成する
+
+    Parameters:
+
+    package: str
+        パッケージ名(__name__)
+    attributes: dict
+        {属性名:その属性を定義しているモジュール名}
+    submodules: list of str
+        | dir()に表示するサブモジュール名.
+        | ここに無いサブモジュールも,存在すれば属性としてアクセスした時にインポートされる.
+
+    Returns:
+        tuple: (__getattr__, __dir__)
+    """
+    submodules = set(submodules)
+    module = sys.modules[package]
+    module._lazy_names = set(attributes)
+    module.__class__ = _LazyModule
+
+    def __getattr__(name):
+        if name in attributes:
+            value = getattr(import_module(attributes[name]),name)
+        elif name in submodules or (not name.startswith("__") and find_spec(f"{package}.{name}")):
+            value = import_module(f"{package}.{name}")
+        else:
+            raise AttributeError(f"module '{package}' has no attribute '{name}'")
+        setattr(module,name,value) # 2回目以降は__getattr__を経由しない
+        return value
+
+    def __dir__():
+        return sorted(set(vars(module)) | set(attributes) | submodules)
+
+    return __getattr__, __dir__
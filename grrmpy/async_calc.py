@@ -0,0 +1,158 @@
+"""
+独立な複数の構造のエネルギー,forceを並行して計算する.
+
+| PFPなどのネットワーク越しのcalculatorでは,1回の計算時間の大部分が通信の待ち時間になる.
+| 構造毎にget_potential_energy()を順に呼び出すと待ち時間がN回分かかるが,
+| get_potential_energies()はasyncioで最大max_concurrency個の要求を同時に送り,
+| 待ち時間を(ほぼ)1回分にする. 結果は与えたリストと同じ順番で返す.
+
+| ASEのcalculatorは同期的なので,AsyncCalculatorが各計算をスレッドで実行して待機可能(awaitable)にする.
+| 同じcalculatorを共有している構造は同時に計算できないので,それらは1つのタスクで順に計算する.
+| 実行中のイベントループ(Jupyterなど)の中から呼び出した場合は,別のスレッドでイベントループを作成する.
+
+Examples:
+
+    >>> from grrmpy.async_calc import get_potential_energies
+    >>> energies = get_potential_energies(atoms_list, calc_func=pfp_calculator)
+
+    asyncioのコード中で用いる場合
+
+    >>> energies = await gather_properties(atoms_list, "energy", max_concurrency=16)
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+#: 同時に計算する構造の数のデフォルト値
+DEFAULT_CONCURRENCY = 8
+
+class AsyncCalculator():
+    """calculatorを待機可能(awaitable)にする
+
+    | calculatorがaget_property(name,atoms)(コルーチン)を持つ場合はそれを用いる.
+    | 持たない場合はget_property(name,atoms)をexecutor(デフォルトはイベントループのスレッドプール)で実行する.
+
+    Parameters:
+
+    calc: calculator
+        ASEのcalculator
+    executor: concurrent.futures.Executor
+        | 計算を実行するexecutor. Noneの場合はイベントループのデフォルトのexecutor.
+    """
+    def __init__(self,calc,executor=None):
+        self.calc = calc
+        self.executor = executor
+
+    async def get_property(self,name,atoms):
+        aget_property = getattr(self.calc,"aget_property",None)
+        if aget_property is not None:
+            return await aget_property(name,atoms)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,self.calc.get_property,name,atoms)
+
+    async def get_potential_energy(self,atoms):
+        return await self.get_property("energy",atoms)
+
+    async def get_forces(self,atoms):
+        """制約を適用したforce(Atoms.get_forces()と同じ)"""
+        forces = np.array(await self.get_property("forces",atoms))
+        for c in atoms.constraints:
+            c.adjust_forces(atoms,forces)
+        return forces
+
+async def _get(calc,name,atoms):
+    if name == "forces":
+        return await calc.get_forces(atoms)
+    return await calc.get_property(name,atoms)
+
+async def gather_properties(atoms_list,name="energy",max_concurrency=DEFAULT_CONCURRENCY):
+    """atoms_listの各構造のnameの値を並行して計算する(コルーチン)
+
+    Parameters:
+
+    atoms_list: list of Atoms
+        calculatorを付けたAtomsのリスト
+    name: str
+        | 'energy','forces'など. 'energy'はget_potential_energy(),'forces'はget_forces()と同じ値を返す.
+    max_concurrency: int
+        同時に計算する数の上限
+
+    Returns:
+        list: atoms_listと同じ順番の値のリスト
+    """
+    atoms_list = list(atoms_list)
+    for atoms in atoms_list:
+        if atoms.calc is None:
+            raise RuntimeError("calculatorが設定されていないAtomsがあります")
+    # 同じcalculatorを共有する構造をまとめる
+    groups = {}
+    for i,atoms in enumerate(atoms_list):
+        groups.setdefault(id(atoms.calc),[]).append(i)
+    results = [None]*len(atoms_list)
+    semaphore = asyncio.Semaphore(max(1,max_concurrency))
+    with ThreadPoolExecutor(max_workers=max(1,min(max_concurrency,len(groups)))) as executor:
+        async def run_group(indices):
+            calc = AsyncCalculator(atoms_list[indices[0]].calc,executor)
+            for i in indices:
+                async with semaphore:
+                    results[i] = await _get(calc,name,atoms_list[i])
+        await asyncio.gather(*[run_group(indices) for indices in groups.values()])
+    return results
+
+def _run(coro):
+    """同期的なコードからコルーチンを実行する(実行中のイベントループがある場合は別のスレッドで実行する)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    result = {}
+    def target():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as e:
+            result["error"] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+def get_properties(atoms_list,name="energy",calc_func=None,max_concurrency=DEFAULT_CONCURRENCY):
+    """gather_propertiesの同期版
+
+    Parameters:
+
+    atoms_list: list of Atoms
+        Atomsのリスト
+    name: str
+        'energy','forces'など
+    calc_func: function
+        | calculatorを返す関数. 与えた場合,calculatorのないAtomsにcalc_func()を設定する.
+    max_concurrency: int
+        | 同時に計算する数の上限. 1の場合や構造が1つの場合は順に計算する(asyncioを用いない).
+
+    Returns:
+        list: atoms_listと同じ順番の値のリスト
+    """
+    atoms_list = list(atoms_list)
+    if calc_func is not None:
+        for atoms in atoms_list:
+            if atoms.calc is None:
+                atoms.calc = calc_func()
+    if max_concurrency <= 1 or len(atoms_list) <= 1:
+        if name == "energy":
+            return [atoms.get_potential_energy() for atoms in atoms_list]
+        if name == "forces":
+            return [atoms.get_forces() for atoms in atoms_list]
+        return [atoms.calc.get_property(name,atoms) for atoms in atoms_list]
+    return _run(gather_properties(atoms_list,name,max_concurrency))
+
+def get_potential_energies(atoms_list,calc_func=None,max_concurrency=DEFAULT_CONCURRENCY):
+    """各構造のエネルギー(eV)を並行して計算し,リストで返す(get_propertiesを参照)"""
+    return get_properties(atoms_list,"energy",calc_func,max_concurrency)
+
+def get_forces_list(atoms_list,calc_func=None,max_concurrency=DEFAULT_CONCURRENCY):
+    """各構造の制約を適用したforce(eV/Å)を並行して計算し,リストで返す(get_propertiesを参照)"""
+    return get_properties(atoms_list,"forces",calc_func,max_concurrency)
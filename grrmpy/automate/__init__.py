@@ -1,4 +1,13 @@
-from grrmpy.automate.by_neb import SinglePath
-from grrmpy.automate.auto_opt import AutoOpt
+from grrmpy._lazy import lazy_attributes
 
-__all__ = ["SinglePath","AutoOpt"]
\ No newline at end of file
+_attributes = {
+    "SinglePath":"grrmpy.automate.by_neb",
+    "AutoOpt":"grrmpy.automate.auto_opt",
+    "ReCalcGRRM":"grrmpy.automate.recalc_grrm",
+    "TaskGraph":"grrmpy.automate.pipeline",
+    "AutoSaddle":"grrmpy.automate.auto_saddle",
+}
+
+__all__ = ["SinglePath","AutoOpt","ReCalcGRRM","TaskGraph","AutoSaddle"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,26 +1,74 @@
+import time
 from pathlib import Path
-from ase.io import write
+import numpy as np
+from ase.io import write, read
 from ase.optimize import LBFGS
+from ase.calculators.calculator import all_properties
+from ase.calculators.singlepoint import SinglePointCalculator
 
 # USER
-from grrmpy.io import log2atoms
 from grrmpy.optimize.attach import automate_maxstep
-from grrmpy import pfp_calculator
-try:
-    from grrmpy.optimize import FIRELBFGS
-except:
-    pass
+from grrmpy.optimize.batch import BatchLBFGS, SerialBatchCalculator
+from grrmpy.calculator import pfp_calculator
+from grrmpy.command.functions import Progress, run_jobs
+from grrmpy.metrics import NULL_METRICS
+
+def _is_firelbfgs(optimizer):
+    """matlantis_featuresをインポートせずにFIRELBFGSか判定する"""
+    return getattr(optimizer,"__name__",None) == "FIRELBFGS"
+
+def _detach_calc(atoms):
+    """calculatorを計算結果だけを持つSinglePointCalculatorに置き換える(calculatorを解放する)"""
+    calc = atoms.calc
+    if calc is None or isinstance(calc,SinglePointCalculator):
+        return
+    results = {k:v for k,v in getattr(calc,"results",{}).items() if k in all_properties}
+    atoms.calc = SinglePointCalculator(atoms,**results) if results else None
+
+def _optimize(atoms,name,params):
+    """1つの構造を最適化する(プロセスプールで実行できるようにモジュールの関数にしている)
+
+    | calculatorは最適化の直前に作成し,最適化後に解放する.
+    | 例外は全てここで捕捉するため,1つの構造の失敗が他の構造に影響しない.
+
+    Returns:
+        tuple: (name, 状態('converged','not converged','error'), エラーメッセージ, 最適化後のAtoms)
+    """
+    logfile = f"{params['log_foldername']}/{name}.log" if params["logfile"] else None
+    trajectory = f"{params['traj_foldername']}/{name}.traj" if params["trajectory"] else None
+    savefile = f"{params['save_foldername']}/{name}.traj"
+    optimizer = params["optimizer"]
+    status, message = "not converged", None
+    converged = False
+    try:
+        atoms.calc = params["calc_func"]()
+        for maxstep,steps in zip(params["maxstep_list"],params["steps_list"]):
+            ms = 0.2 if maxstep is None else maxstep
+            if _is_firelbfgs(optimizer):
+                opt = optimizer(atoms,maxstep_fire=ms,maxstep_lbfgs=ms)
+            else:
+                opt = optimizer(atoms,maxstep=ms,logfile=logfile,trajectory=trajectory)
+            if maxstep is None:
+                opt.attach(lambda:automate_maxstep(opt,params["maxstep_dict"]))
+            converged = opt.run(fmax=params["fmax"],steps=steps)
+        if converged: # 最後の最適化が収束したか
+            write(savefile,atoms)
+            status = "converged"
+    except Exception as e:
+        status, message = "error", str(e)
+    _detach_calc(atoms)
+    return name, status, message, atoms
 
 class AutoOpt():
     """最適化後の構造は'Structure'フォルダ内にtrajファイルで保存される.
-    
+
         計算後の構造を一括で読み込むには
-        
+
         >>> import grrmpy.io import read_traj
         >>> atoms_list = read_traj('Structure')
 
         Parameters:
-        
+
         atomslist: list of Atoms
             Atomsのリスト
         optimizer: object
@@ -36,9 +84,21 @@ class AutoOpt():
             | Trueの場合, logファイルを保存する.
             | 'log'フォルダー内に保存される.
         calc_func: object
-            calculatorを返す関数
+            | calculatorを返す関数.
+            | calculatorは各構造の計算の直前に作成される.
+            | run(n_jobs>1)で並列計算する場合,プロセス間で受け渡せるようにモジュールの関数にする(lambdaは不可).
+        resume: bool
+            | Trueの場合,フォルダに既にファイルがあっても計算を行なう.
+            | runの際,'Structure'フォルダに収束した構造が保存されている番号は計算しない.
+
+        Examples:
+
+            中断した計算を,8プロセスで再開する
+
+            >>> opt = AutoOpt(atomslist,resume=True)
+            >>> results = opt.run(n_jobs=8)
     """
-    def __init__(self, 
+    def __init__(self,
                  atomslist,
                  optimizer = LBFGS,
                  constraints = [],
@@ -48,13 +108,15 @@ class AutoOpt():
                  errorfile = "ERROR",
                  traj_foldername = "trajectory",
                  log_foldername = "log",
-                 save_foldername = "Structure"):
+                 save_foldername = "Structure",
+                 resume = False,
+                 metrics = None):
         """
-        
+
         最適化後の構造は'Structure'フォルダ内にtrajファイルで保存される.
 
         Parameters:
-        
+
         atomslist: list of Atoms
             Atomsのリスト
         optimizer: object
@@ -71,23 +133,31 @@ class AutoOpt():
             'log'フォルダー内に保存される.
         calc_func: object
             calculatorを返す関数
+        resume: bool
+            Trueの場合,中断した計算を再開する.
+        metrics: Metrics
+            | 進捗(完了数,残りの数,状態毎の数)を公開する場合,grrmpy.metrics.Metrics.
+            | run_batchの場合はcalculatorの計算回数,計算時間も公開する.
         """
         self.optimizer = optimizer
         self.trajectory = trajectory
         self.logfile = logfile
         self.maxstep_dict = None
-        
+        self.calc_func = calc_func
+        self.resume = resume
+        self.metrics = NULL_METRICS if metrics is None else metrics
+        self.results = {}
+
         self.atomslist = atomslist
         for atoms in self.atomslist:
             atoms.set_constraint(constraints)
-            atoms.calc = calc_func()
-            
+
         # フォルダ名,ファイル名
         self.errorfile = f"{errorfile}_{id(self)}"
         self.log_foldername = log_foldername
         self.traj_foldername = traj_foldername
         self.save_foldername = save_foldername
-        
+
         # フォルダの作成
         self.make_folder(self.save_foldername)
         if self.trajectory:
@@ -100,72 +170,102 @@ class AutoOpt():
         if not p.exists():
             # フォルダが存在しなければ作成
             p.mkdir()
-        else:
+        elif not self.resume:
             # 存在する場合は中身が空か確認
             if len(list(p.iterdir())) != 0:
                 raise Exception(f"{p.name}内にファイルが存在します.\n"+
-                                "フォルダを削除するか,インスタンス引数のfoldernameを変更してください")
-        
+                                "フォルダを削除するか,インスタンス引数のfoldernameを変更してください\n"+
+                                "計算を再開する場合はresume=Trueにしてください")
+
     def set_maxstep(self,maxstep):
         if type(maxstep) == list:
             self.maxstep = maxstep
         else:
             self.maxstep = [maxstep]
-            
+
     def set_steps(self,steps):
         if type(steps) == list:
             self.steps = steps
         else:
             self.steps = [steps]
-            
+
     def set_automaxstep(self,maxstep_dict):
         """auto_maxstepsを用いる場合のパラメータを変更する
-        
+
         Examples:
-        
+
             >>> obj.set_automaxstep({10:0.1, 5:0.2, 2:0.3, 0:0.35})
-            
+
         必ず0のキーを含める必要があるので注意する.
         """
         self.maxstep_dict = maxstep_dict
-            
+
     def check_param(self):
         if len(self.maxstep) != len(self.steps):
             raise Exception("maxstepとstepsの要素数が一致しません")
-        
+
     def errorlog(self,massage):
         with open(self.errorfile,"a") as f:
             f.write(massage)
             f.write("\n")
-        
-    def irun(self,atoms,name:int,optimizer,maxstep_list,steps_list,fmax):
-        logfile = f"{self.log_foldername}/{name}.log" if self.logfile else None
-        trajectory = f"{self.traj_foldername}/{name}.traj" if self.trajectory else None
-        savefile = f"{self.save_foldername}/{name}.traj"
+
+    def is_done(self,name,fmax):
+        """'Structure'フォルダに収束した構造が保存されているか
+
+        | 保存されている構造のforceがfmax以下の場合に収束しているとみなす.
+        | forceが保存されていない場合は,ファイルがあれば収束しているとみなす(収束した構造のみ保存するため).
+        """
+        savefile = Path(self.save_foldername,f"{name}.traj")
+        if not savefile.exists():
+            return None
         try:
-            for maxstep,steps in zip(maxstep_list,steps_list):
-                ms = 0.2 if maxstep is None else maxstep
-                if optimizer == FIRELBFGS:
-                    opt = FIRELBFGS(atoms,maxstep_fire=ms,maxstep_lbfgs=ms)
-                else:
-                    opt = optimizer(atoms,maxstep=ms,logfile=logfile,trajectory=trajectory)
-                if maxstep is None:
-                    opt.attach(lambda:automate_maxstep(opt,self.maxstep_dict))
-                opt.run(fmax=fmax,steps=steps)
-            if opt.converged:
-                write(savefile,atoms)
-                return True
-            else:
-                self.errorlog(f"{name}の計算:未収束")
-        except Exception as e:
-            self.errorlog(f"{name}の計算:\n{e}")
-        return False
-           
-    def run(self,maxstep_list=[0.05,0.2],steps_list=[200,10000],fmax=0.001):
+            atoms = read(savefile)
+        except Exception:
+            return None # 書き込み途中で中断したファイルなど
+        if atoms.calc is not None and "forces" in atoms.calc.results:
+            if np.sqrt((atoms.get_forces()**2).sum(axis=1).max()) > fmax*(1+1e-6):
+                return None
+        return atoms
+
+    def _params(self,fmax):
+        return {"optimizer":self.optimizer,
+                "calc_func":self.calc_func,
+                "maxstep_list":self.maxstep,
+                "steps_list":self.steps,
+                "maxstep_dict":self.maxstep_dict,
+                "fmax":fmax,
+                "logfile":self.logfile,
+                "trajectory":self.trajectory,
+                "log_foldername":self.log_foldername,
+                "traj_foldername":self.traj_foldername,
+                "save_foldername":self.save_foldername}
+
+    def _collect(self,name,status,message,atoms,progress):
+        self.results[name] = status
+        if atoms is not None:
+            self.atomslist[name] = atoms
+        if status == "not converged":
+            self.errorlog(f"{name}の計算:未収束")
+        elif status == "error":
+            self.errorlog(f"{name}の計算:\n{message}")
+        progress.update()
+        self.metrics.update_progress(progress,status)
+
+    def irun(self,atoms,name:int,optimizer,maxstep_list,steps_list,fmax):
+        params = self._params(fmax)
+        params.update({"optimizer":optimizer,"maxstep_list":maxstep_list,"steps_list":steps_list})
+        name, status, message, atoms = _optimize(atoms,name,params)
+        if status == "not converged":
+            self.errorlog(f"{name}の計算:未収束")
+        elif status == "error":
+            self.errorlog(f"{name}の計算:\n{message}")
+        return status == "converged"
+
+    def run(self,maxstep_list=[0.05,0.2],steps_list=[200,10000],fmax=0.001,n_jobs=1,max_in_flight=None,quiet=False):
         """
-        
+
         Parameters:
-        
+
         maxstep_list: float or list of float
             | maxstep.
             | optimizeをFIRELBFGSにした場合,maxstep_fire,maxstep_lbfgsどちらもmaxstepで指定した値になる.
@@ -173,10 +273,100 @@ class AutoOpt():
             steps
         fmax: float
             収束条件
+        n_jobs: int
+            | プロセス数. Noneの場合はCPU数. 1の場合は並列化しない.
+        max_in_flight: int
+            | 同時にプロセスに渡す構造の数. Noneの場合はn_jobsの2倍.
+        quiet: bool
+            Trueの場合,進捗を表示しない.
+
+        Returns:
+            dict: {番号:'converged','not converged','error','skipped'のいずれか}
         """
         self.set_maxstep(maxstep_list)
         self.set_steps(steps_list)
         self.check_param()
-        for i,atoms in enumerate(self.atomslist):
-            self.irun(atoms,i,self.optimizer,maxstep_list,steps_list,fmax)
-            
\ No newline at end of file
+        params = self._params(fmax)
+        todo = self._todo(fmax)
+        progress = Progress(len(todo),quiet)
+        run_jobs(_optimize,
+                 ((i,(self.atomslist[i],i,params)) for i in todo),
+                 lambda i,result:self._collect(*result,progress),
+                 lambda i,message:self._collect(i,"error",message,None,progress),
+                 n_jobs,max_in_flight)
+        if not quiet:
+            print(self.summary(progress))
+        self.results = dict(sorted(self.results.items()))
+        return self.results
+
+    def _todo(self,fmax):
+        """計算する構造の番号のリスト(resume=Trueの場合,収束済みの構造は除く)"""
+        todo = []
+        for i in range(len(self.atomslist)):
+            saved = self.is_done(i,fmax) if self.resume else None
+            if saved is None:
+                todo.append(i)
+            else:
+                self.atomslist[i] = saved
+                self.results[i] = "skipped"
+        return todo
+
+    def run_batch(self,batch_calc=None,optimizer=BatchLBFGS,maxstep=None,steps=10000,fmax=0.001,batch_size=None,quiet=False):
+        """複数の構造をまとめて最適化する(grrmpy.optimize.batchを参照)
+
+        | 各ステップで未収束の構造のforceを1回のbatch_calcの呼び出しで計算する.
+        | 収束した構造は直ちに'Structure'フォルダに保存される.
+
+        Parameters:
+
+        batch_calc: callable
+            | Atomsのリストを引数とし,(エネルギーの配列, forceのリスト)を返す関数.
+            | Noneの場合,calc_funcで作成した1つのcalculatorで順に計算する(SerialBatchCalculator).
+        optimizer: class
+            BatchLBFGSまたはBatchFIRE
+        maxstep: float or dict
+            | maxstep. {fmax:maxstep}の辞書で与えた場合,構造毎にfmaxに応じて変更する.
+            | Noneの場合はset_automaxstepで設定した値(automate_maxstepと同じ).
+        steps: int
+            最大ステップ数
+        fmax: float
+            収束条件
+        batch_size: int
+            | 1度に最適化する構造の数. Noneの場合は全ての構造.
+        quiet: bool
+            Trueの場合,進捗を表示しない.
+
+        Returns:
+            dict: {番号:'converged','not converged','skipped'のいずれか}
+        """
+        if batch_calc is None:
+            batch_calc = SerialBatchCalculator(self.metrics.wrap_calc_func(self.calc_func)())
+        if maxstep is None:
+            maxstep = self.maxstep_dict
+        todo = self._todo(fmax)
+        progress = Progress(len(todo),quiet)
+        logfile = f"{self.log_foldername}/batch.log" if self.logfile else None
+        batch_size = len(todo) if batch_size is None else batch_size
+        for start in range(0,len(todo),max(batch_size,1)):
+            names = todo[start:start+batch_size]
+            def callback(k,atoms,converged):
+                if converged:
+                    write(f"{self.save_foldername}/{names[k]}.traj",atoms)
+                self._collect(names[k],"converged" if converged else "not converged",None,None,progress)
+            opt = optimizer([self.atomslist[i] for i in names],batch_calc,maxstep=maxstep,logfile=logfile)
+            opt.run(fmax=fmax,steps=steps,callback=callback)
+        if not quiet:
+            print(self.summary(progress))
+        self.results = dict(sorted(self.results.items()))
+        return self.results
+
+    def summary(self,progress=None):
+        """計算結果の集計を文字列で返す"""
+        counts = {s:0 for s in ["converged","not converged","error","skipped"]}
+        for status in self.results.values():
+            counts[status] += 1
+        text = (f"収束:{counts['converged']} 未収束:{counts['not converged']} "
+                f"エラー:{counts['error']} スキップ:{counts['skipped']}")
+        if progress is not None:
+            text += f" ({time.time()-progress.start:.1f}s)"
+        return text
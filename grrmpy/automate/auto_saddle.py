@@ -1,5 +1,203 @@
+import json
+import shutil
+from pathlib import Path, PurePath
+import numpy as np
+import pandas as pd
+from ase.io import write
+from ase.constraints import FixAtoms
+from ase.calculators.singlepoint import SinglePointCalculator
 
+# USER
+from grrmpy.calculator import pfp_calculator
+from grrmpy.io.read_listlog import log2atoms
+from grrmpy.command.functions import Progress, run_jobs
+
+def _moving_indices(atoms):
+    fixed = {i for c in atoms.constraints if isinstance(c,FixAtoms) for i in c.get_indices()}
+    return [i for i in range(len(atoms)) if i not in fixed]
+
+def _vibrations(atoms,indices,name,delta=0.01):
+    """indicesの原子の振動計算を行なう(一時ファイルは計算後に削除する)"""
+    from ase.vibrations import Vibrations
+    vib = Vibrations(atoms,indices,name=name,delta=delta)
+    vib.run()
+    data = vib.get_vibrations()
+    vib.clean()
+    shutil.rmtree(name,ignore_errors=True)
+    return data
+
+def _refine_saddle(atoms,name,params):
+    """1つのTSの初期構造からDimer法で鞍点を探索する(プロセスプールで実行できるようにモジュールの関数にしている)
+
+    | 収束した構造はfolder/{name}.trajに,結果はfolder/{name}.jsonに保存する.
+
+    Returns:
+        dict: 結果(AutoSaddle.runを参照)
+    """
+    from ase.dimer import MinModeAtoms, MinModeTranslate, DimerControl
+    folder = Path(params["folder"])
+    row = {"name":name,"status":"error","energy":None,"fmax":None,"curvature":None,
+           "n_imag":None,"lowest_freq":None,"displacement":None,"steps":None,"message":None}
+    try:
+        atoms = atoms.copy()
+        atoms.set_constraint(params["constraints"] or atoms.constraints)
+        initial = atoms.get_positions()
+        atoms.calc = params["calc_func"]()
+        indices = _moving_indices(atoms)
+        mask = [i in indices for i in range(len(atoms))]
+        eigenmodes = None
+        if params["initial_mode"] == "vib":
+            data = _vibrations(atoms,indices,str(folder/f"vib_{name}"))
+            mode = np.zeros((len(atoms),3))
+            mode[indices] = data.get_modes(all_atoms=False)[0].reshape(-1,3) # 最も小さい固有値のモード
+            eigenmodes = [mode/np.linalg.norm(mode)]
+        control = DimerControl(mask=mask,logfile=None,eigenmode_logfile=None,**params["dimer_kwargs"])
+        d_atoms = MinModeAtoms(atoms,control,eigenmodes=eigenmodes,random_seed=params["seed"])
+        opt = MinModeTranslate(d_atoms,logfile=str(folder/f"{name}.log"))
+        converged = opt.run(fmax=params["fmax"],steps=params["steps"])
+        forces = atoms.get_forces()
+        row.update({"energy":float(atoms.get_potential_energy()),
+                    "fmax":float(np.sqrt((forces**2).sum(axis=1).max())),
+                    "curvature":float(d_atoms.get_curvature()),
+                    "displacement":float(np.linalg.norm(atoms.get_positions()-initial,axis=1).max()),
+                    "steps":int(opt.nsteps)})
+        if not converged:
+            row["status"] = "not converged"
+        elif params["vib_check"]:
+            data = _vibrations(atoms,indices,str(folder/f"check_{name}"))
+            freqs = data.get_frequencies()
+            n_imag = int((freqs.imag > params["imag_threshold"]).sum())
+            row.update({"n_imag":n_imag,
+                        "lowest_freq":float(-freqs.imag.max() if n_imag else freqs.real.min())})
+            row["status"] = {0:"minimum",1:"saddle"}.get(n_imag,"higher-order")
+        else:
+            row["status"] = "saddle" if row["curvature"] < 0 else "minimum"
+        if converged:
+            image = atoms.copy()
+            image.calc = SinglePointCalculator(image,energy=row["energy"],forces=forces)
+            write(str(folder/f"{name}.traj"),image)
+    except Exception as e:
+        row["message"] = str(e)
+    with open(folder/f"{name}.json","w") as f:
+        json.dump(row,f)
+    return row
 
 class AutoSaddle():
-    def __init__(self,ts_list):
-        pass
\ No newline at end of file
+    """GRRMのTS構造を初期構造として,Dimer法で鞍点を再探索する
+
+    | calculatorを変更した際に,NEB計算を行なわずにTSを再構築する.
+    | 各TSの計算はプロセスプールで並列に行ない,1つのTSの失敗は他のTSに影響しない.
+    | 計算後,最低固有モードの曲率(vib_check=Trueの場合は振動計算の虚振動の数)から鞍点であるか判定する.
+    | 結果はfolder/{番号}.traj(収束した構造),folder/{番号}.json,folder/status.csvに保存される.
+
+    Parameters:
+
+    ts_list: TSList or list of Atoms or str
+        | TSList,Atomsのリスト,またはTS_list.logのパス.
+    comfile: str or Path
+        ts_listがTS_list.logの場合,FrozenAtomsを追加する場合にcomファイルを指定.
+    poscar: str or Path
+        ts_listがTS_list.logの場合,セルを設定する場合にPOSCARファイルを指定.
+    constraints: ASE constraint
+        | FixAtoms等の制約.固定した原子は動かさない.
+    calc_func: object
+        | calculatorを返す関数.
+        | n_jobs>1で並列計算する場合,プロセス間で受け渡せるようにモジュールの関数にする(lambdaは不可).
+    folder: str or Path
+        結果を保存するフォルダ
+    resume: bool
+        Trueの場合,folder/{番号}.jsonが存在するTSは計算しない.
+
+    Examples:
+
+        >>> saddle = AutoSaddle(TSList('XXX_TS_list.log','XXX.com'),constraints=FixAtoms(indices=range(16)))
+        >>> df = saddle.run(n_jobs=8,vib_check=True)
+        >>> df[df["status"]=="saddle"]
+    """
+    def __init__(self,ts_list,comfile=None,poscar=None,constraints=[],calc_func=pfp_calculator,
+                 folder="Saddle",resume=False):
+        if isinstance(ts_list,(str,PurePath)):
+            ts_list = log2atoms(ts_list,comfile,poscar,constraints)
+        elif hasattr(ts_list,"get_atoms_list"):
+            ts_list = ts_list.get_atoms_list()
+        self.ts_list = ts_list
+        self.constraints = constraints
+        self.calc_func = calc_func
+        self.folder = Path(folder)
+        self.resume = resume
+        #: {番号:結果のdict}
+        self.results = {}
+        self.folder.mkdir(parents=True,exist_ok=True)
+
+    def run(self,fmax=0.01,steps=1000,initial_mode="gauss",vib_check=False,imag_threshold=20.0,
+            n_jobs=None,max_in_flight=None,quiet=False,seed=0,**dimer_kwargs):
+        """全てのTSで鞍点を探索する
+
+        Parameters:
+
+        fmax: float
+            収束条件
+        steps: int
+            最大ステップ数
+        initial_mode: str
+            | 最初の固有モードの決め方.
+            | 'gauss': ランダム(DimerControlのinitial_eigenmode_method='gauss').
+            | 'vib': 振動計算の最も小さい固有値のモード(力の計算が移動する原子数×6回増える).
+        vib_check: bool
+            | Trueの場合,収束後に振動計算を行ない,虚振動が1つの場合を'saddle'とする.
+            | Falseの場合,Dimer法の曲率が負の場合を'saddle'とする.
+        imag_threshold: float
+            虚部がimag_threshold cm^-1より大きい振動を虚振動として数える.
+        n_jobs: int
+            | プロセス数. Noneの場合はCPU数. 1の場合は並列化しない.
+        max_in_flight: int
+            同時にプロセスに渡すTSの数. Noneの場合はn_jobsの2倍.
+        quiet: bool
+            Trueの場合,進捗を表示しない.
+        seed: int
+            初期の固有モードの乱数のシード
+        dimer_kwargs:
+            DimerControlのパラメータ(gauss_std,maximum_translation等)
+
+        Returns:
+            DataFrame: 各TSの結果
+                | status: 'saddle','minimum','higher-order','not converged','error'
+                | energy(eV), fmax, curvature(最低固有モードの曲率), n_imag(虚振動の数),
+                | lowest_freq(最も小さい振動数,cm^-1.虚振動の場合は負の値), displacement(初期構造からの最大変位,Å), steps
+        """
+        params = {"folder":str(self.folder),
+                  "constraints":self.constraints,
+                  "calc_func":self.calc_func,
+                  "fmax":fmax,
+                  "steps":steps,
+                  "initial_mode":initial_mode,
+                  "vib_check":vib_check,
+                  "imag_threshold":imag_threshold,
+                  "seed":seed,
+                  "dimer_kwargs":dimer_kwargs}
+        todo = []
+        for i in range(len(self.ts_list)):
+            done = self.folder/f"{i}.json"
+            if self.resume and done.exists():
+                with open(done) as f:
+                    self.results[i] = json.load(f)
+            else:
+                todo.append(i)
+        progress = Progress(len(todo),quiet)
+        def callback(i,row):
+            self.results[i] = row
+            progress.update()
+        def on_error(i,message):
+            self.results[i] = {"name":i,"status":"error","message":message}
+            progress.update()
+        run_jobs(_refine_saddle,
+                 ((i,(self.ts_list[i],i,params)) for i in todo),
+                 callback,on_error,n_jobs,max_in_flight)
+        df = self.status_table()
+        df.to_csv(self.folder/"status.csv")
+        return df
+
+    def status_table(self):
+        """結果をDataFrameにする"""
+        rows = [self.results[i] for i in sorted(self.results)]
+        return pd.DataFrame(rows).set_index("name") if rows else pd.DataFrame()
@@ -1,10 +1,11 @@
 from ase.neb import interpolate
 from ase.optimize import FIRE, LBFGS
-from ase.io import write,iread, Trajectory
+from ase.io import write, Trajectory
 from ase.vibrations import Vibrations
 from ase.units import kJ,mol
 from ase.geometry import find_mic
 from pathlib import Path
+from itertools import count
 import csv
 from pprint import pprint
 import numpy as np
@@ -12,13 +13,19 @@ from ase.build.rotate import minimize_rotation_and_translation
 
 #USER
 from grrmpy.calculator import pfp_calculator
+from grrmpy.async_calc import get_potential_energies
 from grrmpy.neb.auto_neb import SNEB
 from grrmpy.io.write_html import write_html
-from grrmpy.vibrations.functions import to_html_table_and_imode,find_ts_idx,to_html_graph
+from grrmpy.vibrations.functions import to_html_table_and_imode,to_html_graph
+from grrmpy.vibrations.mode_scan import scan_mode
+from grrmpy.vibrations.lanczos import lowest_modes
 from grrmpy.functions import (to_html_energy_diagram,
                               minimize_rotation_and_translation_for_specified_indices_only,
                               connected_components)
 from grrmpy.path import ReactPath
+from grrmpy.io.compact_traj import CompactTrajectoryWriter
+from grrmpy.trace import Tracer
+from grrmpy.metrics import NULL_METRICS
 try:
     from grrmpy.optimize import FIRELBFGS
     defaultoptimizer = FIRELBFGS
@@ -62,6 +69,18 @@ class SinglePath():
             calculatorを返す関数. デフォルトは ``pfp_calculator``
         debug: bool
             debug.logを出力する(デバック用)
+        traj_format: str
+            | SNEB,IRCの構造の保存形式.
+            | 'traj': 最後の構造のみをSNEB{n}.traj,IRC{n}_{reverse,forward}.trajに保存する.
+            | 'ctraj': 全ステップの構造をSNEB{n}.ctraj,IRC{n}_{reverse,forward}.ctrajに保存する.
+            | (grrmpy.io.compact_traj. 固定原子を除いた座標の差分を圧縮して保存する)
+        trace: bool
+            | Trueの場合,各段階(SNEBの各NEB計算,振動計算,モード方向のスキャン,IRC,構造の比較,書き込み)の
+            | 時間,CPU時間,エネルギー/力の計算回数,Optimizerのステップ数,書き込んだバイト数を記録し,
+            | run()の終了時にtrace.json(Chromeのtrace形式)とtrace_summary.csvに保存する(grrmpy.trace).
+        metrics: Metrics
+            | 反復回数,QUEの長さ,EQ,TS,PTの数,計算回数,NEBの各イメージのfmax等をHTTPで公開する場合,
+            | grrmpy.metrics.Metrics(prometheus_clientが必要).
             
         Note:
             | EQ_list.traj, TS_list.trajが既にディレクトリ中にある場合,上書きされてしまうので
@@ -74,7 +93,10 @@ class SinglePath():
                  mic:bool=None,
                  calc_func=pfp_calculator,
                  debug=False,
-                 constraints=[]):
+                 constraints=[],
+                 traj_format="traj",
+                 trace=False,
+                 metrics=None):
         """
         
         EQ構造,TS構造,PT構造はEQ_list.traj,TS_list.traj,PT_list.trajに保存される.
@@ -103,16 +125,29 @@ class SinglePath():
             | constraintsまたはconstraintsのリスト
         debug: bool
             debug.logを出力する(デバック用)
+        traj_format: str
+            | SNEB,IRCの構造の保存形式('traj'または'ctraj')
+        trace: bool
+            | 各段階の時間と計算回数をtrace.json,trace_summary.csvに保存する場合True.
+        metrics: Metrics
+            | 計算の進捗を公開する場合,grrmpy.metrics.Metrics.
             
         Note:
             EQ_list.traj, TS_list.trajが既にディレクトリ中にある場合,上書きされてしまうので
             1つフォルダ内で複数の計算を行なわないようにする!!!
         """
         self.parallel = parallel
-        self.calc_func = calc_func
+        self.trace = trace
+        #: grrmpy.trace.Tracer(trace=Falseの場合は何も記録しない)
+        self.tracer = Tracer(enabled=trace)
+        self.metrics = NULL_METRICS if metrics is None else metrics
+        self.calc_func = self.metrics.wrap_calc_func(self.tracer.wrap_calc_func(calc_func))
         self.indices = indices # vibrations用
         self.debug = debug
         self.constraints = constraints
+        if traj_format not in ["traj","ctraj"]:
+            raise ValueError("traj_formatは'traj'または'ctraj'です")
+        self.traj_format = traj_format
         ### 初期イメージの作成 ###
         if len(data)==1:
             data_type="images"
@@ -144,16 +179,22 @@ class SinglePath():
             writer.writerow(data_list)
         
     def write_eq(self,atoms):
-        self.eq_traj.write(atoms)
+        with self.tracer.span("write_eq",cat="output",files=[self.eq_list_file]):
+            self.eq_traj.write(atoms)
         self.eq_count += 1
+        self.metrics.set_count("EQ",self.eq_count)
         
     def write_ts(self,atoms):
-        self.ts_traj.write(atoms)
-        self.ts_count += 1 
+        with self.tracer.span("write_ts",cat="output",files=[self.ts_list_file]):
+            self.ts_traj.write(atoms)
+        self.ts_count += 1
+        self.metrics.set_count("TS",self.ts_count)
          
     def write_pt(self,atoms):
-        self.pt_traj.write(atoms)
+        with self.tracer.span("write_pt",cat="output",files=[self.pt_list_file]):
+            self.pt_traj.write(atoms)
         self.pt_count += 1
+        self.metrics.set_count("PT",self.pt_count)
     
     def debug_log(self,text):
         if self.debug:
@@ -234,11 +275,24 @@ class SinglePath():
             | maxsteps値. maxstepsの値を大きく設定したとしても,始めの200回はmaxstep=0.03で計算する.
             | Noneを指定した場合,forceに合わせて自動的にmaxstepを調整する.
         dif: float
-            | 振動数計算後のエネルギーダイアグラム解析の結果,
-            | TS(極大値)と谷間(極小値)の差が,dif(kJ/mol)以下の時,optimizer2を使って計算する.
+            | 虚振動のモードに沿ってTSからdif(kJ/mol)下がった点をIRC計算の初期構造とする.
+            | dif(kJ/mol)下がらない(TSとモード方向の極小値の差がdif以下の)時,optimizer2を使って計算する.
+            | (grrmpy.vibrations.mode_scan.scan_mode)
         calc_notop_ts: boolean
             | 振動数計算後のエネルギーダイアグラム解析の結果,TSがない(極大値がない)時,
             | IRC計算を行なわないならFalse.
+
+        VIB:
+
+        method: str
+            | TSの確認方法.
+            | 'lowest': NEBの接線を初期ベクトルとして,最も小さい2つの振動モードのみを求める
+            | (grrmpy.vibrations.lanczos.lowest_modes). 虚振動の数を判断できない場合は'full'で計算する.
+            | 'full': Vibrationsで全ての振動モードを求める(振動数の表が必要な場合).
+        threshold: float
+            'lowest'の場合,threshold cm^-1より小さい虚振動は虚振動として数えない.
+        max_calls: int
+            'lowest'の場合の力の計算回数の上限
         """
         return {
             "General":{
@@ -271,6 +325,11 @@ class SinglePath():
                 "dif":2.0,
                 "calc_notop_ts":True,
             },
+            "VIB":{
+                "method":"lowest",
+                "threshold":10.0,
+                "max_calls":60,
+            },
             }
         
     def set_calculator(self,atoms):
@@ -279,91 +338,171 @@ class SinglePath():
             atoms.set_constraint(self.constraints) # 多分なくても良い
         
     def run_sneb(self,*images):
-        self.sneb = SNEB(*images,
-                            logfile=f"SNEB{self.iter_count}.log",
-                            html=f"SNEB{self.iter_count}_progress.html",
-                            mic=self.mic,
-                            parallel=self.parallel,
-                            calc_func=self.calc_func,
-                            optimizer=self.neb_optimizer,
-                            with_stop = self.with_stop,
-                            max_n = self.max_n,
-                            times = self.times)
-        self.sneb.attach(lambda:write_html(f"SNEB{self.iter_count}.html", self.sneb.images))
-        self.sneb.attach(lambda:write(f"SNEB{self.iter_count}.traj", self.sneb.images))
-        sneb_converged = self.sneb.run(
-            nimages=self.nimages,
-            maxstep=self.neb_maxstep,
-            fmax=self.neb_fmax,
-            steps=self.neb_steps,
-            tolerance=self.tolerance,
-            threshold=self.threshold,
-            dist=self.neb_dist,
-            min_nimages=self.min_nimages,
-            climb_steps = self.climb_steps,
-            climb = self.climb
-        )     
-        return sneb_converged
+        with self.tracer.span(f"SNEB{self.iter_count}",cat="SNEB",
+                              files=[f"SNEB{self.iter_count}.log",f"SNEB{self.iter_count}.{self.traj_format}"]):
+            self.sneb = SNEB(*images,
+                                logfile=f"SNEB{self.iter_count}.log",
+                                html=f"SNEB{self.iter_count}_progress.html",
+                                mic=self.mic,
+                                parallel=self.parallel,
+                                calc_func=self.calc_func,
+                                optimizer=self.neb_optimizer,
+                                with_stop = self.with_stop,
+                                max_n = self.max_n,
+                                times = self.times,
+                                tracer = self.tracer,
+                                metrics = self.metrics)
+            self.sneb.attach(lambda:write_html(f"SNEB{self.iter_count}.html", self.sneb.images))
+            sneb_traj = None
+            if self.traj_format == "ctraj":
+                sneb_traj = CompactTrajectoryWriter(f"SNEB{self.iter_count}.ctraj")
+                step = count()
+                self.sneb.attach(lambda:sneb_traj.write_images(self.sneb.images,step=next(step)))
+            else:
+                self.sneb.attach(lambda:write(f"SNEB{self.iter_count}.traj", self.sneb.images))
+            try:
+                sneb_converged = self.sneb.run(
+                    nimages=self.nimages,
+                    maxstep=self.neb_maxstep,
+                    fmax=self.neb_fmax,
+                    steps=self.neb_steps,
+                    tolerance=self.tolerance,
+                    threshold=self.threshold,
+                    dist=self.neb_dist,
+                    min_nimages=self.min_nimages,
+                    climb_steps = self.climb_steps,
+                    climb = self.climb
+                )
+            finally:
+                if sneb_traj is not None:
+                    sneb_traj.close() # 例外で終了した場合もバッファのフレームを書き込む
+            return sneb_converged
     
+    def neb_tangent(self):
+        """SNEBのTS(imax)での接線"""
+        images,imax = self.sneb.images,self.sneb.imax
+        if not 0 < imax < len(images)-1:
+            return None
+        d = images[imax+1].get_positions()-images[imax-1].get_positions()
+        if self.mic:
+            d = find_mic(d,images[imax].get_cell(),images[imax].get_pbc())[0]
+        return d
+
+    def run_lowest_modes(self):
+        """最も小さい2つの振動モードのみでTSを確認する
+
+        Returns:
+            bool or None: 虚振動が1つの場合True. 判断できなかった場合None.
+        """
+        self.lowest = lowest_modes(self.ts,self.indices,guess=self.neb_tangent(),
+                                   threshold=self.vib_threshold,max_calls=self.vib_max_calls)
+        self.debug_log(f"LOWEST MODES({self.lowest.n_calls}回の力の計算):\n{self.lowest.tabulate()}")
+        if self.lowest.n_imag is None:
+            return None
+        if self.lowest.n_imag == 1:
+            self.vmode = self.lowest.get_mode(0)
+        self.vib_table = f"<pre>{self.lowest.tabulate()}</pre>"
+        return self.lowest.n_imag == 1
+
     def run_vib(self):
-        self.vib = Vibrations(self.ts,self.indices,name=f"vib{self.iter_count}")
-        self.vib.run()
-        tb_text,imode = to_html_table_and_imode(self.vib,full_html=False,include_plotlyjs="cdn")
-        if type(imode) == int:
-            self.vib.write_mode(n=imode)
-            self.vimages = [i for i in iread(f"vib{self.iter_count}.{imode}.traj")]
+        """TSの虚振動を確認する(虚振動が1つの場合,そのモードをself.vmodeにする)"""
+        with self.tracer.span(f"VIB{self.iter_count}",cat="vib",method=self.vib_method):
+            success = None
+            if self.vib_method == "lowest":
+                success = self.run_lowest_modes()
+            if success is None:
+                self.vib = Vibrations(self.ts,self.indices,name=f"vib{self.iter_count}")
+                self.vib.run()
+                self.vib_table,imode = to_html_table_and_imode(self.vib,full_html=False,include_plotlyjs="cdn")
+                success = type(imode) == int
+                if success:
+                    self.vmode = self.vib.get_vibrations().get_modes(all_atoms=True)[imode]
+            if not success:
+                self.write_vib_html()
+            return success
+
+    def run_mode_scan(self):
+        """虚振動のモードに沿ってIRC計算の初期構造を求める(grrmpy.vibrations.mode_scan.scan_mode)
+
+        | self.vimagesは[reverseの初期構造,TS,forwardの初期構造]になる.
+
+        Returns:
+            tuple: find_ts_idxと同じ形式((ts_idx,(reverse_newton,forward_newton,n_peak)))
+        """
+        with self.tracer.span(f"MODE_SCAN{self.iter_count}",cat="mode_scan"):
+            self.scan = scan_mode(self.ts,self.vmode,dif=self.irc_dif,calc_func=self.calc_func)
+            self.debug_log(f"MODE SCAN({self.scan.n_calls}回の計算):{self.scan.info}")
+            self.vimages = [self.scan.reverse,self.ts,self.scan.forward]
+            self.write_vib_html(self.scan)
+            return 1,self.scan.info
+
+    def write_vib_html(self,scan=None):
+        """振動数の表とモード方向のエネルギーダイアグラム(計算済みのエネルギー)をvib{n}.htmlに書き込む"""
+        if scan is not None:
             fig_text = to_html_energy_diagram(
-                self.vimages,
-                calc_func=self.calc_func,
+                scan.images,
                 full_html=False,
                 unit="kJ/mol",
                 title="Vibration Energy Diagram",
-                xaxis_title="",
+                xaxis_title="Displacement(Å)",
                 yaxis_title=None,
+                energies=scan.energies,
+                x=scan.displacements,
                 include_plotlyjs="cdn")
-            success = True
         else:
-            success = False
             fig_text = ""
         with open(f"vib{self.iter_count}.html","w") as f:
-            f.write(tb_text+fig_text)
-        return success
+            f.write(self.vib_table+fig_text)
     
     def run_irc(self,ts_idx:int,r_use_newton:bool, f_use_newton:bool):
         self.ini = self.vimages[ts_idx-1].copy()
         self.ini.calc = self.calc_func()
-        self.ini.set_constraints(self.constraints)
+        self.ini.set_constraint(self.constraints)
         self.fin = self.vimages[ts_idx+1].copy()
         self.fin.calc = self.calc_func()
-        self.fin.set_constraints(self.constraints)
+        self.fin.set_constraint(self.constraints)
         r_converged = self.irun_irc(self.ini, r_use_newton, "reverse")
         f_converged = self.irun_irc(self.fin, f_use_newton, "forward")
         return [r_converged, f_converged]
         
     def irun_irc(self,atoms,use_newton,name):
-        optimizer = self.optimizer2 if use_newton else self.optimizer1
-        def get_args(maxsteps):
-            try:
-                if optimizer==FIRELBFGS:
-                    arg = {"switch":0.04,"maxstep_fire":maxsteps,"maxstep_lbfgs":maxsteps}
-                else:
+        with self.tracer.span(f"IRC{self.iter_count}_{name}",cat="IRC",
+                              files=[f"IRC{self.iter_count}_{name}.log",f"IRC{self.iter_count}_{name}.{self.traj_format}"]):
+            optimizer = self.optimizer2 if use_newton else self.optimizer1
+            def get_args(maxsteps):
+                try:
+                    if optimizer==FIRELBFGS:
+                        arg = {"switch":0.04,"maxstep_fire":maxsteps,"maxstep_lbfgs":maxsteps}
+                    else:
+                        arg = {"maxstep":maxsteps}
+                except:
                     arg = {"maxstep":maxsteps}
-            except:
-                arg = {"maxstep":maxsteps}
-            return arg
-        ### 始めにmaxstep=0.03で200回計算しておく
-        self.irc_opt = optimizer(atoms,
-                                 logfile = f"IRC{self.iter_count}_{name}.log",
-                                 **get_args(0.03))
-        self.irc_opt.attach(lambda:write(f"IRC{self.iter_count}_{name}.traj", atoms))
-        self.irc_opt.run(fmax=self.irc_fmax, steps=200)
-        ### 計算
-        self.irc_opt = optimizer(atoms,
-                                 logfile = f"IRC{self.iter_count}_{name}.log",
-                                 **get_args(self.irc_maxstep))
-        self.irc_opt.attach(lambda:write(f"IRC{self.iter_count}_{name}.traj", atoms))
-        converged = self.irc_opt.run(fmax=self.irc_fmax, steps=self.irc_steps)
-        return converged
+                return arg
+            irc_traj = None
+            if self.traj_format == "ctraj":
+                irc_traj = CompactTrajectoryWriter(f"IRC{self.iter_count}_{name}.ctraj",atoms=atoms)
+                save = irc_traj.write
+            else:
+                save = lambda:write(f"IRC{self.iter_count}_{name}.traj", atoms)
+            try:
+                ### 始めにmaxstep=0.03で200回計算しておく
+                self.irc_opt = optimizer(atoms,
+                                         logfile = f"IRC{self.iter_count}_{name}.log",
+                                         **get_args(0.03))
+                self.irc_opt.attach(save)
+                self.irc_opt.run(fmax=self.irc_fmax, steps=200)
+                self.tracer.add_steps(self.irc_opt.nsteps)
+                ### 計算
+                self.irc_opt = optimizer(atoms,
+                                         logfile = f"IRC{self.iter_count}_{name}.log",
+                                         **get_args(self.irc_maxstep))
+                self.irc_opt.attach(save)
+                converged = self.irc_opt.run(fmax=self.irc_fmax, steps=self.irc_steps)
+                self.tracer.add_steps(self.irc_opt.nsteps)
+            finally:
+                if irc_traj is not None:
+                    irc_traj.close() # 例外で終了した場合もバッファのフレームを書き込む
+            return converged
     
     def _get_dif_energy(self,atoms1, atoms2):
         """エネルギー差の判定"""
@@ -391,44 +530,45 @@ class SinglePath():
             | 原子間距離のRMS誤差,原子間距離の最大距離がそれぞれ,
             | e%, fÅ 以下の時, 同一構造であるとみなす. 
         """
-        a,b,c,d,e,f = self.struct_check_threshold
-        
-        dif_energy = self._get_dif_energy(atoms1, atoms2) # エネルギー差を取得
-        
-        atoms1_cp = atoms1.copy()
-        atoms2_cp = atoms2.copy()
-        mols_idx1 = [i for i in connected_components(atoms1_cp,self.indices)] # 分子を抽出
-        mols_idx2 = [i for i in connected_components(atoms2_cp,self.indices)] # 分子を抽出
-        if mols_idx1 == mols_idx2: # 同じ分子で構成されていた場合
-            for idxs in mols_idx1:
-                indices = list(idxs)
-                minimize_rotation_and_translation_for_specified_indices_only(
-                    atoms1_cp,
-                    atoms2_cp,
-                    indices
-                    )
-            rmse1, max_dist1 = self._get_check_rmse_and_maxdist(atoms1_cp,atoms2_cp)
-            same_geo = True
-        else:
-            rmse1, max_dist1 = False,False
-            same_geo = False
+        with self.tracer.span("check_structures",cat="check"):
+            a,b,c,d,e,f = self.struct_check_threshold
+        
+            dif_energy = self._get_dif_energy(atoms1, atoms2) # エネルギー差を取得
+        
+            atoms1_cp = atoms1.copy()
+            atoms2_cp = atoms2.copy()
+            mols_idx1 = [i for i in connected_components(atoms1_cp,self.indices)] # 分子を抽出
+            mols_idx2 = [i for i in connected_components(atoms2_cp,self.indices)] # 分子を抽出
+            if mols_idx1 == mols_idx2: # 同じ分子で構成されていた場合
+                for idxs in mols_idx1:
+                    indices = list(idxs)
+                    minimize_rotation_and_translation_for_specified_indices_only(
+                        atoms1_cp,
+                        atoms2_cp,
+                        indices
+                        )
+                rmse1, max_dist1 = self._get_check_rmse_and_maxdist(atoms1_cp,atoms2_cp)
+                same_geo = True
+            else:
+                rmse1, max_dist1 = False,False
+                same_geo = False
         
-        atoms1_cp = atoms1.copy()
-        atoms2_cp = atoms2.copy()   
-        if self.mrt:
-            minimize_rotation_and_translation(atoms1_cp,atoms2_cp)  
-        rmse2, max_dist2 = self._get_check_rmse_and_maxdist(atoms1_cp,atoms2_cp)
+            atoms1_cp = atoms1.copy()
+            atoms2_cp = atoms2.copy()   
+            if self.mrt:
+                minimize_rotation_and_translation(atoms1_cp,atoms2_cp)  
+            rmse2, max_dist2 = self._get_check_rmse_and_maxdist(atoms1_cp,atoms2_cp)
         
-        # 同じ分子で構成されていた場合,rmse1を返す
-        rmse = rmse1 if rmse1 else rmse2
-        max_dist = max_dist1 if max_dist1 else max_dist2
+            # 同じ分子で構成されていた場合,rmse1を返す
+            rmse = rmse1 if rmse1 else rmse2
+            max_dist = max_dist1 if max_dist1 else max_dist2
         
-        self.debug_log(f"{dif_energy},{rmse1},{max_dist1},{rmse2},{max_dist2}")
+            self.debug_log(f"{dif_energy},{rmse1},{max_dist1},{rmse2},{max_dist2}")
 
-        if all([dif_energy<a, rmse2<b, max_dist2<c]) or all([dif_energy<d, b<rmse<e, max_dist<f]):
-            return True, same_geo, rmse
-        else:
-            return False, same_geo, rmse
+            if all([dif_energy<a, rmse2<b, max_dist2<c]) or all([dif_energy<d, b<rmse<e, max_dist<f]):
+                return True, same_geo, rmse
+            else:
+                return False, same_geo, rmse
     
     def analyze_connection(self,ts_n,ini_n,fin_n,ts,ini,fin):
         """CSVファイルに書き込む情報を作成する
@@ -446,9 +586,7 @@ class SinglePath():
         self.set_calculator(ini)
         self.set_calculator(fin)
         self.set_calculator(ts)
-        ini_e = ini.get_potential_energy()*mol/kJ
-        fin_e = fin.get_potential_energy()*mol/kJ
-        ts_e = ts.get_potential_energy()*mol/kJ
+        ini_e,fin_e,ts_e = [e*mol/kJ for e in get_potential_energies([ini,fin,ts])]
         forward_ea = ts_e-ini_e
         reverse_ea = ts_e-fin_e
         text = [ts_n,ini_n,fin_n,ini_e,fin_e,forward_ea,reverse_ea]
@@ -456,11 +594,12 @@ class SinglePath():
     
     def create_path(self):
         """Pathオブジェクトを作成する"""
-        name = self.order
-        atoms = [self.atoms_dict[i] for i in self.order]
-        self.path = ReactPath({"name":name,"atoms":atoms})
-        self.path.write_html("Path.html")
-        self.path.topkl("Path.pickle")
+        with self.tracer.span("create_path",cat="output",files=["Path.html","Path.pickle"]):
+            name = self.order
+            atoms = [self.atoms_dict[i] for i in self.order]
+            self.path = ReactPath({"name":name,"atoms":atoms},calc_func=self.calc_func)
+            self.path.write_html("Path.html")
+            self.path.topkl("Path.pickle")
         
     def run(self, param=None):
         """計算を実行する
@@ -480,6 +619,19 @@ class SinglePath():
         >>> param["IRC"]["optimizer1"] = BFGS
         >>> sp.run(param)
         """
+        try:
+            with self.tracer.span("SinglePath.run",cat="run"):
+                return self._run(param)
+        finally:
+            if self.trace:
+                self.write_trace()
+
+    def write_trace(self,file="trace.json",summary_file="trace_summary.csv"):
+        """記録した各段階の時間と計算回数を保存する(trace=Trueの場合)"""
+        self.tracer.write(file)
+        self.tracer.summary().to_csv(summary_file)
+
+    def _run(self,param):
         ### 番号の初期化 ###
         self.eq_count = 0
         self.ts_count = 0
@@ -542,6 +694,10 @@ class SinglePath():
         self.irc_steps = param["IRC"]["steps"]
         self.irc_dif = param["IRC"]["dif"]
         self.calc_notop_ts = param["IRC"]["calc_notop_ts"]
+        vib_param = param.get("VIB",self.default_param["VIB"])
+        self.vib_method = vib_param["method"]
+        self.vib_threshold = vib_param["threshold"]
+        self.vib_max_calls = vib_param["max_calls"]
         #QUE
         self.que = [[0,1]] # 実際には一回目はinitで作成したself.imagesを用いる
         
@@ -559,6 +715,8 @@ class SinglePath():
             self.debug_log(f"QUE:{self.que}")
             self.create_path()
             sneb_ini_idx,sneb_fin_idx = self.que.pop(0)
+            self.metrics.set_iteration(self.iter_count)
+            self.metrics.set_queue(len(self.que))
             self.debug_log(f"SNEB:{sneb_ini_idx}-{sneb_fin_idx}")
             
             if self.first_calculation:
@@ -585,9 +743,7 @@ class SinglePath():
                 continue # 虚振動がない時はSellaを行なうように今後したい
 
             ### VIB エネルギーダイアグラムの分析 ###
-            ts_idx,(r_use_newton,f_use_newton,n) = find_ts_idx(self.vimages,
-                                         dif=self.irc_dif,
-                                         calc_func=self.calc_func)
+            ts_idx,(r_use_newton,f_use_newton,n) = self.run_mode_scan()
             if n == 0 and not self.calc_notop_ts: #TSが見えない(極大値がない)時,
                 self.debug_log(f"ピークが見えない．終了")
                 self.write_pt(self.ts)
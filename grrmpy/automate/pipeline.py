@@ -0,0 +1,219 @@
+"""
+依存関係のある計算(タスク)をプロセスプールで実行する.
+
+| 各タスクは,依存するタスクが全て完了した時点で実行される.
+| タスクの状態はfolder/state.jsonに,結果はfolder/results/{タスク名}.pklに保存されるため,
+| 同じfolderで再実行すると,完了したタスクは実行されない.
+
+Examples:
+
+    >>> graph = TaskGraph("pipeline")
+    >>> graph.add("EQ0", optimize, args=(eq0,))
+    >>> graph.add("EQ1", optimize, args=(eq1,))
+    >>> graph.add("TS0", neb, args=(), deps=["EQ0","EQ1"]) # neb(EQ0の結果,EQ1の結果)が実行される
+    >>> states = graph.run(n_jobs=8)
+    >>> ts = graph.result("TS0")
+"""
+import os
+import json
+import time
+import pickle
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# USER
+from grrmpy.command.functions import Progress
+
+def _execute(func,args,dep_files,result_file):
+    """タスクを実行し,結果をresult_fileに保存する(プロセスプールで実行できるようにモジュールの関数にしている)
+
+    | 依存するタスクの結果はこのプロセスでファイルから読み込み,argsの後ろに追加してfuncに渡す.
+
+    Returns:
+        float: 実行時間(秒)
+    """
+    start = time.time()
+    dep_results = []
+    for file in dep_files:
+        with open(file,"rb") as f:
+            dep_results.append(pickle.load(f))
+    result = func(*args,*dep_results)
+    tmp = f"{result_file}.tmp"
+    with open(tmp,"wb") as f:
+        pickle.dump(result,f)
+    os.replace(tmp,result_file)
+    return time.time()-start
+
+class TaskGraph():
+    """依存関係のあるタスクを実行する
+
+    Parameters:
+
+    folder: str or Path
+        状態(state.json)と結果(results/)を保存するフォルダ
+
+    Note:
+        | タスクの関数と引数はプロセス間で受け渡せる必要がある(関数はモジュールの関数にする).
+        | 完了したかどうかはタスク名で判断するため,引数を変えて再計算する場合はfolderを変更する.
+    """
+    def __init__(self,folder="pipeline"):
+        self.folder = Path(folder)
+        self.results_folder = self.folder/"results"
+        self.results_folder.mkdir(parents=True,exist_ok=True)
+        self.state_file = self.folder/"state.json"
+        #: {タスク名:(関数,引数,依存するタスク名のリスト)}
+        self.tasks = {}
+        #: {タスク名:{"state":状態,"error":エラーメッセージ,"time":実行時間}}
+        self.states = {}
+        if self.state_file.exists():
+            with open(self.state_file) as f:
+                self.states = json.load(f)
+
+    def add(self,name,func,args=(),deps=()):
+        """タスクを追加する
+
+        Parameters:
+
+        name: str
+            タスク名(ファイル名に使用できる文字列)
+        func: callable
+            func(*args,*依存するタスクの結果)が実行される
+        args: tuple
+            引数
+        deps: list of str
+            | 依存するタスク名. 先に追加しておく必要がある(循環する依存関係は作れない).
+        """
+        if name in self.tasks:
+            raise ValueError(f"{name}は既に追加されています")
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"{name}が依存する{dep}が追加されていません")
+        self.tasks[name] = (func,tuple(args),list(deps))
+
+    def result_file(self,name):
+        return self.results_folder/f"{name}.pkl"
+
+    def state(self,name):
+        """タスクの状態('done','failed','skipped','pending')"""
+        return self.states.get(name,{}).get("state","pending")
+
+    def is_done(self,name):
+        return self.state(name) == "done" and self.result_file(name).exists()
+
+    def result(self,name):
+        """完了したタスクの結果を読み込む"""
+        with open(self.result_file(name),"rb") as f:
+            return pickle.load(f)
+
+    def _set_state(self,name,state,error=None,elapsed=None):
+        self.states[name] = {"state":state,"error":error,"time":elapsed}
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp,"w") as f:
+            json.dump(self.states,f,indent=1,ensure_ascii=False)
+        os.replace(tmp,self.state_file)
+
+    def _job(self,name):
+        func,args,deps = self.tasks[name]
+        return func,args,[str(self.result_file(d)) for d in deps],str(self.result_file(name))
+
+    def run(self,n_jobs=None,max_in_flight=None,quiet=False):
+        """完了していない全てのタスクを実行する
+
+        | 失敗したタスクに依存するタスクは'skipped'になる(再実行時に再び実行を試みる).
+        | 計算中にプロセスが異常終了した場合,その時に実行中だったタスクは1つずつ別のプロセスで実行し直す.
+
+        Parameters:
+
+        n_jobs: int
+            | プロセス数. Noneの場合はCPU数. 1の場合は並列化せず,このプロセスで実行する.
+        max_in_flight: int
+            同時にプロセスに渡すタスクの数. Noneの場合はn_jobs.
+        quiet: bool
+            Trueの場合,進捗を表示しない.
+
+        Returns:
+            dict: {タスク名:状態}
+        """
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        max_in_flight = n_jobs if max_in_flight is None else max(max_in_flight,1)
+        dependents = {name:[] for name in self.tasks}
+        waiting = {}
+        for name,(_,_,deps) in self.tasks.items():
+            for dep in set(deps):
+                dependents[dep].append(name)
+            if not self.is_done(name):
+                waiting[name] = {dep for dep in deps if not self.is_done(dep)}
+        ready = deque(name for name,deps in waiting.items() if not deps)
+        progress = Progress(len(waiting),quiet)
+
+        def finish(name,error=None,elapsed=None):
+            if error is None:
+                self._set_state(name,"done",None,elapsed)
+                for child in dependents[name]:
+                    waiting[child].discard(name)
+                    if not waiting[child]:
+                        ready.append(child)
+                progress.update()
+                return
+            self._set_state(name,"failed",error,elapsed)
+            progress.update()
+            stack = list(dependents[name])
+            while stack: # 下流のタスクは実行しない
+                child = stack.pop()
+                if child in waiting:
+                    del waiting[child]
+                    self._set_state(child,"skipped",f"{name}が失敗したため実行しません")
+                    progress.update()
+                    stack.extend(dependents[child])
+
+        if n_jobs == 1:
+            while ready:
+                name = ready.popleft()
+                try:
+                    finish(name,elapsed=_execute(*self._job(name)))
+                except Exception as e:
+                    finish(name,error=str(e))
+            return {name:self.state(name) for name in self.tasks}
+        while ready:
+            suspects = []
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                pending = {}
+                while (ready or pending) and not suspects:
+                    while ready and len(pending) < max_in_flight:
+                        name = ready.popleft()
+                        try:
+                            pending[executor.submit(_execute,*self._job(name))] = name
+                        except BrokenProcessPool:
+                            suspects.append(name)
+                            break
+                    if suspects:
+                        break
+                    finished,_ = wait(pending,return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = pending.pop(future)
+                        try:
+                            finish(name,elapsed=future.result())
+                        except BrokenProcessPool:
+                            suspects.append(name)
+                        except Exception as e:
+                            finish(name,error=str(e))
+                suspects.extend(pending.values())
+            for name in suspects:
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    try:
+                        finish(name,elapsed=executor.submit(_execute,*self._job(name)).result())
+                    except BrokenProcessPool as e:
+                        finish(name,error=f"プロセスが異常終了しました({e})")
+                    except Exception as e:
+                        finish(name,error=str(e))
+        return {name:self.state(name) for name in self.tasks}
+
+    def summary(self):
+        """状態毎のタスクの数"""
+        counts = {}
+        for name in self.tasks:
+            counts[self.state(name)] = counts.get(self.state(name),0)+1
+        return counts
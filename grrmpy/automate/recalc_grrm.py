@@ -1,72 +1,139 @@
 import warnings
-from ase.optimize import FIRE
-from ase.io import write,iread
-from pathlib import PurePath
+from pathlib import Path
+from ase.optimize import FIRE,LBFGS
+from ase.units import Hartree
 
 # USER
-from grrmpy.optimize import FIRELBFGS
-from grrmpy.optimize.attach import automate_maxstep
 from grrmpy.io.read_listlog import log2atoms,read_connections
 from grrmpy import pfp_calculator
+from grrmpy.automate.auto_opt import _optimize
+from grrmpy.automate.pipeline import TaskGraph
+from grrmpy.neb.list_auto_neb import _run_sneb
+from grrmpy.structure.structure import TS
+from grrmpy.structure.structures import TSList
+try:
+    from grrmpy.optimize import FIRELBFGS
+except ImportError:
+    FIRELBFGS = LBFGS
+
+def _opt_task(atoms,name,params):
+    """EQの再最適化(TaskGraphのタスク)
+
+    | 最後の最適化が収束しなかった場合(ステップ数の上限で止まった場合を含む)は例外を出し,
+    | このEQに依存するTSのタスクは実行しない.
+    """
+    _,status,message,atoms = _optimize(atoms,name,params)
+    if status != "converged":
+        raise RuntimeError(message or "未収束")
+    return atoms
+
+def _ts_task(name,params,ini,fin):
+    """最適化した2つのEQ間のSNEB計算(TaskGraphのタスク)"""
+    _,status,message,ts = _run_sneb(name,ini,fin,params)
+    if status != "converged":
+        raise RuntimeError(message or "SNEBが未収束")
+    return ts
+
+def _irc_task(name,params,ts):
+    """TSの虚振動の方向に変位させた2つの構造の最適化(TaskGraphのタスク)
+
+    | 振動計算の結果から振動モードの構造を作成し,find_ts_idxでTSと判断した構造の両隣の構造を最適化する.
+
+    Returns:
+        tuple: (reverse側のAtoms, forward側のAtoms)
+    """
+    from ase.vibrations import Vibrations
+    from ase.constraints import FixAtoms
+    from grrmpy.vibrations.functions import get_imode,get_vib_images,find_ts_idx
+    folder = Path(params["vib_folder"])
+    folder.mkdir(parents=True,exist_ok=True)
+    ts = ts.copy()
+    ts.calc = params["calc_func"]()
+    fixed = {i for c in ts.constraints if isinstance(c,FixAtoms) for i in c.get_indices()}
+    indices = [i for i in range(len(ts)) if i not in fixed]
+    vib = Vibrations(ts,indices,name=str(folder/name))
+    vib.run()
+    imode = get_imode(vib)
+    if imode is None:
+        raise RuntimeError("虚振動が1つではありません")
+    vib_images = get_vib_images(vib,imode)
+    ts_idx,_ = find_ts_idx(vib_images,calc_func=params["calc_func"])
+    if not 0 < ts_idx < len(vib_images)-1:
+        raise RuntimeError("振動モードの構造からTSを判断できません")
+    results = []
+    for atoms,direction in [(vib_images[ts_idx-1],"reverse"),(vib_images[ts_idx+1],"forward")]:
+        atoms = atoms.copy()
+        atoms.set_constraint(ts.constraints)
+        results.append(_opt_task(atoms,f"{name}_{direction}",params["opt"]))
+    return tuple(results)
 
 class ReCalcGRRM():
+    """GRRMの計算結果を別のcalculatorで再計算する
+
+    | 各EQの再最適化,各TS(PT)のSNEBによる再探索,各TSのIRC計算をそれぞれタスクとし,
+    | TaskGraph(grrmpy.automate.pipeline)でプロセスプールを用いて並列に実行する.
+    | TSのタスクは,CONNECTIONの2つのEQの最適化が終わると直ちに開始される.
+    | タスクの状態はfolder/pipeline/state.jsonに保存され,再実行すると完了したタスクは飛ばされる.
+
+    Parameters:
+
+    eq_listlog: str or Path
+        EQ_list.log
+    ts_listlog: str or Path
+        TS_list.log. Noneの場合,TSの計算は行なわない.
+    pt_listlog: str or Path
+        PT_list.log. Noneの場合,PTの計算は行なわない.
+    comfile: str or Path
+        FrozenAtomsを追加する場合にcomファイルを指定.
+    poscar: str or Path
+        セルを設定する場合にPOSCARファイルを指定.
+    constraints: ASE constraint
+        FixAtoms等の制約.
+    calc_func: object
+        | calculatorを返す関数.
+        | プロセス間で受け渡せるようにモジュールの関数にする(lambdaは不可).
+    folder: str or Path
+        計算結果を保存するフォルダ
+
+    Examples:
+
+        >>> recalc = ReCalcGRRM('XXX_EQ_list.log','XXX_TS_list.log',comfile='XXX.com',calc_func=pfp_calculator)
+        >>> param = recalc.default_param
+        >>> param["OPT"]["fmax"] = 0.01
+        >>> states = recalc.run(param,n_jobs=16)
+        >>> ts_list = recalc.get_ts_list()
+    """
     def __init__(self,
                  eq_listlog,
                  ts_listlog=None,
-                 pt_listlig=None,
+                 pt_listlog=None,
+                 comfile=None,
+                 poscar=None,
                  constraints=[],
-                 calc_functions = pfp_calculator,
+                 calc_func=pfp_calculator,
+                 folder="ReCalcGRRM",
                  ):
-        """
+        self.constraints = constraints
+        self.calc_func = calc_func
+        self.folder = Path(folder)
+        self.eq_list = log2atoms(eq_listlog,comfile,poscar,constraints)
+        #: {"TS":connections,"PT":connections}
+        self.connections = {"TS":read_connections(ts_listlog) if ts_listlog else [],
+                            "PT":read_connections(pt_listlog) if pt_listlog else []}
+        self.graph = None
 
-        Parameters:
-        
-        *data:
-            指定の仕方は3通りある.
-            
-            方法1:
-                eq_listとconnectionsを与える.
-                >>> eq_list = log2atoms('XXX_EQ_list.log','XXX.com','POSCAR')
-                >>> connections = read_connections('XXX_TS_list.log')
-                >>> auto_neb = AutoNEB(eq_list,connections,16)
-            方法2:
-                data1にEQのAtomsのリスト,data2にconnections情報(List[List[int]])を与える.
-                connections情報はgrrmpy.io.read_listlog.read_connectionsで取得可能.
-            方法3:
-                data1にiniの構造のAtomsのリスト,data2にfinの構造のAtomsのリストを与える.
-                つまり,data1の0番目の要素とdata2の0番目の要素でNEB計算が行なわれる.
-            方法4:
-                imagesを与える場合
-        
-        """
-        if isinstance(data1,str) or isinstance(data1,PurePath):
-            # data1がEQ_list.logだった場合.
-            eq_list = log2atoms(data1,comfile,poscar,constraints)
-            if isinstance(data2,str) or isinstance(data2,PurePath):
-                # data2 がTS_list.logの場合.
-                connections = read_connections(data2)
-            else:
-                connections = data2
-        else:
-            # data1がAotomsリストだった場合
-            if type(data2) == list:
-                # data2がAtomsリストだった場合
-                ini_list = data1
-                fin_list = data2
-            else:
-                # data1がeq_listのAtomsリスト,data2がconnectionsの場合.
-                eq_list = data1
-                connections = data2
-
-    @property 
-    def dafault_param(self):
+    @property
+    def default_param(self):
         """run()のデフォルトのparameterを返す.
+
         CALC_MODE:
             "opt_only": bool
                 最適化計算のみを行なう場合True.
+            "irc": bool
+                TSのIRC計算を行なう場合True.
         OPT:
             "optimizer": Optimizer
-                構造最適化計算時に使用するOptimizer. Noneの場合構造最適化計算を行なわない.
+                構造最適化計算時に使用するOptimizer.
             "fmax": float
                 収束条件
             "maxstep_list": list of float
@@ -82,25 +149,22 @@ class ReCalcGRRM():
                 logファイルを保存するフォルダ名.Noneの場合,logファイルを作成しない.
             "trajectory_folder":
                 trajctoryファイルを保存するフォルダ名.Noneの場合作成しない.
-            "run_keyword":dict
-                その他,最適化計算のrunの際のキーワード引数を指定できる.
-            "attach_list":list of dict
-                [{"function":lambda:XXX, "interval":XXX},]の形式で与える.
-        IRC: 
-            基本的に"OPT"と同じ.
-            
+            "save_folder":
+                最適化後の構造を保存するフォルダ名.
+        SNEB:
+            "nimages": int
+                始めのNEBイメージの数
             "optimizer": Optimizer
-                構造最適化計算時に使用するOptimizer.
-            "fmax": float
-            "maxstep_list": list of float
-            "automate_maxstep": dict
-            "steps_list":
-            "logfile_folder":
-            "trajectory_folder":
+                NEB計算のOptimizer
+            "run_keyword": dict
+                SNEB.runのキーワード引数
+        IRC:
+            基本的に"OPT"と同じ.
         """
         return {
             "CALC_MODE":{
                 "opt_only":False,
+                "irc":True,
             },
             "OPT":{
                 "optimizer":LBFGS,
@@ -111,18 +175,11 @@ class ReCalcGRRM():
                 "logfile_folder":"log",
                 "trajectory_folder":None,
                 "save_folder":"OPT",
-                "run_keyword":{},
-                "attach_list":[],
             },
-            "NEB":{
-                "nimages_list":[20,20],
-                "parallel":True,
+            "SNEB":{
+                "nimages":13,
                 "optimizer":FIRE,
                 "run_keyword":{},
-                "attach_list":[],
-            },
-            "SNEB":{
-                
             },
             "IRC":{
                 "optimizer":FIRELBFGS,
@@ -133,97 +190,104 @@ class ReCalcGRRM():
                 "logfile_folder":"log",
                 "trajectory_folder":None,
                 "save_folder":"IRC",
-                "run_keyword":{},
-                "attach_list":[],
             },
         }
-        
-    def set_param(self,param):
-        self.opt = OPT(**param["OPT"])
-        self.irc = IRC(**param["IRC"])
 
-    def run(self,param):
-        self.set_param(param)
+    @property
+    def dafault_param(self):
+        warnings.warn("dafault_paramはdefault_paramに名前が変更されました",DeprecationWarning)
+        return self.default_param
 
-class OPT():
-    def __init__(self,
-                 optimizer,
-                 fmax,
-                 maxstep_list,
-                 automate_maxstep,
-                 steps_list,
-                 logfile_folder = None,
-                 trajectory_folder=None,
-                 save_folder = "OPT",
-                 run_keyword = {},
-                 attach_list = [],
-                 calc_func = pfp_calculator,
-                 ):
-        self.optimizer = optimizer
-        self.fmax = fmax
-        self.maxstep_list = maxstep_list
-        self.automate_maxstep = automate_maxstep
-        self.steps_list = steps_list
-        self.logfile_folder = logfile_folder
-        self.trajectory_folder = trajectory_folder
-        self.save_folder = save_folder
-        self.run_keyword = run_keyword
-        self.attach_list = attach_list
-        self.calc_func = calc_func
+    def _opt_params(self,param):
+        """param["OPT"]などをauto_opt._optimizeの引数に変換する"""
+        for folder in [param["logfile_folder"],param["trajectory_folder"],param["save_folder"]]:
+            if folder:
+                Path(self.folder,folder).mkdir(parents=True,exist_ok=True)
+        return {"optimizer":param["optimizer"],
+                "calc_func":self.calc_func,
+                "maxstep_list":param["maxstep_list"],
+                "steps_list":param["steps_list"],
+                "maxstep_dict":param["automate_maxstep"],
+                "fmax":param["fmax"],
+                "logfile":bool(param["logfile_folder"]),
+                "trajectory":bool(param["trajectory_folder"]),
+                "log_foldername":str(Path(self.folder,param["logfile_folder"] or "")),
+                "traj_foldername":str(Path(self.folder,param["trajectory_folder"] or "")),
+                "save_foldername":str(Path(self.folder,param["save_folder"]))}
+
+    def build_graph(self,param=None):
+        """計算のTaskGraphを作成する
+
+        | タスク名はEQ{i}, TS{i}, PT{i}, IRC_TS{i}, IRC_PT{i}.
+        """
+        if param is None:
+            param = self.default_param
+        graph = TaskGraph(self.folder/"pipeline")
+        opt_params = self._opt_params(param["OPT"])
+        for i,atoms in enumerate(self.eq_list):
+            graph.add(f"EQ{i}",_opt_task,args=(atoms,f"EQ{i}",opt_params))
+        if param["CALC_MODE"]["opt_only"]:
+            return graph
+        neb_params = {"logfolder":str(self.folder/"NEB"),
+                      "nimages":param["SNEB"]["nimages"],
+                      "html":False,
+                      "calc_func":self.calc_func,
+                      "optimizer":param["SNEB"]["optimizer"],
+                      "constraints":self.constraints,
+                      "run_kwargs":param["SNEB"]["run_keyword"]}
+        irc_params = {"opt":self._opt_params(param["IRC"]),
+                      "calc_func":self.calc_func,
+                      "vib_folder":str(self.folder/"vib")}
+        for kind,connections in self.connections.items():
+            for j,(ini_idx,fin_idx) in enumerate(connections):
+                if not (isinstance(ini_idx,int) and isinstance(fin_idx,int)) or ini_idx == fin_idx:
+                    continue # DC,??,自己ループ
+                graph.add(f"{kind}{j}",_ts_task,args=(f"{kind}{j}",neb_params),deps=[f"EQ{ini_idx}",f"EQ{fin_idx}"])
+                if param["CALC_MODE"]["irc"]:
+                    graph.add(f"IRC_{kind}{j}",_irc_task,args=(f"IRC_{kind}{j}",irc_params),deps=[f"{kind}{j}"])
+        return graph
 
-    def _run(self,atoms,filename):
-        for maxstep,steps in zip(self.maxstep_list,self.steps_list):
-            atoms.calc = self.calc_func()
-            # logfile引数
-            if self.logfile_folder:
-                logfile = f"{self.logfile_folder}/{filename}.log"
-            else:
-                logfile = None
-            # trajectory引数
-            if self.trajectory_folder:
-                trajectory = f"{self.trajectory_folder}/{filename}.traj"
-            else:
-                trajectory = None
-            # その他引数
-            if self.optimizer == FIRELBFGS:
-                kwargs = {"maxstep_fire":maxstep if maxstep else 0.2,
-                          "maxstep_lbfgs":maxstep if maxstep else 0.2,
-                          "logfile":logfile,
-                          "trajectory":trajectory}
-            else:
-                kwargs = {"maxstep":maxstep if maxstep else 0.2,
-                          "logfile":logfile,
-                          "trajectory":trajectory}
-            kwargs.update(self.run_keyword)
-            
-            opt = self.optimizer(atoms,**kwargs)
-            # attach
-            if maxstep is None:
-                opt.attach(lambda:automate_maxstep(opt,self.automate_maxstep))
-            for attach in self.attach_list:
-                opt.attach(**attach)
-            # run
-            opt.run(fmax=self.fmax,steps=steps)
-        return True if opt.converged else False
-    
-    def run(self,atoms,filename):
-        converged = self._run(atoms,filename)
-        if converged:
-            write(f"{self.save_folder}/{filename}.traj",atoms)
-
-class IRC(OPT):
-    def __init__(self,**kwargs):
-        super().__init__(**kwargs)
-    
-    def irun(self,atoms,filename):
-        return super().irn(atoms,filename)
-    
-    def _run(self,vib_images,filename1,filename2):
-        ini = vib_images[14].copy() # 正確に何番か！！！！！
-        fin = vib_images[16].copy() # 正確に何番か！！！！！
-        ini.calc = self.calc_func()
-        fin.calc = self.calc_func()
-        converged1 = self.irun(ini,filename1)
-        converged2 = self.irun(fin,filename1)
-        return converged1,converged2
-    
+    def run(self,param=None,n_jobs=None,max_in_flight=None,quiet=False):
+        """全てのタスクを実行する
+
+        Parameters:
+
+        param: dict
+            default_paramを参照. Noneの場合はdefault_param.
+        n_jobs: int
+            | プロセス数. Noneの場合はCPU数. 1の場合は並列化しない.
+        max_in_flight: int
+            同時にプロセスに渡すタスクの数. Noneの場合はn_jobs.
+        quiet: bool
+            Trueの場合,進捗を表示しない.
+
+        Returns:
+            dict: {タスク名:状態('done','failed','skipped')}
+        """
+        self.graph = self.build_graph(param)
+        return self.graph.run(n_jobs=n_jobs,max_in_flight=max_in_flight,quiet=quiet)
+
+    def get_eq_list(self):
+        """最適化したEQのAtomsのリスト(失敗したEQはNone)"""
+        return [self.graph.result(f"EQ{i}") if self.graph.is_done(f"EQ{i}") else None
+                for i in range(len(self.eq_list))]
+
+    def get_ts_list(self,kind="TS"):
+        """再探索したTS(またはPT)のTSList
+
+        Parameters:
+
+        kind: str
+            'TS'または'PT'
+
+        Returns:
+            TSList: エネルギーはHartree. 各TSのGRRMでの番号はnames属性に入る.
+        """
+        names = [j for j in range(len(self.connections[kind])) if self.graph.is_done(f"{kind}{j}")]
+        ts_list = TSList()
+        ts_list._strctures = []
+        for j in names:
+            ts = self.graph.result(f"{kind}{j}")
+            ts_list._strctures.append(TS(ts.get_potential_energy()/Hartree,ts,list(self.connections[kind][j])))
+        ts_list.names = names
+        return ts_list
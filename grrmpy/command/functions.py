@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+# user
+import grrmpy.io.compressed_pickle as cpickle
+from grrmpy.io.archive import ArchiveWriter
+
+def blocks2atoms_dicts(lines,starts,natoms):
+    """座標のブロックをまとめてnumpy配列に変換し,Atoms.todict()と同じ形式のdictのリストを返す
+
+    | Atomsオブジェクトは作成しない.
+    | numbers,cell,pbcの配列は全ての構造で共有する.
+
+    Parameters:
+
+    lines: list of str
+        ファイルの行のリスト
+    starts: list of int
+        各構造の座標の1行目の行番号
+    natoms: int
+        原子数
+
+    Returns:
+        | list of dict: {"numbers","positions","cell","pbc"}のリスト.
+        | 座標の行の形式が正しくない(書き込み途中のファイルなど)場合はNone.
+    """
+    from ase.data import atomic_numbers
+    if len(starts) == 0:
+        return []
+    text = "".join(["".join(lines[i:i+natoms]) for i in starts])
+    try:
+        tokens = np.array(text.split()).reshape(len(starts),natoms,4)
+        positions = tokens[:,:,1:].astype(float)
+        numbers = np.array([atomic_numbers[s] for s in tokens[0,:,0].tolist()])
+    except (ValueError,KeyError):
+        return None
+    cell = np.zeros((3,3))
+    pbc = np.zeros(3,dtype=bool)
+    return [{"numbers":numbers,"positions":pos,"cell":cell,"pbc":pbc} for pos in positions]
+
+def find_logfiles(kind,name=None):
+    """XXX_TSi.log,XXX_PTi.logのファイルのリストを番号順で返す
+
+    Parameters:
+
+    kind: str
+        'TS'または'PT'
+    name: str
+        XXX.comのXXXの部分. Noneの場合はフォルダにあるcomファイルから読みとる.
+
+    Returns:
+        tuple: (name, {番号:ファイルパス})
+    """
+    p = Path(".")
+    if name is None:
+        name = list(p.glob('*.com'))[0].stem
+    logfiles = {}
+    prefix = f"{name}_{kind}"
+    for log in p.glob(f'{prefix}*.log'):
+        num = log.stem[len(prefix):]
+        if num.isdecimal(): # XXX_TS_list.logなどを除く
+            logfiles[int(num)] = log
+    return name, dict(sorted(logfiles.items()))
+
+def done_indices(outfile,offset=False):
+    """dump_recordで書き込んだファイルから,既に抽出済み(記録が壊れていない)の番号の集合を返す
+
+    | offset=Trueの場合,(番号の集合,最後の正常な記録の終わりのバイト位置)を返す.
+    """
+    ids,end = set(),0
+    if Path(outfile).exists():
+        try:
+            for i,_,end in cpickle.iload_records(outfile,offsets=True):
+                ids.add(i)
+        except ValueError:
+            ids,end = set(),0 # dump_recordで作成したファイルでない
+    return (ids,end) if offset else ids
+
+def is_archive(outfile):
+    """拡張子からアーカイブ(grrmpy.io.archive)に出力するかを判定する"""
+    return Path(outfile).suffix == ".arc"
+
+class _RecordWriter():
+    """cpickle.dump_recordで1つずつ追記する(ArchiveWriterと同じ使い方ができる)"""
+    def __init__(self,outfile,resume=False,level=9,length=None):
+        self.outfile = outfile
+        self.level = level
+        self.length = length
+        self.ids,end = done_indices(outfile,offset=True) if resume else (set(),0)
+        if Path(outfile).exists():
+            if self.ids:
+                with open(outfile,"r+b") as f:
+                    f.truncate(end) # 書き込み途中で壊れた記録を除く
+            else:
+                os.remove(outfile) # 上書きするか,壊れているか古い形式のファイル
+
+    def add(self,i,obj):
+        cpickle.dump_record(i,obj,self.outfile,self.level,self.length)
+
+    def close(self):
+        pass
+
+def _open_writer(outfile,resume,level,length,codec):
+    if is_archive(outfile):
+        mode = "a" if resume else "w"
+        try:
+            return ArchiveWriter(outfile,mode,codec,level)
+        except ValueError:
+            return ArchiveWriter(outfile,"w",codec,level) # アーカイブでないファイル
+    return _RecordWriter(outfile,resume,level,length)
+
+class Progress():
+    """進捗(完了数,経過時間,残り時間)を標準エラー出力に表示する"""
+    def __init__(self,total,quiet=False,stream=None):
+        self.total = total
+        self.count = 0
+        self.quiet = quiet
+        self.stream = sys.stderr if stream is None else stream
+        self.start = time.time()
+
+    def update(self,n=1):
+        self.count += n
+        if self.quiet:
+            return
+        elapsed = time.time()-self.start
+        eta = elapsed/self.count*(self.total-self.count) if self.count else 0
+        self.stream.write(f"\r[{self.count}/{self.total}] {elapsed:.1f}s 残り{eta:.1f}s")
+        if self.count >= self.total:
+            self.stream.write("\n")
+        self.stream.flush()
+
+def run_jobs(func,jobs,callback,on_error,n_jobs=None,max_in_flight=None):
+    """jobsの各引数でfuncをプロセスプールで実行し,完了した順にcallbackを呼ぶ
+
+    | 実行中のジョブの数はmax_in_flightまでに制限する.
+    | 計算中にプロセスが異常終了した場合(プール全体が使えなくなる),
+    | その時に実行中だったジョブは最後に1つずつ別のプロセスで実行し直し,異常終了したジョブを特定する.
+
+    Parameters:
+
+    func: callable
+        | 実行する関数(プロセス間で受け渡せるようにモジュールの関数にする)
+    jobs: iterable of tuple
+        (キー,funcの引数のタプル)
+    callback: callable
+        callback(キー,funcの返り値)
+    on_error: callable
+        | on_error(キー,エラーメッセージ).
+        | funcが例外を出した場合,プロセスが異常終了した場合に呼ばれる.
+    n_jobs: int
+        | プロセス数. Noneの場合はCPU数. 1の場合は並列化せず,このプロセスで実行する.
+    max_in_flight: int
+        同時にプロセスに渡すジョブの数. Noneの場合はn_jobsの2倍.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        for key,args in jobs:
+            try:
+                result = func(*args)
+            except Exception as e:
+                on_error(key,str(e))
+                continue
+            callback(key,result)
+        return
+    max_in_flight = n_jobs*2 if max_in_flight is None else max(max_in_flight,1)
+    todo = deque(jobs)
+    suspects = []
+    while todo:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            pending = {}
+            broken = False
+            while (todo or pending) and not broken:
+                while todo and len(pending) < max_in_flight:
+                    key,args = todo.popleft()
+                    try:
+                        pending[executor.submit(func,*args)] = (key,args)
+                    except BrokenProcessPool:
+                        broken = True
+                        suspects.append((key,args))
+                        break
+                if broken:
+                    break
+                finished,_ = wait(pending,return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key,args = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        suspects.append((key,args))
+                        continue
+                    except Exception as e: # 引数をプロセスに渡せない場合など
+                        on_error(key,str(e))
+                        continue
+                    callback(key,result)
+            suspects.extend(pending.values())
+    for key,args in suspects:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                result = executor.submit(func,*args).result()
+            except BrokenProcessPool as e:
+                on_error(key,f"プロセスが異常終了しました({e})")
+                continue
+            except Exception as e:
+                on_error(key,str(e))
+                continue
+        callback(key,result)
+
+def run_extraction(func,logfiles,outfile,n_jobs=None,resume=False,quiet=False,level=None,codec="zlib"):
+    """logファイル毎にfuncを並列に実行し,結果を1つずつoutfileに追記する
+
+    | 結果は完了した順に(番号,結果)として追記するため,全ての結果をメモリに保持しない.
+    | outfileの拡張子が'.arc'の場合はアーカイブ(grrmpy.io.archive)に書き込み,
+    | load_pathで1つの経路だけを読み込める.
+    | それ以外の場合はcpickle.dump_recordで追記し,cpickle.loadで番号順のリストとして読み込める.
+    | 実行中のジョブの数はn_jobsの数倍に制限する(run_jobsを参照).
+
+    Parameters:
+
+    func: callable
+        | logファイルのパスを引数とし,結果を返す関数(プロセス間で受け渡せるようにモジュールの関数にする)
+    logfiles: dict
+        {番号:logファイル}
+    outfile: str or Path
+        出力ファイル
+    n_jobs: int
+        | プロセス数. Noneの場合はCPU数. 1の場合は並列化しない.
+    resume: bool
+        | Trueの場合,outfileに既にある番号は飛ばして追記する.
+        | Falseの場合,outfileを上書きする.
+    quiet: bool
+        Trueの場合,進捗を表示しない.
+    level: int
+        圧縮レベル. Noneの場合,アーカイブは6,bz2は9.
+    codec: str
+        アーカイブの圧縮方式('zlib','lzma')
+
+    Returns:
+        | dict: {番号:エラーメッセージ}. 例外を出した,またはプロセスが異常終了したlogファイルは
+        | 出力せずに続行する(resume=Trueで実行し直せる).
+    """
+    length = max(logfiles)+1 if logfiles else 0
+    if level is None:
+        level = 6 if is_archive(outfile) else 9
+    writer = _open_writer(outfile,resume,level,length,codec)
+    todo = [(i,log) for i,log in logfiles.items() if i not in writer.ids]
+    progress = Progress(len(todo),quiet)
+    errors = {}
+    def callback(i,result):
+        writer.add(i,result)
+        progress.update()
+    def on_error(i,message):
+        errors[i] = message
+        progress.stream.write(f"\n{logfiles[i]}: {message}\n")
+        progress.update()
+    try:
+        run_jobs(func,((i,(log,)) for i,log in todo),callback,on_error,n_jobs)
+    finally:
+        writer.close()
+    return errors
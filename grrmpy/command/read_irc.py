@@ -1,47 +1,64 @@
 # coding: utf-8
-from ase import Atoms
-from natsort import natsorted
-from pathlib import Path
 import argparse
+from functools import partial
 import numpy as np
 
 # user
 import grrmpy.io.compressed_pickle as cpickle
 from grrmpy.command.arg_formatter import CustomHelpFormatter
+from grrmpy.command.functions import blocks2atoms_dicts,find_logfiles,run_extraction
 
 description = """
 ##########################################################
-XXX_TSi.logのIRC構造を読みとり,pkl.bz2ファイルで出力する
+XXX_TSi.logのIRC構造を読みとり,アーカイブ(.arc)で出力する
 ##########################################################
-    pkl.bz2ファイルはpickleのバイナリデータをbz2に圧縮したものである.
+    デフォルトの出力ファイルはXXX_IRC.arc(以前のXXX_IRC.pkl.bz2から変更).
+    grrmpy.io.archive.load_path(ファイル名,TS番号)で1つのTSのIRCのみを読み込める.
+    pkl.bz2で出力する場合は-o XXX_IRC.pkl.bz2のように指定する.
     
     imagesとstepは,どちらかしか指定できないので注意"""
 
-parser = argparse.ArgumentParser(description=description, formatter_class=CustomHelpFormatter)
-parser.add_argument('--images','-n', default=None, type=int,
-                    help="始終構造を除くイメージの数.指定しない場合全ての構造を保存する")
-parser.add_argument('--step','-s', default=None, type=int,
-                    help="(おおよそ)step個飛ばしに構造を抽出する, 25辺りが最適?\n"+
-                    "偶数個抽出されるように調整してある.\n"+
-                    "min_n, max_nで最小,最大のイメージ数を決められる")
-parser.add_argument('--index','-i', default=None, type=int,
-                    help="指定したTS番号のIRCを作成する")
-parser.add_argument('--outfile','-o', default=None, type=str,
-                    help="指定した名前でファイルを作成する\n指定しない場合,IRC.pkl.bz2の名前で作成される")
-parser.add_argument('--name', default=None, type=str,
-                    help="ファイル名. XXX.comのXXXの部分.\n"+
-                    "指定しない場合, フォルダにあるcomファイルから自動的に読みとる\n"+
-                    "フォルダ内に複数のcomファイルが存在する時にはnameを設定する必要がある")
-parser.add_argument('--min', default=8, type=int,
-                    help="最小イメージ数")
-parser.add_argument('--max', default=64, type=int,
-                    help="最大イメージ数")
-args = parser.parse_args()
+def _parser():
+    parser = argparse.ArgumentParser(description=description, formatter_class=CustomHelpFormatter)
+    parser.add_argument('--images','-n', default=None, type=int,
+                        help="始終構造を除くイメージの数.指定しない場合全ての構造を保存する")
+    parser.add_argument('--step','-s', default=None, type=int,
+                        help="(おおよそ)step個飛ばしに構造を抽出する, 25辺りが最適?\n"+
+                        "偶数個抽出されるように調整してある.\n"+
+                        "min_n, max_nで最小,最大のイメージ数を決められる")
+    parser.add_argument('--index','-i', default=None, type=int,
+                        help="指定したTS番号のIRCを作成する")
+    parser.add_argument('--outfile','-o', default=None, type=str,
+                        help="指定した名前でファイルを作成する\n指定しない場合,XXX_IRC.arcの名前で作成される\n"+
+                        "(indexを指定した場合はXXX_IRCi.pkl.bz2)\n"+
+                        "拡張子が.arc以外の場合はpkl.bz2ファイルとして出力する")
+    parser.add_argument('--name', default=None, type=str,
+                        help="ファイル名. XXX.comのXXXの部分.\n"+
+                        "指定しない場合, フォルダにあるcomファイルから自動的に読みとる\n"+
+                        "フォルダ内に複数のcomファイルが存在する時にはnameを設定する必要がある")
+    parser.add_argument('--min', default=8, type=int,
+                        help="最小イメージ数")
+    parser.add_argument('--max', default=64, type=int,
+                        help="最大イメージ数")
+    parser.add_argument('--jobs','-j', default=None, type=int,
+                        help="並列に処理するプロセス数.指定しない場合CPU数")
+    parser.add_argument('--resume','-r', action='store_true',
+                        help="出力ファイルに既にあるTSを飛ばして追記する")
+    parser.add_argument('--quiet','-q', action='store_true',
+                        help="進捗を表示しない")
+    parser.add_argument('--codec', default="zlib", choices=["zlib","lzma"],
+                        help="アーカイブ(.arc)の圧縮方式")
+    parser.add_argument('--level', default=None, type=int,
+                        help="圧縮レベル.指定しない場合,アーカイブは6,pkl.bz2は9")
+    return parser
 
 def read_irc():
-    """XXX_TSi.logのIRC構造を読みとり,pkl.bz2ファイルで出力する
+    """XXX_TSi.logのIRC構造を読みとり,アーカイブ(.arc)で出力する
     
-    pkl.bz2ファイルはpickleのバイナリデータをbz2に圧縮したファイルである.
+    | TS毎に並列に読み込み,読み込んだ順にファイルに追記する.
+    | デフォルトの出力ファイルはXXX_IRC.arcである.
+    | grrmpy.io.archive.load_path(ファイル名,TS番号)で1つのTSのIRCのみを,
+    | grrmpy.io.archive.load_archiveでTS番号順のリストとして読み込める.
 
     Parameters:
     
@@ -55,7 +72,8 @@ def read_irc():
         | 指定したTS番号のIRCを作成する
     outfile(-o):
         | 指定した名前でファイルを作成する
-        | 指定しない場合, IRC.pkl.bzの名前で作成される
+        | 指定しない場合, XXX_IRC.arcの名前で作成される(indexを指定した場合はXXX_IRCi.pkl.bz2)
+        | 拡張子が.arc以外の場合はpkl.bz2ファイルとして出力する
     name: str
         | ファイル名. XXX.comのXXXの部分.
         | 指定しない場合, フォルダにあるcomファイルから自動的に読みとる
@@ -64,39 +82,44 @@ def read_irc():
         最小イメージ数
     max_n: int
         最大イメージ数
+    jobs(-j): int
+        並列に処理するプロセス数.指定しない場合CPU数
+    resume(-r):
+        出力ファイルに既にあるTSを飛ばして追記する
+    quiet(-q):
+        進捗を表示しない
+    codec: str
+        アーカイブ(.arc)の圧縮方式('zlib','lzma')
+    level: int
+        圧縮レベル.指定しない場合,アーカイブは6,pkl.bz2は9
         
     Note:
-        imagesとstepは,どちらかしか指定できない.
+        | imagesとstepは,どちらかしか指定できない.
+        | 以前のデフォルトのXXX_IRC.pkl.bz2は作成されなくなったため,
+        | compressed_pickle.load("XXX_IRC.pkl.bz2")で読み込んでいたスクリプトは修正が必要である.
+        | outfileに.arc以外の拡張子(XXX_IRC.pkl.bz2など)を指定すると,従来通りpkl.bz2ファイルで出力する.
     """
-    images = args.images
-    step = args.step
-    index = args.index
-    outfile = args.outfile
-    name = args.name
-    min_n = args.min
-    max_n = args.max
-    return _read_ircs(images,step,index,outfile,name,min_n,max_n)
+    args = _parser().parse_args()
+    return _read_ircs(args.images,args.step,args.index,args.outfile,args.name,args.min,args.max,
+                      n_jobs=args.jobs,resume=args.resume,quiet=args.quiet,
+                      codec=args.codec,level=args.level)
     
-def _read_ircs(images=None,step=None,index=None,outfile=None,name=None,min_n=8,max_n=64):
-    p = Path(".")
-    if name is None:
-        name = list(p.glob('*.com'))[0].stem
+def _read_ircs(images=None,step=None,index=None,outfile=None,name=None,min_n=8,max_n=64,
+               n_jobs=None,resume=False,quiet=False,codec="zlib",level=None):
+    name,logfiles = find_logfiles("TS",name)
     if outfile is None:
-        num = "" if index is None else index
-        outfile = f"{name}_IRC{num}.pkl.bz2"
-            
-    logfile = natsorted(list(p.glob(f'{name}_TS*.log')))
-    logfile = logfile[:-1] # 最後は*TS_list.logなので省く
+        outfile = f"{name}_IRC.arc" if index is None else f"{name}_IRC{index}.pkl.bz2"
+    func = partial(_read_irc,images=images,step=step,min_n=min_n,max_n=max_n)
     if type(index) == int:
-        data = _read_irc(logfile[index],images,step,min_n,max_n)
+        cpickle.dump(func(logfiles[index]), outfile)
     else:
-        data = [_read_irc(log,images,step,min_n,max_n) for log in logfile]
-    
-    cpickle.dump(data, outfile)
+        return run_extraction(func,logfiles,outfile,n_jobs,resume,quiet,level,codec)
         
 def _read_irc(filename,images=None,step=None,min_n=8,max_n=64):
     """XXX_TSi.logファイルを読み込みAtoms情報のdictを要素とするリストを返す
     
+    | ファイルは1回だけ走査し,座標はまとめてnumpy配列に変換する.
+    
     Parameters:
     
     filename: str
@@ -107,31 +130,36 @@ def _read_irc(filename,images=None,step=None,min_n=8,max_n=64):
     """
     with open(filename) as f:
         l = f.readlines()
-    step_idx = [i for i,text in enumerate(l) if "# STEP" in text]
-    separate_idx = [i for i,text in enumerate(l) if "Sphere optimization converged" in text][1]
-    eq_idx = [i for i,text in enumerate(l) if "Optimized structure" in text]
-    if len(eq_idx) != 2: # ini,finのどちらかが存在しない時
+    step_idx = []
+    sphere_idx = []
+    eq_idx = []
+    energy_i = None
+    for i,text in enumerate(l):
+        if "# STEP" in text:
+            step_idx.append(i)
+        elif "Sphere optimization converged" in text:
+            sphere_idx.append(i)
+        elif "Optimized structure" in text:
+            eq_idx.append(i)
+        elif energy_i is None and "ENERGY    =" in text:
+            energy_i = i
+    if len(eq_idx) != 2 or len(sphere_idx) < 2 or energy_i is None: # ini,finのどちらかが存在しない時
         return None
+    separate_idx = sphere_idx[1]
     ts_idx = 1
-    for i,text in enumerate(l):
-        if "ENERGY    =" in text:
-            atoms_n = i-2 # 原子の数
-            break
-    for i in range(len(step_idx)):
-        if step_idx[i] < separate_idx and separate_idx < step_idx[i+1]:
-            forward_idx = step_idx[:i+1]
-            reverse_idx = step_idx[i+1:]
-            break
+    atoms_n = energy_i-2 # 原子の数
+    forward_idx = [i for i in step_idx if i < separate_idx]
+    reverse_idx = [i for i in step_idx if i > separate_idx]
     forward_idx.reverse() #逆順にする
     idx = [eq_idx[0]] + forward_idx + [ts_idx] + reverse_idx + [eq_idx[1]]
     if images is not None:
         idx = n_sampling(idx,images-2)
     if step is not None:
         idx = step_sampling(idx,step,min_n,max_n)
-    irc = [coordination2atoms_dict(l[i+1:i+atoms_n+1]) for i in idx]
-    return irc
+    return blocks2atoms_dicts(l,[i+1 for i in idx],atoms_n)
         
 def coordination2atoms_dict(coordination:list):
+    from ase import Atoms
     def int2float(text):
         text = text.split()
         return [float(text[1]),float(text[2]),float(text[3])]
@@ -1,36 +1,51 @@
 # coding: utf-8
-from ase import Atoms
-from natsort import natsorted
-from pathlib import Path
 import argparse
 
 # user
 import grrmpy.io.compressed_pickle as cpickle
 from grrmpy.command.arg_formatter import CustomHelpFormatter
+from grrmpy.command.functions import blocks2atoms_dicts,find_logfiles,run_extraction
 
 description = """
 ##########################################################
-XXX_PTi.logのLUP構造を読みとり,pkl.bz2ファイルで出力する
+XXX_PTi.logのLUP構造を読みとり,アーカイブ(.arc)で出力する
 ##########################################################
-    pkl.bz2ファイルはpickleのバイナリデータをbz2に圧縮したものである.
+    デフォルトの出力ファイルはXXX_LUP.arc(以前のXXX_LUP.pkl.bz2から変更).
+    grrmpy.io.archive.load_path(ファイル名,PT番号)で1つのPTのLUPのみを読み込める.
+    pkl.bz2で出力する場合は-o XXX_LUP.pkl.bz2のように指定する.
     """
 
-parser = argparse.ArgumentParser(description=description, formatter_class=CustomHelpFormatter)
-
-parser.add_argument('--index','-i', default=None, type=int,
-                    help="指定したPT番号のLUPを作成する")
-parser.add_argument('--outfile','-o', default=None, type=str,
-                    help="指定した名前でファイルを作成する\n指定しない場合,LUP.pkl.bz2の名前で作成される")
-parser.add_argument('--name', default=None, type=str,
-                    help="ファイル名. XXX.comのXXXの部分.\n"+
-                    "指定しない場合, フォルダにあるcomファイルから自動的に読みとる\n"+
-                    "フォルダ内に複数のcomファイルが存在する時にはnameを設定する必要がある")
-args = parser.parse_args()
+def _parser():
+    parser = argparse.ArgumentParser(description=description, formatter_class=CustomHelpFormatter)
+    parser.add_argument('--index','-i', default=None, type=int,
+                        help="指定したPT番号のLUPを作成する")
+    parser.add_argument('--outfile','-o', default=None, type=str,
+                        help="指定した名前でファイルを作成する\n指定しない場合,XXX_LUP.arcの名前で作成される\n"+
+                        "(indexを指定した場合はXXX_LUPi.pkl.bz2)\n"+
+                        "拡張子が.arc以外の場合はpkl.bz2ファイルとして出力する")
+    parser.add_argument('--name', default=None, type=str,
+                        help="ファイル名. XXX.comのXXXの部分.\n"+
+                        "指定しない場合, フォルダにあるcomファイルから自動的に読みとる\n"+
+                        "フォルダ内に複数のcomファイルが存在する時にはnameを設定する必要がある")
+    parser.add_argument('--jobs','-j', default=None, type=int,
+                        help="並列に処理するプロセス数.指定しない場合CPU数")
+    parser.add_argument('--resume','-r', action='store_true',
+                        help="出力ファイルに既にあるPTを飛ばして追記する")
+    parser.add_argument('--quiet','-q', action='store_true',
+                        help="進捗を表示しない")
+    parser.add_argument('--codec', default="zlib", choices=["zlib","lzma"],
+                        help="アーカイブ(.arc)の圧縮方式")
+    parser.add_argument('--level', default=None, type=int,
+                        help="圧縮レベル.指定しない場合,アーカイブは6,pkl.bz2は9")
+    return parser
 
 def read_lup():
-    """XXX_PTi.logのLUP構造を読みとり,pkl.bz2ファイルで出力する
+    """XXX_PTi.logのLUP構造を読みとり,アーカイブ(.arc)で出力する
     
-    pkl.bz2ファイルはpickleのバイナリデータをbz2に圧縮したファイルである.
+    | PT毎に並列に読み込み,読み込んだ順にファイルに追記する.
+    | デフォルトの出力ファイルはXXX_LUP.arcである.
+    | grrmpy.io.archive.load_path(ファイル名,PT番号)で1つのPTのLUPのみを,
+    | grrmpy.io.archive.load_archiveでPT番号順のリストとして読み込める.
 
     Parameters:
     
@@ -38,40 +53,47 @@ def read_lup():
         | 指定したPT番号のLUPを作成する
     outfile(-o):
         | 指定した名前でファイルを作成する
-        | 指定しない場合, LUP.pkl.bzの名前で作成される
+        | 指定しない場合, XXX_LUP.arcの名前で作成される(indexを指定した場合はXXX_LUPi.pkl.bz2)
+        | 拡張子が.arc以外の場合はpkl.bz2ファイルとして出力する
     name: str
         | ファイル名. XXX.comのXXXの部分.
         | 指定しない場合, フォルダにあるcomファイルから自動的に読みとる
         | フォルダ内に複数のcomファイルが存在する時にはnameを設定する必要がある
-        
+    jobs(-j): int
+        並列に処理するプロセス数.指定しない場合CPU数
+    resume(-r):
+        出力ファイルに既にあるPTを飛ばして追記する
+    quiet(-q):
+        進捗を表示しない
+    codec: str
+        アーカイブ(.arc)の圧縮方式('zlib','lzma')
+    level: int
+        圧縮レベル.指定しない場合,アーカイブは6,pkl.bz2は9
+
     Note:
-        imagesとstepは,どちらかしか指定できない.
+        | 以前のデフォルトのXXX_LUP.pkl.bz2は作成されなくなったため,
+        | compressed_pickle.load("XXX_LUP.pkl.bz2")で読み込んでいたスクリプトは修正が必要である.
+        | outfileに.arc以外の拡張子(XXX_LUP.pkl.bz2など)を指定すると,従来通りpkl.bz2ファイルで出力する.
     """
-    index = args.index
-    outfile = args.outfile
-    name = args.name
-    return _read_lups(index,outfile,name)
+    args = _parser().parse_args()
+    return _read_lups(args.index,args.outfile,args.name,
+                      n_jobs=args.jobs,resume=args.resume,quiet=args.quiet,
+                      codec=args.codec,level=args.level)
     
-def _read_lups(index=None,outfile=None,name=None):
-    p = Path(".")
-    if name is None:
-        name = list(p.glob('*.com'))[0].stem
+def _read_lups(index=None,outfile=None,name=None,n_jobs=None,resume=False,quiet=False,codec="zlib",level=None):
+    name,logfiles = find_logfiles("PT",name)
     if outfile is None:
-        num = "" if index is None else index
-        outfile = f"{name}_LUP{num}.pkl.bz2"
-            
-    logfile = natsorted(list(p.glob(f'{name}_PT*.log')))
-    logfile = logfile[:-1] # 最後は*PT_list.logなので省く
+        outfile = f"{name}_LUP.arc" if index is None else f"{name}_LUP{index}.pkl.bz2"
     if type(index) == int:
-        data = _read_lup(logfile[index])
+        cpickle.dump(_read_lup(logfiles[index]), outfile)
     else:
-        data = [_read_lup(log) for log in logfile]
-    
-    cpickle.dump(data, outfile)
+        return run_extraction(_read_lup,logfiles,outfile,n_jobs,resume,quiet,level,codec)
         
 def _read_lup(filename):
     """XXX_PTi.logファイルを読み込みAtoms情報のdictを要素とするリストを返す
     
+    | ファイルは1回だけ走査し,座標はまとめてnumpy配列に変換する.
+    
     Parameters:
     
     filename: str
@@ -83,16 +105,17 @@ def _read_lup(filename):
     with open(filename) as f:
         l = f.readlines()
     node_idx = [i for i,text in enumerate(l) if "# NODE" in text]
-
-    for i,text in enumerate(l[node_idx[0]+1:]):
+    if not node_idx:
+        return None
+    atoms_n = 0 # 原子の数
+    for text in l[node_idx[0]+1:]:
         if len(text.split()) != 4:
-            atoms_n = i # 原子の数
             break
-
-    irc = [coordination2atoms_dict(l[i+1:i+atoms_n+1]) for i in node_idx]
-    return irc
+        atoms_n += 1
+    return blocks2atoms_dicts(l,[i+1 for i in node_idx],atoms_n)
         
 def coordination2atoms_dict(coordination:list):
+    from ase import Atoms
     def int2float(text):
         text = text.split()
         return [float(text[1]),float(text[2]),float(text[3])]
@@ -1,3 +1,9 @@
-from grrmpy.constraints.constraints import ForProduct
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "ForProduct":"grrmpy.constraints.constraints",
+}
 
 __all__ = ["ForProduct"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,9 +1,17 @@
-from grrmpy.conv.log2atoms import log2atoms
-from grrmpy.conv.atoms2mol import atoms2mol,atomslist2mols
-from grrmpy.conv.atoms2smiles import atoms2smiles,atomslist2smileses
-from grrmpy.conv.mol2png_binary import mol2png_binary
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "log2atoms":"grrmpy.conv.log2atoms",
+    "atoms2mol":"grrmpy.conv.atoms2mol",
+    "atomslist2mols":"grrmpy.conv.atoms2mol",
+    "atoms2smiles":"grrmpy.conv.atoms2smiles",
+    "atomslist2smileses":"grrmpy.conv.atoms2smiles",
+    "mol2png_binary":"grrmpy.conv.mol2png_binary",
+}
 
 __all__ = ["log2atoms",
            "atoms2mol","atomslist2mols",
            "atoms2smiles","atomslist2smileses",
            "mol2png_binary"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,6 +1,5 @@
 from ase.geometry.analysis import Analysis
 from ase.neighborlist import build_neighbor_list,natural_cutoffs
-from rdkit import Chem
 
 def atoms2mol(atoms,target0=None,target1=[],target2=[],mult=1.0,**kwargs):
     """_summary_
@@ -58,6 +57,7 @@ def _renumbering_target(n_atoms,target0,target1,target2):
         return new_target0,new_target1,new_target2,target3
     
 def _atoms2mol(atoms,target0,target1,target3,mult=1,**kwargs):
+    from rdkit import Chem
     atoms = atoms.copy()
     del atoms[target3]
     m = Chem.MolFromSmiles('')
@@ -1,5 +1,5 @@
-from ase import Atoms
-from grrmpy.io.read_listlog import _open_file,_read_mark_of_list,_get_chemical_symbols,_int2float
+from grrmpy.io.read_listlog import (_open_file,_read_mark_of_list,_get_chemical_symbols,
+                                   _positions_array,symbols2numbers,atoms_views)
 
 def log2atoms(logfile):
     """logファイルをAtomsオブジェクトのリストに変換する
@@ -20,6 +20,5 @@ def log2atoms(logfile):
 def _log2atoms(logtext:str,hash_idx:list,energy_idx:list):
     chemical_symbols = _get_chemical_symbols(logtext, energy_idx)
     natoms = len(chemical_symbols)
-    positions_list = (_int2float(logtext[i+1:i+natoms+1]) for i in hash_idx) # 座標を取得
-    atoms_list = (Atoms(chemical_symbols,p) for p in positions_list)
-    return atoms_list # ジェネレーター
\ No newline at end of file
+    positions = _positions_array(logtext, hash_idx, natoms) # 座標を取得
+    return atoms_views(symbols2numbers(chemical_symbols), positions)
\ No newline at end of file
@@ -1,9 +1,16 @@
-from grrmpy.excel.workbook import Workbook
-from grrmpy.excel.worksheet import Worksheet
-from grrmpy.excel.chart_path import ChartPath
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "Workbook":"grrmpy.excel.workbook",
+    "Worksheet":"grrmpy.excel.worksheet",
+    "ChartPath":"grrmpy.excel.chart_path",
+}
 
 __all__ = ["Workbook","Worksheet","ChartPath"]
 
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
+
+
     
 """
 基本的な操作はxlsxwriterのWorkbook,Worksheetと同様である(継承しているので)
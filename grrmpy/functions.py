@@ -1,9 +1,6 @@
 import math
 from math import sqrt
 import numpy as np
-import plotly.graph_objects as go
-import plotly.io as pyi
-import networkx as nx
 from ase.units import kJ,Hartree,mol,kcal
 from ase.geometry import find_mic
 from ase.geometry.analysis import Analysis
@@ -11,6 +8,7 @@ from ase.build.rotate import rotation_matrix_from_points
 from ase.neighborlist import build_neighbor_list,natural_cutoffs
 # User
 from grrmpy.calculator import pfp_calculator
+from grrmpy.async_calc import get_potential_energies
 
 def get_fmax(atoms):
     """fmaxを返す"""
@@ -21,7 +19,9 @@ def draw_graph(images,
                unit="kJ/mol",
                title="Energy Diagram",
                xaxis_title="",
-               yaxis_title=None):
+               yaxis_title=None,
+               energies=None,
+               x=None):
     """エネルギーダイアグラムのグラフを作成する
     
     Parameters:
@@ -37,15 +37,24 @@ def draw_graph(images,
         x軸のタイトル  
     yaxis_title: string
         Noneの場合,Energy({unit})
+    energies: list of float
+        | 計算済みの各imageのエネルギー(eV). 与えた場合,エネルギーの計算は行なわない.
+    x: list of float
+        x軸の値. Noneの場合はimageの番号.
     
     """        
-    x = [i for i in range(len(images))]
-    try:
-        y = [atoms.get_potential_energy() for atoms in images]
-    except:
-        for image in images:
-            image.calc = calc_func()
-        y = [atoms.get_potential_energy() for atoms in images]
+    import plotly.graph_objects as go
+    if x is None:
+        x = [i for i in range(len(images))]
+    if energies is not None:
+        y = list(energies)
+    else:
+        try:
+            y = get_potential_energies(images)
+        except:
+            for image in images:
+                image.calc = calc_func()
+            y = get_potential_energies(images)
            
     y = [i-y[0] for i in y] # iniのエネルギーを0スタートで表記
     if unit == "kJ/mol":
@@ -74,6 +83,8 @@ def to_html_energy_diagram(images,calc_func=pfp_calculator,
                            title="Energy Diagram",
                            xaxis_title="",
                            yaxis_title=None,
+                           energies=None,
+                           x=None,
                            **kwargs):
     """エネルギーダイアグラムのhtmlテキストを作成する
     
@@ -90,15 +101,22 @@ def to_html_energy_diagram(images,calc_func=pfp_calculator,
         x軸のタイトル  
     yaxis_title: string
         Noneの場合,Energy({unit})
+    energies: list of float
+        計算済みの各imageのエネルギー(eV)(draw_graphを参照)
+    x: list of float
+        x軸の値. Noneの場合はimageの番号.
     
     """
+    import plotly.io as pyi
     fig = draw_graph(
         images,
         calc_func=calc_func,
         unit=unit,
         title=title,
         xaxis_title=xaxis_title,
-        yaxis_title=yaxis_title)
+        yaxis_title=yaxis_title,
+        energies=energies,
+        x=x)
     return pyi.to_html(fig,full_html=full_html,**kwargs)
 
 
@@ -308,6 +326,7 @@ def connected_components(atoms,indices=None,mult=1.0,**kwargs):
         >>> #--> {5,6,7,8,9}
         >>> #--> {10,11}
     """
+    import networkx as nx
     if indices is None:
         indices = [i for i in range(len(atoms))]
     G = nx.Graph()
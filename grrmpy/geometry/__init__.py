@@ -1,4 +1,10 @@
-from grrmpy.geometry.geometry import Geometry
-from grrmpy.geometry.geometries import Geometries
+from grrmpy._lazy import lazy_attributes
 
-__all__ = ["Geometry","Geometries"]
\ No newline at end of file
+_attributes = {
+    "Geometry":"grrmpy.geometry.geometry",
+    "Geometries":"grrmpy.geometry.geometries",
+}
+
+__all__ = ["Geometry","Geometries"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,8 +1,4 @@
-import pandas as pd
 import numpy as np
-from rdkit import Chem,DataStructs
-from rdkit.Chem import AllChem
-from rdkit.Avalon import pyAvalonTools
 from copy import deepcopy
 from grrmpy.geometry import Geometry
 from ase import Atoms
@@ -125,9 +121,8 @@ class Geometries():
         return [Geometry(atoms,target0,target1,target2,mult,**kwargs) for atoms in atoms_list]
     
     def _assign_group_and_cluster(self,smileses):
-        df = pd.DataFrame({'similes': smileses})
-        unique = df['similes'].unique().tolist()
-        group = [unique.index(smile) for smile in smileses]
+        unique = {smiles:i for i,smiles in enumerate(dict.fromkeys(smileses))} # 出現順に番号を付ける
+        group = [unique[smile] for smile in smileses]
         culster = self.group2cluster(group)
         return group, culster
     
@@ -150,6 +145,7 @@ class Geometries():
             return [i for i,other_smiles in enumerate(other_smileses) if other_smiles==smiles]
         
     def similar(self,index,method="maccs"):
+        from rdkit import Chem
         mols = deepcopy(self.mols)
         valid_mol_dict = {i:mol for i,mol in enumerate(mols) if mol}
         valid_mol = valid_mol_dict.values()
@@ -179,16 +175,22 @@ class Geometries():
         return similar_dict
     
     def _macss(self,index,mols):
+        from rdkit import DataStructs
+        from rdkit.Chem import AllChem
         maccs_fps = [AllChem.GetMACCSKeysFingerprint(mol) for mol in mols]
         maccs = DataStructs.BulkTanimotoSimilarity(maccs_fps[index], maccs_fps)
         return maccs
     
     def _tanimoto(self,index,mols):
+        from rdkit import DataStructs
+        from rdkit.Chem import AllChem
         morgan_fp = [AllChem.GetMorganFingerprintAsBitVect(mol, 2, 2048) for mol in mols]
         tanimoto = DataStructs.BulkTanimotoSimilarity(morgan_fp[index], morgan_fp)
         return tanimoto
     
     def _avalon(self,index,mols):
+        from rdkit import DataStructs
+        from rdkit.Avalon import pyAvalonTools
         avalon_fps = [pyAvalonTools.GetAvalonFP(mol) for mol in mols]
         avalon = DataStructs.BulkTanimotoSimilarity(avalon_fps[index], avalon_fps)
         return avalon
@@ -1,7 +1,6 @@
 from audioop import mul
 from types import new_class
 from ase import Atoms
-from rdkit import Chem
 import copy
 from grrmpy.conv.atoms2mol import atoms2mol
 import  grrmpy.geometry as gg
@@ -66,6 +65,7 @@ class Geometry():
         
     def build_mols_and_smiles(self):
         if self.atoms is not None:
+            from rdkit import Chem
             self.__mol = atoms2mol(self.atoms,self.target0,self.target1,self.target2,self.mult)
             self.__smiles = Chem.MolToSmiles(self.mol)
         
@@ -1,10 +1,43 @@
-from grrmpy.io.format import read,write
-from grrmpy.io.read_listlog import read_positions, read_energies, read_connections,log2atoms
-from grrmpy.io.compressed_pickle import loads, dumps, load, dump
-from grrmpy.io.write_html import write_html
-from grrmpy.io.read_com import frozen2atoms
-from grrmpy.io.read_acfdat import read_acf,get_dader
-from grrmpy.io.read_traj import read_traj, iread_traj
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "read":"grrmpy.io.format",
+    "write":"grrmpy.io.format",
+    "read_positions":"grrmpy.io.read_listlog",
+    "read_energies":"grrmpy.io.read_listlog",
+    "read_connections":"grrmpy.io.read_listlog",
+    "log2atoms":"grrmpy.io.read_listlog",
+    "loads":"grrmpy.io.compressed_pickle",
+    "dumps":"grrmpy.io.compressed_pickle",
+    "load":"grrmpy.io.compressed_pickle",
+    "dump":"grrmpy.io.compressed_pickle",
+    "write_html":"grrmpy.io.write_html",
+    "frozen2atoms":"grrmpy.io.read_com",
+    "read_acf":"grrmpy.io.read_acfdat",
+    "get_dader":"grrmpy.io.read_acfdat",
+    "read_traj":"grrmpy.io.read_traj",
+    "iread_traj":"grrmpy.io.read_traj",
+    "TrajFolder":"grrmpy.io.read_traj",
+    "read_columnar_structures":"grrmpy.io.read_traj",
+    "write_network_html":"grrmpy.io.write_network",
+    "write_network_json":"grrmpy.io.write_network",
+    "network_level":"grrmpy.io.write_network",
+    "write_columnar":"grrmpy.io.columnar",
+    "read_columnar":"grrmpy.io.columnar",
+    "export_network":"grrmpy.io.columnar",
+    "read_network":"grrmpy.io.columnar",
+    "CompactTrajectory":"grrmpy.io.compact_traj",
+    "CompactTrajectoryWriter":"grrmpy.io.compact_traj",
+    "read_ctraj":"grrmpy.io.compact_traj",
+    "iread_ctraj":"grrmpy.io.compact_traj",
+    "ctraj2traj":"grrmpy.io.compact_traj",
+    "traj2ctraj":"grrmpy.io.compact_traj",
+    "Archive":"grrmpy.io.archive",
+    "ArchiveWriter":"grrmpy.io.archive",
+    "dump_archive":"grrmpy.io.archive",
+    "load_archive":"grrmpy.io.archive",
+    "load_path":"grrmpy.io.archive",
+}
 
 __all__ = ["read","write",
            "read_positions","read_energies","read_connections","log2atoms",
@@ -12,5 +45,10 @@ __all__ = ["read","write",
            "write_html",
            "frozen2atoms",
            "read_acf","get_dader",
-           "read_traj","iread_traj"]
+           "read_traj","iread_traj","TrajFolder","read_columnar_structures",
+           "write_network_html","write_network_json","network_level",
+           "write_columnar","read_columnar","export_network","read_network",
+           "CompactTrajectory","CompactTrajectoryWriter","read_ctraj","iread_ctraj","ctraj2traj","traj2ctraj",
+           "Archive","ArchiveWriter","dump_archive","load_archive","load_path"]
 
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -0,0 +1,247 @@
+"""
+IRC,LUPの経路などを1つずつ圧縮して保存する,ランダムアクセス可能なアーカイブ.
+
+| ファイルの構造
+| - ヘッダー: MAGIC(8byte)
+| - ブロック: BLOCK_HEAD(b"BLK1",番号,圧縮後のサイズ,フレーム数,圧縮方式) + 圧縮したpickle
+| - フッター: 索引(JSON) + 索引の位置(8byte) + FOOTER_MAGIC(8byte)
+| 索引には各ブロックの番号,位置,サイズ,フレーム数が記録されているため,
+| 1つの経路を読み込む時に他のブロックを展開する必要がない.
+| フッターが無い(書き込み途中で終了した)場合は,ブロックを先頭から走査して索引を作り直す.
+"""
+import os
+import json
+import lzma
+import zlib
+import struct
+import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAGIC = b"GRRMARC1"
+FOOTER_MAGIC = b"GRRMIDX1"
+BLOCK_HEAD = struct.Struct("<4sqqiB")
+CODECS = {"zlib":0,"lzma":1,"none":2}
+
+def _compress(data,codec,level):
+    if codec == "zlib":
+        return zlib.compress(data,level)
+    elif codec == "lzma":
+        return lzma.compress(data,preset=level)
+    return data
+
+def _decompress(data,codec_id):
+    if codec_id == 0:
+        return zlib.decompress(data)
+    elif codec_id == 1:
+        return lzma.decompress(data)
+    return data
+
+def _n_frames(obj):
+    try:
+        return len(obj)
+    except TypeError:
+        return 0
+
+class ArchiveWriter():
+    """アーカイブに経路を1つずつ書き込む
+
+    | 圧縮はスレッドで並列に行ない(zlib,lzmaはGILを解放する),書き込みは追加した順に行なう.
+
+    Parameters:
+
+    fname: str or Path
+        アーカイブのファイル名
+    mode: str
+        | 'w': 新たに作成する(上書き)
+        | 'a': 既存のアーカイブに追記する(既にある番号はidsで確認できる)
+    codec: str
+        'zlib','lzma','none'のいずれか
+    level: int
+        圧縮レベル(zlib:0~9,lzma:0~9)
+    n_threads: int
+        圧縮に用いるスレッド数
+
+    Examples:
+
+        >>> with ArchiveWriter("IRC.arc") as w:
+        >>>     for i,path in enumerate(paths):
+        >>>         w.add(i,path)
+        >>> load_path("IRC.arc",10)
+    """
+    def __init__(self,fname,mode="w",codec="zlib",level=6,n_threads=None):
+        if codec not in CODECS:
+            raise ValueError("codecは'zlib','lzma','none'のいずれかです")
+        self.fname = fname
+        self.codec = codec
+        self.level = level
+        self.index = {}
+        if mode == "a" and os.path.exists(fname) and os.path.getsize(fname) > 0:
+            self.index,end = _read_index(fname)
+            self._f = open(fname,"r+b")
+            self._f.seek(end)
+            self._f.truncate() # フッターは閉じる時に書き直す
+        else:
+            self._f = open(fname,"wb")
+            self._f.write(MAGIC)
+        self._executor = ThreadPoolExecutor(max_workers=n_threads or os.cpu_count() or 1)
+        self._pending = deque()
+        self._max_pending = 4*(n_threads or os.cpu_count() or 1)
+
+    @property
+    def ids(self):
+        """既に書き込んだ番号の集合"""
+        return set(self.index)
+
+    def add(self,i,obj):
+        """番号iのオブジェクトを追加する"""
+        data = pickle.dumps(obj,protocol=pickle.HIGHEST_PROTOCOL)
+        future = self._executor.submit(_compress,data,self.codec,self.level)
+        self._pending.append((int(i),_n_frames(obj),future))
+        self._flush(block=len(self._pending)>=self._max_pending)
+
+    def _flush(self,block=False):
+        while self._pending and (block or self._pending[0][2].done()):
+            i,n_frames,future = self._pending.popleft()
+            data = future.result()
+            offset = self._f.tell()
+            self._f.write(BLOCK_HEAD.pack(b"BLK1",i,len(data),n_frames,CODECS[self.codec]))
+            self._f.write(data)
+            self.index[i] = {"offset":offset,"size":len(data),"frames":n_frames,"codec":CODECS[self.codec]}
+            block = False
+
+    def close(self):
+        while self._pending:
+            self._flush(block=True)
+        self._executor.shutdown()
+        footer = self._f.tell()
+        index = {"ids":list(self.index),
+                 "offset":[v["offset"] for v in self.index.values()],
+                 "size":[v["size"] for v in self.index.values()],
+                 "frames":[v["frames"] for v in self.index.values()],
+                 "codec":[v["codec"] for v in self.index.values()]}
+        self._f.write(json.dumps(index,separators=(",",":")).encode())
+        self._f.write(struct.pack("<q",footer))
+        self._f.write(FOOTER_MAGIC)
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+def _read_index(fname):
+    """索引({番号:{offset,size,frames,codec}})とブロックの終わりの位置を返す"""
+    with open(fname,"rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{fname}はアーカイブではありません")
+        size = os.path.getsize(fname)
+        if size >= len(MAGIC)+16:
+            f.seek(size-16)
+            tail = f.read(16)
+            if tail[8:] == FOOTER_MAGIC:
+                footer = struct.unpack("<q",tail[:8])[0]
+                f.seek(footer)
+                try:
+                    data = json.loads(f.read(size-16-footer).decode())
+                    index = {i:{"offset":o,"size":s,"frames":n,"codec":c} for i,o,s,n,c in
+                             zip(data["ids"],data["offset"],data["size"],data["frames"],data["codec"])}
+                    return index,footer
+                except ValueError:
+                    pass
+        # フッターが無い場合はブロックを走査する
+        index = {}
+        pos = len(MAGIC)
+        f.seek(pos)
+        while True:
+            head = f.read(BLOCK_HEAD.size)
+            if len(head) < BLOCK_HEAD.size:
+                break
+            tag,i,n_bytes,n_frames,codec = BLOCK_HEAD.unpack(head)
+            if tag != b"BLK1" or pos+BLOCK_HEAD.size+n_bytes > size:
+                break # 書き込み途中のブロック
+            index[i] = {"offset":pos,"size":n_bytes,"frames":n_frames,"codec":codec}
+            pos += BLOCK_HEAD.size+n_bytes
+            f.seek(pos)
+        return index,pos
+
+class Archive():
+    """アーカイブを読み込む(必要な経路のブロックだけを展開する)
+
+    Parameters:
+
+    fname: str or Path
+        アーカイブのファイル名
+
+    Examples:
+
+        >>> arc = Archive("IRC.arc")
+        >>> len(arc), arc.ids[:5], arc.frames(4711)
+        >>> path = arc.load_path(4711) # TS4711の経路のみ展開する
+    """
+    def __init__(self,fname):
+        self.fname = fname
+        self.index,_ = _read_index(fname)
+        self._f = open(fname,"rb")
+
+    @property
+    def ids(self):
+        """番号のリスト(昇順)"""
+        return sorted(self.index)
+
+    def frames(self,i):
+        """番号iの経路のフレーム数"""
+        return self.index[i]["frames"]
+
+    def load_path(self,i):
+        """番号iのオブジェクトを読み込む"""
+        info = self.index[i]
+        self._f.seek(info["offset"]+BLOCK_HEAD.size)
+        return pickle.loads(_decompress(self._f.read(info["size"]),info["codec"]))
+
+    def to_list(self):
+        """番号順のリスト(番号の無いところはNone)に変換する(cpickle.loadと同じ形式)"""
+        n = max(self.index)+1 if self.index else 0
+        return [self.load_path(i) if i in self.index else None for i in range(n)]
+
+    def __getitem__(self,i):
+        return self.load_path(i)
+
+    def __contains__(self,i):
+        return i in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for i in self.ids:
+            yield i, self.load_path(i)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+def dump_archive(fname,data,codec="zlib",level=6,n_threads=None):
+    """リストまたは{番号:オブジェクト}をアーカイブとして保存する(Noneの要素は保存しない)"""
+    items = data.items() if isinstance(data,dict) else enumerate(data)
+    with ArchiveWriter(fname,"w",codec,level,n_threads) as w:
+        for i,obj in items:
+            if obj is not None:
+                w.add(i,obj)
+
+def load_path(fname,i):
+    """アーカイブから番号iのオブジェクトのみを読み込む"""
+    with Archive(fname) as arc:
+        return arc.load_path(i)
+
+def load_archive(fname):
+    """アーカイブを番号順のリストとして読み込む"""
+    with Archive(fname) as arc:
+        return arc.to_list()
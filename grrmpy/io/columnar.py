@@ -0,0 +1,387 @@
+"""
+ノード,エッジの表を列毎に保存する.
+
+| format="parquet": pyarrowがインストールされている場合.チャンク毎にrow groupとして書き込む.
+| format="columns": フォルダに列毎のバイナリファイル(数値は生データ,文字列はutf-8+オフセット)とmeta.jsonを保存する.
+|                   数値の列はnp.memmapで読み込むため,読み込みはI/O律速になる.
+"""
+import sys
+import json
+import numpy as np
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+def _pyarrow():
+    """(pyarrow,pyarrow.parquet)を返す. インストールされていない場合は(None,None)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None,None
+    return pa,pq
+
+def _as_dict(table):
+    """DataFrameの場合は列名:配列のdictにする(DataFrameがあればpandasは既に読み込まれている)"""
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(table,pd.DataFrame):
+        return {c:table[c].to_numpy() for c in table.columns}
+    return table
+
+class ColumnarWriter():
+    """表をチャンク毎に列形式で書き込む
+
+    Parameters:
+
+    path: str or Path
+        | format="parquet"の場合はファイル名(.parquet)
+        | format="columns"の場合はフォルダ名
+    format: str
+        | 'parquet','columns','auto'のいずれか.
+        | 'auto'の場合,pyarrowがあればparquet,なければcolumns.
+
+    Examples:
+
+        >>> with ColumnarWriter("nodes",format="columns") as w:
+        >>>     w.write({"node":np.arange(10),"name":[f"EQ{i}" for i in range(10)]})
+        >>> df = read_columnar("nodes")
+    """
+    def __init__(self,path,format="auto"):
+        _,pq = _pyarrow()
+        if format == "auto":
+            format = "parquet" if pq is not None else "columns"
+        if format == "parquet" and pq is None:
+            raise ImportError("format='parquet'にはpyarrowが必要です")
+        if format not in ("parquet","columns"):
+            raise ValueError("formatは'parquet','columns','auto'のいずれかです")
+        self.format = format
+        self.path = Path(path)
+        self._writer = None
+        self._files = None
+        self._meta = None
+
+    def write(self,chunk):
+        """チャンク(列名:配列のdictまたはDataFrame)を書き込む"""
+        chunk = {name:_as_column(col) for name,col in _as_dict(chunk).items()}
+        if self.format == "parquet":
+            pa,pq = _pyarrow()
+            table = pa.table(chunk)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(str(self.path),table.schema)
+            self._writer.write_table(table)
+        else:
+            self._write_columns(chunk)
+
+    def _write_columns(self,chunk):
+        if self._meta is None:
+            self.path.mkdir(parents=True,exist_ok=True)
+            self._meta = {"length":0,"columns":[]}
+            self._files = []
+            for i,(name,col) in enumerate(chunk.items()):
+                kind = "str" if col.dtype.kind in "OU" else "num"
+                info = {"name":name,"file":f"{i:03d}.bin","kind":kind}
+                if kind == "num":
+                    info["dtype"] = col.dtype.str
+                    self._files.append((open(self.path/info["file"],"wb"),None))
+                else:
+                    info["offsets"] = f"{i:03d}.off"
+                    off = open(self.path/info["offsets"],"wb")
+                    off.write(np.zeros(1,dtype=np.int64).tobytes())
+                    self._files.append((open(self.path/info["file"],"wb"),off))
+                    info["_pos"] = 0
+                self._meta["columns"].append(info)
+        length = None
+        for info,(f,off),(name,col) in zip(self._meta["columns"],self._files,chunk.items()):
+            if name != info["name"]:
+                raise ValueError("全てのチャンクで列の順番を同じにして下さい")
+            length = len(col) if length is None else length
+            if info["kind"] == "num":
+                f.write(np.ascontiguousarray(col,dtype=info["dtype"]).tobytes())
+            else:
+                encoded = [str(s).encode() for s in col.tolist()]
+                f.write(b"".join(encoded))
+                ends = info["_pos"]+np.cumsum([len(s) for s in encoded],dtype=np.int64)
+                off.write(ends.tobytes())
+                if len(ends):
+                    info["_pos"] = int(ends[-1])
+        self._meta["length"] += length or 0
+
+    def close(self):
+        if self.format == "parquet":
+            if self._writer is not None:
+                self._writer.close()
+        elif self._meta is not None:
+            for f,off in self._files:
+                f.close()
+                if off is not None:
+                    off.close()
+            meta = {"length":self._meta["length"],
+                    "columns":[{k:v for k,v in info.items() if not k.startswith("_")}
+                               for info in self._meta["columns"]]}
+            with open(self.path/"meta.json","w") as f:
+                json.dump(meta,f,indent=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+def _as_column(col):
+    col = np.asarray(col)
+    if col.dtype.kind == "O":
+        # 文字列と数字が混ざっている場合('??'など)は文字列にする
+        col = col.astype(str)
+    return col
+
+def write_columnar(path,table,chunk_size=1000000,format="auto"):
+    """表を列形式で保存する
+
+    Parameters:
+
+    path: str or Path
+        保存先(ColumnarWriterを参照)
+    table: dict or DataFrame
+        列名:配列
+    chunk_size: int
+        1回に書き込む行数
+    format: str
+        'parquet','columns','auto'のいずれか
+    """
+    table = _as_dict(table)
+    n = len(next(iter(table.values()))) if table else 0
+    with ColumnarWriter(path,format) as w:
+        for start in range(0,max(n,1),chunk_size):
+            w.write({k:np.asarray(v)[start:start+chunk_size] for k,v in table.items()})
+
+def read_columnar(path,columns=None,as_dataframe=True,mmap=True):
+    """write_columnar,ColumnarWriterで保存した表を読み込む
+
+    Parameters:
+
+    path: str or Path
+        .parquetファイルまたはフォルダ
+    columns: list of str
+        読み込む列名. Noneの場合は全て.
+    as_dataframe: bool
+        Trueの場合DataFrame,Falseの場合は列名:配列のdictを返す
+    mmap: bool
+        | format="columns"の場合,数値の列をnp.memmapで読み込む.
+        | (as_dataframe=Falseの場合はコピーされない)
+    """
+    path = Path(path)
+    if path.is_dir():
+        with open(path/"meta.json") as f:
+            meta = json.load(f)
+        table = {}
+        for info in meta["columns"]:
+            if columns is not None and info["name"] not in columns:
+                continue
+            if info["kind"] == "num":
+                dtype = np.dtype(info["dtype"])
+                if meta["length"] == 0:
+                    col = np.zeros(0,dtype=dtype)
+                elif mmap:
+                    col = np.memmap(path/info["file"],dtype=dtype,mode="r",shape=(meta["length"],))
+                else:
+                    col = np.fromfile(path/info["file"],dtype=dtype)
+            else:
+                data = (path/info["file"]).read_bytes()
+                off = np.fromfile(path/info["offsets"],dtype=np.int64).tolist()
+                if data.isascii():
+                    text = data.decode()
+                    col = np.array([text[a:b] for a,b in zip(off[:-1],off[1:])],dtype=object)
+                else:
+                    col = np.array([data[a:b].decode() for a,b in zip(off[:-1],off[1:])],dtype=object)
+            table[info["name"]] = col
+    else:
+        _,pq = _pyarrow()
+        if pq is None:
+            raise ImportError("parquetファイルの読み込みにはpyarrowが必要です")
+        t = pq.read_table(str(path),columns=columns)
+        if as_dataframe:
+            return t.to_pandas()
+        table = {name:t.column(name).to_numpy() for name in t.column_names}
+    if as_dataframe:
+        import pandas as pd
+        return pd.DataFrame(table,copy=False)
+    return table
+
+_GRAPHML_TYPE = {"f":"double","i":"long","u":"long","b":"boolean"}
+
+class _XMLGraphWriter():
+    """GraphML,GEXFをチャンク毎に書き込む(ノードを全て書き込んでからエッジを書き込む)"""
+    def __init__(self,file,node_columns,edge_columns,directed=False):
+        self.file = open(file,"w")
+        self.node_columns = node_columns # [(列名,dtype.kind)]
+        self.edge_columns = edge_columns
+        self.directed = directed
+        self._state = "nodes"
+        self.write_header()
+
+    def _attr_type(self,kind):
+        return _GRAPHML_TYPE.get(kind,"string")
+
+    def _values(self,col):
+        """属性値の文字列のリスト"""
+        col = np.asarray(col)
+        if col.dtype.kind == "b":
+            return ["true" if v else "false" for v in col.tolist()]
+        if col.dtype.kind in "fiu":
+            return [repr(v) for v in col.tolist()]
+        return [escape(str(v),{'"':"&quot;"}) for v in col.tolist()]
+
+    def write_nodes(self,ids,attrs):
+        """ids: ノード番号の配列, attrs: 列名:配列のdict"""
+        values = [self._values(attrs[name]) for name,_ in self.node_columns]
+        self.file.write("".join(self.node_text(i,vals) for i,*vals in zip(np.asarray(ids).tolist(),*values)))
+
+    def write_edges(self,ids,source,target,attrs):
+        if self._state == "nodes":
+            self.file.write(self.middle)
+            self._state = "edges"
+        values = [self._values(attrs[name]) for name,_ in self.edge_columns]
+        self.file.write("".join(self.edge_text(k,s,t,vals) for k,s,t,*vals in
+                                zip(np.asarray(ids).tolist(),np.asarray(source).tolist(),
+                                    np.asarray(target).tolist(),*values)))
+
+    def close(self):
+        if self._state == "nodes":
+            self.file.write(self.middle)
+        self.file.write(self.footer)
+        self.file.close()
+
+class GraphMLWriter(_XMLGraphWriter):
+    """GraphMLをチャンク毎に書き込む"""
+    middle = ""
+    footer = "</graph>\n</graphml>\n"
+
+    def write_header(self):
+        lines = ['<?xml version="1.0" encoding="utf-8"?>\n',
+                 '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n']
+        for i,(name,kind) in enumerate(self.node_columns):
+            lines.append(f'<key id="n{i}" for="node" attr.name={quoteattr(name)} attr.type="{self._attr_type(kind)}"/>\n')
+        for i,(name,kind) in enumerate(self.edge_columns):
+            lines.append(f'<key id="e{i}" for="edge" attr.name={quoteattr(name)} attr.type="{self._attr_type(kind)}"/>\n')
+        edgedefault = "directed" if self.directed else "undirected"
+        lines.append(f'<graph edgedefault="{edgedefault}">\n')
+        self.file.write("".join(lines))
+
+    def node_text(self,i,vals):
+        data = "".join(f'<data key="n{j}">{v}</data>' for j,v in enumerate(vals))
+        return f'<node id="{i}">{data}</node>\n'
+
+    def edge_text(self,k,s,t,vals):
+        data = "".join(f'<data key="e{j}">{v}</data>' for j,v in enumerate(vals))
+        return f'<edge id="e{k}" source="{s}" target="{t}">{data}</edge>\n'
+
+_GEXF_TYPE = {"f":"double","i":"long","u":"long","b":"boolean"}
+
+class GEXFWriter(_XMLGraphWriter):
+    """GEXFをチャンク毎に書き込む"""
+    middle = "</nodes>\n<edges>\n"
+    footer = "</edges>\n</graph>\n</gexf>\n"
+
+    def _attr_type(self,kind):
+        return _GEXF_TYPE.get(kind,"string")
+
+    def write_header(self):
+        mode = "directed" if self.directed else "undirected"
+        lines = ['<?xml version="1.0" encoding="utf-8"?>\n',
+                 '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n',
+                 f'<graph mode="static" defaultedgetype="{mode}">\n',
+                 '<attributes class="node">\n']
+        for i,(name,kind) in enumerate(self.node_columns):
+            lines.append(f'<attribute id="{i}" title={quoteattr(name)} type="{self._attr_type(kind)}"/>\n')
+        lines.append('</attributes>\n<attributes class="edge">\n')
+        for i,(name,kind) in enumerate(self.edge_columns):
+            lines.append(f'<attribute id="{i}" title={quoteattr(name)} type="{self._attr_type(kind)}"/>\n')
+        lines.append('</attributes>\n<nodes>\n')
+        self.file.write("".join(lines))
+
+    def node_text(self,i,vals):
+        data = "".join(f'<attvalue for="{j}" value="{v}"/>' for j,v in enumerate(vals))
+        return f'<node id="{i}" label="{i}"><attvalues>{data}</attvalues></node>\n'
+
+    def edge_text(self,k,s,t,vals):
+        data = "".join(f'<attvalue for="{j}" value="{v}"/>' for j,v in enumerate(vals))
+        return f'<edge id="{k}" source="{s}" target="{t}"><attvalues>{data}</attvalues></edge>\n'
+
+def export_network(folder,nodes,edges,chunk_size=1000000,format="auto",graphml=False,gexf=False,self_loop=False):
+    """ノード,エッジの表を列形式で保存する.必要に応じてGraphML,GEXFも同時に書き込む
+
+    | 保存されるファイル(folder内)
+    | - nodes.parquet(またはnodesフォルダ), edges.parquet(またはedgesフォルダ)
+    | - network.graphml (graphml=Trueの場合)
+    | - network.gexf (gexf=Trueの場合)
+    | 全てチャンク毎に書き込むため,一度に全体の文字列やグラフを作成しない.
+    | GraphML,GEXFには,sourceまたはtargetが負(??,DCなど)のエッジは書き込まない.
+
+    Parameters:
+
+    folder: str or Path
+        保存フォルダ
+    nodes: dict or DataFrame
+        | ノードの表. 1列目はノード番号.
+        | 例: {"node":...,"name":...,"group":...,"E/Hartree":...,"E/kJmol-1":...}
+    edges: dict or DataFrame
+        | エッジの表. 1列目はエッジ番号,"source","target"の列(int,不明な場合は-1)が必要.
+    chunk_size: int
+        1回に書き込む行数
+    format: str
+        'parquet','columns','auto'のいずれか
+    graphml: bool
+        GraphMLも作成する場合True
+    gexf: bool
+        GEXFも作成する場合True
+    self_loop: bool
+        GraphML,GEXFに自己ループを含める場合True
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True,exist_ok=True)
+    nodes = {k:_as_column(v) for k,v in _as_dict(nodes).items()}
+    edges = {k:_as_column(v) for k,v in _as_dict(edges).items()}
+    fmt = "parquet" if (format == "auto" and _pyarrow()[1] is not None) or format == "parquet" else "columns"
+    suffix = ".parquet" if fmt == "parquet" else ""
+    node_id = list(nodes)[0]
+    edge_id = list(edges)[0]
+    node_columns = [(k,v.dtype.kind) for k,v in nodes.items() if k != node_id]
+    edge_columns = [(k,v.dtype.kind) for k,v in edges.items() if k not in (edge_id,"source","target")]
+    xml_writers = []
+    if graphml:
+        xml_writers.append(GraphMLWriter(folder/"network.graphml",node_columns,edge_columns))
+    if gexf:
+        xml_writers.append(GEXFWriter(folder/"network.gexf",node_columns,edge_columns))
+    n_nodes = len(nodes[node_id])
+    n_edges = len(edges[edge_id])
+    with ColumnarWriter(folder/f"nodes{suffix}",fmt) as w:
+        for start in range(0,max(n_nodes,1),chunk_size):
+            chunk = {k:v[start:start+chunk_size] for k,v in nodes.items()}
+            w.write(chunk)
+            for xw in xml_writers:
+                xw.write_nodes(chunk[node_id],chunk)
+    with ColumnarWriter(folder/f"edges{suffix}",fmt) as w:
+        for start in range(0,max(n_edges,1),chunk_size):
+            chunk = {k:v[start:start+chunk_size] for k,v in edges.items()}
+            w.write(chunk)
+            if xml_writers:
+                s = np.asarray(chunk["source"]).astype(np.int64)
+                t = np.asarray(chunk["target"]).astype(np.int64)
+                mask = (s>=0)&(t>=0)
+                if not self_loop:
+                    mask &= s!=t
+                sub = {k:v[mask] for k,v in chunk.items()}
+                for xw in xml_writers:
+                    xw.write_edges(sub[edge_id],s[mask],t[mask],sub)
+    for xw in xml_writers:
+        xw.close()
+
+def read_network(folder,mmap=True):
+    """export_networkで保存したノード,エッジの表を読み込む
+
+    Returns:
+        tuple of DataFrame: (nodes, edges)
+    """
+    folder = Path(folder)
+    node_path = folder/"nodes.parquet" if (folder/"nodes.parquet").exists() else folder/"nodes"
+    edge_path = folder/"edges.parquet" if (folder/"edges.parquet").exists() else folder/"edges"
+    return read_columnar(node_path,mmap=mmap), read_columnar(edge_path,mmap=mmap)
@@ -0,0 +1,322 @@
+"""
+NEB,IRCの履歴などを小さく保存するためのtrajectory(.ctraj).
+
+| ファイルの構造
+| - ヘッダー: MAGIC(8byte) + サイズ(8byte) + 圧縮したpickle
+|   (numbers,cell,pbc,constraints,動く原子のindex,固定原子の座標,精度)
+| - チャンク: CHUNK_HEAD(b"CHK1",フレーム数,圧縮後のサイズ) + 圧縮したpickle
+| 固定原子(FixAtoms)の座標など全フレームで変わらないものは1度だけ保存する.
+| 動く原子の座標はprecision(Å)単位の整数に量子化し,チャンクの最初のフレーム(キーフレーム)と
+| 前のフレームとの差分(int32)として保存する. チャンク毎に独立して展開できる.
+"""
+import os
+import zlib
+import struct
+import pickle
+import numpy as np
+from ase import Atoms
+from ase.io import Trajectory, iread
+from ase.constraints import FixAtoms, dict2constraint
+from ase.calculators.singlepoint import SinglePointCalculator
+
+MAGIC = b"GRRMCTJ1"
+CHUNK_HEAD = struct.Struct("<4sqq")
+
+def _moving_indices(atoms):
+    """FixAtomsで固定されていない原子のindexを返す"""
+    fixed = np.zeros(len(atoms),dtype=bool)
+    for c in atoms.constraints:
+        if isinstance(c,FixAtoms):
+            fixed[c.get_indices()] = True
+    return np.nonzero(~fixed)[0]
+
+def _read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name}はctrajファイルではありません")
+    size = struct.unpack("<q",f.read(8))[0]
+    return pickle.loads(zlib.decompress(f.read(size)))
+
+class CompactTrajectoryWriter():
+    """Atomsを.ctrajファイルに書き込む
+
+    | ase.io.Trajectoryと同様に,Optimizerにattachして用いることができる.
+    | chunk_sizeフレーム毎にまとめて圧縮して書き込む.
+
+    Parameters:
+
+    fname: str or Path
+        ファイル名(.ctraj)
+    mode: str
+        | 'w': 新たに作成する(上書き)
+        | 'a': 追記する(既にあるファイルと原子の構成が同じである必要がある)
+    atoms: Atoms
+        write()で引数を省略した場合に書き込むAtoms
+    precision: float
+        座標の精度(Å)
+    chunk_size: int
+        1つのチャンクのフレーム数
+    level: int
+        zlibの圧縮レベル
+
+    Examples:
+
+        >>> traj = CompactTrajectoryWriter("IRC.ctraj",atoms=atoms)
+        >>> opt = LBFGS(atoms)
+        >>> opt.attach(traj.write)
+        >>> opt.run(fmax=0.001,steps=40000)
+        >>> traj.close()
+    """
+    def __init__(self,fname,mode="w",atoms=None,precision=1e-6,chunk_size=100,level=6):
+        self.fname = fname
+        self.atoms = atoms
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self.level = level
+        self.header = None
+        self.n_frames = 0
+        self._buffer = []
+        if mode == "a" and os.path.exists(fname) and os.path.getsize(fname) > 0:
+            with open(fname,"rb") as f:
+                self.header = _read_header(f)
+            self.precision = self.header["precision"]
+            traj = CompactTrajectory(fname)
+            self.n_frames = len(traj)
+            with open(fname,"r+b") as f:
+                f.truncate(traj._end) # 書き込み途中のチャンクを除く
+        elif os.path.exists(fname):
+            os.remove(fname)
+
+    def _write_header(self,atoms):
+        moving = _moving_indices(atoms)
+        fixed = np.setdiff1d(np.arange(len(atoms)),moving)
+        self.header = {
+            "numbers":atoms.get_atomic_numbers(),
+            "cell":np.array(atoms.get_cell()),
+            "pbc":atoms.get_pbc(),
+            "constraints":[c.todict() for c in atoms.constraints],
+            "moving":moving,
+            "fixed_positions":atoms.positions[fixed].copy(),
+            "precision":self.precision,
+        }
+        data = zlib.compress(pickle.dumps(self.header,protocol=pickle.HIGHEST_PROTOCOL),self.level)
+        with open(self.fname,"wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<q",len(data)))
+            f.write(data)
+
+    def write(self,atoms=None,**kwargs):
+        """1フレームを書き込む
+
+        Parameters:
+
+        atoms: Atoms
+            Noneの場合,初期化時に与えたatoms
+        kwargs:
+            | フレーム毎に保存する値(例:step=10). 読み込み時にatoms.infoに入る.
+        """
+        if atoms is None:
+            atoms = self.atoms
+        if self.header is None:
+            self._write_header(atoms)
+        header = self.header
+        if len(atoms) != len(header["numbers"]):
+            raise ValueError("原子数が異なるAtomsは書き込めません")
+        fixed = np.setdiff1d(np.arange(len(atoms)),header["moving"])
+        if len(fixed) and np.abs(atoms.positions[fixed]-header["fixed_positions"]).max() > self.precision:
+            raise ValueError("固定原子の座標が変化しています")
+        frame = {"positions":atoms.positions[header["moving"]].copy()}
+        if atoms.calc is not None:
+            results = atoms.calc.results
+            if "energy" in results:
+                frame["energy"] = results["energy"]
+            if "forces" in results:
+                frame["forces"] = np.asarray(results["forces"])[header["moving"]]
+        if not np.array_equal(atoms.get_cell(),header["cell"]):
+            frame["cell"] = np.array(atoms.get_cell())
+        if kwargs:
+            frame["info"] = kwargs
+        self._buffer.append(frame)
+        self.n_frames += 1
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_images(self,images,**kwargs):
+        """複数のAtoms(NEBのimagesなど)をまとめて書き込む"""
+        for atoms in images:
+            self.write(atoms,**kwargs)
+
+    def flush(self):
+        """バッファにあるフレームを1つのチャンクとして書き込む"""
+        if not self._buffer:
+            return
+        frames,self._buffer = self._buffer,[]
+        q = np.rint(np.stack([f["positions"] for f in frames])/self.precision).astype(np.int64)
+        delta = np.diff(q,axis=0)
+        if np.abs(delta).max(initial=0) <= np.iinfo(np.int32).max: # 収まらない場合はint64のまま
+            delta = delta.astype(np.int32)
+        chunk = {"key":q[0],"delta":delta}
+        if all("energy" in f for f in frames):
+            chunk["energy"] = np.array([f["energy"] for f in frames])
+        if all("forces" in f for f in frames):
+            chunk["forces"] = np.stack([f["forces"] for f in frames]).astype(np.float32)
+        for key in ("cell","info"):
+            if any(key in f for f in frames):
+                chunk[key] = [f.get(key) for f in frames]
+        data = zlib.compress(pickle.dumps(chunk,protocol=pickle.HIGHEST_PROTOCOL),self.level)
+        with open(self.fname,"ab") as f:
+            f.write(CHUNK_HEAD.pack(b"CHK1",len(frames),len(data)))
+            f.write(data)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+class CompactTrajectory():
+    """.ctrajファイルを読み込む
+
+    | len(),インデックス,スライスでAtomsを取り出せる. 必要なチャンクだけを展開する.
+
+    Parameters:
+
+    fname: str or Path
+        ファイル名(.ctraj)
+
+    Examples:
+
+        >>> traj = CompactTrajectory("IRC0_forward.ctraj")
+        >>> last = traj[-1]
+        >>> for atoms in traj:
+        >>>     print(atoms.get_potential_energy())
+    """
+    def __init__(self,fname):
+        self.fname = fname
+        with open(fname,"rb") as f:
+            self.header = _read_header(f)
+            self._chunks = [] # (位置,サイズ,最初のフレーム番号,フレーム数)
+            size = os.path.getsize(fname)
+            pos = f.tell()
+            n = 0
+            while pos+CHUNK_HEAD.size <= size:
+                tag,n_frames,n_bytes = CHUNK_HEAD.unpack(f.read(CHUNK_HEAD.size))
+                if tag != b"CHK1" or pos+CHUNK_HEAD.size+n_bytes > size:
+                    break # 書き込み途中のチャンク
+                self._chunks.append((pos+CHUNK_HEAD.size,n_bytes,n,n_frames))
+                n += n_frames
+                pos += CHUNK_HEAD.size+n_bytes
+                f.seek(pos)
+        self._n_frames = n
+        self._end = pos
+        self._starts = np.array([c[2] for c in self._chunks],dtype=np.int64)
+        self._cache = (None,None)
+
+    def __len__(self):
+        return self._n_frames
+
+    def _load_chunk(self,c):
+        if self._cache[0] == c:
+            return self._cache[1]
+        offset,n_bytes,_,_ = self._chunks[c]
+        with open(self.fname,"rb") as f:
+            f.seek(offset)
+            chunk = pickle.loads(zlib.decompress(f.read(n_bytes)))
+        q = np.concatenate([chunk["key"][np.newaxis],chunk["delta"].astype(np.int64)])
+        chunk["positions"] = np.cumsum(q,axis=0)*self.header["precision"]
+        self._cache = (c,chunk)
+        return chunk
+
+    def _make_atoms(self,chunk,j):
+        h = self.header
+        positions = np.empty((len(h["numbers"]),3))
+        fixed = np.setdiff1d(np.arange(len(h["numbers"])),h["moving"])
+        positions[fixed] = h["fixed_positions"]
+        positions[h["moving"]] = chunk["positions"][j]
+        cell = h["cell"]
+        if "cell" in chunk and chunk["cell"][j] is not None:
+            cell = chunk["cell"][j]
+        atoms = Atoms(h["numbers"],positions=positions,cell=cell,pbc=h["pbc"])
+        atoms.set_constraint([dict2constraint(c) for c in h["constraints"]])
+        if "info" in chunk and chunk["info"][j] is not None:
+            atoms.info.update(chunk["info"][j])
+        results = {}
+        if "energy" in chunk:
+            results["energy"] = chunk["energy"][j]
+        if "forces" in chunk:
+            forces = np.zeros((len(atoms),3))
+            forces[h["moving"]] = chunk["forces"][j]
+            results["forces"] = forces
+        if results:
+            atoms.calc = SinglePointCalculator(atoms,**results)
+        return atoms
+
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+        c = int(np.searchsorted(self._starts,i,side="right"))-1
+        return self._make_atoms(self._load_chunk(c),i-self._chunks[c][2])
+
+    def __iter__(self):
+        for c,(_,_,_,n_frames) in enumerate(self._chunks):
+            chunk = self._load_chunk(c)
+            for j in range(n_frames):
+                yield self._make_atoms(chunk,j)
+
+def iread_ctraj(fname,index=None):
+    """.ctrajファイルのAtomsを順に返すジェネレーター(ase.io.ireadと同様)
+
+    Parameters:
+
+    fname: str or Path
+        ファイル名(.ctraj)
+    index: slice
+        読み込むフレーム. Noneの場合は全て.
+    """
+    traj = CompactTrajectory(fname)
+    if index is None:
+        yield from traj
+    else:
+        for i in range(*index.indices(len(traj))):
+            yield traj[i]
+
+def read_ctraj(fname,index=-1):
+    """.ctrajファイルを読み込む(ase.io.readと同様)
+
+    Parameters:
+
+    fname: str or Path
+        ファイル名(.ctraj)
+    index: int or slice
+        | 読み込むフレーム. デフォルトは最後のフレーム.
+        | sliceの場合はAtomsのリストを返す.
+    """
+    return CompactTrajectory(fname)[index]
+
+def ctraj2traj(fname,outfile):
+    """.ctrajファイルをase.io.Trajectory(.traj)に変換する
+
+    | 座標はprecisionの精度で,エネルギー,力(float32)はそのまま復元される.
+
+    Parameters:
+
+    fname: str or Path
+        .ctrajファイル
+    outfile: str or Path
+        出力する.trajファイル
+    """
+    with Trajectory(outfile,"w") as traj:
+        for atoms in iread_ctraj(fname):
+            traj.write(atoms)
+
+def traj2ctraj(fname,outfile,precision=1e-6,chunk_size=100,level=6):
+    """ase.io.Trajectory(.traj)などを.ctrajファイルに変換する"""
+    with CompactTrajectoryWriter(outfile,"w",precision=precision,chunk_size=chunk_size,level=level) as w:
+        for atoms in iread(fname):
+            w.write(atoms)
@@ -1,27 +1,138 @@
+import os
 import pickle
 import bz2
+import warnings
 
 def loads(comp):
     return pickle.loads(bz2.decompress(comp))
 
-def dumps(obj):
-    return bz2.decompress(pickle.dumps(obj))
+def dumps(obj, level=9):
+    """pythonオブジェクトをbz2で圧縮したbytesにする(loadsで元に戻せる)
+
+    | 多数の経路をまとめて保存する場合はgrrmpy.io.archiveを用いる.
+    """
+    warnings.warn("dumpsは非推奨です. 経路の保存にはgrrmpy.io.archive.ArchiveWriterを用いてください",
+                  DeprecationWarning, stacklevel=2)
+    return bz2.compress(pickle.dumps(obj), level)
 
 def load(fname):
     """dumpで圧縮したbz2ファイルをpythonオブジェクトとして展開する
     
+    | dump_recordで追記したファイルの場合,番号順に並べたリストとして返す.
+    
     Parameters
     
     fname:
         入力ファイル名(bz2ファイル)
     
     """
-    fin = bz2.BZ2File(fname, 'rb')
-    try:
-        pkl = fin.read()
-    finally:
-        fin.close()
-    return pickle.loads(pkl)
+    with bz2.BZ2File(fname, 'rb') as fin:
+        obj = pickle.load(fin)
+        if not _is_record_header(obj):
+            return obj
+        header = obj
+    return records2list(iload_records(fname),header.get("length"))
+
+RECORD_HEADER = {"format":"grrmpy-records","version":1}
+
+def _is_record_header(obj):
+    return isinstance(obj,dict) and obj.get("format") == RECORD_HEADER["format"]
+
+def dump_record(index, obj, fname, level=9, length=None):
+    """(番号,オブジェクト)を1つの記録としてbz2ファイルに追記する
+
+    | 1つの記録毎に独立したbz2ストリームとして追記するため,全体をメモリに保持する必要がない.
+    | ファイルが無い場合はヘッダーを書き込んでから追記する.
+    | loadで読み込むと番号順のリスト(記録の無い番号はNone)になる.
+
+    Parameters:
+
+    index: int
+        番号
+    obj: obj
+        Pythonオブジェクト
+    fname:
+        出力ファイル名
+    level: int
+        圧縮レベル
+    length: int
+        | 新たにファイルを作成する場合,loadで返すリストの長さ.
+        | Noneの場合は最大の番号+1.
+    """
+    data = b""
+    if not os.path.exists(fname) or os.path.getsize(fname) == 0:
+        header = dict(RECORD_HEADER,length=length)
+        data += bz2.compress(pickle.dumps(header),level)
+    data += bz2.compress(pickle.dumps((index,obj)),level)
+    with open(fname,"ab") as f:
+        f.write(data)
+        f.flush()
+
+def _iter_streams(fname,chunk_size=1<<16):
+    """ファイル中の完全なbz2ストリームを順に展開し,(展開したbytes,ストリームの終わりの位置)を返すジェネレーター
+
+    | 途中で終わっている,または壊れているストリームがあれば,そこで終了する.
+    """
+    with open(fname,"rb") as f:
+        end = 0
+        buf = b""
+        while True:
+            if not buf:
+                buf = f.read(chunk_size)
+                if not buf:
+                    return # ファイルの終わり
+            decompressor = bz2.BZ2Decompressor()
+            data = []
+            while True:
+                try:
+                    data.append(decompressor.decompress(buf))
+                except OSError:
+                    return # 壊れている
+                if decompressor.eof:
+                    end += len(buf)-len(decompressor.unused_data)
+                    buf = decompressor.unused_data
+                    break
+                end += len(buf)
+                buf = f.read(chunk_size)
+                if not buf:
+                    return # 書き込み途中で終わっている
+            yield b"".join(data),end
+
+def iload_records(fname,offsets=False):
+    """dump_recordで追記したファイルの(番号,オブジェクト)を順に返すジェネレーター
+
+    | 書き込み途中で終了したなどで壊れている記録があれば,そこで終了する.
+
+    Parameters:
+
+    fname:
+        dump_recordで作成したファイル
+    offsets: bool
+        | Trueの場合,(番号,オブジェクト,記録の終わりのバイト位置)を返す.
+        | 最後に返した位置までが正常に読み込めた部分なので,追記する前にその位置でtruncateする.
+    """
+    streams = _iter_streams(fname)
+    for data,_ in streams:
+        try:
+            header = pickle.loads(data)
+        except Exception:
+            return
+        if not _is_record_header(header):
+            raise ValueError(f"{fname}はdump_recordで作成したファイルではありません")
+        break
+    for data,end in streams:
+        try:
+            index,obj = pickle.loads(data)
+        except Exception:
+            return # 壊れている記録
+        yield (index,obj,end) if offsets else (index,obj)
+
+def records2list(records,length=None):
+    """(番号,オブジェクト)のイテラブルを番号順のリストにする"""
+    data = dict(records)
+    n = max(data)+1 if data else 0
+    n = max(n,length or 0)
+    return [data.get(i) for i in range(n)]
 
 def dump(obj, fname, level=9):
     """pythonオブジェクトをbz2ファイルに圧縮しつつ,シリアライズ化する
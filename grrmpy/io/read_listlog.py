@@ -1,6 +1,7 @@
 import numpy as np
 from ase import Atoms
 from ase.io import read
+from ase.data import atomic_numbers
 
 # USER
 from grrmpy.io.read_com import frozen2atoms
@@ -27,23 +28,53 @@ def log2atoms(logfile,com=None,poscar=None,constraints=[]):
     logtext = _open_file(logfile)
     hash_idx, energy_idx = _read_mark_of_list(logtext)
     natoms = _get_natoms(logtext, energy_idx)
-    positions_list = (_int2float(logtext[i+1:i+natoms+1]) for i in hash_idx) # 座標を取得
-    elements = _get_chemical_symbols(logtext, energy_idx)
-    if com:
-        frozen = frozen2atoms(com)
-        atoms_list = [Atoms(elements,positions)+frozen for positions in positions_list]
-    else:
-        atoms_list = [Atoms(elements,positions) for positions in positions_list]
-    
+    positions = _positions_array(logtext, hash_idx, natoms) # 座標を取得
+    numbers = symbols2numbers(_get_chemical_symbols(logtext, energy_idx))
+    frozen = frozen2atoms(com) if com else None
+    cell, pbc = None, None
     if poscar:
-        pos_atoms = read(poscar,format="vasp")
-        cell = pos_atoms.get_cell()
-        for atoms in atoms_list:
-            atoms.set_cell(cell)
-            atoms.set_pbc(True)
-    
-    for atoms in atoms_list:
+        cell = read(poscar,format="vasp").get_cell()
+        pbc = True
+    return atoms_views(numbers,positions,frozen,cell,pbc,constraints)
+
+def atoms_views(numbers,positions,frozen=None,cell=None,pbc=None,constraints=[]):
+    """同じ組成の構造の座標からAtomsのリストを作成する
+
+    | FrozenAtomsを含めた全構造の座標を1つの配列(構造数,原子数,3)に確保し,
+    | 各Atomsの座標はその配列のビューとする(構造毎にAtomsの足し算を行なわない).
+
+    Parameters:
+
+    numbers: array-like of int
+        原子番号(FrozenAtomsを除く)
+    positions: np.ndarray
+        (構造数,原子数,3)の座標
+    frozen: Atoms
+        全ての構造に追加するFrozenAtoms. Noneの場合は追加しない.
+    cell: array-like
+        セル. Noneの場合は設定しない.
+    pbc: bool or list of bool
+        周期境界条件
+    constraints: ase.constraints
+        全てのAtomsに適用するconstraints
+
+    Returns:
+        list of Atoms: Atomsオブジェクトのリスト
+    """
+    positions = np.asarray(positions,dtype=float).reshape(len(positions),-1,3)
+    n_frozen = len(frozen) if frozen is not None else 0
+    block = np.empty((len(positions),positions.shape[1]+n_frozen,3))
+    block[:,:positions.shape[1]] = positions
+    numbers = np.asarray(numbers,dtype=int)
+    if n_frozen:
+        block[:,positions.shape[1]:] = frozen.positions
+        numbers = np.concatenate([numbers,frozen.numbers])
+    atoms_list = []
+    for pos in block:
+        atoms = Atoms(numbers=numbers,cell=cell,pbc=pbc)
+        atoms.arrays["positions"] = pos
         atoms.set_constraint(constraints)
+        atoms_list.append(atoms)
     return atoms_list
 
 def read_positions(logfile):
@@ -60,8 +91,7 @@ def read_positions(logfile):
     logtext = _open_file(logfile)
     hash_idx, energy_idx = _read_mark_of_list(logtext)
     natoms = _get_natoms(logtext, energy_idx)
-    positions_list = (_int2float(logtext[i+1:i+natoms+1]) for i in hash_idx) # 座標を取得
-    return positions_list
+    return list(_positions_array(logtext, hash_idx, natoms)) # 座標を取得
 
 def read_energies(logfile):
     """logファイルからenergyのリストを返す
@@ -109,7 +139,7 @@ def _read_mark_of_list(logtext):
     energy_idx = [i for i,text in enumerate(logtext) if "Energy    =" in text]
     if len(hash_idx)*2 == len(energy_idx):
         """ReEnergyの場合,`Energy    =`が2つ出るため"""
-        energy_idx = [i for i in energy_idx if i%2 == 0] #偶数個目のEnergy    =の値だけ読み取る
+        energy_idx = energy_idx[::2] #偶数個目のEnergy    =の値だけ読み取る
     return hash_idx, energy_idx
 
 def _logtext2energies(logtext, energy_idx):
@@ -122,6 +152,16 @@ def _get_chemical_symbols(logtext, energy_idx):
 def _get_natoms(logtext, energy_idx):
     return len(_get_chemical_symbols(logtext, energy_idx))
 
+def _positions_array(logtext, hash_idx, natoms):
+    """全構造の座標をまとめて(構造数,原子数,3)の配列にする"""
+    if len(hash_idx) == 0:
+        return np.zeros((0,natoms,3))
+    text = "".join(["".join(logtext[i+1:i+natoms+1]) for i in hash_idx])
+    return np.array(text.split()).reshape(len(hash_idx),natoms,4)[:,:,1:].astype(float)
+
+def symbols2numbers(symbols):
+    return np.array([atomic_numbers[s] for s in symbols])
+
 def _int2float(positions):
     return [[float(xyz) for xyz in atom.split()[1:]] for atom in positions]
 
@@ -1,41 +1,257 @@
+import os
+import numpy as np
 from pathlib import Path
-from natsort import natsorted
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from ase import Atoms
 from ase.io import read,iread
+from ase.calculators.singlepoint import SinglePointCalculator
+
+#USER
+from grrmpy.io.columnar import ColumnarWriter, read_columnar
+
+_INDEX_CACHE = {}
+
+def _folder_index(folder):
+    """フォルダ内の{i}.trajを{i:ファイルパス}として返す
+
+    | フォルダの更新時刻が変わらない限り,走査結果を再利用する.
+    """
+    folder = Path(folder).resolve()
+    mtime = os.stat(folder).st_mtime_ns
+    cached = _INDEX_CACHE.get(folder)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    index = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            stem,ext = os.path.splitext(entry.name)
+            if ext == ".traj" and stem.isdecimal():
+                index[int(stem)] = entry.path
+    index = dict(sorted(index.items()))
+    _INDEX_CACHE[folder] = (mtime,index)
+    return index
+
+class TrajFolder():
+    """フォルダ内の0.traj,1.traj,2.traj...を必要な時に読み込むリストのようなオブジェクト
+
+    | AutoOptのStructureフォルダなどに用いる.
+    | len()は最大の番号+1で,ファイルの無い番号はNoneになる.
+    | 読み込んだ構造は最大maxsize個まで保持する(LRU).
+    | 先頭から順に読み込む(for文など)場合,prefetch個先のファイルをスレッドで読み込んでおく.
+
+    Parameters:
+
+    folder: str or Path
+        フォルダ名
+    images: bool
+        | Trueの場合,各trajファイルの全ての構造(Atomsのリスト)を返す.
+        | Falseの場合,最後の構造(Atoms)を返す.
+    maxsize: int
+        保持する構造の数
+    prefetch: int
+        | 順に読み込む際に先読みするファイルの数. 0の場合は先読みしない.
+    n_threads: int
+        先読みに用いるスレッド数
+
+    Examples:
+
+        >>> structures = TrajFolder("Structure",prefetch=8)
+        >>> len(structures)
+        >>> atoms = structures[10]
+        >>> for atoms in structures:
+        >>>     if atoms is not None:
+        >>>         print(atoms.get_potential_energy())
+        >>> structures.to_columnar("Structure_store")
+    """
+    def __init__(self,folder,images=False,maxsize=128,prefetch=0,n_threads=4):
+        self.folder = Path(folder)
+        self.images = images
+        self.maxsize = maxsize
+        self.prefetch = prefetch
+        self.n_threads = n_threads
+        self._cache = OrderedDict()
+        self.refresh()
+
+    def refresh(self):
+        """フォルダの内容を再び確認する"""
+        self.files = _folder_index(self.folder)
+        self._cache.clear()
+
+    @property
+    def indices(self):
+        """trajファイルが存在する番号のリスト"""
+        return list(self.files)
+
+    def __len__(self):
+        return max(self.files)+1 if self.files else 0
+
+    def __contains__(self,i):
+        return i in self.files
+
+    def _read(self,path):
+        if self.images:
+            return list(iread(path))
+        return read(path)
+
+    def _store(self,i,obj):
+        self._cache[i] = obj
+        self._cache.move_to_end(i)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+        if i not in self.files:
+            return None
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        obj = self._read(self.files[i])
+        self._store(i,obj)
+        return obj
+
+    def _iter_items(self):
+        """存在するファイルの(番号,構造)を順に返す"""
+        if self.prefetch <= 0:
+            for i in self.files:
+                yield i, self[i]
+            return
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            pending = deque()
+            todo = iter(self.files.items())
+            for i,path in todo:
+                pending.append((i,executor.submit(self._read,path)))
+                if len(pending) >= self.prefetch:
+                    break
+            while pending:
+                i,future = pending.popleft()
+                for j,path in todo:
+                    pending.append((j,executor.submit(self._read,path)))
+                    break
+                obj = future.result()
+                self._store(i,obj)
+                yield i, obj
+
+    def __iter__(self):
+        expected = 0
+        for i,obj in self._iter_items():
+            for _ in range(expected,i):
+                yield None # ファイルが無い番号
+            yield obj
+            expected = i+1
+
+    def tolist(self):
+        """全ての構造を読み込みリストにする(ファイルの無い番号はNone)"""
+        return list(self)
+
+    def to_columnar(self,path,format="columns",chunk_size=1000):
+        """全ての構造を列形式で保存する
+
+        | path/structuresに構造毎の情報(番号,フレーム,原子数,先頭の原子の位置,エネルギー,セル)を,
+        | path/atomsに原子毎の情報(原子番号,座標)を保存する.
+        | read_columnar_structuresで読み込める.
+
+        Parameters:
+
+        path: str or Path
+            保存先のフォルダ
+        format: str
+            'parquet','columns','auto'のいずれか(ColumnarWriterを参照)
+        chunk_size: int
+            1回に書き込む構造の数
+        """
+        path = Path(path)
+        path.mkdir(parents=True,exist_ok=True)
+        with ColumnarWriter(path/"structures",format) as sw, ColumnarWriter(path/"atoms",format) as aw:
+            rows = []
+            start = 0
+            def flush(rows,start):
+                if not rows:
+                    return start
+                n_atoms = np.array([len(a) for _,_,a in rows],dtype=np.int64)
+                offset = start+np.concatenate([[0],np.cumsum(n_atoms)[:-1]]).astype(np.int64)
+                energy = np.array([_energy(a) for _,_,a in rows])
+                cell = np.array([np.array(a.get_cell()).ravel() for _,_,a in rows]).reshape(-1,9)
+                pbc = np.array([a.get_pbc() for _,_,a in rows]).reshape(-1,3)
+                table = {"index":np.array([i for i,_,_ in rows],dtype=np.int64),
+                         "frame":np.array([f for _,f,_ in rows],dtype=np.int64),
+                         "n_atoms":n_atoms,"offset":offset,"energy":energy}
+                table.update({f"cell{k}":cell[:,k] for k in range(9)})
+                table.update({f"pbc{k}":pbc[:,k] for k in range(3)})
+                sw.write(table)
+                positions = np.concatenate([a.positions for _,_,a in rows])
+                aw.write({"number":np.concatenate([a.numbers for _,_,a in rows]).astype(np.int16),
+                          "x":positions[:,0],"y":positions[:,1],"z":positions[:,2]})
+                return start+int(n_atoms.sum())
+            for i,obj in self._iter_items():
+                frames = obj if self.images else [obj]
+                rows.extend((i,f,a) for f,a in enumerate(frames))
+                if len(rows) >= chunk_size:
+                    start = flush(rows,start)
+                    rows = []
+            flush(rows,start)
+
+def _energy(atoms):
+    if atoms.calc is not None and "energy" in atoms.calc.results:
+        return atoms.calc.results["energy"]
+    return np.nan
+
+def read_columnar_structures(path,index=None):
+    """TrajFolder.to_columnarで保存した構造をAtomsのリストとして読み込む
+
+    Parameters:
+
+    path: str or Path
+        to_columnarで保存したフォルダ
+    index: list of int
+        読み込む行(構造)の番号. Noneの場合は全て.
+
+    Returns:
+        list of Atoms: エネルギーはSinglePointCalculatorとして付く.構造の番号とフレームはatoms.infoに入る.
+    """
+    path = Path(path)
+    s = read_columnar(path/"structures",as_dataframe=False)
+    a = read_columnar(path/"atoms",as_dataframe=False)
+    rows = range(len(s["index"])) if index is None else index
+    atoms_list = []
+    for r in rows:
+        o,n = int(s["offset"][r]),int(s["n_atoms"][r])
+        positions = np.stack([a["x"][o:o+n],a["y"][o:o+n],a["z"][o:o+n]],axis=1)
+        cell = np.array([s[f"cell{k}"][r] for k in range(9)]).reshape(3,3)
+        pbc = [bool(s[f"pbc{k}"][r]) for k in range(3)]
+        atoms = Atoms(np.asarray(a["number"][o:o+n]),positions=positions,cell=cell,pbc=pbc)
+        atoms.info.update({"index":int(s["index"][r]),"frame":int(s["frame"][r])})
+        if not np.isnan(s["energy"][r]):
+            atoms.calc = SinglePointCalculator(atoms,energy=float(s["energy"][r]))
+        atoms_list.append(atoms)
+    return atoms_list
 
 def read_traj(folder):
     """
-    
+
     | フォルダ内のtrajファイルを検索し,Atomsのリストする.
     | trajファイルは0.traj 1.traj 2.traj...のようになっている必要がある.
     | また例えば,0.traj 2.traj のように1.trajが抜けていた場合はNoneの要素になる.
     | trajの中身がimagesの場合は別の関数である,iread_trajを用いる
+    | 全てを読み込まずに必要な構造のみ読み込む場合はTrajFolderを用いる.
 
 
     Parameters:
-    
+
     folder: str or Path
         フォルダ名
 
     Returns:
         list: Atomsのリスト
     """
-    p = Path(folder)
-    traj_files = natsorted([p for p in p.glob("*traj")],lambda x:x.name)
-    max_i = int(traj_files[-1].stem)
-    atoms_list = [read(p.joinpath(f"{i}.traj")) 
-                  if p.joinpath(f"{i}.traj").exists() 
-                  else None 
-                  for i in range(max_i)]
-    return atoms_list
+    return TrajFolder(folder,maxsize=0,prefetch=8).tolist()
 
 def iread_traj(folder):
     """read_trajのimages版"""
-
-    p = Path(folder)
-    traj_files = natsorted([p for p in p.glob("*traj")],lambda x:x.name)
-    max_i = int(traj_files[-1].stem)
-    atoms_list = [[atoms for atoms in iread(p.joinpath(f"{i}.traj"))]
-                  if p.joinpath(f"{i}.traj").exists() 
-                  else None 
-                  for i in range(max_i)]
-    return atoms_list
\ No newline at end of file
+    return TrajFolder(folder,images=True,maxsize=0,prefetch=8).tolist()
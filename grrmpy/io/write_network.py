@@ -0,0 +1,187 @@
+import json
+import numpy as np
+
+def network_level(name,pos,source,target,color,title=None,size=None):
+    """write_network_html,write_network_jsonに与える1つの表示レベルのデータを作成する
+
+    | 各データは列(配列)毎に保持する.
+
+    Parameters:
+
+    name: str
+        レベルの名前(例:'EQ','group')
+    pos: np.ndarray
+        (ノード数,2)の座標
+    source: array-like of int
+        エッジのsource. 無効なエッジ(-1)は除かれる.
+    target: array-like of int
+        エッジのtarget
+    color: list of str
+        ノードの色('#rrggbb')
+    title: list of str
+        マウスを重ねた時に表示する文字列
+    size: array-like
+        ノードの大きさ(相対値). Noneの場合は全て1.
+
+    Returns:
+        dict: 表示レベルのデータ
+    """
+    pos = np.asarray(pos,dtype=float)
+    n = len(pos)
+    source = np.asarray(source,dtype=np.int64)
+    target = np.asarray(target,dtype=np.int64)
+    mask = (source>=0)&(target>=0)&(source<n)&(target<n)&(source!=target)
+    level = {
+        "name":name,
+        "x":np.round(pos[:,0],4).tolist(),
+        "y":np.round(pos[:,1],4).tolist(),
+        "color":list(color),
+        "source":source[mask].tolist(),
+        "target":target[mask].tolist(),
+    }
+    if title is not None:
+        level["title"] = list(title)
+    if size is not None:
+        size = np.asarray(size,dtype=float)
+        level["size"] = np.round(size/size.max(),4).tolist() if len(size) and size.max() > 0 else size.tolist()
+    return level
+
+def write_network_json(file,levels):
+    """表示レベルのリストをJSONで保存する
+
+    Parameters:
+
+    file: str or Path
+        保存するファイル名(.json)
+    levels: list of dict
+        network_level()で作成したデータのリスト
+    """
+    with open(file,"w") as f:
+        json.dump({"levels":levels},f,separators=(",",":"))
+
+def write_network_html(html,levels,title="Network",height="100vh"):
+    """力学計算を行なわない静的なhtml(canvas)でネットワークを表示する
+
+    | 座標は事前に求めたものを用いるため,10万ノード程度でもすぐに表示される.
+    | 複数のレベルを与えた場合,プルダウンで切り替えられる.
+    | 'auto'を選んだ場合,縮小時は最初のレベル以外(まとめたネットワーク)を,拡大時は最初のレベルを表示する.
+    | ドラッグで移動,ホイールで拡大縮小,ノードにマウスを重ねるとtitleを表示する.
+
+    Parameters:
+
+    html: str or Path
+        保存するファイル名(.html)
+    levels: list of dict
+        network_level()で作成したデータのリスト
+    title: str
+        ページのタイトル
+    height: str
+        表示領域の高さ
+    """
+    data = json.dumps({"levels":levels},separators=(",",":")).replace("</","<\\/")
+    text = _HTML_TEMPLATE.replace("__TITLE__",title).replace("__HEIGHT__",height).replace("__DATA__",data)
+    with open(html,"w") as f:
+        f.write(text)
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+body{margin:0;font-family:sans-serif}
+#bar{position:absolute;top:4px;left:4px;background:rgba(255,255,255,0.8);padding:2px 6px;font-size:12px}
+#tip{position:absolute;pointer-events:none;background:#fff;border:1px solid #888;padding:2px 4px;font-size:12px;white-space:pre;display:none}
+canvas{display:block;width:100%;height:__HEIGHT__}
+</style>
+</head>
+<body>
+<div id="bar">level: <select id="level"></select> <span id="info"></span></div>
+<div id="tip"></div>
+<canvas id="cv"></canvas>
+<script type="application/json" id="data">__DATA__</script>
+<script>
+const levels = JSON.parse(document.getElementById("data").textContent).levels;
+const cv = document.getElementById("cv"), ctx = cv.getContext("2d");
+const tip = document.getElementById("tip"), sel = document.getElementById("level");
+const info = document.getElementById("info");
+let view = {x:0,y:0,s:1}, mode = levels.length > 1 ? "auto" : "0";
+if(levels.length > 1){const o=document.createElement("option");o.value="auto";o.text="auto";sel.add(o);}
+levels.forEach((l,i)=>{const o=document.createElement("option");o.value=String(i);o.text=l.name;sel.add(o);});
+sel.value = mode;
+sel.onchange = ()=>{mode = sel.value; draw();};
+// 範囲
+let xmin=Infinity,xmax=-Infinity,ymin=Infinity,ymax=-Infinity;
+for(const v of levels[0].x){xmin=Math.min(xmin,v);xmax=Math.max(xmax,v);}
+for(const v of levels[0].y){ymin=Math.min(ymin,v);ymax=Math.max(ymax,v);}
+// マウス位置のノードを探すための格子
+function buildGrid(l){
+  const n=l.x.length, g=Math.max(1,Math.ceil(Math.sqrt(n/4)));
+  const cells=new Map(), w=(xmax-xmin)/g||1, h=(ymax-ymin)/g||1;
+  for(let i=0;i<n;i++){
+    const k=Math.floor((l.x[i]-xmin)/w)+","+Math.floor((l.y[i]-ymin)/h);
+    if(!cells.has(k)) cells.set(k,[]);
+    cells.get(k).push(i);
+  }
+  l._grid={cells:cells,w:w,h:h};
+}
+levels.forEach(buildGrid);
+function resize(){cv.width=cv.clientWidth;cv.height=cv.clientHeight;fit();draw();}
+function fit(){
+  const s=Math.min(cv.width/((xmax-xmin)||1),cv.height/((ymax-ymin)||1))*0.95;
+  view={s:s,x:cv.width/2-s*(xmin+xmax)/2,y:cv.height/2+s*(ymin+ymax)/2};
+  view.s0=s;
+}
+function current(){
+  if(mode!=="auto") return levels[Number(mode)];
+  return view.s < view.s0*3 ? levels[levels.length-1] : levels[0];
+}
+function draw(){
+  const l=current(), n=l.x.length, X=l.x, Y=l.y;
+  ctx.clearRect(0,0,cv.width,cv.height);
+  ctx.strokeStyle="rgba(120,120,120,0.4)";ctx.lineWidth=0.5;ctx.beginPath();
+  for(let k=0;k<l.source.length;k++){
+    const a=l.source[k],b=l.target[k];
+    ctx.moveTo(view.x+view.s*X[a],view.y-view.s*Y[a]);
+    ctx.lineTo(view.x+view.s*X[b],view.y-view.s*Y[b]);
+  }
+  ctx.stroke();
+  const r0=Math.max(1.5,Math.min(6,view.s*0.3));
+  for(let i=0;i<n;i++){
+    const px=view.x+view.s*X[i], py=view.y-view.s*Y[i];
+    if(px<-10||py<-10||px>cv.width+10||py>cv.height+10) continue;
+    const r=l.size? r0*(1+3*Math.sqrt(l.size[i])) : r0;
+    ctx.fillStyle=l.color[i];ctx.fillRect(px-r,py-r,2*r,2*r);
+  }
+  info.textContent=l.name+": "+n+" nodes, "+l.source.length+" edges";
+}
+function nearest(mx,my){
+  const l=current(), wx=(mx-view.x)/view.s, wy=(view.y-my)/view.s, G=l._grid;
+  const cx=Math.floor((wx-xmin)/G.w), cy=Math.floor((wy-ymin)/G.h);
+  let best=-1,bd=Infinity;
+  for(let dx=-1;dx<=1;dx++)for(let dy=-1;dy<=1;dy++){
+    const c=G.cells.get((cx+dx)+","+(cy+dy)); if(!c) continue;
+    for(const i of c){const d=(l.x[i]-wx)**2+(l.y[i]-wy)**2; if(d<bd){bd=d;best=i;}}
+  }
+  return (best>=0 && Math.sqrt(bd)*view.s<8) ? best : -1;
+}
+let drag=null;
+cv.onmousedown=e=>{drag={x:e.clientX,y:e.clientY};};
+window.onmouseup=()=>{drag=null;};
+cv.onmousemove=e=>{
+  if(drag){view.x+=e.clientX-drag.x;view.y+=e.clientY-drag.y;drag={x:e.clientX,y:e.clientY};draw();return;}
+  const l=current(), i=nearest(e.offsetX,e.offsetY);
+  if(i>=0 && l.title){tip.style.display="block";tip.style.left=(e.pageX+10)+"px";tip.style.top=(e.pageY+10)+"px";tip.textContent=l.title[i];}
+  else tip.style.display="none";
+};
+cv.onwheel=e=>{
+  e.preventDefault();
+  const f=e.deltaY<0?1.2:1/1.2;
+  view.x=e.offsetX-(e.offsetX-view.x)*f;view.y=e.offsetY-(e.offsetY-view.y)*f;view.s*=f;draw();
+};
+window.onresize=resize;
+resize();
+</script>
+</body>
+</html>
+"""
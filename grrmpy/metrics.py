@@ -0,0 +1,179 @@
+"""
+長時間の計算の進捗をPrometheusの形式でHTTPで公開する(prometheus_clientが必要).
+
+| Metrics(job,port)を作成し,SinglePath,SNEB,AutoOpt,ListAutoNEBのmetrics引数に与えると,
+| http://127.0.0.1:{port}/metrics で計算中の値を取得できる.
+| metricsを指定しない場合は何もしないNULL_METRICSが使われ,各メソッドは直ちに戻る.
+
+公開する値(全てjobラベルを持つ):
+
+    - grrmpy_iteration: 現在の反復(SinglePathのSNEBの回数,AutoOpt,ListAutoNEBの完了数)
+    - grrmpy_queue_length: 残りの計算の数
+    - grrmpy_structures{kind}: EQ,TS,PT(AutoOpt,ListAutoNEBは'converged'等の状態)の数
+    - grrmpy_force_calls_total: calculatorの計算回数(1秒あたりの回数はrate()で求める)
+    - grrmpy_force_calls_per_second: 直近(約1秒間)の1秒あたりの計算回数
+    - grrmpy_image_fmax{image}: 計算中のNEBバンドの各イメージのfmax
+    - grrmpy_calc_latency_seconds: calculatorの1回の計算時間(ヒストグラム)
+    - grrmpy_calc_requests_total, grrmpy_calc_cache_hits_total:
+      calculatorへの要求(get_property)の数と,そのうち計算せずに結果を返した数
+
+Note:
+    | プロセスプールで計算する場合(AutoOpt.run,ListAutoNEB.run),各プロセスのcalculatorの値は含まれない.
+
+Examples:
+
+    >>> metrics = Metrics("SinglePath", port=8000)
+    >>> sp = SinglePath(ini, fin, metrics=metrics)
+    >>> sp.run()
+"""
+import time
+
+_collectors = None
+_servers = {}
+
+def _get_collectors():
+    """全てのMetricsで共有するcollector(初めて使用する時に作成する)"""
+    global _collectors
+    if _collectors is None:
+        from prometheus_client import CollectorRegistry, Gauge, Counter, Histogram
+        registry = CollectorRegistry()
+        _collectors = {
+            "registry":registry,
+            "iteration":Gauge("grrmpy_iteration","現在の反復",["job"],registry=registry),
+            "queue":Gauge("grrmpy_queue_length","残りの計算の数",["job"],registry=registry),
+            "structures":Gauge("grrmpy_structures","構造の数",["job","kind"],registry=registry),
+            "calls":Counter("grrmpy_force_calls","calculatorの計算回数",["job"],registry=registry),
+            "rate":Gauge("grrmpy_force_calls_per_second","直近の1秒あたりの計算回数",["job"],registry=registry),
+            "fmax":Gauge("grrmpy_image_fmax","NEBの各イメージのfmax",["job","image"],registry=registry),
+            "latency":Histogram("grrmpy_calc_latency_seconds","calculatorの1回の計算時間",["job"],registry=registry,
+                                buckets=(0.001,0.005,0.01,0.05,0.1,0.5,1,5,10,60,float("inf"))),
+            "requests":Counter("grrmpy_calc_requests","calculatorへの要求の数",["job"],registry=registry),
+            "hits":Counter("grrmpy_calc_cache_hits","計算せずに結果を返した要求の数",["job"],registry=registry),
+        }
+    return _collectors
+
+def start_server(port=8000,addr="127.0.0.1"):
+    """/metricsを公開するHTTPサーバーを起動する(同じportで2回起動しない)"""
+    if port not in _servers:
+        import prometheus_client
+        prometheus_client.start_http_server(port,addr,registry=_get_collectors()["registry"])
+        _servers[port] = addr
+
+class Metrics():
+    """計算の進捗を記録する
+
+    Parameters:
+
+    job: str
+        jobラベルの値(同時に複数の計算を公開する場合に区別する)
+    port: int
+        | HTTPサーバーのport. Noneの場合はサーバーを起動しない(start_serverで別に起動する).
+    addr: str
+        HTTPサーバーのアドレス
+    enabled: bool
+        Falseの場合,何も記録しない(prometheus_clientも不要).
+    """
+    def __init__(self,job="grrmpy",port=None,addr="127.0.0.1",enabled=True):
+        self.enabled = enabled
+        self.job = job
+        if not enabled:
+            return
+        try:
+            c = _get_collectors()
+        except ImportError:
+            raise ImportError("Metricsを使用するにはprometheus_clientをインストールしてください")
+        self._iteration = c["iteration"].labels(job)
+        self._queue = c["queue"].labels(job)
+        self._structures = c["structures"]
+        self._calls = c["calls"].labels(job)
+        self._rate = c["rate"].labels(job)
+        self._fmax = c["fmax"]
+        self._latency = c["latency"].labels(job)
+        self._requests = c["requests"].labels(job)
+        self._hits = c["hits"].labels(job)
+        self.n_calls = 0
+        self._window = (0,time.perf_counter())
+        if port is not None:
+            start_server(port,addr)
+
+    def set_iteration(self,n):
+        if self.enabled:
+            self._iteration.set(n)
+
+    def set_queue(self,n):
+        if self.enabled:
+            self._queue.set(n)
+
+    def set_count(self,kind,n):
+        """kindの構造の数をnにする"""
+        if self.enabled:
+            self._structures.labels(self.job,kind).set(n)
+
+    def update_progress(self,progress,status=None):
+        """プールで計算する場合の進捗(grrmpy.command.functions.Progress)と,完了した計算の状態を記録する"""
+        if not self.enabled:
+            return
+        self._iteration.set(progress.count)
+        self._queue.set(progress.total-progress.count)
+        if status is not None:
+            self._structures.labels(self.job,status).inc()
+
+    def set_image_fmax(self,images):
+        """NEBの各イメージのfmaxを記録する(両端のイメージを含む)
+
+        | calculatorの計算済みのforceを用いる(要求の数に含めない). forceがないイメージは記録しない.
+        """
+        if not self.enabled:
+            return
+        for i,image in enumerate(images):
+            if image.calc is None or "forces" not in image.calc.results:
+                continue
+            forces = image.calc.results["forces"].copy()
+            for c in image.constraints:
+                c.adjust_forces(image,forces)
+            self._fmax.labels(self.job,str(i)).set(float((forces**2).sum(axis=1).max()**0.5))
+
+    def _observe_call(self,elapsed):
+        self.n_calls += 1
+        self._calls.inc()
+        self._latency.observe(elapsed)
+        calls,start = self._window
+        now = time.perf_counter()
+        if now-start >= 1.0:
+            self._rate.set((self.n_calls-calls)/(now-start))
+            self._window = (self.n_calls,now)
+
+    def count_calculator(self,calc):
+        """calcの計算回数,計算時間,計算せずに結果を返した回数を記録するようにする"""
+        if not self.enabled or calc is None or hasattr(calc,"_metrics"):
+            return calc
+        calculate,get_property = calc.calculate,calc.get_property
+        def timed_calculate(*args,**kwargs):
+            start = time.perf_counter()
+            try:
+                return calculate(*args,**kwargs)
+            finally:
+                self._observe_call(time.perf_counter()-start)
+        def counted_get_property(*args,**kwargs):
+            self._requests.inc()
+            n_calls = self.n_calls
+            result = get_property(*args,**kwargs)
+            if self.n_calls == n_calls:
+                self._hits.inc()
+            return result
+        calc.calculate = timed_calculate
+        calc.get_property = counted_get_property
+        calc._metrics = self
+        return calc
+
+    def wrap_calc_func(self,calc_func):
+        """記録するcalculatorを返す関数にする(既にこのMetricsで包んだ関数はそのまま返す)"""
+        if not self.enabled or getattr(calc_func,"_metrics",None) is self:
+            return calc_func
+        def measured_calc_func():
+            return self.count_calculator(calc_func())
+        measured_calc_func._metrics = self
+        return measured_calc_func
+
+#: 何も記録しないMetrics(metricsを指定しない場合に使用する)
+NULL_METRICS = Metrics(enabled=False)
@@ -1,5 +1,13 @@
-from grrmpy.neb.auto_neb import ANEB,SNEB
-from grrmpy.neb.functions import insert_image
+from grrmpy._lazy import lazy_attributes
 
-__all__ = ["ANEB","SNEB",
-           "insert_image"]
\ No newline at end of file
+_attributes = {
+    "ANEB":"grrmpy.neb.auto_neb",
+    "SNEB":"grrmpy.neb.auto_neb",
+    "ListAutoNEB":"grrmpy.neb.list_auto_neb",
+    "insert_image":"grrmpy.neb.functions",
+}
+
+__all__ = ["ANEB","SNEB","ListAutoNEB",
+           "insert_image"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
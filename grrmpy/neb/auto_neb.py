@@ -5,7 +5,6 @@ from ase.geometry import find_mic
 from ase.units import kJ,mol
 from ase import Atoms
 import numpy as np
-from scipy import signal
 
 from math import sqrt
 import warnings
@@ -17,6 +16,8 @@ from grrmpy.calculator import pfp_calculator
 from grrmpy.optimize import automate_maxstep
 from grrmpy.optimize.functions import add_stop_to
 from grrmpy.neb.functions import to_html_nebgraph
+from grrmpy.trace import NULL_TRACER
+from grrmpy.metrics import NULL_METRICS
 
 class ANEB():
     def __init__(self,
@@ -30,7 +31,9 @@ class ANEB():
                  with_stop=True,
                  max_n=12,
                  times=2,
-                 constraints=[]):
+                 constraints=[],
+                 tracer=None,
+                 metrics=None):
         """Adaptive NEBを行なう.
 
         Parameters:
@@ -67,6 +70,10 @@ class ANEB():
             with_stop(add_stop_to)の引数. デフォルト2
         constraints: constrain or list
             適用するconstraint
+        tracer: Tracer
+            | 各NEB計算の時間と計算回数を記録する場合,grrmpy.trace.Tracer.
+        metrics: Metrics
+            | 計算回数,各イメージのfmax等を公開する場合,grrmpy.metrics.Metrics.
             
         Note:
             arg以外の引数は全てキーワード引数なので注意!
@@ -82,12 +89,16 @@ class ANEB():
         self.attach_dict = {} # {func:interval}
         self.logfile = logfile
         self.parallel=parallel
-        self.calc_func = calc_func
+        self.tracer = NULL_TRACER if tracer is None else tracer
+        self.metrics = NULL_METRICS if metrics is None else metrics
+        self.calc_func = self.metrics.wrap_calc_func(self.tracer.wrap_calc_func(calc_func))
         self.mic = mic
         self.html = html
         self.constraints = constraints
         #: 全てのNEBイメージが2次元リストで保存されている
         self.archive = []
+        #: 実行したNEB計算の数
+        self.n_stage = 0
         if with_stop:
             optimizer = add_stop_to(optimizer,max_n,times)
         self.optimizer = optimizer
@@ -213,17 +224,24 @@ class ANEB():
     def write_html(self,comment,**kargs):
         if self.html is None:
             return
-        with open(self.html,"a") as f:
-            html_text = to_html_nebgraph(self.neb,self.calc_func,False,include_plotlyjs="cdn",**kargs)
-            f.write(comment)
-            f.write(html_text)
+        with self.tracer.span("write_html",cat="output",files=[self.html]):
+            with open(self.html,"a") as f:
+                html_text = to_html_nebgraph(self.neb,self.calc_func,False,include_plotlyjs="cdn",**kargs)
+                f.write(comment)
+                f.write(html_text)
         
     def iter_run(self,fmax:float,steps:int,climb=True,maxstep:float=None):
-        self.make_neb(climb)
-        self.make_opt(maxstep)
-        for func,i in self.attach_dict.items():
-            self.opt.attach(func,interval=i)
-        converged = self.opt.run(fmax=fmax,steps=steps)    
+        self.n_stage += 1
+        with self.tracer.span(f"NEB stage{self.n_stage}",cat="NEB",
+                              climb=climb,fmax=fmax,nimages=len(self.images)):
+            self.make_neb(climb)
+            self.make_opt(maxstep)
+            for func,i in self.attach_dict.items():
+                self.opt.attach(func,interval=i)
+            if self.metrics.enabled:
+                self.opt.attach(lambda:self.metrics.set_image_fmax(self.images))
+            converged = self.opt.run(fmax=fmax,steps=steps)
+            self.tracer.add_steps(self.opt.nsteps)
         self.archive.append([image.copy() for image in self.images])
         return converged
     
@@ -401,7 +419,9 @@ class SNEB(ANEB):
                  with_stop=True,
                  max_n=12,
                  times=2,
-                 constraints=[]):
+                 constraints=[],
+                 tracer=None,
+                 metrics=None):
         """Separative NEB
         
         | 緩い収束条件でNEB計算を行ない,最もエネルギーの高い点をTSとする.
@@ -448,6 +468,10 @@ class SNEB(ANEB):
             with_stop(add_stop_to)の引数. デフォルト2
         constraints: constraint obj or list
             適用するconstraintのオブジェクトまたはそのリスト
+        tracer: Tracer
+            | 各NEB計算の時間と計算回数を記録する場合,grrmpy.trace.Tracer.
+        metrics: Metrics
+            | 計算回数,各イメージのfmax等を公開する場合,grrmpy.metrics.Metrics.
             
         Note:
             *data以外の引数は全てキーワード引数になるので注意!!
@@ -471,9 +495,12 @@ class SNEB(ANEB):
                          with_stop=with_stop,
                          max_n=max_n,
                          times=times,
-                         constraints=constraints)
+                         constraints=constraints,
+                         tracer=tracer,
+                         metrics=metrics)
         
     def updata_images(self,nimages,tolerance,threshold,dist,min_nimages,i=None):
+        from scipy import signal
         if i is None:
             imax = self.neb.imax
         else:
@@ -636,7 +663,8 @@ class SNEB(ANEB):
                     if not converged:
                         s = s if self.climb_steps is None else self.climb_steps
                     converged = self.iter_run(fmax=f,steps=s,climb=True,maxstep=m)
-                ini_idx,fin_idx = self.updata_images(n,tolerance,t,dist,min_nimages)
+                with self.tracer.span("update_images",cat="NEB"):
+                    ini_idx,fin_idx = self.updata_images(n,tolerance,t,dist,min_nimages)
                 self.write_html(f"<p>climb={self.neb.climb}, converged={converged}</p><p>{ini_idx}番,{fin_idx}番をini,finに選択</p>")
             # 最後のNEB計算
             converged = self.iter_run(fmax=fmax[-1],steps=steps[-1],climb=False,maxstep=maxstep[-1])
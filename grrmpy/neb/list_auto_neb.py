@@ -1,10 +1,257 @@
-from pathlib import Path
-import warnings
+from pathlib import Path, PurePath
+import numpy as np
+from ase.io import write, read
+from ase.optimize import FIRE
+from ase.geometry import find_mic
+from ase.units import Hartree
+from ase.calculators.singlepoint import SinglePointCalculator
 
-from grrmpy.neb.auto_neb import AutoNEB
+# USER
+from grrmpy.calculator import pfp_calculator
+from grrmpy.io.read_listlog import log2atoms,read_connections
+from grrmpy.neb.auto_neb import SNEB
+from grrmpy.structure.structure import TS
+from grrmpy.structure.structures import TSList
+from grrmpy.command.functions import Progress, run_jobs
+from grrmpy.metrics import NULL_METRICS
+
+def path_cost(ini,fin,mic=None,threshold=0.1):
+    """ini,fin間のNEB計算の重さの目安を返す
+
+    Parameters:
+
+    ini: Atoms
+        始状態
+    fin: Atoms
+        終状態
+    mic: bool
+        | 最小移動規則を用いる場合True. Noneの場合,周期境界条件があればTrue.
+    threshold: float
+        threshold Å以上移動した原子を移動した原子として数える.
+
+    Returns:
+        tuple: (移動した原子の数, バンドの長さ(全原子の変位のノルム))
+    """
+    d = fin.get_positions()-ini.get_positions()
+    if mic is None:
+        mic = any(ini.get_pbc())
+    if mic:
+        d = find_mic(d,ini.get_cell(),ini.get_pbc())[0]
+    norms = np.linalg.norm(d,axis=1)
+    return int((norms > threshold).sum()), float(np.sqrt((norms**2).sum()))
+
+def _run_sneb(name,ini,fin,params):
+    """1つの経路でSNEB計算を行なう(プロセスプールで実行できるようにモジュールの関数にしている)
+
+    | logfolder/{name}フォルダに,ログ,最後のNEBイメージ(SNEB.traj),TS構造(TS.traj)を保存する.
+
+    Returns:
+        tuple: (name, 状態('converged','not converged','error'), エラーメッセージ, TSのAtoms)
+    """
+    folder = Path(params["logfolder"],str(name))
+    folder.mkdir(parents=True,exist_ok=True)
+    try:
+        sneb = SNEB(ini,fin,params["nimages"],
+                    logfile=str(folder/"SNEB.log"),
+                    html=str(folder/"SNEB_progress.html") if params["html"] else None,
+                    parallel=False,
+                    calc_func=params["calc_func"],
+                    optimizer=params["optimizer"],
+                    constraints=params["constraints"])
+        converged = sneb.run(**params["run_kwargs"])
+        write(str(folder/"SNEB.traj"),sneb.images)
+        image = sneb.images[sneb.imax]
+        ts = image.copy()
+        ts.calc = SinglePointCalculator(ts,energy=image.get_potential_energy(),forces=image.get_forces())
+    except Exception as e:
+        return name, "error", str(e), None
+    if converged:
+        write(str(folder/"TS.traj"),ts)
+    return name, "converged" if converged else "not converged", None, ts
 
 class ListAutoNEB():
-    def __init__(self,images_list,clac_func,logfolder="NEBLog"):
+    """GRRMのCONNECTIONS(またはini,finのリスト)の全ての経路でSNEB計算を行なう
+
+    | 各経路のSNEB計算は共通のプロセスプールで並列に行なう.
+    | 重い(移動する原子が多く,バンドが長い)経路から順に計算を始めることで,最後に1つの重い計算だけが残ることを防ぐ.
+    | 1つの経路の計算が失敗(例外,プロセスの異常終了)しても他の経路の計算は続ける.
+    | 各経路のログ等はlogfolder/{番号}フォルダに保存される.
+
+    Parameters:
+
+    data1, data2:
+        指定の仕方は3通りある.
+
+        方法1:
+            data1にEQ_list.log,data2にTS_list.log(またはPT_list.log)を与える.
+            comfile,poscarを与えた場合,FrozenAtoms,セルが設定される.
+
+            >>> lneb = ListAutoNEB('XXX_EQ_list.log','XXX_TS_list.log','XXX.com','POSCAR')
+
+        方法2:
+            data1にEQのAtomsのリスト,data2にconnections情報(List[List[int]])を与える.
+            connections情報はgrrmpy.io.read_listlog.read_connectionsで取得可能.
+            connectionsに'DC','??'などが含まれる経路は計算しない.
+        方法3:
+            data1にiniの構造のAtomsのリスト,data2にfinの構造のAtomsのリストを与える.
+            つまり,data1の0番目の要素とdata2の0番目の要素でNEB計算が行なわれる.
+    comfile: str or Path
+        方法1の場合に,FrozenAtomsを追加する場合にcomファイルを指定.
+    poscar: str or Path
+        方法1の場合に,セルを設定する場合にPOSCARファイルを指定.
+    constraints: ASE constraint
+        FixAtoms等の制約.
+    calc_func: object
+        | calculatorを返す関数.
+        | n_jobs>1で並列計算する場合,プロセス間で受け渡せるようにモジュールの関数にする(lambdaは不可).
+    nimages: int
+        始めのNEBイメージの数
+    optimizer: class
+        NEB計算を行なう際のOptimizer. デフォルトはFIRE.
+    logfolder: str or Path
+        ログを保存するフォルダ
+    html: bool
+        Trueの場合,各経路のSNEBの途中経過をhtmlに保存する.
+    resume: bool
+        | Trueの場合,logfolder/{番号}/TS.trajが存在する経路は計算しない.
+    metrics: Metrics
+        | 進捗(完了数,残りの数,状態毎の数)を公開する場合,grrmpy.metrics.Metrics.
+
+    Examples:
+
+        >>> lneb = ListAutoNEB('XXX_EQ_list.log','XXX_TS_list.log','XXX.com',calc_func=pfp_calculator)
+        >>> ts_list = lneb.run(n_jobs=8)
+        >>> ts_list.summary
+    """
+    def __init__(self,
+                 data1,
+                 data2,
+                 comfile=None,
+                 poscar=None,
+                 constraints=[],
+                 calc_func=pfp_calculator,
+                 nimages=13,
+                 optimizer=FIRE,
+                 logfolder="NEBLog",
+                 html=False,
+                 resume=False,
+                 metrics=None):
+        self.constraints = constraints
+        self.calc_func = calc_func
+        self.nimages = nimages
+        self.optimizer = optimizer
         self.logfolder = Path(logfolder)
-        if self.logfolder.exists():
-            warnings.warn("既に{logfolder}フォルダが存在します")
\ No newline at end of file
+        self.html = html
+        self.resume = resume
+        self.metrics = NULL_METRICS if metrics is None else metrics
+        self.errorfile = self.logfolder/"ERROR"
+        #: {番号:[ini番号,fin番号]} (方法3の場合は[None,None])
+        self.connections = {}
+        #: {番号:(ini,fin)}
+        self.paths = {}
+        #: {番号:'converged','not converged','error','skipped'のいずれか}
+        self.results = {}
+        #: {番号:TSのAtoms}
+        self.ts = {}
+
+        if isinstance(data1,(str,PurePath)):
+            eq_list = log2atoms(data1,comfile,poscar,constraints)
+            connections = read_connections(data2) if isinstance(data2,(str,PurePath)) else data2
+            self._set_connections(eq_list,connections)
+        elif len(data2) > 0 and all(hasattr(d,"get_positions") for d in data2):
+            for i,(ini,fin) in enumerate(zip(data1,data2)):
+                self.paths[i] = (ini,fin)
+                self.connections[i] = [None,None]
+        else:
+            self._set_connections(data1,data2)
+        self.logfolder.mkdir(parents=True,exist_ok=True)
+
+    def _set_connections(self,eq_list,connections):
+        for i,(ini_idx,fin_idx) in enumerate(connections):
+            if not (isinstance(ini_idx,(int,np.integer)) and isinstance(fin_idx,(int,np.integer))):
+                continue # DC,??など
+            self.paths[i] = (eq_list[ini_idx],eq_list[fin_idx])
+            self.connections[i] = [int(ini_idx),int(fin_idx)]
+
+    def errorlog(self,massage):
+        with open(self.errorfile,"a") as f:
+            f.write(massage)
+            f.write("\n")
+
+    def order(self):
+        """計算する順番(重い経路から順)に番号を返す"""
+        cost = {i:path_cost(ini,fin) for i,(ini,fin) in self.paths.items()}
+        return sorted(self.paths,key=lambda i:cost[i],reverse=True)
+
+    def _collect(self,name,status,message,ts,progress):
+        self.results[name] = status
+        if ts is not None:
+            self.ts[name] = ts
+        if status == "not converged":
+            self.errorlog(f"{name}の計算:未収束")
+        elif status == "error":
+            self.errorlog(f"{name}の計算:\n{message}")
+        progress.update()
+        self.metrics.update_progress(progress,status)
+
+    def run(self,n_jobs=None,max_in_flight=None,sort=True,quiet=False,**kwargs):
+        """全ての経路でSNEB計算を行なう
+
+        Parameters:
+
+        n_jobs: int
+            | プロセス数. Noneの場合はCPU数. 1の場合は並列化しない.
+        max_in_flight: int
+            同時にプロセスに渡す経路の数. Noneの場合はn_jobsの2倍.
+        sort: bool
+            Trueの場合,重い経路から順に計算する.
+        quiet: bool
+            Trueの場合,進捗を表示しない.
+        kwargs:
+            SNEB.runの引数(nimages,maxstep,fmax,steps等)
+
+        Returns:
+            TSList: 収束した経路のTS(connectionsはEQの番号)
+        """
+        params = {"logfolder":str(self.logfolder),
+                  "nimages":self.nimages,
+                  "html":self.html,
+                  "calc_func":self.calc_func,
+                  "optimizer":self.optimizer,
+                  "constraints":self.constraints,
+                  "run_kwargs":kwargs}
+        todo = []
+        for i in (self.order() if sort else list(self.paths)):
+            done = self.logfolder/str(i)/"TS.traj"
+            if self.resume and done.exists():
+                self.ts[i] = read(str(done))
+                self.results[i] = "skipped"
+            else:
+                todo.append(i)
+        progress = Progress(len(todo),quiet)
+        run_jobs(_run_sneb,
+                 ((i,(i,*self.paths[i],params)) for i in todo),
+                 lambda i,result:self._collect(*result,progress),
+                 lambda i,message:self._collect(i,"error",message,None,progress),
+                 n_jobs,max_in_flight)
+        self.results = dict(sorted(self.results.items()))
+        return self.get_tslist()
+
+    def get_tslist(self,converged_only=True):
+        """計算したTSをTSListにする
+
+        Parameters:
+
+        converged_only: bool
+            Trueの場合,収束した経路(resumeで読み込んだものを含む)のTSのみ含める.
+
+        Returns:
+            TSList: エネルギーはHartree. 各TSの番号はnames属性に入る.
+        """
+        names = [i for i in sorted(self.ts)
+                 if not converged_only or self.results.get(i) in ("converged","skipped")]
+        ts_list = TSList()
+        ts_list._strctures = [TS(self.ts[i].get_potential_energy()/Hartree,self.ts[i],self.connections[i])
+                              for i in names]
+        ts_list.names = names
+        return ts_list
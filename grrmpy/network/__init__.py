@@ -1,3 +1,13 @@
-from grrmpy.network.network import NetGraph
+from grrmpy._lazy import lazy_attributes
 
-__all__ = ["NetGraph"]
\ No newline at end of file
+_attributes = {
+    "NetGraph":"grrmpy.network.network",
+    "BottleneckIndex":"grrmpy.network.bottleneck",
+    "Kinetics":"grrmpy.network.kinetics",
+    "DisconnectivityGraph":"grrmpy.network.disconnectivity",
+    "IncrementalNetGraph":"grrmpy.network.incremental",
+}
+
+__all__ = ["NetGraph","BottleneckIndex","Kinetics","DisconnectivityGraph","IncrementalNetGraph"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -0,0 +1,196 @@
+import numpy as np
+
+#USER
+from grrmpy.network.functions import (connections2array,
+                                      structures2arrays,
+                                      kruskal_tree,
+                                      tree_leaf_order,
+                                      tree_depth_and_root)
+
+class BottleneckIndex():
+    """全てのEQ間のボトルネック障壁(経路上の最も高いTSのエネルギーが最小となる経路の,そのTSのエネルギー)を求める
+
+    | TSを実効的なエネルギー(TSと両端のEQのエネルギーの最大値)の低い順にunion-findで結合し,
+    | 最小全域木(Kruskal木)を1度だけ作成する.
+    | 2つのEQのボトルネックエネルギーはKruskal木上の最小共通祖先(LCA)の高さとなるため,
+    | 1回の問い合わせはO(log n)で求まる.
+    | 連結していないEQ間はinfになる.
+
+    Parameters:
+
+    eq_energies: array-like
+        EQのエネルギー
+    ts_energies: array-like
+        TS(PT)のエネルギー. eq_energiesと同じ単位で与える.
+    connections: list or np.ndarray
+        | TS(PT)のCONNECTIONS. [[source,target],...]
+        | '??','DC'などを含んでいてもよい(無視される).
+
+    Examples:
+
+        >>> eq = EQList("XXX_EQ_list.log")
+        >>> ts = TSList("XXX_TS_list.log")
+        >>> b = BottleneckIndex.from_structures(eq,ts) # kJ/mol単位
+        >>> b.bottleneck(0,10) # EQ0とEQ10の間のボトルネックTSのエネルギー
+        >>> b.barrier(0,10) # EQ0から見た障壁(ボトルネックエネルギー-EQ0のエネルギー)
+        >>> b.barriers_from(0) # EQ0から全てのEQへの障壁(np.ndarray)
+    """
+    def __init__(self,eq_energies,ts_energies,connections):
+        source,target = connections2array(connections)
+        self._build(eq_energies,ts_energies,source,target)
+
+    @classmethod
+    def from_arrays(cls,eq_energies,ts_energies,source,target):
+        """source,targetのint配列(無効なエッジは-1)から作成する"""
+        new_obj = cls.__new__(cls)
+        new_obj._build(eq_energies,ts_energies,source,target)
+        return new_obj
+
+    @classmethod
+    def from_structures(cls,eq_list,*ts_lists,unit="kJ/mol"):
+        """EQList,TSList(,PTList)から作成する
+
+        Parameters:
+
+        eq_list: EQList
+            EQList
+        *ts_lists: TSList or PTList
+            PTListも与えた場合,PTも経路として用いる
+        unit: str
+            'kJ/mol','Hartree','eV'のいずれか
+        """
+        eq_e,ts_e,source,target = structures2arrays(eq_list,*ts_lists,unit=unit)
+        return cls.from_arrays(eq_e,ts_e,source,target)
+
+    def _build(self,eq_energies,ts_energies,source,target):
+        self.energies = np.asarray(eq_energies,dtype=float)
+        self.ts_energies = np.asarray(ts_energies,dtype=float)
+        self.parent,self.height,self.edge = kruskal_tree(self.energies,self.ts_energies,source,target)
+        self._depth,self._root = tree_depth_and_root(self.parent)
+        self._order,self._lo,self._hi = tree_leaf_order(self.parent,len(self))
+        # binary lifting用のテーブル
+        n_log = max(1,int(self._depth.max()).bit_length()) if len(self.parent) else 1
+        up = np.where(self.parent>=0,self.parent,np.arange(len(self.parent)))
+        self._up = [up]
+        for _ in range(1,n_log):
+            up = up[up]
+            self._up.append(up)
+
+    def __len__(self):
+        """EQの数"""
+        return len(self.energies)
+
+    def _lca(self,u,v):
+        """Kruskal木上の最小共通祖先(u,vは同じ木に属している必要がある)"""
+        swap = self._depth[u] < self._depth[v]
+        u,v = np.where(swap,v,u),np.where(swap,u,v)
+        diff = self._depth[u]-self._depth[v]
+        for k,up in enumerate(self._up):
+            u = np.where((diff>>k)&1,up[u],u)
+        same = u==v
+        for up in reversed(self._up):
+            uu,vv = up[u],up[v]
+            move = uu!=vv
+            u = np.where(move,uu,u)
+            v = np.where(move,vv,v)
+        return np.where(same,u,self._up[0][u])
+
+    def bottleneck(self,i,j):
+        """EQiとEQjを結ぶ経路のうち,最も高いTSのエネルギーが最小となる経路のそのエネルギーを返す
+
+        | i==jの場合はEQiのエネルギーを返す.
+        | 連結していない場合はinfを返す.
+
+        Parameters:
+
+        i: int or array-like of int
+            EQ番号
+        j: int or array-like of int
+            EQ番号
+
+        Returns:
+            float or np.ndarray: ボトルネックエネルギー
+        """
+        scalar = np.ndim(i)==0 and np.ndim(j)==0
+        i,j = np.broadcast_arrays(np.asarray(i,dtype=np.int64),np.asarray(j,dtype=np.int64))
+        i,j = i.ravel(),j.ravel()
+        connected = self._root[i]==self._root[j]
+        result = np.full(i.shape,np.inf)
+        if np.any(connected):
+            lca = self._lca(i[connected],j[connected])
+            result[connected] = self.height[lca]
+        return float(result[0]) if scalar else result
+
+    def barrier(self,i,j):
+        """EQiからEQjへ到達するための障壁(ボトルネックエネルギー - EQiのエネルギー)を返す
+
+        Parameters:
+
+        i: int or array-like of int
+            始状態のEQ番号
+        j: int or array-like of int
+            終状態のEQ番号
+        """
+        return self.bottleneck(i,j) - self.energies[i]
+
+    def bottlenecks_from(self,i):
+        """EQiから全てのEQへのボトルネックエネルギーをまとめて求める(O(n))
+
+        Parameters:
+
+        i: int
+            EQ番号
+
+        Returns:
+            np.ndarray: 要素数はEQの数. 連結していないEQはinf.
+        """
+        n = len(self)
+        result = np.full(n,np.inf)
+        lo,hi = self._lo,self._hi
+        prev = i
+        result[lo[i]:hi[i]] = self.energies[i]
+        v = self.parent[i]
+        while v >= 0:
+            # vの下にある葉のうち,まだ値を入れていない部分(prevの外側)に値を入れる
+            result[lo[v]:lo[prev]] = self.height[v]
+            result[hi[prev]:hi[v]] = self.height[v]
+            prev = v
+            v = self.parent[v]
+        out = np.empty(n)
+        out[self._order] = result
+        return out
+
+    def barriers_from(self,i):
+        """EQiから全てのEQへの障壁をまとめて求める(O(n))
+
+        Parameters:
+
+        i: int
+            始状態のEQ番号
+
+        Returns:
+            np.ndarray: 要素数はEQの数. 連結していないEQはinf.
+        """
+        return self.bottlenecks_from(i) - self.energies[i]
+
+    def accessible(self,i,threshold):
+        """EQiから障壁threshold以下で到達できるEQ番号の配列を返す
+
+        Parameters:
+
+        i: int
+            始状態のEQ番号
+        threshold: float
+            障壁の上限(エネルギーと同じ単位)
+        """
+        return np.nonzero(self.barriers_from(i)<=threshold)[0]
+
+    def bottleneck_ts(self,i,j):
+        """ボトルネックとなるTSの番号を返す.(i==jまたは連結していない場合は-1)"""
+        if i == j or self._root[i] != self._root[j]:
+            return -1
+        lca = self._lca(np.array([i]),np.array([j]))[0]
+        return int(self.edge[lca])
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(n_eq={len(self)},n_ts={len(self.ts_energies)})"
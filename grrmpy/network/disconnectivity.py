@@ -0,0 +1,210 @@
+import numpy as np
+
+#USER
+from grrmpy.network.functions import (connections2array,
+                                      structures2arrays,
+                                      kruskal_tree,
+                                      tree_leaf_order)
+
+class DisconnectivityGraph():
+    """非連結グラフ(Disconnectivity graph)を作成する
+
+    | TSを実効的なエネルギー(TSと両端のEQのエネルギーの最大値)の低い順にunion-findで結合した木(kruskal_tree)から作成する.(O(E log E))
+    | 2つのEQの分岐の高さは,EQ間の経路の最大エネルギーの最小値(ボトルネックエネルギー)になる.
+    | 木は配列(parent,height,x)で保持し,描画はmatplotlibのLineCollection1つで行なう.
+    | 葉(0~n_leaves-1)はEQ番号に対応する.
+
+    Parameters:
+
+    eq_energies: array-like
+        EQのエネルギー
+    ts_energies: array-like
+        TS(PT)のエネルギー
+    connections: list or np.ndarray
+        TS(PT)のCONNECTIONS. '??','DC'は無視される.
+    delta: float
+        | エネルギーの刻み幅. 与えた場合,各分岐のエネルギーを刻み幅の格子に切り上げ,
+        | 同じ格子上にある分岐を1つにまとめる. Noneの場合はまとめない.
+    emax: float
+        このエネルギーより高い分岐は描画しない(木が分割される).
+
+    Examples:
+
+        >>> dg = DisconnectivityGraph.from_structures(eq,ts,delta=5)
+        >>> dg.savefig("dg.svg") # 拡張子がpngの場合はpng
+    """
+    def __init__(self,eq_energies,ts_energies,connections,delta=None,emax=None):
+        source,target = connections2array(connections)
+        self._build(eq_energies,ts_energies,source,target,delta,emax)
+
+    @classmethod
+    def from_arrays(cls,eq_energies,ts_energies,source,target,delta=None,emax=None):
+        """source,targetのint配列(無効なエッジは-1)から作成する"""
+        new_obj = cls.__new__(cls)
+        new_obj._build(eq_energies,ts_energies,source,target,delta,emax)
+        return new_obj
+
+    @classmethod
+    def from_structures(cls,eq_list,*ts_lists,unit="kJ/mol",delta=None,emax=None):
+        """EQList,TSList(,PTList)から作成する
+
+        Parameters:
+
+        eq_list: EQList
+            EQList
+        *ts_lists: TSList or PTList
+            PTListも与えた場合,PTも経路として用いる
+        unit: str
+            'kJ/mol','Hartree','eV'のいずれか
+        """
+        eq_e,ts_e,source,target = structures2arrays(eq_list,*ts_lists,unit=unit)
+        return cls.from_arrays(eq_e,ts_e,source,target,delta,emax)
+
+    def _build(self,eq_energies,ts_energies,source,target,delta,emax):
+        self.energies = np.asarray(eq_energies,dtype=float)
+        self.delta = delta
+        self.emax = emax
+        n = len(self.energies)
+        parent,height,edge = kruskal_tree(self.energies,ts_energies,source,target)
+        n_nodes = len(parent)
+        internal = np.arange(n_nodes) >= n
+        if delta is not None:
+            height = height.copy()
+            height[internal] = np.ceil(height[internal]/delta)*delta
+        # 親と同じ高さの分岐(delta)とemaxより高い分岐は削除する
+        keep = np.ones(n_nodes,dtype=bool)
+        has_parent = parent >= 0
+        if delta is not None:
+            same = np.zeros(n_nodes,dtype=bool)
+            same[has_parent] = height[has_parent] == height[parent[has_parent]]
+            keep &= ~(internal&same)
+        if emax is not None:
+            keep &= ~(internal&(height>emax))
+        # 削除した節点の代わりとなる祖先を求める(pointer jumping)
+        up = np.where(has_parent,parent,-1)
+        rep = np.where(keep,np.arange(n_nodes),up)
+        rep = np.where(rep>=0,rep,-1)
+        while True:
+            pending = (rep>=0)&~keep[np.maximum(rep,0)]
+            if not np.any(pending):
+                break
+            rep[pending] = rep[rep[pending]]
+        new_id = np.cumsum(keep)-1
+        new_parent = np.full(n_nodes,-1,dtype=np.int64)
+        p = rep[np.maximum(up,0)]
+        ok = has_parent&(p>=0)
+        new_parent[ok] = new_id[p[ok]]
+        #: 各節点の親(根は-1). 親の番号は子より必ず大きい.
+        self.parent = new_parent[keep]
+        #: 各節点のエネルギー(葉はEQのエネルギー)
+        self.height = height[keep]
+        #: 分岐を作ったTSの番号(葉は-1)
+        self.edge = edge[keep]
+        self.n_leaves = n
+        order,lo,hi = tree_leaf_order(self.parent,n)
+        #: 葉の並び順(EQ番号)
+        self.order = order
+        #: 各節点の横方向の位置
+        self.x = (lo+hi-1)/2
+
+    def __len__(self):
+        """節点の数"""
+        return len(self.parent)
+
+    def segments(self,top=None):
+        """描画用の線分の配列(線分の数,2,2)を返す
+
+        | 子の節点から親の高さまで縦線を引き,親の高さで子同士を横線で結ぶ(線は交差しない).
+        | 根の節点からはtopまで縦線を引く.
+
+        Parameters:
+
+        top: float
+            根から伸ばす縦線の上端. Noneの場合は最も高い節点(またはemax)
+        """
+        if top is None:
+            top = self.emax if self.emax is not None else self.height.max()
+        has_parent = self.parent>=0
+        p = self.parent[has_parent]
+        # 縦線
+        vertical = np.empty((len(self),2,2))
+        vertical[:,0,0] = self.x
+        vertical[:,1,0] = self.x
+        vertical[:,0,1] = self.height
+        vertical[has_parent,1,1] = self.height[p]
+        vertical[~has_parent,1,1] = np.maximum(top,self.height[~has_parent])
+        # 横線
+        internal = np.arange(self.n_leaves,len(self))
+        x_min = self.x.copy()
+        x_max = self.x.copy()
+        np.minimum.at(x_min,p,self.x[has_parent])
+        np.maximum.at(x_max,p,self.x[has_parent])
+        horizontal = np.empty((len(internal),2,2))
+        horizontal[:,0,0] = x_min[internal]
+        horizontal[:,1,0] = x_max[internal]
+        horizontal[:,0,1] = self.height[internal]
+        horizontal[:,1,1] = self.height[internal]
+        return np.concatenate([vertical,horizontal])
+
+    def plot(self,ax=None,color="k",linewidth=0.5,labels=None,fontsize=6,ylabel="Energy (kJ/mol)"):
+        """matplotlibで描画する
+
+        Parameters:
+
+        ax: matplotlib.axes.Axes
+            Noneの場合は新たに作成する
+        color: str
+            線の色
+        linewidth: float
+            線の太さ
+        labels: list of int
+            | ラベルを表示するEQ番号のリスト. Noneの場合は表示しない.
+            | 全てのEQにラベルを付ける場合は range(n) を与える.
+        fontsize: float
+            ラベルのフォントサイズ
+
+        Returns:
+            matplotlib.axes.Axes
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        if ax is None:
+            _,ax = plt.subplots()
+        seg = self.segments()
+        ax.add_collection(LineCollection(seg,colors=color,linewidths=linewidth))
+        ax.set_xlim(-1,self.n_leaves)
+        y = seg[:,:,1]
+        margin = (y.max()-y.min())*0.02 if len(y) else 1
+        ax.set_ylim(y.min()-margin,y.max()+margin)
+        ax.set_xticks([])
+        ax.set_ylabel(ylabel)
+        for spine in ["top","right","bottom"]:
+            ax.spines[spine].set_visible(False)
+        if labels is not None:
+            for i in labels:
+                ax.text(self.x[i],self.height[i],str(i),fontsize=fontsize,
+                        ha="center",va="top",rotation=90)
+        return ax
+
+    def savefig(self,filename,figsize=(12,8),dpi=300,**kwargs):
+        """SVG,PNGなどで保存する(形式は拡張子で判断)
+
+        Parameters:
+
+        filename: str
+            保存するファイル名
+        figsize: tuple
+            図のサイズ
+        dpi: int
+            解像度
+        **kwargs:
+            plot()の引数
+        """
+        import matplotlib.pyplot as plt
+        fig,ax = plt.subplots(figsize=figsize)
+        self.plot(ax=ax,**kwargs)
+        fig.savefig(filename,dpi=dpi,bbox_inches="tight")
+        plt.close(fig)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(n_eq={self.n_leaves},n_nodes={len(self)})"
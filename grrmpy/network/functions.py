@@ -0,0 +1,213 @@
+import numpy as np
+from ase.units import kJ,mol,Hartree
+
+def connections2array(connections):
+    """CONNECTIONSのリストをsource,targetのint配列に変換する
+
+    | '??'や'DC'などの数字でない要素は-1に変換する.
+    | TSList.connections(文字列のnp.arrayになる場合がある)をそのまま与えてもよい.
+
+    Parameters:
+
+    connections: list or np.ndarray
+        [[source,target],...]の形式のCONNECTIONS
+
+    Returns:
+        tuple of np.ndarray: (source, target) の2つのint配列
+    """
+    arr = np.asarray(connections)
+    if arr.size == 0:
+        empty = np.zeros(0,dtype=np.int64)
+        return empty, empty.copy()
+    arr = arr.reshape(-1,2)
+    if arr.dtype.kind in "iu":
+        return arr[:,0].astype(np.int64), arr[:,1].astype(np.int64)
+    text = arr.astype(str)
+    valid = np.char.isdigit(text)
+    idx = np.full(text.shape,-1,dtype=np.int64)
+    idx[valid] = text[valid].astype(np.int64)
+    return idx[:,0], idx[:,1]
+
+def valid_edge_mask(source,target,n_nodes,self_loop=False):
+    """'??','DC'などを除いた有効なエッジのブーリアン配列を返す"""
+    source = np.asarray(source)
+    target = np.asarray(target)
+    mask = (source>=0)&(target>=0)&(source<n_nodes)&(target<n_nodes)
+    if not self_loop:
+        mask &= source!=target
+    return mask
+
+def structures2arrays(eq_list,*ts_lists,unit="kJ/mol"):
+    """EQList,TSList(PTList)からエネルギーとCONNECTIONSの配列を作成する
+
+    Parameters:
+
+    eq_list: EQList
+        EQList
+    *ts_lists: TSList or PTList
+        TSList,PTList(複数与えた場合は連結される)
+    unit: str
+        'kJ/mol','Hartree','eV'のいずれか
+
+    Returns:
+        tuple: (eq_energies, ts_energies, source, target)
+    """
+    eq_energies = _convert_unit(eq_list.energies,unit)
+    ts_energies = [np.zeros(0)]
+    source = [np.zeros(0,dtype=np.int64)]
+    target = [np.zeros(0,dtype=np.int64)]
+    for ts_list in ts_lists:
+        if not ts_list:
+            continue
+        ts_energies.append(_convert_unit(ts_list.energies,unit))
+        s,t = connections2array(ts_list.connections)
+        source.append(s)
+        target.append(t)
+    return eq_energies, np.concatenate(ts_energies), np.concatenate(source), np.concatenate(target)
+
+def _convert_unit(energies,unit):
+    """Hartree単位のエネルギーをunitに変換する"""
+    energies = np.asarray(energies,dtype=float)
+    if unit == "kJ/mol":
+        return energies*Hartree*mol/kJ
+    elif unit == "eV":
+        return energies*Hartree
+    elif unit == "Hartree":
+        return energies
+    else:
+        raise ValueError("unitは'kJ/mol','Hartree','eV'のいずれかです")
+
+def kruskal_tree(node_energies,edge_energies,source,target):
+    """エッジを実効的なエネルギーの低い順に結合し(union-find),結合の履歴を木構造の配列で返す
+
+    | 葉(0~n-1)はEQ,内部節点(n~)は2つの集合を初めて結んだTSに対応する.
+    | エッジの実効的なエネルギーは max(TS,source,targetのエネルギー) で,内部節点の高さになる.
+    | (TSのエネルギーが両端のEQより低い場合はEQに合わせる. NetGraph.forward_energyで負の障壁を0とするのと同様)
+    | この順に結合するので,2つのEQを結ぶ経路の最大エネルギーの最小値(minimax)が共通祖先の高さになる.
+    | 計算量はO(E log E)
+
+    Parameters:
+
+    node_energies: array-like
+        EQのエネルギー
+    edge_energies: array-like
+        TSのエネルギー
+    source: array-like of int
+        TSのsource(EQ番号), 無効なエッジは-1
+    target: array-like of int
+        TSのtarget(EQ番号), 無効なエッジは-1
+
+    Returns:
+        tuple of np.ndarray:
+
+        - parent: 各節点の親の番号(根は-1)
+        - height: 各節点の高さ(エネルギー)
+        - edge: 内部節点を作ったTSの番号(葉は-1)
+    """
+    node_energies = np.asarray(node_energies,dtype=float)
+    edge_energies = np.asarray(edge_energies,dtype=float)
+    source = np.asarray(source,dtype=np.int64)
+    target = np.asarray(target,dtype=np.int64)
+    n = len(node_energies)
+    edge_idx = np.nonzero(valid_edge_mask(source,target,n))[0]
+    weights = np.maximum(edge_energies[edge_idx],
+                         np.maximum(node_energies[source[edge_idx]],node_energies[target[edge_idx]]))
+    order = np.argsort(weights,kind="stable")
+    edge_idx,weights = edge_idx[order],weights[order]
+
+    size = max(2*n-1,n)
+    parent = np.full(size,-1,dtype=np.int64)
+    height = np.empty(size)
+    height[:n] = node_energies
+    edge = np.full(size,-1,dtype=np.int64)
+
+    uf = list(range(n)) # union-findの親
+    rank = [0]*n
+    top = list(range(n)) # 集合の代表(union-findの根)が対応する木の節点
+    new = n
+    s_list = source[edge_idx].tolist()
+    t_list = target[edge_idx].tolist()
+    e_list = weights.tolist()
+    for k,s,t,e in zip(edge_idx.tolist(),s_list,t_list,e_list):
+        while uf[s] != s:
+            uf[s] = uf[uf[s]]
+            s = uf[s]
+        while uf[t] != t:
+            uf[t] = uf[uf[t]]
+            t = uf[t]
+        if s == t:
+            continue
+        a,b = top[s],top[t]
+        parent[a] = new
+        parent[b] = new
+        height[new] = max(e,height[a],height[b])
+        edge[new] = k
+        if rank[s] < rank[t]:
+            s,t = t,s
+        uf[t] = s
+        if rank[s] == rank[t]:
+            rank[s] += 1
+        top[s] = new
+        new += 1
+        if new == size:
+            break
+    return parent[:new], height[:new], edge[:new]
+
+def tree_leaf_order(parent,n_leaves):
+    """各節点の下にある葉が連続するように葉を並べる
+
+    | 子が3つ以上ある節点(DisconnectivityGraphで分岐をまとめた場合)にも対応する.
+
+    Returns:
+        tuple of np.ndarray:
+
+        - order: 並べた葉の番号
+        - lo, hi: 節点vの下にある葉はorder[lo[v]:hi[v]]
+    """
+    parent = np.asarray(parent,dtype=np.int64)
+    n_nodes = len(parent)
+    nodes = np.nonzero(parent>=0)[0]
+    nodes = nodes[np.argsort(parent[nodes],kind="stable")]
+    indptr = np.zeros(n_nodes+1,dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(parent[nodes],minlength=n_nodes))
+    indptr = indptr.tolist()
+    child_list = nodes.tolist()
+    roots = np.nonzero(parent<0)[0][::-1].tolist()
+    order = []
+    stack = roots
+    while stack:
+        v = stack.pop()
+        if v < n_leaves:
+            order.append(v)
+        else:
+            stack.extend(reversed(child_list[indptr[v]:indptr[v+1]]))
+    order = np.array(order,dtype=np.int64)
+    pos = np.empty(n_leaves,dtype=np.int64)
+    pos[order] = np.arange(n_leaves)
+    lo = np.empty(n_nodes,dtype=np.int64)
+    hi = np.empty(n_nodes,dtype=np.int64)
+    lo[:n_leaves] = pos
+    hi[:n_leaves] = pos+1
+    lo_list,hi_list = lo.tolist(),hi.tolist()
+    # 子の番号は親より必ず小さいので,番号順に処理すればよい
+    for v in range(n_leaves,n_nodes):
+        c = child_list[indptr[v]:indptr[v+1]]
+        lo_list[v] = min(lo_list[i] for i in c)
+        hi_list[v] = max(hi_list[i] for i in c)
+    return order, np.array(lo_list,dtype=np.int64), np.array(hi_list,dtype=np.int64)
+
+def tree_depth_and_root(parent):
+    """各節点の深さと根の番号を返す"""
+    n_nodes = len(parent)
+    depth = np.zeros(n_nodes,dtype=np.int64)
+    root = np.arange(n_nodes,dtype=np.int64)
+    p_list = parent.tolist()
+    d_list = depth.tolist()
+    r_list = root.tolist()
+    # 親の番号は子より必ず大きいので,番号の大きい順に処理すればよい
+    for v in range(n_nodes-1,-1,-1):
+        p = p_list[v]
+        if p >= 0:
+            d_list[v] = d_list[p]+1
+            r_list[v] = r_list[p]
+    return np.array(d_list,dtype=np.int64), np.array(r_list,dtype=np.int64)
@@ -0,0 +1,535 @@
+import os
+import csv
+import numpy as np
+import pandas as pd
+import networkx as nx
+from pathlib import Path
+from ase import Atoms
+from ase.io import read, Trajectory
+from ase.units import kJ,mol,Hartree
+
+#USER
+from grrmpy.io.read_com import frozen2atoms
+from grrmpy.conv.atoms2smiles import atomslist2smileses
+
+class _GrowArray():
+    """末尾への追加が償却O(1)の1次元配列"""
+    def __init__(self,dtype=float,fill=0):
+        self._data = np.full(16,fill,dtype=dtype)
+        self._fill = fill
+        self._n = 0
+
+    def append(self,value):
+        if self._n == len(self._data):
+            new = np.full(2*len(self._data),self._fill,dtype=self._data.dtype)
+            new[:self._n] = self._data[:self._n]
+            self._data = new
+        self._data[self._n] = value
+        self._n += 1
+
+    def __setitem__(self,i,value):
+        self._data[:self._n][i] = value
+
+    def __getitem__(self,i):
+        return self._data[:self._n][i]
+
+    @property
+    def array(self):
+        """現在の要素の配列(ビュー)"""
+        return self._data[:self._n]
+
+    def __len__(self):
+        return self._n
+
+class IncrementalNetGraph():
+    """EQ,TS,PTを1つずつ追加して更新できるNetGraph
+
+    | NetGraphのように毎回list logを読み直したりDataFrameを作り直すことなく,
+    | 新たな構造1つあたり償却O(1)でノード,エッジ,グループ,色,障壁,networkxのグラフを更新する.
+    | 計算中のGRRMの*_list.logやSinglePathの出力(EQ_list.traj,TS_CONNECTIONS.csvなど)を
+    | follow_listlog(),follow_singlepath()で前回読み込んだ位置から追加で読み込むことができる.
+    | エネルギーの単位はkJ/mol.
+
+    Parameters:
+
+    indices: list of int
+        | 原子のindex番号のリスト.
+        | 同一構造をグループ化するために用いる(NetGraphと同じ).
+    grouping: bool
+        Falseの場合,SMILESによるグループ化を行なわない(全て0)
+    cm: str
+        カラースケール
+
+    Examples:
+
+        >>> G = IncrementalNetGraph(indices=[i for i in range(10)])
+        >>> G.follow_listlog("XXX_EQ_list.log","XXX_TS_list.log","XXX_PT_list.log",comfile="XXX.com",poscar="POSCAR")
+        >>> # 数分後
+        >>> G.follow_listlog("XXX_EQ_list.log","XXX_TS_list.log","XXX_PT_list.log",comfile="XXX.com",poscar="POSCAR")
+        >>> G.write_html("network.html")
+
+        SinglePathの計算フォルダを追跡する場合
+
+        >>> G = IncrementalNetGraph()
+        >>> G.follow_singlepath("SinglePath_folder")
+    """
+    def __init__(self,indices=None,grouping=True,cm="gnuplot"):
+        self.indices = indices
+        self.grouping = grouping
+        self.cm = cm
+        # ノード
+        self.node_atoms = []
+        self._eq_e = _GrowArray(float)
+        self._group = _GrowArray(np.int64)
+        self._smiles2group = {}
+        # エッジ(TSとPT)
+        self.edge_atoms = []
+        self._ts_e = _GrowArray(float)
+        self._source = _GrowArray(np.int64,-1)
+        self._target = _GrowArray(np.int64,-1)
+        self._is_pt = _GrowArray(bool,False)
+        self._fwd = _GrowArray(float,np.nan)
+        self._rev = _GrowArray(float,np.nan)
+        self._waiting = {} # まだ追加されていないEQ番号:そのEQを参照しているエッジ番号のリスト
+        self.connections = []
+        # 派生量のキャッシュ
+        self._graph = nx.Graph()
+        self._edge_count = {} # 同じEQ間のエッジ(TS)の数
+        self._colors = []
+        self._color_range = None
+        # follow用
+        self._tails = {}
+
+    @property
+    def n_eq(self):
+        return len(self._eq_e)
+
+    @property
+    def n_edge(self):
+        return len(self._ts_e)
+
+    def __len__(self):
+        return self.n_eq
+
+    def _get_energy(self,atoms,energy):
+        if energy is not None:
+            return energy
+        return atoms.get_potential_energy()*mol/kJ
+
+    def add_eq(self,atoms=None,energy=None,smiles=None):
+        """EQを追加する
+
+        Parameters:
+
+        atoms: Atoms
+            EQの構造
+        energy: float
+            | エネルギー(kJ/mol). Noneの場合はatomsのcalculatorから求める.
+        smiles: str
+            | グループ化に用いるSMILES. Noneの場合はatomsから求める.
+
+        Returns:
+            int: 追加したEQの番号
+        """
+        i = self.n_eq
+        e = self._get_energy(atoms,energy)
+        self.node_atoms.append(atoms)
+        self._eq_e.append(e)
+        if self.grouping and smiles is None and atoms is not None:
+            smiles = atomslist2smileses([atoms],target0=self.indices)[0]
+        group = self._smiles2group.setdefault(smiles,len(self._smiles2group)) if self.grouping else 0
+        self._group.append(group)
+        self._graph.add_node(i)
+        self._add_color(e)
+        # このEQを待っていたエッジの障壁を求める
+        for k in self._waiting.pop(i,[]):
+            self._update_barrier(k)
+        return i
+
+    def add_ts(self,atoms=None,energy=None,source=None,target=None):
+        """TSを追加する
+
+        Parameters:
+
+        atoms: Atoms
+            TSの構造
+        energy: float
+            | エネルギー(kJ/mol). Noneの場合はatomsのcalculatorから求める.
+        source: int or str
+            | 始状態のEQ番号. 不明な場合はNoneまたは'??'など.
+        target: int or str
+            終状態のEQ番号
+
+        Returns:
+            int: 追加したエッジの番号
+        """
+        return self._add_edge(atoms,energy,source,target,False)
+
+    def add_pt(self,atoms=None,energy=None,source=None,target=None):
+        """PTを追加する(引数はadd_tsと同じ)"""
+        return self._add_edge(atoms,energy,source,target,True)
+
+    def _add_edge(self,atoms,energy,source,target,is_pt):
+        k = self.n_edge
+        self.edge_atoms.append(atoms)
+        self._ts_e.append(self._get_energy(atoms,energy))
+        self._is_pt.append(is_pt)
+        self._source.append(-1)
+        self._target.append(-1)
+        self._fwd.append(np.nan)
+        self._rev.append(np.nan)
+        self.connections.append(["??","??"])
+        self.set_connection(k,source,target)
+        return k
+
+    def set_connection(self,k,source,target):
+        """エッジkのCONNECTIONを設定する(IRC計算が後で終わった場合など)"""
+        old = self._source[k],self._target[k]
+        if old[0] >= 0 and old[1] >= 0 and old[0] != old[1]:
+            pair = (min(old),max(old))
+            self._edge_count[pair] -= 1
+            if self._edge_count[pair] == 0:
+                del self._edge_count[pair]
+                self._graph.remove_edge(*pair)
+        conn = [_to_index(source),_to_index(target)]
+        self.connections[k] = conn
+        s,t = [c if isinstance(c,int) else -1 for c in conn]
+        self._source[k] = s
+        self._target[k] = t
+        if s >= 0 and t >= 0:
+            if s != t:
+                pair = (min(s,t),max(s,t))
+                self._edge_count[pair] = self._edge_count.get(pair,0)+1
+                self._graph.add_edge(*pair)
+            for i in (s,t):
+                if i >= self.n_eq:
+                    self._waiting.setdefault(i,[]).append(k)
+        self._update_barrier(k)
+
+    def _update_barrier(self,k):
+        s,t = self._source[k],self._target[k]
+        e = self._ts_e[k]
+        n = self.n_eq
+        self._fwd[k] = max(e-self._eq_e[s],0) if 0 <= s < n else np.nan
+        self._rev[k] = max(e-self._eq_e[t],0) if 0 <= t < n else np.nan
+
+    def _add_color(self,e):
+        """色のキャッシュを更新する.エネルギーの範囲が変わった場合のみ全体を再計算する"""
+        if self._color_range is None:
+            return
+        low,high = self._color_range
+        if low <= e <= high:
+            self._colors.append(self._to_color(np.array([e]),low,high)[0])
+        else:
+            self._color_range = None # 次にcolorsを呼び出した時に再計算する
+
+    def _to_color(self,energies,low,high):
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import to_hex
+        scale = (energies-low)/(high-low) if high > low else np.zeros(len(energies))
+        rgba = plt.get_cmap(self.cm)(scale)
+        return [to_hex(c) for c in rgba]
+
+    @property
+    def colors(self):
+        """各EQの色(エネルギーのカラースケール)"""
+        if self._color_range is None:
+            e = self._eq_e.array
+            if len(e) == 0:
+                return []
+            self._color_range = (e.min(),e.max())
+            self._colors = self._to_color(e,*self._color_range)
+        return self._colors
+
+    def change_color_scale(self,cm):
+        self.cm = cm
+        self._color_range = None
+
+    @property
+    def energies(self):
+        """EQのエネルギー(kJ/mol)の配列"""
+        return self._eq_e.array
+
+    @property
+    def ts_energies(self):
+        """TS(PT)のエネルギー(kJ/mol)の配列"""
+        return self._ts_e.array
+
+    @property
+    def group(self):
+        """各EQのグループ番号の配列"""
+        return self._group.array
+
+    @property
+    def source(self):
+        """エッジのsourceの配列(不明な場合は-1)"""
+        return self._source.array
+
+    @property
+    def target(self):
+        """エッジのtargetの配列(不明な場合は-1)"""
+        return self._target.array
+
+    @property
+    def forward_energy(self):
+        """"単位はkJ/mol,もしマイナスになる場合0とする(NetGraphと同じ)"""
+        return [None if np.isnan(e) else e for e in self._fwd.array.tolist()]
+
+    @property
+    def reverse_energy(self):
+        """"単位はkJ/mol"""
+        return [None if np.isnan(e) else e for e in self._rev.array.tolist()]
+
+    @property
+    def node_df(self):
+        """NetGraph.node_dfと同じ形式のDataFrame"""
+        n = self.n_eq
+        return pd.DataFrame({
+            "node":np.arange(n),
+            "name":[f"EQ{i}" for i in range(n)],
+            "group":self.group.copy(),
+            "E/Hartree":self.energies*(kJ/mol)/Hartree,
+            "E/kJmol-1":self.energies.copy(),
+        })
+
+    @property
+    def edge_df(self):
+        """NetGraph.edge_dfと同じ形式のDataFrame"""
+        n = self.n_edge
+        is_pt = self._is_pt.array
+        # TS,PTはそれぞれのlist.logの中の番号(追加した順)で名前を付ける
+        pt_idx,ts_idx = np.cumsum(is_pt)-1,np.cumsum(~is_pt)-1
+        return pd.DataFrame({
+            "edge":np.arange(n),
+            "name":[f"PT{p}" if pt else f"TS{t}" for pt,p,t in zip(is_pt.tolist(),pt_idx.tolist(),ts_idx.tolist())],
+            "source":[s for s,_ in self.connections],
+            "target":[t for _,t in self.connections],
+            "E/Hartree":self.ts_energies*(kJ/mol)/Hartree,
+            "E/kJmol-1":self.ts_energies.copy(),
+            "forward/kJmol-1":self.forward_energy,
+            "reverse/kJmol-1":self.reverse_energy,
+        })
+
+    def get_graph(self,self_loop=False,cm=None,copy=True):
+        """NetWorkXのグラフを返す
+
+        | グラフは構造を追加する度に更新されており,作り直さない.
+
+        Parameters:
+
+        self_loop: bool
+            自己ループを含める場合True.
+        cm: str
+            カラースケール. Noneの場合はself.cm
+        copy: bool
+            | Falseの場合,内部で保持しているグラフをそのまま返す(変更しないこと).
+            | self_loop=Trueの場合は常にコピーを返す.
+        """
+        if cm is not None and cm != self.cm:
+            self.change_color_scale(cm)
+        colors = self.colors
+        for i,data in self._graph.nodes(data=True):
+            if data.get("color") != colors[i]:
+                data.update({"label":f"{i}",
+                             "title":f"EQ{i}\nEnergy:{self._eq_e[i]:.03f} kJ/mol",
+                             "color":colors[i]})
+        G = self._graph.copy() if copy or self_loop else self._graph
+        if self_loop:
+            s,t = self.source,self.target
+            loop = (s>=0)&(s==t)
+            G.add_edges_from(zip(s[loop].tolist(),t[loop].tolist()))
+        return G
+
+    def write_html(self,html,height="500px",width="100%",cm=None,notebook=True,show_buttons=False,self_loop=False):
+        """htmlにグラフを作成する(引数はNetGraph.write_htmlと同じ)"""
+        from pyvis.network import Network
+        g = Network(height,width,notebook=notebook)
+        g.from_nx(self.get_graph(self_loop,cm))
+        if show_buttons:
+            g.show_buttons(True)
+        else:
+            g.show_buttons(filter_=['physics', 'nodes'])
+        g.show(html)
+
+    def follow_singlepath(self,folder="."):
+        """SinglePathの出力フォルダから,前回読み込んだ後に追加された構造を読み込む
+
+        | EQ_list.traj,TS_list.traj,PT_list.trajは前回読み込んだフレームの次から,
+        | TS_CONNECTIONS.csvは前回読み込んだバイト位置から読み込む.
+        | 最初に呼び出した時点のEQ,TSの数を番号のずれとして扱う.
+
+        Parameters:
+
+        folder: str or Path
+            SinglePathを実行したフォルダ
+
+        Returns:
+            tuple: 追加した(EQの数,TSの数,PTの数)
+        """
+        folder = Path(folder)
+        key = ("singlepath",str(folder.resolve()))
+        state = self._tails.setdefault(key,{"eq":0,"ts":0,"pt":0,"csv":0,
+                                           "eq_base":self.n_eq,"ts_map":{}})
+        added = []
+        for name,kind in [("EQ_list.traj","eq"),("TS_list.traj","ts"),("PT_list.traj","pt")]:
+            new = _read_new_frames(folder/name,state[kind])
+            for atoms in new:
+                if kind == "eq":
+                    self.add_eq(atoms)
+                else:
+                    k = self._add_edge(atoms,None,None,None,kind=="pt")
+                    if kind == "ts":
+                        state["ts_map"][state["ts"]] = k
+                state[kind] += 1
+            added.append(len(new))
+        # CONNECTIONS
+        rows,state["csv"] = _read_new_lines(folder/"TS_CONNECTIONS.csv",state["csv"])
+        for row in csv.reader(rows):
+            if not row or not row[0].isdecimal():
+                continue # ヘッダー
+            ts_n,ini,fin = [int(i) for i in row[:3]]
+            if ts_n in state["ts_map"]:
+                base = state["eq_base"]
+                self.set_connection(state["ts_map"][ts_n],ini+base,fin+base)
+        return tuple(added)
+
+    def follow_listlog(self,eq_log,ts_log=None,pt_log=None,comfile=None,poscar=None,final=False):
+        """GRRMの*_list.logから,前回読み込んだ後に追加された構造を読み込む
+
+        | 前回読み込んだバイト位置から読み込む.
+        | 最後の構造は次の'#'の行が書かれるまで完了していないとみなし読み込まない.
+        | (final=Trueの場合は最後の構造も読み込む)
+        | ファイルが前回より小さくなった場合(書き直された場合)は先頭から読み直し,既に読み込んだ構造は飛ばす.
+
+        Parameters:
+
+        eq_log: str or Path
+            EQ_list.logのパス
+        ts_log: str or Path
+            TS_list.logのパス
+        pt_log: str or Path
+            PT_list.logのパス
+        comfile: str or Path
+            FrozenAtomsを追加する場合にcomファイルを指定.
+        poscar: str or Path
+            POSCARパスを設定した場合.セル情報を読み取りAtomsオブジェクトに適用する.
+        final: bool
+            Trueの場合,最後の構造も完了しているとみなす.
+
+        Returns:
+            tuple: 追加した(EQの数,TSの数,PTの数)
+        """
+        frozen = frozen2atoms(comfile) if comfile else None
+        cell = read(poscar,format="vasp").get_cell() if poscar else None
+        added = []
+        for log,kind in [(eq_log,"eq"),(ts_log,"ts"),(pt_log,"pt")]:
+            if log is None:
+                added.append(0)
+                continue
+            key = ("listlog",str(Path(log).resolve()))
+            state = self._tails.setdefault(key,{"offset":0,"count":0,"symbols":None})
+            blocks = _read_new_blocks(log,state,final)
+            for block in blocks:
+                atoms,energy,connection = _parse_block(block,state)
+                if frozen is not None:
+                    atoms += frozen
+                if cell is not None:
+                    atoms.set_cell(cell)
+                    atoms.set_pbc(True)
+                energy = energy*Hartree*mol/kJ
+                if kind == "eq":
+                    self.add_eq(atoms,energy)
+                else:
+                    source,target = connection if connection else (None,None)
+                    self._add_edge(atoms,energy,source,target,kind=="pt")
+            added.append(len(blocks))
+        return tuple(added)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(n_eq={self.n_eq},n_edge={self.n_edge})"
+
+def _to_index(value):
+    if value is None:
+        return "??"
+    if isinstance(value,(int,np.integer)):
+        return int(value)
+    value = str(value).strip()
+    return int(value) if value.isdecimal() else value
+
+def _read_new_frames(traj,n_read):
+    """trajファイルのn_read番目以降のフレームを読み込む"""
+    if not Path(traj).exists() or os.path.getsize(traj) == 0:
+        return []
+    try:
+        with Trajectory(traj,mode="r") as t:
+            return [t[i] for i in range(n_read,len(t))]
+    except Exception:
+        return [] # 書き込み途中
+
+def _read_new_lines(file,offset):
+    """offsetバイト目以降の完了した行(改行で終わる行)を読み込む
+
+    | 各行は改行(CRLFの場合は\\r\\n)を含むので,len(line.encode())の和が読み込んだバイト数になる.
+
+    Returns:
+        tuple: (行のリスト,読み込んだ最後の行の終わりのバイト位置)
+    """
+    if not Path(file).exists():
+        return [],offset
+    with open(file,"rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n")+1
+    if end == 0:
+        return [],offset
+    return [line.decode()+"\n" for line in data[:end-1].split(b"\n")], offset+end
+
+def _read_new_blocks(log,state,final):
+    """list logの新たに完了した構造のブロック(行のリスト)を返す"""
+    size = os.path.getsize(log)
+    if size < state["offset"]:
+        # 書き直された場合は先頭から読み,既に読み込んだ構造を飛ばす
+        skip = state["count"]
+        state["offset"] = 0
+    else:
+        skip = 0
+    lines,end = _read_new_lines(log,state["offset"])
+    if final:
+        with open(log,"rb") as f:
+            f.seek(end)
+            rest = f.read().decode()
+        if rest:
+            lines.append(rest)
+            end += len(rest.encode())
+    heads = [i for i,line in enumerate(lines) if line.startswith("#")]
+    if not heads:
+        return []
+    if final:
+        bounds = heads+[len(lines)]
+    else:
+        bounds = heads # 最後のブロックは次の'#'が現れるまで保留する
+    blocks = [lines[a:b] for a,b in zip(bounds[:-1],bounds[1:])]
+    consumed = sum(len(line.encode()) for line in lines[:bounds[-1]])
+    if final:
+        state["offset"] = end
+    else:
+        state["offset"] += consumed
+    blocks = blocks[skip:]
+    state["count"] += len(blocks)
+    return blocks
+
+def _parse_block(block,state):
+    """list logの1つの構造のブロックからAtoms,エネルギー(Hartree),CONNECTIONを求める"""
+    energy_i = next(i for i,line in enumerate(block) if "Energy    =" in line)
+    coords = block[1:energy_i]
+    if state["symbols"] is None:
+        state["symbols"] = [line.split()[0] for line in coords]
+    positions = np.array([line.split()[1:4] for line in coords],dtype=float)
+    atoms = Atoms(state["symbols"],positions)
+    energy = float(block[energy_i].split()[2])
+    connection = None
+    for line in block[energy_i:]:
+        if "CONNECTION" in line:
+            text = line.split()
+            connection = (_to_index(text[2]),_to_index(text[4]))
+    return atoms,energy,connection
@@ -0,0 +1,356 @@
+import heapq
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import expm_multiply, spsolve
+from ase.units import _k, _hplanck
+
+#USER
+from grrmpy.network.functions import (connections2array,
+                                      structures2arrays,
+                                      valid_edge_mask)
+
+R = _k*6.02214076e23*1e-3 # 気体定数(kJ/mol/K)
+
+class Kinetics():
+    """反応ネットワークの速度論解析を行なう
+
+    | 各TS(PT)のエネルギーからEyringの式で速度定数を求め,scipy.sparseの速度行列を作成する.
+    | 使用メモリはエッジ(TS)の数に比例する.
+    | 速度定数は k = kappa * kB*T/h * exp(-ΔE/RT) [1/s].
+    | TSのエネルギーが両側のEQより低い場合は高い方のEQのエネルギーとして扱う(ΔEは負にならない).
+    | 同じEQ間に複数のTSがある場合は速度定数の和をとる.
+
+    Parameters:
+
+    eq_energies: array-like
+        EQのエネルギー(kJ/mol)
+    ts_energies: array-like
+        TS(PT)のエネルギー(kJ/mol)
+    connections: list or np.ndarray
+        | TS(PT)のCONNECTIONS. '??','DC'や自己ループは無視される.
+    temperature: float
+        デフォルトの温度(K)
+    kappa: float
+        透過係数
+
+    Examples:
+
+        >>> kin = Kinetics.from_structures(eq,ts,temperature=500)
+        >>> p0 = np.zeros(len(kin)); p0[0] = 1
+        >>> kin.propagate(p0,[1e-12,1e-9,1e-6]) # 各時刻の存在比
+        >>> kin.steady_state(p0)
+        >>> states,mapping,M = kin.rcmc(1e-3) # 1ms以内に平衡になるEQをまとめる
+        >>> kin.scan([300,400,500],p0,1e-6) # 温度毎の存在比
+    """
+    def __init__(self,eq_energies,ts_energies,connections,temperature=300.0,kappa=1.0):
+        source,target = connections2array(connections)
+        self._build(eq_energies,ts_energies,source,target,temperature,kappa)
+
+    @classmethod
+    def from_arrays(cls,eq_energies,ts_energies,source,target,temperature=300.0,kappa=1.0):
+        """source,targetのint配列(無効なエッジは-1)から作成する"""
+        new_obj = cls.__new__(cls)
+        new_obj._build(eq_energies,ts_energies,source,target,temperature,kappa)
+        return new_obj
+
+    @classmethod
+    def from_structures(cls,eq_list,*ts_lists,temperature=300.0,kappa=1.0):
+        """EQList,TSList(,PTList)から作成する"""
+        eq_e,ts_e,source,target = structures2arrays(eq_list,*ts_lists,unit="kJ/mol")
+        return cls.from_arrays(eq_e,ts_e,source,target,temperature,kappa)
+
+    def _build(self,eq_energies,ts_energies,source,target,temperature,kappa):
+        self.energies = np.asarray(eq_energies,dtype=float)
+        ts_energies = np.asarray(ts_energies,dtype=float)
+        source = np.asarray(source,dtype=np.int64)
+        target = np.asarray(target,dtype=np.int64)
+        mask = valid_edge_mask(source,target,len(self.energies))
+        #: 有効なエッジのTS番号
+        self.ts_index = np.nonzero(mask)[0]
+        self.source = source[mask]
+        self.target = target[mask]
+        # TSが両側のEQより低い場合は高い方のEQに合わせる(詳細釣り合いを保つため)
+        ts_e = np.maximum(ts_energies[mask],
+                          np.maximum(self.energies[self.source],self.energies[self.target]))
+        #: source -> targetの障壁(kJ/mol)
+        self.forward_barrier = ts_e-self.energies[self.source]
+        #: target -> sourceの障壁(kJ/mol)
+        self.reverse_barrier = ts_e-self.energies[self.target]
+        self.temperature = temperature
+        self.kappa = kappa
+        self._pattern = None
+
+    def __len__(self):
+        """EQの数"""
+        return len(self.energies)
+
+    def rate_constants(self,temperature=None):
+        """各エッジの速度定数を返す
+
+        Parameters:
+
+        temperature: float or array-like
+            | 温度(K). Noneの場合はself.temperature.
+            | 配列で与えた場合,(温度の数,エッジの数)の配列をまとめて計算する.
+
+        Returns:
+            tuple of np.ndarray: (source->targetの速度定数, target->sourceの速度定数)
+        """
+        if temperature is None:
+            temperature = self.temperature
+        T = np.asarray(temperature,dtype=float)[...,np.newaxis]
+        pref = self.kappa*_k*T/_hplanck
+        kf = pref*np.exp(-self.forward_barrier/(R*T))
+        kr = pref*np.exp(-self.reverse_barrier/(R*T))
+        return kf, kr
+
+    def _build_pattern(self):
+        """速度行列の非ゼロ要素の位置(全ての温度で共通)を1度だけ求める"""
+        n = len(self)
+        diag = np.arange(n)
+        rows = np.concatenate([self.target,self.source,diag])
+        cols = np.concatenate([self.source,self.target,diag])
+        key = rows*n+cols
+        unique = np.unique(key)
+        self._pattern = (np.searchsorted(unique,key),
+                         (unique//n).astype(np.int64),
+                         (unique%n).astype(np.int64))
+
+    def _assemble(self,kf,kr):
+        n = len(self)
+        if self._pattern is None:
+            self._build_pattern()
+        pos,rows,cols = self._pattern
+        out = (np.bincount(self.source,weights=kf,minlength=n)
+               + np.bincount(self.target,weights=kr,minlength=n))
+        values = np.concatenate([kf,kr,-out])
+        data = np.bincount(pos,weights=values,minlength=len(rows))
+        return sparse.csr_matrix((data,(rows,cols)),shape=(n,n))
+
+    def rate_matrix(self,temperature=None):
+        """速度行列(dp/dt = M p のM)をscipy.sparseのcsr行列で返す
+
+        | M[j,i]はEQiからEQjへの速度定数, 対角成分はEQiから出ていく速度定数の和の負値.
+
+        Parameters:
+
+        temperature: float
+            温度(K). Noneの場合はself.temperature.
+        """
+        kf,kr = self.rate_constants(temperature)
+        return self._assemble(kf,kr)
+
+    def propagate(self,p0,times,temperature=None,matrix=None):
+        """存在比の時間発展をKrylov法(expm_multiply)で求める
+
+        | 速度定数の幅が大きい(stiffな)場合は計算に時間がかかるため,
+        | 先にrcmc()で速いEQをまとめることを推奨する.
+
+        Parameters:
+
+        p0: array-like
+            初期の存在比(要素数はEQの数)
+        times: float or array-like
+            時刻(s)
+        temperature: float
+            温度(K). Noneの場合はself.temperature.
+        matrix: sparse matrix
+            | 速度行列を直接与える場合(rcmc()で縮約した行列など).
+            | この場合p0の要素数は行列のサイズに合わせる.
+
+        Returns:
+            np.ndarray: (時刻の数,EQの数)の存在比の配列. timesがfloatの場合は1次元.
+        """
+        M = self.rate_matrix(temperature) if matrix is None else sparse.csr_matrix(matrix)
+        p = np.asarray(p0,dtype=float)
+        scalar = np.ndim(times) == 0
+        times = np.atleast_1d(np.asarray(times,dtype=float))
+        order = np.argsort(times)
+        result = np.empty((len(times),len(p)))
+        t_now = 0.0
+        for k in order:
+            dt = times[k]-t_now
+            if dt > 0:
+                p = expm_multiply(M*dt,p)
+                t_now = times[k]
+            result[k] = p
+        return result[0] if scalar else result
+
+    def steady_state(self,p0=None,temperature=None,matrix=None):
+        """定常状態(M p = 0)の存在比を求める
+
+        | 連結成分毎に,p0の存在比の合計を保存したまま定常状態を求める.
+        | 速度定数は詳細釣り合いを満たすので,各連結成分内ではBoltzmann分布となる(O(n)).
+        | matrixを与えた場合は,全ての連結成分を1回の疎行列の連立方程式でまとめて解く.
+
+        Parameters:
+
+        p0: array-like
+            初期の存在比. Noneの場合は全てのEQが等しい存在比とする.
+        temperature: float
+            温度(K). Noneの場合はself.temperature.
+        matrix: sparse matrix
+            速度行列を直接与える場合(rcmc()で縮約した行列など)
+
+        Returns:
+            np.ndarray: 定常状態の存在比
+        """
+        if matrix is None:
+            n = len(self)
+            adj = sparse.csr_matrix((np.ones(len(self.source)),(self.source,self.target)),shape=(n,n))
+        else:
+            adj = sparse.csr_matrix(matrix)
+            n = adj.shape[0]
+        p0 = np.full(n,1.0/n) if p0 is None else np.asarray(p0,dtype=float)
+        n_comp,labels = connected_components(adj,directed=True,connection="weak")
+        total = np.bincount(labels,weights=p0,minlength=n_comp)
+        if matrix is None:
+            T = self.temperature if temperature is None else temperature
+            e = self.energies/(R*T)
+            e_min = np.full(n_comp,np.inf)
+            np.minimum.at(e_min,labels,e)
+            w = np.exp(-(e-e_min[labels]))
+            return w*(total/np.bincount(labels,weights=w,minlength=n_comp))[labels]
+        # 各連結成分の代表(最初の状態)の行を,成分内の存在比の和の式に置き換える
+        rep = np.full(n_comp,-1,dtype=np.int64)
+        rep[labels[::-1]] = np.arange(n)[::-1]
+        M = adj.tocoo()
+        keep = ~np.isin(M.row,rep)
+        rows = np.concatenate([M.row[keep],rep[labels]])
+        cols = np.concatenate([M.col[keep],np.arange(n)])
+        data = np.concatenate([M.data[keep],np.ones(n)])
+        A = sparse.csc_matrix((data,(rows,cols)),shape=(n,n))
+        b = np.zeros(n)
+        b[rep] = total
+        return spsolve(A,b)
+
+    def rcmc(self,t,temperature=None,matrix=None,cutoff=1e-10):
+        """速度定数行列縮約法(RCMC)で時間スケールt以内に平衡になるEQをまとめる
+
+        | 出ていく速度定数の和kが最も大きいEQを定常状態とみなし,順に縮約する.
+        | k*t < 1 となった時点で縮約を終了する.
+        | 縮約されたEQjを経由する経路は k_ab += k_aj*k_jb/k_j として残りのEQに引き継がれる.
+
+        Parameters:
+
+        t: float
+            時間スケール(s)
+        temperature: float
+            温度(K). Noneの場合はself.temperature.
+        matrix: sparse matrix
+            速度行列を直接与える場合
+        cutoff: float
+            | 縮約で新たに生じる速度定数のうち k*t < cutoff のものは無視する.
+            | 縮約による非ゼロ要素の増加(fill-in)を抑える.
+
+        Returns:
+            tuple:
+
+            - states: 縮約されずに残ったEQ番号の配列
+            - mapping: | (EQの数,statesの数)のcsr行列.
+                       | EQiの存在比は時間t程度でmapping[i,k]の割合でstates[k]に移る.
+                       | p0 @ mapping で縮約後の存在比になる.
+            - matrix: 縮約後の速度行列(statesの数×statesの数)
+        """
+        M = self.rate_matrix(temperature) if matrix is None else sparse.csr_matrix(matrix)
+        n = M.shape[0]
+        M = M.tocoo()
+        off = M.row != M.col
+        out = [dict() for _ in range(n)] # out[a][b] = k(a->b)
+        inc = [dict() for _ in range(n)] # inc[b][a] = k(a->b)
+        for b,a,k in zip(M.row[off].tolist(),M.col[off].tolist(),M.data[off].tolist()):
+            if k > 0:
+                out[a][b] = out[a].get(b,0.0)+k
+                inc[b][a] = inc[b].get(a,0.0)+k
+        k_out = [sum(d.values()) for d in out]
+        heap = [(-k,j) for j,k in enumerate(k_out) if k > 0]
+        heapq.heapify(heap)
+        contracted = [] # [(j,{b:割合})]
+        removed = np.zeros(n,dtype=bool)
+        while heap:
+            k,j = heapq.heappop(heap)
+            k = -k
+            if removed[j] or k != k_out[j]:
+                continue # 古い値
+            if k*t < 1:
+                break
+            removed[j] = True
+            dist = {b:kjb/k for b,kjb in out[j].items()}
+            contracted.append((j,dist))
+            for b in out[j]:
+                del inc[b][j]
+            for a,kaj in inc[j].items():
+                del out[a][j]
+                for b,ratio in dist.items():
+                    if a == b:
+                        continue # 自己ループは除く
+                    kab = kaj*ratio
+                    if kab*t < cutoff and b not in out[a]:
+                        continue
+                    out[a][b] = out[a].get(b,0.0)+kab
+                    inc[b][a] = inc[b].get(a,0.0)+kab
+                k_out[a] = sum(out[a].values())
+                heapq.heappush(heap,(-k_out[a],a))
+            out[j] = {}
+            inc[j] = {}
+            k_out[j] = 0.0
+        states = np.nonzero(~removed)[0]
+        col = np.full(n,-1,dtype=np.int64)
+        col[states] = np.arange(len(states))
+        # 縮約した順の逆順に,縮約されたEQの行き先を求める
+        rows = [None]*n
+        for s in states.tolist():
+            rows[s] = {int(col[s]):1.0}
+        for j,dist in reversed(contracted):
+            row = {}
+            for b,ratio in dist.items():
+                for c,v in rows[b].items():
+                    row[c] = row.get(c,0.0)+ratio*v
+            rows[j] = row
+        indptr = np.zeros(n+1,dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in rows])
+        indices = np.fromiter((c for r in rows for c in r.keys()),dtype=np.int64,count=indptr[-1])
+        data = np.fromiter((v for r in rows for v in r.values()),dtype=float,count=indptr[-1])
+        mapping = sparse.csr_matrix((data,indices,indptr),shape=(n,len(states)))
+        # 縮約後の速度行列
+        r_list,c_list,d_list = [],[],[]
+        for a in states.tolist():
+            for b,kab in out[a].items():
+                r_list.append(col[b])
+                c_list.append(col[a])
+                d_list.append(kab)
+        m = len(states)
+        reduced = sparse.csr_matrix((d_list,(r_list,c_list)),shape=(m,m))
+        reduced = reduced - sparse.diags(np.asarray(reduced.sum(axis=0)).ravel())
+        return states, mapping, reduced.tocsr()
+
+    def scan(self,temperatures,p0,t):
+        """複数の温度で時刻tの存在比をまとめて求める
+
+        | 速度定数は全ての温度について1度にベクトル計算し,
+        | 速度行列の非ゼロ要素の位置は全ての温度で使い回す.
+
+        Parameters:
+
+        temperatures: array-like
+            温度(K)のリスト
+        p0: array-like
+            初期の存在比
+        t: float
+            時刻(s)
+
+        Returns:
+            np.ndarray: (温度の数,EQの数)の存在比の配列
+        """
+        temperatures = np.atleast_1d(np.asarray(temperatures,dtype=float))
+        kf,kr = self.rate_constants(temperatures)
+        p0 = np.asarray(p0,dtype=float)
+        result = np.empty((len(temperatures),len(p0)))
+        for i in range(len(temperatures)):
+            M = self._assemble(kf[i],kr[i])
+            result[i] = expm_multiply(M*t,p0)
+        return result
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(n_eq={len(self)},n_edge={len(self.source)},temperature={self.temperature})"
@@ -0,0 +1,191 @@
+import hashlib
+import numpy as np
+from pathlib import Path
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh
+
+#USER
+from grrmpy.network.functions import valid_edge_mask
+
+def spectral_layout(n_nodes,source,target,cache=None,seed=0):
+    """ネットワークの2次元座標をスペクトル法で求める
+
+    | 連結成分毎に正規化ラプラシアンの固有ベクトル(scipy.sparse.linalg.eigsh)を座標とし,
+    | 連結成分を大きい順に並べて配置する.力学計算を行わないため大規模なネットワークでも高速.
+    | cacheを与えた場合,計算結果をnpzで保存し,同じネットワークの場合は読み込むだけにする.
+
+    Parameters:
+
+    n_nodes: int
+        ノード(EQ)の数
+    source: array-like of int
+        エッジのsource(無効なエッジは-1)
+    target: array-like of int
+        エッジのtarget(無効なエッジは-1)
+    cache: str or Path
+        キャッシュファイル(.npz)のパス. Noneの場合は保存しない.
+    seed: int
+        eigshの初期ベクトルの乱数シード
+
+    Returns:
+        np.ndarray: (n_nodes,2)の座標
+    """
+    source = np.asarray(source,dtype=np.int64)
+    target = np.asarray(target,dtype=np.int64)
+    mask = valid_edge_mask(source,target,n_nodes)
+    source,target = source[mask],target[mask]
+    key = _network_key(n_nodes,source,target)
+    if cache is not None and Path(cache).exists():
+        data = np.load(cache)
+        if str(data["key"]) == key:
+            return data["pos"]
+    pos = _spectral_layout(n_nodes,source,target,seed)
+    if cache is not None:
+        np.savez(cache,pos=pos,key=key)
+    return pos
+
+def _network_key(n_nodes,source,target):
+    h = hashlib.sha1()
+    h.update(np.int64(n_nodes).tobytes())
+    h.update(source.tobytes())
+    h.update(target.tobytes())
+    return h.hexdigest()
+
+def _spectral_layout(n_nodes,source,target,seed):
+    adj = sparse.csr_matrix((np.ones(len(source)),(source,target)),shape=(n_nodes,n_nodes))
+    adj = ((adj+adj.T)>0).astype(float).tocsr()
+    n_comp,labels = connected_components(adj,directed=False)
+    order = np.argsort(labels,kind="stable")
+    sizes = np.bincount(labels,minlength=n_comp)
+    starts = np.concatenate([[0],np.cumsum(sizes)])
+    rng = np.random.default_rng(seed)
+    local = np.zeros((n_nodes,2))
+    for c in np.nonzero(sizes>2)[0]:
+        members = order[starts[c]:starts[c+1]]
+        local[members] = _component_layout(adj[members][:,members],rng)
+    two = np.nonzero(sizes==2)[0]
+    if len(two):
+        members = order[starts[two][:,np.newaxis]+np.arange(2)]
+        local[members[:,0],0] = -0.5
+        local[members[:,1],0] = 0.5
+    # 連結成分を大きい順に並べる(各成分の大きさはsqrt(ノード数)に比例させる)
+    comp_order = np.argsort(-sizes,kind="stable")
+    radius = 0.5*np.sqrt(sizes[comp_order])+0.5
+    offset = np.zeros((n_comp,2))
+    width = max(2*radius.sum()/max(np.sqrt(n_comp),1),2*radius[0]) if n_comp else 0
+    x = y = row_h = 0.0
+    for c,r in zip(comp_order.tolist(),radius.tolist()):
+        if x+2*r > width and x > 0:
+            x = 0.0
+            y -= row_h
+            row_h = 0.0
+        offset[c] = (x+r,y-r)
+        x += 2*r
+        row_h = max(row_h,2*r)
+    scale = 0.5*np.sqrt(sizes)[labels][:,np.newaxis]
+    return local*scale+offset[labels]
+
+def _component_layout(adj,rng):
+    """連結グラフの座標を正規化ラプラシアンの2番目,3番目に小さい固有値の固有ベクトルから求める"""
+    n = adj.shape[0]
+    deg = np.asarray(adj.sum(axis=1)).ravel()
+    d = 1/np.sqrt(deg)
+    norm_adj = sparse.diags(d)@adj@sparse.diags(d)
+    k = min(3,n-1)
+    if n <= 200:
+        _,vec = np.linalg.eigh(norm_adj.toarray())
+        vec = vec[:,::-1][:,:k]
+    else:
+        # 正規化ラプラシアンの小さい固有値 = (I+norm_adj)/2 の大きい固有値
+        shifted = (sparse.identity(n)+norm_adj)*0.5
+        _,vec = eigsh(shifted,k=k,which="LA",v0=rng.random(n),tol=1e-4,maxiter=n*10)
+        vec = vec[:,::-1]
+    pos = np.zeros((n,2))
+    coords = vec[:,1:]*d[:,np.newaxis]
+    pos[:,:coords.shape[1]] = coords
+    pos -= pos.mean(axis=0)
+    r = np.abs(pos).max()
+    return pos/r if r > 0 else pos
+
+def coarsen(group,energies,source,target,edge_energies=None,pos=None):
+    """グループ(Geometries.groupなど)毎に1つのノードにまとめたネットワークを作成する
+
+    Parameters:
+
+    group: array-like of int
+        | 各ノードのグループ番号.
+        | Geometries.clusterのようなリストのリストを与えてもよい.
+        | どのグループにも含まれないノードは,それぞれ1つのノードだけのグループになる.
+    energies: array-like
+        ノードのエネルギー
+    source: array-like of int
+        エッジのsource(無効なエッジは-1)
+    target: array-like of int
+        エッジのtarget(無効なエッジは-1)
+    edge_energies: array-like
+        エッジのエネルギー
+    pos: np.ndarray
+        ノードの座標. まとめたノードの座標は重心となる.
+
+    Returns:
+        tuple of dict:
+
+        - nodes: {"size","e_min","e_max","rep"(最も安定なノード),"pos"}
+        - edges: {"source","target","count","e_min"}
+    """
+    group = cluster2group(group,len(energies))
+    energies = np.asarray(energies,dtype=float)
+    n_group = int(group.max())+1 if len(group) else 0
+    size = np.bincount(group,minlength=n_group)
+    e_min = np.full(n_group,np.inf)
+    e_max = np.full(n_group,-np.inf)
+    np.minimum.at(e_min,group,energies)
+    np.maximum.at(e_max,group,energies)
+    # 最も安定なノード
+    order = np.lexsort((energies,group))
+    first = np.ones(len(order),dtype=bool)
+    first[1:] = group[order][1:]!=group[order][:-1]
+    rep = np.empty(n_group,dtype=np.int64)
+    rep[group[order][first]] = order[first]
+    nodes = {"size":size,"e_min":e_min,"e_max":e_max,"rep":rep}
+    if pos is not None:
+        pos = np.asarray(pos,dtype=float)
+        nodes["pos"] = np.stack([np.bincount(group,weights=pos[:,i],minlength=n_group)
+                                 for i in range(2)],axis=1)/np.maximum(size,1)[:,np.newaxis]
+    source = np.asarray(source,dtype=np.int64)
+    target = np.asarray(target,dtype=np.int64)
+    mask = valid_edge_mask(source,target,len(energies))
+    gs,gt = group[source[mask]],group[target[mask]]
+    a,b = np.minimum(gs,gt),np.maximum(gs,gt)
+    inter = a!=b
+    pair,inverse,count = np.unique(a[inter]*n_group+b[inter],return_inverse=True,return_counts=True)
+    edges = {"source":pair//n_group if n_group else pair,
+             "target":pair%n_group if n_group else pair,
+             "count":count}
+    if edge_energies is not None:
+        ee = np.asarray(edge_energies,dtype=float)[mask][inter]
+        e = np.full(len(pair),np.inf)
+        np.minimum.at(e,inverse,ee)
+        edges["e_min"] = e
+    return nodes, edges
+
+def cluster2group(cluster,n_nodes=None):
+    """Geometries.cluster(グループ毎のノード番号のリスト)をグループ番号の配列に変換する
+
+    | 既にグループ番号の配列の場合はそのまま(コピーして)用いる.
+    | どのグループにも含まれないノード(-1)は,それぞれ1つのノードだけのグループにする.
+    | (番号は既存のグループの後に順に付ける)
+    """
+    if len(cluster)==0 or isinstance(cluster[0],(list,tuple,np.ndarray)):
+        n = n_nodes if n_nodes is not None else sum(len(c) for c in cluster)
+        group = np.full(n,-1,dtype=np.int64)
+        for g,members in enumerate(cluster):
+            group[list(members)] = g
+        n_group = len(cluster)
+    else:
+        group = np.array(cluster,dtype=np.int64)
+        n_group = int(group.max())+1 if len(group) else 0
+    unassigned = group<0
+    group[unassigned] = n_group+np.arange(np.count_nonzero(unassigned))
+    return group
@@ -1,16 +1,17 @@
 from pathlib import PurePath
-import networkx as nx
 import itertools
-import pandas as pd
-from matplotlib.colors import rgb2hex
-import matplotlib.pyplot as plt
-from pyvis.network import Network
+import numpy as np
 from ase.units import kJ,mol,Hartree,eV
 
 #USER
 from grrmpy.io.read_listlog import log2atoms,read_connections,read_energies
 from grrmpy import pfp_calculator
+from grrmpy.async_calc import get_potential_energies
 from grrmpy.conv.atoms2smiles import atomslist2smileses
+from grrmpy.io.write_network import network_level,write_network_html,write_network_json
+from grrmpy.io.columnar import export_network
+from grrmpy.network.functions import connections2array
+from grrmpy.network.layout import spectral_layout,coarsen
 
 def make_color(x,cm="gnuplot"):
     """カラースケール
@@ -22,19 +23,39 @@ def make_color(x,cm="gnuplot"):
     cm str:
         'jet','viridis','plasma','inferno','magma','cividis','gnuplot','CMRmap','rainbow'
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import rgb2hex
     cmap = plt.get_cmap(cm)
     colorcode = rgb2hex(cmap(x))
     return colorcode
 
 def make_color_scale(val_list,cm="gnuplot"):
-    max_val = max(val_list)
-    min_val = min(val_list)
-    val_scale = [(i-min_val)/(max_val-min_val) for i in val_list]
-    color_scale = [make_color(x,cm=cm) for x in val_scale]
-    return color_scale
+    """値のリストをカラーコードのリストに変換する(カラーマップの取得は1回のみ)
+
+    Parameters:
+
+    val_list: array-like
+        値のリスト
+    cm str:
+        'jet','viridis','plasma','inferno','magma','cividis','gnuplot','CMRmap','rainbow'
+
+    Returns:
+        list of str: カラーコード('#rrggbb')のリスト
+    """
+    import matplotlib.pyplot as plt
+    vals = np.asarray(val_list,dtype=float)
+    if len(vals) == 0:
+        return []
+    max_val = vals.max()
+    min_val = vals.min()
+    val_scale = (vals-min_val)/(max_val-min_val) if max_val > min_val else np.zeros(len(vals))
+    rgb = np.round(plt.get_cmap(cm)(val_scale)[:,:3]*255).astype(np.int64)
+    code = (rgb[:,0]<<16)|(rgb[:,1]<<8)|rgb[:,2]
+    return np.char.mod("#%06x",code).tolist()
 
 class NodeData():
     def __init__(self,eq_list:list,energies:list,cm="gnuplot",indices=None):
+        import pandas as pd
         self.energies = energies
         self.atoms_list = eq_list
         self.all_data = pd.DataFrame({
@@ -53,6 +74,7 @@ class NodeData():
     @property
     def data(self):
         """xlwingで動かすプログラムと互換性を保つため"""
+        import pandas as pd
         data = {
             "node":[i for i in range(len(self))],
             "name":[f"EQ{i}" for i in range(len(self))],
@@ -80,6 +102,7 @@ class NodeData():
     
 class EdgeData():
     def __init__(self,ts_list,connections,energies:list):
+        import pandas as pd
         self.energies = energies
         self.atoms_list = ts_list
         self.connections = connections
@@ -107,6 +130,7 @@ class EdgeData():
     @property
     def data(self):
         """xlwingで動かすプログラムと互換性を保つため"""
+        import pandas as pd
         data = {
             "edge":[i for i in range(len(self))],
             "name":[f"TS{i}" for i in range(len(self))],
@@ -216,11 +240,11 @@ class NetGraph():
             
     def _set_calc_and_get_energy(self,atoms_list,calc_func):
         try:
-            energies = [atoms.get_potential_energy() for atoms in atoms_list]
+            energies = get_potential_energies(atoms_list)
         except Exception:
             for atoms in atoms_list:
                 atoms.calc = calc_func()
-            energies = [atoms.get_potential_energy() for atoms in atoms_list]
+            energies = get_potential_energies(atoms_list)
         return energies
     
     @property
@@ -269,6 +293,7 @@ class NetGraph():
         """
         if node is None:
             node = self.node.df.to_dict(orient='list')["node"]
+        import networkx as nx
         if edge is None:
             edge = self.edge.nx_data(self_loop)
         G = nx.Graph()
@@ -299,6 +324,7 @@ class NetGraph():
         self_loop: bool
             自己ループを表示する場合はTrue.
         """
+        from pyvis.network import Network # 読み込みに時間がかかるため使用時にインポート
         g = Network(height, width,notebook=notebook)
         g.from_nx(self.get_graph(self_loop,cm))
         if show_buttons:
@@ -307,6 +333,58 @@ class NetGraph():
             g.show_buttons(filter_=['physics', 'nodes']) # 一部の機能のみ使用
         g.show(html)
     
+    def layout(self,cache=None):
+        """スペクトル法で求めた各EQの座標((EQの数,2)の配列)を返す
+
+        Parameters:
+
+        cache: str or Path
+            | キャッシュファイル(.npz). 同じネットワークの場合は読み込むだけにする.
+        """
+        source,target = connections2array(self.edge.connections)
+        return spectral_layout(len(self.node),source,target,cache=cache)
+
+    def _static_levels(self,cm="gnuplot",layout_cache=None,lod=True):
+        energies = np.asarray(self.node.energies,dtype=float)
+        source,target = connections2array(self.edge.connections)
+        pos = self.layout(cache=layout_cache)
+        title = [f"EQ{i}\nEnergy:{e:.03f} kJ/mol" for i,e in enumerate(energies.tolist())]
+        levels = [network_level("EQ",pos,source,target,make_color_scale(energies,cm),title)]
+        if lod:
+            nodes,edges = coarsen(self.node.all_data["group"].to_numpy(),energies,
+                                  source,target,self.edge.energies,pos)
+            title = [f"group{g} ({size} EQ)\nEQ{rep}\nEnergy:{e0:.03f}~{e1:.03f} kJ/mol"
+                     for g,(size,rep,e0,e1) in enumerate(zip(nodes["size"].tolist(),nodes["rep"].tolist(),
+                                                             nodes["e_min"].tolist(),nodes["e_max"].tolist()))]
+            levels.append(network_level("group",nodes["pos"],edges["source"],edges["target"],
+                                        make_color_scale(nodes["e_min"],cm),title,nodes["size"]))
+        return levels
+
+    def write_static_html(self,html,cm="gnuplot",layout_cache=None,lod=True,title="Network"):
+        """座標を事前に求めた静的なhtmlを作成する(大規模なネットワーク用)
+
+        | write_htmlと異なりブラウザ上で力学計算を行わないため,10万ノード程度でも表示できる.
+        | lod=Trueの場合,同じグループ(SMILES)のEQを1つのノードにまとめた表示も作成する.
+
+        Parameters:
+
+        html: str
+            保存名.html
+        cm: str
+            カラースケール
+        layout_cache: str or Path
+            座標のキャッシュファイル(.npz)
+        lod: bool
+            グループ毎にまとめた表示も作成する場合True
+        title: str
+            htmlのタイトル
+        """
+        write_network_html(html,self._static_levels(cm,layout_cache,lod),title=title)
+
+    def write_static_json(self,file,cm="gnuplot",layout_cache=None,lod=True):
+        """write_static_htmlで用いるデータをJSONで保存する(引数はwrite_static_htmlと同じ)"""
+        write_network_json(file,self._static_levels(cm,layout_cache,lod))
+
     @property
     def _node_data_for_graphml(self):
         df = self.node_df
@@ -335,6 +413,68 @@ class NetGraph():
         graphml: str or Path
             | graphmlパス(.graphml)
         """
+        import networkx as nx
         node = self._node_data_for_graphml
         edge = self._edge_data_for_graphml
-        nx.write_graphml(self.get_graph(node=node,edge=edge),path)
\ No newline at end of file
+        nx.write_graphml(self.get_graph(node=node,edge=edge),graphml)
+
+    def columns(self):
+        """ノード,エッジの表を列(配列)のdictで返す(DataFrameを1行ずつ作成しない)
+
+        | エッジのsource,targetは'??','DC'などの場合-1になる.
+        | 障壁は求まらない場合NaNになる.
+
+        Returns:
+            tuple of dict: (nodes, edges)
+        """
+        node_e = np.asarray(self.node.energies,dtype=float)
+        edge_e = np.asarray(self.edge.energies,dtype=float)
+        n,m = len(node_e),len(edge_e)
+        source,target = connections2array(self.edge.connections)
+        valid_s = (source>=0)&(source<n)
+        valid_t = (target>=0)&(target<n)
+        forward = np.full(m,np.nan)
+        reverse = np.full(m,np.nan)
+        forward[valid_s] = np.maximum(edge_e[valid_s]-node_e[source[valid_s]],0)
+        reverse[valid_t] = np.maximum(edge_e[valid_t]-node_e[target[valid_t]],0)
+        nodes = {
+            "node":np.arange(n),
+            "name":np.char.add("EQ",np.arange(n).astype(str)),
+            "group":self.node.all_data["group"].to_numpy(dtype=np.int64),
+            "E/Hartree":node_e*(kJ/mol)/Hartree,
+            "E/kJmol-1":node_e,
+        }
+        edges = {
+            "edge":np.arange(m),
+            "name":np.char.add("TS",np.arange(m).astype(str)),
+            "source":source,
+            "target":target,
+            "E/Hartree":edge_e*(kJ/mol)/Hartree,
+            "E/kJmol-1":edge_e,
+            "forward/kJmol-1":forward,
+            "reverse/kJmol-1":reverse,
+        }
+        return nodes, edges
+
+    def write_columnar(self,folder,chunk_size=1000000,format="auto",graphml=False,gexf=False):
+        """ノード,エッジの表を列形式(parquetまたは列毎のバイナリ)で保存する
+
+        | graphml=True,gexf=Trueの場合,GraphML,GEXFも同時にチャンク毎に書き込む.
+        | 読み込みはgrrmpy.io.columnar.read_networkで行なう.
+
+        Parameters:
+
+        folder: str or Path
+            保存フォルダ
+        chunk_size: int
+            1回に書き込む行数
+        format: str
+            | 'parquet','columns','auto'のいずれか.
+            | 'auto'の場合,pyarrowがあればparquet.
+        graphml: bool
+            network.graphmlも作成する場合True
+        gexf: bool
+            network.gexfも作成する場合True
+        """
+        nodes,edges = self.columns()
+        export_network(folder,nodes,edges,chunk_size,format,graphml,gexf)
\ No newline at end of file
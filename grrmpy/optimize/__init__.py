@@ -1,11 +1,32 @@
-from grrmpy.optimize.attach import optimize_eq,automate_maxstep,write_traj
-from grrmpy.optimize.optimizer import CustumOptimizer
 import warnings
+from importlib.util import find_spec
 
-try:
-    from matlantis_features.ase_ext.optimize import FIRELBFGS #今後matlantis_featuresのアップデートの際に場所が変更される恐れがあるため.
-    __all__ = ["optimize_eq","automate_maxstep","write_traj","FIRELBFGS","CustumOptimizer"]
-    
-except:
-    warnings.warn('matlantis_featuresのFIRELBFGSのディレクトリの位置が変更されたためインポートできませんでした')
-    __all__ = ["optimize_eq","automate_maxstep","write_traj","CustumOptimizer"]
\ No newline at end of file
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "optimize_eq":"grrmpy.optimize.attach",
+    "automate_maxstep":"grrmpy.optimize.attach",
+    "write_traj":"grrmpy.optimize.attach",
+    "CustumOptimizer":"grrmpy.optimize.optimizer",
+    "BatchFIRE":"grrmpy.optimize.batch",
+    "BatchLBFGS":"grrmpy.optimize.batch",
+    "SerialBatchCalculator":"grrmpy.optimize.batch",
+    "FIRELBFGS":"matlantis_features.ase_ext.optimize", #今後matlantis_featuresのアップデートの際に場所が変更される恐れがあるため.
+}
+
+if find_spec("matlantis_features") is not None:
+    __all__ = ["optimize_eq","automate_maxstep","write_traj","FIRELBFGS","CustumOptimizer",
+               "BatchFIRE","BatchLBFGS","SerialBatchCalculator"]
+else:
+    __all__ = ["optimize_eq","automate_maxstep","write_traj","CustumOptimizer",
+               "BatchFIRE","BatchLBFGS","SerialBatchCalculator"]
+
+_getattr, __dir__ = lazy_attributes(__name__, _attributes)
+
+def __getattr__(name):
+    try:
+        return _getattr(name)
+    except ImportError:
+        if name == "FIRELBFGS":
+            warnings.warn('matlantis_featuresのFIRELBFGSのディレクトリの位置が変更されたためインポートできませんでした')
+        raise
@@ -0,0 +1,311 @@
+"""
+複数の構造をまとめて最適化するOptimizer.
+
+| ASEのOptimizerは1つの構造毎にforceを計算するため,小さな構造を多数最適化する場合,
+| calculatorの呼び出し回数が構造数×ステップ数になる.
+| BatchFIRE,BatchLBFGSはK個の独立な構造の座標を1つの配列(K,最大原子数,3)で保持し,
+| 各ステップで未収束の全構造のforceを1回のbatch_calcの呼び出しで計算する.
+| ステップ幅,maxstep,収束判定は構造毎に行ない,収束した構造は次のステップから計算しない.
+| 更新式はASEのFIRE,LBFGSと同じ.
+
+Examples:
+
+    >>> from ase.calculators.emt import EMT
+    >>> from grrmpy.optimize.batch import BatchLBFGS, SerialBatchCalculator
+    >>> opt = BatchLBFGS(atoms_list, SerialBatchCalculator(EMT()), maxstep=0.2)
+    >>> converged = opt.run(fmax=0.05, steps=500)
+
+    | batch_calcには,Atomsのリストを引数として,(エネルギーの配列, forceのリスト)を返す関数を与える.
+    | 複数の構造を1回で計算できるモデルを用いる場合は,そのモデルを呼び出す関数を作成する.
+
+    >>> def batch_calc(atoms_list):
+    >>>     energies, forces = model.predict(atoms_list)
+    >>>     return energies, forces
+"""
+import sys
+import time
+import numpy as np
+from ase.calculators.singlepoint import SinglePointCalculator
+
+# USER
+from grrmpy.optimize.attach import opt_maxstep
+
+class SerialBatchCalculator():
+    """1つのcalculatorで構造を順に計算する(複数の構造を同時に計算できないcalculator用)
+
+    Parameters:
+
+    calc: calculator
+        ASEのcalculator. 全ての構造で共有する.
+    """
+    def __init__(self,calc):
+        self.calc = calc
+
+    def __call__(self,atoms_list):
+        energies = np.empty(len(atoms_list))
+        forces = []
+        for k,atoms in enumerate(atoms_list):
+            energies[k] = self.calc.get_property("energy",atoms)
+            forces.append(np.array(self.calc.get_property("forces",atoms)))
+        return energies, forces
+
+class BatchOptimizer():
+    """BatchFIRE,BatchLBFGSの親クラス
+
+    Parameters:
+
+    atoms_list: list of Atoms
+        | 最適化する構造のリスト. 原子数が異なっていてもよい.
+        | 各Atomsの座標は,全構造の座標をまとめた配列のビューに置き換えられる.
+    batch_calc: callable
+        | Atomsのリストを引数とし,(エネルギーの配列, forceのリスト)を返す関数.
+        | forceは制約を適用する前のもの.
+    maxstep: float or dict
+        | 1ステップの最大移動距離.
+        | {fmax:maxstep}の辞書で与えた場合,構造毎にfmaxに応じて変更する(automate_maxstepと同じ).
+        | Noneの場合はautomate_maxstepのデフォルトの値を用いる.
+    logfile: str
+        | ログファイル. '-'の場合は標準出力. Noneの場合は出力しない.
+    """
+    def __init__(self,atoms_list,batch_calc,maxstep=0.2,logfile=None):
+        self.atoms_list = list(atoms_list)
+        self.batch_calc = batch_calc
+        self.logfile = logfile
+        self.n_calls = 0 # batch_calcの呼び出し回数
+
+        K = len(self.atoms_list)
+        self.natoms = np.array([len(atoms) for atoms in self.atoms_list],dtype=int)
+        nmax = int(self.natoms.max()) if K > 0 else 0
+        self.positions = np.zeros((K,nmax,3))
+        self.forces = np.zeros((K,nmax,3))
+        for k,atoms in enumerate(self.atoms_list):
+            n = self.natoms[k]
+            self.positions[k,:n] = atoms.positions
+            atoms.arrays["positions"] = self.positions[k,:n] # 座標をまとめた配列のビューにする
+        self.energies = np.full(K,np.nan)
+        self.fmax = np.full(K,np.inf)
+        self.nsteps = np.zeros(K,dtype=int)
+        self.active = np.ones(K,dtype=bool)
+        self.converged = np.zeros(K,dtype=bool)
+        self._constrained = [k for k,atoms in enumerate(self.atoms_list) if atoms.constraints]
+        self.set_maxstep(maxstep)
+
+    def set_maxstep(self,maxstep):
+        if maxstep is None:
+            maxstep = opt_maxstep
+        if isinstance(maxstep,dict):
+            self.maxstep_table = sorted(maxstep.items(),key=lambda x:x[0],reverse=True)
+            first = self.maxstep_table[-1][1] if self.maxstep_table else 0.2
+            self.maxstep = np.full(len(self.atoms_list),first,dtype=float)
+        else:
+            self.maxstep_table = None
+            self.maxstep = np.full(len(self.atoms_list),maxstep,dtype=float)
+
+    def _update_maxstep(self,idx):
+        """automate_maxstepと同じ規則で構造毎にmaxstepを変更する"""
+        if self.maxstep_table is None:
+            return
+        fmax = self.fmax[idx]
+        done = np.zeros(len(idx),dtype=bool)
+        for f,step in self.maxstep_table:
+            hit = ~done & (fmax > f)
+            self.maxstep[idx[hit]] = step
+            done |= hit
+
+    def _calculate(self,idx):
+        """idxの構造のエネルギーとforceを計算する(制約を適用する)"""
+        energies,forces = self.batch_calc([self.atoms_list[k] for k in idx])
+        self.n_calls += 1
+        for k,e,f in zip(idx,energies,forces):
+            atoms = self.atoms_list[k]
+            f = np.array(f,dtype=float)
+            raw = f.copy()
+            for c in atoms.constraints:
+                c.adjust_forces(atoms,f)
+            self.forces[k,:self.natoms[k]] = f
+            self.energies[k] = e
+            atoms.calc = SinglePointCalculator(atoms,energy=float(e),forces=raw)
+        self.fmax[idx] = np.sqrt((self.forces[idx]**2).sum(axis=2).max(axis=1))
+
+    def _move(self,idx,dr):
+        """idxの構造をdrだけ移動する(制約を適用する)"""
+        constrained = np.isin(idx,self._constrained)
+        free = idx[~constrained]
+        self.positions[free] += dr[~constrained]
+        for k,d in zip(idx[constrained],dr[constrained]):
+            atoms = self.atoms_list[k]
+            new = atoms.positions+d[:self.natoms[k]]
+            for c in atoms.constraints:
+                c.adjust_positions(atoms,new)
+            self.positions[k,:self.natoms[k]] = new
+
+    def step(self,idx):
+        """idxの構造の移動量(len(idx),最大原子数,3)を返す"""
+        raise NotImplementedError
+
+    def log(self,idx,start):
+        if self.logfile is None:
+            return
+        line = (f"{self.__class__.__name__}: {self.n_calls:5d} {time.strftime('%H:%M:%S')} "
+                f"active={len(idx):6d} converged={int(self.converged.sum()):6d} "
+                f"max_fmax={self.fmax[idx].max() if len(idx) else 0:.4f} {time.time()-start:.1f}s\n")
+        if self.logfile == "-":
+            sys.stdout.write(line)
+        else:
+            with open(self.logfile,"a") as f:
+                f.write(line)
+
+    def run(self,fmax=0.05,steps=1000,callback=None):
+        """全ての構造が収束するか,stepsに達するまで最適化する
+
+        Parameters:
+
+        fmax: float
+            収束条件
+        steps: int
+            最大ステップ数(構造毎)
+        callback: callable
+            | 構造の計算が終了した時に, callback(番号,Atoms,収束したか)が呼ばれる.
+            | Atomsにはエネルギーとforceを持つSinglePointCalculatorが設定されている.
+
+        Returns:
+            np.ndarray: 構造毎に収束したかどうか(bool)
+        """
+        start = time.time()
+        self.active[:] = ~self.converged
+        max_steps = self.nsteps+steps
+        while self.active.any():
+            idx = np.flatnonzero(self.active)
+            self._calculate(idx)
+            finished = self.fmax[idx] <= fmax
+            self.converged[idx[finished]] = True
+            self.log(idx,start)
+            finished |= self.nsteps[idx] >= max_steps[idx]
+            self.active[idx[finished]] = False
+            if callback is not None:
+                for k in idx[finished]:
+                    callback(int(k),self.atoms_list[k],bool(self.converged[k]))
+            idx = idx[~finished]
+            if len(idx) == 0:
+                break
+            self._update_maxstep(idx)
+            self._move(idx,self.step(idx))
+            self.nsteps[idx] += 1
+        return self.converged.copy()
+
+class BatchFIRE(BatchOptimizer):
+    """ASEのFIREを複数の構造で同時に行なう
+
+    | パラメータはASEのFIREと同じ. その他のパラメータはBatchOptimizerを参照.
+    """
+    def __init__(self,atoms_list,batch_calc,maxstep=0.2,logfile=None,
+                 dt=0.1,dtmax=1.0,Nmin=5,finc=1.1,fdec=0.5,astart=0.1,fa=0.99,a=0.1):
+        super().__init__(atoms_list,batch_calc,maxstep,logfile)
+        K = len(self.atoms_list)
+        self.v = np.zeros_like(self.positions)
+        self.dt = np.full(K,dt,dtype=float)
+        self.a = np.full(K,a,dtype=float)
+        self.Nsteps = np.zeros(K,dtype=int)
+        self.started = np.zeros(K,dtype=bool)
+        self.dtmax = dtmax
+        self.Nmin = Nmin
+        self.finc = finc
+        self.fdec = fdec
+        self.astart = astart
+        self.fa = fa
+
+    def step(self,idx):
+        f = self.forces[idx]
+        v = self.v[idx]
+        a = self.a[idx]
+        dt = self.dt[idx]
+        started = self.started[idx]
+        vf = (f*v).sum(axis=(1,2))
+        uphill = started & (vf <= 0)
+        downhill = started & (vf > 0)
+        fnorm = np.sqrt((f*f).sum(axis=(1,2)))
+        vnorm = np.sqrt((v*v).sum(axis=(1,2)))
+        scale = np.divide(vnorm,fnorm,out=np.zeros_like(fnorm),where=fnorm>0)
+        v[downhill] = ((1-a[downhill])[:,None,None]*v[downhill]
+                       +(a[downhill]*scale[downhill])[:,None,None]*f[downhill])
+        accel = downhill & (self.Nsteps[idx] > self.Nmin)
+        dt[accel] = np.minimum(dt[accel]*self.finc,self.dtmax)
+        a[accel] *= self.fa
+        self.Nsteps[idx[downhill]] += 1
+        v[uphill] = 0.0
+        a[uphill] = self.astart
+        dt[uphill] *= self.fdec
+        self.Nsteps[idx[uphill]] = 0
+        v += dt[:,None,None]*f
+        dr = dt[:,None,None]*v
+        normdr = np.sqrt((dr*dr).sum(axis=(1,2)))
+        maxstep = self.maxstep[idx]
+        too_long = normdr > maxstep
+        dr[too_long] *= (maxstep[too_long]/normdr[too_long])[:,None,None]
+        self.v[idx] = v
+        self.a[idx] = a
+        self.dt[idx] = dt
+        self.started[idx] = True
+        return dr
+
+class BatchLBFGS(BatchOptimizer):
+    """ASEのLBFGS(line searchなし)を複数の構造で同時に行なう
+
+    | パラメータはASEのLBFGSと同じ. その他のパラメータはBatchOptimizerを参照.
+    | 全ての構造は同時に開始するため,履歴は全構造で共通のリストとして保持する.
+    """
+    def __init__(self,atoms_list,batch_calc,maxstep=0.2,logfile=None,
+                 memory=100,damping=1.0,alpha=70.0):
+        super().__init__(atoms_list,batch_calc,maxstep,logfile)
+        self.memory = memory
+        self.damping = damping
+        self.H0 = 1.0/alpha
+        K = len(self.atoms_list)
+        self.r0 = None
+        self.f0 = None
+        self.iteration = np.zeros(K,dtype=int)
+        self.s = [] # 各要素は(K,最大原子数*3)
+        self.y = []
+        self.rho = [] # 各要素は(K,)
+
+    def _update(self,idx,r,f):
+        if self.r0 is None:
+            self.r0 = np.zeros((len(self.atoms_list),r.shape[1]))
+            self.f0 = np.zeros_like(self.r0)
+        if self.iteration[idx].max() > 0:
+            if len(self.s) == self.memory:
+                s,y,rho = self.s.pop(0),self.y.pop(0),self.rho.pop(0) # 配列を再利用する
+            else:
+                s,y,rho = np.zeros_like(self.r0),np.zeros_like(self.r0),np.zeros(len(self.atoms_list))
+            s[idx] = r-self.r0[idx]
+            y[idx] = self.f0[idx]-f
+            ys = (y[idx]*s[idx]).sum(axis=1)
+            rho[idx] = np.divide(1.0,ys,out=np.zeros_like(ys),where=ys!=0)
+            self.s.append(s)
+            self.y.append(y)
+            self.rho.append(rho)
+        self.r0[idx] = r
+        self.f0[idx] = f
+
+    def step(self,idx):
+        n = len(idx)
+        r = self.positions[idx].reshape(n,-1)
+        f = self.forces[idx].reshape(n,-1)
+        self._update(idx,r,f)
+        loopmax = len(self.s)
+        a = np.empty((n,loopmax))
+        q = -f
+        for i in range(loopmax-1,-1,-1):
+            a[:,i] = self.rho[i][idx]*(self.s[i][idx]*q).sum(axis=1)
+            q -= a[:,i,None]*self.y[i][idx]
+        z = self.H0*q
+        for i in range(loopmax):
+            b = self.rho[i][idx]*(self.y[i][idx]*z).sum(axis=1)
+            z += self.s[i][idx]*(a[:,i]-b)[:,None]
+        dr = -z.reshape(n,-1,3)
+        steplengths = np.sqrt((dr**2).sum(axis=2)).max(axis=1)
+        maxstep = self.maxstep[idx]
+        too_long = steplengths >= maxstep
+        dr[too_long] *= (maxstep[too_long]/steplengths[too_long])[:,None,None]
+        self.iteration[idx] += 1
+        return dr*self.damping
@@ -1,3 +1,9 @@
-from grrmpy.path.reaction_path import ReactPath
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "ReactPath":"grrmpy.path.reaction_path",
+}
 
 __all__ = ["ReactPath"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,8 +1,4 @@
-import xlsxwriter
-from xlsxwriter.utility import xl_cell_to_rowcol
-import matplotlib.pyplot as plt
 import numpy as np
-import plotly.graph_objects as go
 
 
 deffault_x_axis = {
@@ -66,6 +62,8 @@ def to_excell(outfile,
     graph_data (_type_): _description_
     pos (str, optional): _description_. Defaults to "D2".
     """
+    import xlsxwriter
+    from xlsxwriter.utility import xl_cell_to_rowcol
     if x_axis is None:
         x_axis = deffault_x_axis
     else:
@@ -175,6 +173,7 @@ def to_excell(outfile,
     
 def to_fig(solid_data,dot_data,xlabel="Energy",ylabel="Reaction Coordinate"):
     """matplotlibのfigに変換する"""
+    import matplotlib.pyplot as plt
     fig = plt.figure()
     ax = fig.add_subplot(1,1,1)
     
@@ -201,6 +200,7 @@ def to_fig(solid_data,dot_data,xlabel="Energy",ylabel="Reaction Coordinate"):
 
 def to_plotly(solid_data,dot_data):
     """plotlyのfigに変換する"""
+    import plotly.graph_objects as go
     dot_plot = [
         go.Scatter(
             x=[dot_xini,dot_xfin], y=[dot_yini, dot_yfin],
@@ -1,4 +1,3 @@
-import pandas as pd
 from ase.units import eV, kJ, mol, Hartree
 from ase import Atoms
 from ase.constraints import FixAtoms
@@ -7,6 +6,7 @@ import pickle
 #user
 from grrmpy.path.functions import to_excell,to_fig, to_html, to_plotly
 from grrmpy.calculator import pfp_calculator
+from grrmpy.async_calc import get_potential_energies
 
 class ReactPath():
     """
@@ -84,7 +84,7 @@ class ReactPath():
         if 'atoms' in self.data.columns:
             for atoms in self.data["atoms"]:
                 atoms.calc = self.calc_func()
-            self.data["energy"] = [atoms.get_potential_energy()*mol/kJ for atoms in self.data["atoms"]]
+            self.data["energy"] = [e*mol/kJ for e in get_potential_energies(self.data["atoms"])]
         else:
             if unit == "eV":
                 self.data["energy"] = [i*mol/kJ for i in self.data["energy"]]
@@ -97,6 +97,7 @@ class ReactPath():
     
     @data.setter
     def data(self,data):
+        import pandas as pd
         if type(data) == dict:
             if not "name" in data.keys():
                 raise KeyError("'name'キーがありません")
@@ -126,6 +127,7 @@ class ReactPath():
         self._positions = positions
         
     def get_solid_df(self):
+        import pandas as pd
         solid_xini = [i*2+1 for i,b in enumerate(self.positions) if b]
         solid_xfin = [i+1 for i in solid_xini]
         std_e = self.get_energy()[0]
@@ -139,6 +141,7 @@ class ReactPath():
         return df
     
     def get_dot_df(self):
+        import pandas as pd
         solid_df = self.get_solid_df()
         dot_xini = solid_df["solid_xfin"][:-1].to_list()
         dot_xfin = solid_df["solid_xini"][1:].to_list()
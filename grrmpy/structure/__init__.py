@@ -1,7 +1,19 @@
-from grrmpy.structure.structure import Structure,EQ,TS,PT
-from grrmpy.structure.structures import Structures,EQList,TSList,PTList
-from grrmpy.structure.comfile import COM
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "Structure":"grrmpy.structure.structure",
+    "EQ":"grrmpy.structure.structure",
+    "TS":"grrmpy.structure.structure",
+    "PT":"grrmpy.structure.structure",
+    "Structures":"grrmpy.structure.structures",
+    "EQList":"grrmpy.structure.structures",
+    "TSList":"grrmpy.structure.structures",
+    "PTList":"grrmpy.structure.structures",
+    "COM":"grrmpy.structure.comfile",
+}
 
 __all__ = ["Structure","EQ","TS","PT",
            "Structures","EQList","TSList","PTList",
-           "COM"]
\ No newline at end of file
+           "COM"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,4 +1,5 @@
 import numpy as np
+from copy import deepcopy
 from ase import Atoms
 from pathlib import Path
 from grrmpy.io.read_poscar import get_cell
@@ -6,6 +7,19 @@ from grrmpy.geometry import Geometry
 from grrmpy.structure.comfile import COM
 from ase.units import kJ,Hartree,mol
 
+def join_frozen_atoms(atoms,frozen_atoms):
+    """atoms+frozen_atomsと同じAtomsを作成する
+
+    | 原子番号と座標以外の情報(tagsなど)を持たない場合は,配列を連結して直接作成する.
+    """
+    if set(atoms.arrays) != {"numbers","positions"} or set(frozen_atoms.arrays) != {"numbers","positions"}:
+        return atoms + frozen_atoms
+    new = Atoms(numbers=np.concatenate([atoms.numbers,frozen_atoms.numbers]),
+                positions=np.concatenate([atoms.positions,frozen_atoms.positions]),
+                cell=atoms.cell,pbc=atoms.pbc,info=deepcopy(atoms.info))
+    new.set_constraint(deepcopy(atoms.constraints))
+    return new
+
 class Structure():
     def __init__(self,atoms:Atoms=None):
         self.set_atoms(atoms)
@@ -13,7 +27,7 @@ class Structure():
 
     @property
     def atoms(self):
-        if self._atoms == Atoms():
+        if len(self._atoms) == 0:
             return None
         else:
             return self._atoms
@@ -154,7 +168,7 @@ class EQ(Structure):
     
     @property
     def frozen_atoms(self):
-        if self._frozen_atoms == Atoms():
+        if len(self._frozen_atoms) == 0:
             return None
         else:
             return self._frozen_atoms
@@ -194,9 +208,12 @@ class EQ(Structure):
             raise TypeError("Atoms,COMファイルパス,Noneのいずれかでず")
     
     def get_atoms(self,frozen_atoms=True):
-        """親クラスを上書きしている"""
+        """親クラスを上書きしている
+
+        | frozen_atoms=Trueの場合,FrozenAtomsを追加したAtomsを新たに作成して返す.
+        """
         if frozen_atoms and self.frozen_atoms:
-            return self.atoms + self.frozen_atoms
+            return join_frozen_atoms(self.atoms, self.frozen_atoms)
         else:
             return self.atoms
     
@@ -206,7 +223,7 @@ class EQ(Structure):
         return new_obj
       
     def __str__(self):
-        if self._atoms == Atoms():
+        if len(self._atoms) == 0:
             return f"{self.__class__.__name__}()"
         else:
             tokens = []
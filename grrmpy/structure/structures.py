@@ -1,11 +1,11 @@
 
-from ..io.read_listlog import _open_file,_read_mark_of_list,_logtext2energies,_read_connections
+from ..io.read_listlog import _open_file,_read_mark_of_list,_logtext2energies,_read_connections,atoms_views
 from ..io.read_poscar import get_cell,get_cell_and_pbc
 from ..conv.log2atoms import _log2atoms
 from .structure import EQ,TS,PT,Structure,COM
+from ..async_calc import get_potential_energies,DEFAULT_CONCURRENCY
 import grrmpy.geometry.geometries as gg
 import numpy as np
-import pandas as pd
 from pathlib import Path
 import copy
 from ase import Atoms
@@ -30,7 +30,7 @@ class Structures():
     
     def _check_same_len(self,atoms_list):
         """atoms_listの原子が全て同じ数か確認"""
-        len_atoms = np.array([len(atoms) for atoms in atoms_list if atoms is not None and atoms!= Atoms()])
+        len_atoms = np.array([len(atoms) for atoms in atoms_list if atoms is not None and len(atoms) > 0])
         return np.all(len_atoms > len_atoms[0]) # 全部同じ原子数の場合True
         
     @property
@@ -329,8 +329,29 @@ class EQList(Structures):
             raise Exception(f"EQ_list.logファイルを読み込めません\n{token}")
         
     def get_atoms_list(self, frozen_atoms=True):
-        """親クラスを上書きしている"""
-        return [structure.get_atoms(frozen_atoms) for structure in self._strctures]
+        """親クラスを上書きしている
+
+        | 全ての構造が同じFrozenAtomsを共有している場合,FrozenAtomsを含めた座標を1つの配列に確保し,
+        | 各Atomsの座標はその配列のビューとする.
+        """
+        if not frozen_atoms or not self._strctures:
+            return [structure.get_atoms(frozen_atoms) for structure in self._strctures]
+        frozen = self._strctures[0]._frozen_atoms
+        atoms_list = [structure.atoms for structure in self._strctures]
+        if (len(frozen) == 0
+            or any(structure._frozen_atoms is not frozen for structure in self._strctures)
+            or any(atoms is None or len(atoms) != len(atoms_list[0])
+                   or set(atoms.arrays) != {"numbers","positions"} for atoms in atoms_list)
+            or any(not np.array_equal(atoms.numbers,atoms_list[0].numbers) for atoms in atoms_list)):
+            return [structure.get_atoms(frozen_atoms) for structure in self._strctures]
+        positions = np.stack([atoms.positions for atoms in atoms_list])
+        new_list = atoms_views(atoms_list[0].numbers,positions,frozen)
+        for new,atoms in zip(new_list,atoms_list):
+            new.cell = atoms.cell
+            new.pbc = atoms.pbc
+            new.info = copy.deepcopy(atoms.info)
+            new.set_constraint(copy.deepcopy(atoms.constraints))
+        return new_list
         
     @property
     def frozen_atoms_list(self):
@@ -359,12 +380,34 @@ class EQList(Structures):
     @property
     def energies(self):
         return np.array([eq.energy for eq in self._strctures])
-        
+
+    def calc_energies(self,calc_func,frozen_atoms=True,max_concurrency=DEFAULT_CONCURRENCY):
+        """全ての構造のエネルギーをcalc_funcのcalculatorで計算し直す
+
+        | 各構造の計算は並行して行なう(grrmpy.async_calcを参照). energiesの値は変更しない.
+
+        Parameters:
+
+        calc_func: function
+            calculatorを返す関数
+        frozen_atoms: bool
+            FrozenAtomsを含めて計算する場合True
+        max_concurrency: int
+            同時に計算する構造の数の上限
+
+        Returns:
+            ndarray: 各構造のエネルギー(Hartree)
+        """
+        atoms_list = [atoms.copy() for atoms in self.get_atoms_list(frozen_atoms)] # 保持しているAtomsにcalculatorを付けない
+        energies = get_potential_energies(atoms_list,calc_func,max_concurrency)
+        return np.array(energies)/Hartree
+
     def build_structure_obj(self, energies_gen, atoms_list_gen, _): # _にはlogtextが入るがこれはTSList,PTList用(子クラス)
         return [self._element(energy,atoms,self.com.frozen_atoms) for energy,atoms in zip(energies_gen,atoms_list_gen)]
 
     @property
     def summary(self):
+        import pandas as pd
         if self.geometies is None:
             group = [None for _ in range(len(self))]
         else:
@@ -419,6 +462,12 @@ class EQList(Structures):
     def fromdict(cls,dct):
         new_obj = super().fromdict(dct)
         new_obj.com = COM.fromdict(dct["com"])
+        if new_obj._strctures:
+            # 同じFrozenAtomsは1つのAtomsを共有する
+            frozen = new_obj._strctures[0]._frozen_atoms
+            for structure in new_obj._strctures[1:]:
+                if structure._frozen_atoms is not frozen and structure._frozen_atoms == frozen:
+                    structure._frozen_atoms = frozen
         return new_obj
     
     def todict(self):
@@ -465,6 +514,7 @@ class TSList(EQList):
     
     @property
     def summary(self):
+        import pandas as pd
         summary = pd.DataFrame(
             data = {"edge":[i for i in range(len(self))],
                     "name":[f"{self._element.__name__}{i}" for i in range(len(self))],
@@ -0,0 +1,142 @@
+"""
+計算の各段階(SNEBの各ステージ,振動計算,IRC,構造の比較,ファイルの書き込み等)の
+実行時間,CPU時間,エネルギー/力の計算回数,Optimizerのステップ数,書き込んだバイト数を記録する.
+
+| 結果はChromeのtrace形式のjson(chrome://tracing や https://ui.perfetto.dev で表示できる)と,
+| 段階毎の集計表で出力する.
+| enabled=Falseの場合,span()は何もしないコンテキストマネージャを返し,calculatorも変更しない.
+
+Examples:
+
+    >>> tracer = Tracer()
+    >>> calc_func = tracer.wrap_calc_func(pfp_calculator) # calculatorの計算回数を数える
+    >>> with tracer.span("SNEB0", cat="SNEB", files=["SNEB0.traj"]):
+    ...     opt.run(fmax=0.05)
+    ...     tracer.add_steps(opt.nsteps)
+    >>> tracer.write("trace.json")
+    >>> tracer.summary()
+"""
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+def _size(file):
+    try:
+        return os.path.getsize(file)
+    except OSError:
+        return 0
+
+class Tracer():
+    """計算の各段階を記録する
+
+    Parameters:
+
+    enabled: bool
+        Falseの場合,何も記録しない.
+
+    Attributes:
+
+    events: list of dict
+        記録した区間(Chromeのtrace形式の'X'イベント)
+    calls: int
+        wrap_calc_func(count_calculator)を通したcalculatorの計算回数の合計
+    steps: int
+        add_stepsで加えたOptimizerのステップ数の合計
+    """
+    def __init__(self,enabled=True):
+        self.enabled = enabled
+        self.events = []
+        self.calls = 0
+        self.steps = 0
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+
+    def span(self,name,cat="",files=(),**args):
+        """with文で囲んだ区間を記録する
+
+        Parameters:
+
+        name: str
+            区間の名前
+        cat: str
+            | 区間の種類('SNEB','vib','IRC'等). summary()はcat毎に集計する.
+        files: list of str
+            区間の前後でサイズの増加量を書き込んだバイト数として記録するファイル
+        args:
+            区間の情報(climb=True等). traceのargsに記録される.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name,cat,files,args)
+
+    @contextmanager
+    def _span(self,name,cat,files,args):
+        start,cpu = time.perf_counter(),time.process_time()
+        calls,steps = self.calls,self.steps
+        sizes = [_size(f) for f in files]
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            written = sum(max(_size(f)-s,0) for f,s in zip(files,sizes))
+            self.events.append({"name":name,
+                                "cat":cat,
+                                "ph":"X",
+                                "ts":(start-self._t0)*1e6,
+                                "dur":(end-start)*1e6,
+                                "pid":self._pid,
+                                "tid":0,
+                                "args":{"cpu_time":time.process_time()-cpu,
+                                        "calls":self.calls-calls,
+                                        "steps":self.steps-steps,
+                                        "bytes":written,
+                                        **args}})
+
+    def count_calculator(self,calc):
+        """calcの計算(calculate)の回数を数えるようにする"""
+        if not self.enabled or calc is None or hasattr(calc,"_tracer"):
+            return calc
+        calculate = calc.calculate
+        def counted_calculate(*args,**kwargs):
+            self.calls += 1
+            return calculate(*args,**kwargs)
+        calc.calculate = counted_calculate
+        calc._tracer = self
+        return calc
+
+    def wrap_calc_func(self,calc_func):
+        """計算回数を数えるcalculatorを返す関数にする(既にこのTracerで包んだ関数はそのまま返す)"""
+        if not self.enabled or getattr(calc_func,"_tracer",None) is self:
+            return calc_func
+        def traced_calc_func():
+            return self.count_calculator(calc_func())
+        traced_calc_func._tracer = self
+        return traced_calc_func
+
+    def add_steps(self,n):
+        """Optimizerのステップ数を加える"""
+        self.steps += n
+
+    def write(self,file="trace.json"):
+        """Chromeのtrace形式で書き込む"""
+        with open(file,"w") as f:
+            json.dump({"traceEvents":self.events,"displayTimeUnit":"ms"},f)
+
+    def summary(self):
+        """cat毎の集計(入れ子の区間は外側の区間にも含まれる)
+
+        Returns:
+            DataFrame: count(区間の数), wall_time(s), cpu_time(s), calls, steps, bytes
+        """
+        import pandas as pd
+        rows = [{"cat":e["cat"],"count":1,"wall_time":e["dur"]/1e6,"cpu_time":e["args"]["cpu_time"],
+                 "calls":e["args"]["calls"],"steps":e["args"]["steps"],"bytes":e["args"]["bytes"]}
+                for e in self.events]
+        columns = ["count","wall_time","cpu_time","calls","steps","bytes"]
+        if not rows:
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame(rows).groupby("cat")[columns].sum().sort_values("wall_time",ascending=False)
+
+#: 何も記録しないTracer(tracerを指定しない場合に使用する)
+NULL_TRACER = Tracer(enabled=False)
@@ -1,15 +1,26 @@
-from grrmpy.vibrations.functions import (get_vibdf,
-                                         find_ivib,
-                                         get_imode,
-                                         get_vib_images,
-                                         has_ivib,
-                                         to_html_table_and_imode,
-                                         to_html_graph,
-                                         find_ts_idx,
-                                         )
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "get_vibdf":"grrmpy.vibrations.functions",
+    "find_ivib":"grrmpy.vibrations.functions",
+    "get_imode":"grrmpy.vibrations.functions",
+    "get_vib_images":"grrmpy.vibrations.functions",
+    "has_ivib":"grrmpy.vibrations.functions",
+    "to_html_table_and_imode":"grrmpy.vibrations.functions",
+    "to_html_graph":"grrmpy.vibrations.functions",
+    "find_ts_idx":"grrmpy.vibrations.functions",
+    "lowest_modes":"grrmpy.vibrations.lanczos",
+    "LowestModes":"grrmpy.vibrations.lanczos",
+    "scan_mode":"grrmpy.vibrations.mode_scan",
+    "ModeScan":"grrmpy.vibrations.mode_scan",
+}
 
 __all__ = ["get_vibdf","find_ivib","get_imode","has_ivib","get_vib_images",
            "to_html_table_and_imode",
            "to_html_graph",
            "find_ts_idx",
-           ]
\ No newline at end of file
+           "lowest_modes","LowestModes",
+           "scan_mode","ModeScan",
+           ]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)
@@ -1,14 +1,11 @@
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.io as pyi
 import ase.units as units
 from ase.io import write
-from scipy.signal import argrelmax,argrelmin
 import numpy as np
 from ase.units import mol, kJ
 
 # User Modules
 from grrmpy.calculator import pfp_calculator
+from grrmpy.async_calc import get_potential_energies
 
 def get_vibdf(vib_obj):
     """vib.summary()の結果をDataFrameで取得する
@@ -18,6 +15,7 @@ def get_vibdf(vib_obj):
     vib_obj: Vibrarions object
         Vibrarionsオブジェクト()
     """
+    import pandas as pd
     vib_data = vib_obj.get_vibrations()
     table = vib_data.tabulate()
     data = [{"meV":row.split()[1],"cm^-1":row.split()[2]} for row in table.split("\n")[3:-3]]
@@ -98,6 +96,8 @@ def has_ivib(vib_obj):
         return False
 
 def _to_fig_table_and_imode(vib_obj):
+    import pandas as pd
+    import plotly.graph_objects as go
     vib_data = vib_obj.get_vibrations()
     table = vib_data.tabulate()
     data = [
@@ -146,6 +146,7 @@ def to_html_table_and_imode(vib_obj,full_html:bool=False,**kwargs):
     n: int
         虚振動の振動モード番号, 虚振動が存在しない場合,または複数ある場合はNone
     """
+    import plotly.io as pyi
     fig,n_mode = _to_fig_table_and_imode(vib_obj)
     return pyi.to_html(fig,full_html=full_html,**kwargs), n_mode
 
@@ -158,6 +159,7 @@ def to_html_table(vib_obj,full_html=False):
     return html_txt
 
 def to_fig_graph(vib_obj, n:int, outfile=None, calc_func=pfp_calculator, kT=units.kB * 300, nimages=30):
+    import plotly.graph_objects as go
     n %= len(vib_obj.get_energies())
     vib_images = [image 
                   for image 
@@ -169,7 +171,7 @@ def to_fig_graph(vib_obj, n:int, outfile=None, calc_func=pfp_calculator, kT=unit
         """trajファイルに保存する"""
         write(outfile,vib_images)
     x = [i for i in range(len(vib_images))]
-    y = [atoms.get_potential_energy() for atoms in vib_images]
+    y = get_potential_energies(vib_images)
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(x=x, y=y,
@@ -201,6 +203,7 @@ def to_html_graph(vib_obj, n:int, outfile=None, calc_func=pfp_calculator, kT=uni
         | <html>タグから始まる,完全なhtmlを出力する場合True
         | Falseの場合<div>タグから始まるテキストを出力
     """
+    import plotly.io as pyi
     fig = to_fig_graph(vib_obj, n, outfile, calc_func, kT, nimages)
     return pyi.to_html(fig,full_html=full_html,**kwargs)
 
@@ -240,26 +243,28 @@ def find_ts_idx(vib_images,dif=2,calc_func=pfp_calculator,**kwargs):
         - 3要素目:
             極大値の数.(1の場合うまくTSの場所を判断できたと考える.0の場合はTSはなかったと考える)
     """
+    from scipy.signal import argrelmax
     nimages = len(vib_images)
     for image in vib_images:
         if not image.get_calculator():
             image.calc = calc_func()
     
-    energy = [i.get_potential_energy() for i in vib_images]
-    middle_img = list(np.array_split(energy, 5))[2] # TS付近の構造(5等分した内お3番目)
-    middle_ini_idx = energy.index(middle_img[0])
-    middle_fin_idx = energy.index(middle_img[-1])
-    peak_idx = argrelmax(middle_img)
+    energy = get_potential_energies(vib_images)
+    splited = list(np.array_split(energy, 5))
+    middle_img = splited[2] # TS付近の構造(5等分した内お3番目)
+    middle_ini_idx = len(splited[0])+len(splited[1])
+    middle_fin_idx = middle_ini_idx+len(middle_img)-1
+    peak_idx = argrelmax(middle_img)[0] # middle_img中のindex
     
     if len(peak_idx) == 0:
         """極大値が見つからなかった場合"""
         ts_idx = int(nimages/2)
     elif len(peak_idx) == 1:
         """極大値が1つ見つかった時(理想的)"""
-        ts_idx = energy.index(middle_img[peak_idx])
+        ts_idx = middle_ini_idx+int(peak_idx[0])
     else:
         """極大値が複数見つかった時"""
-        ts_idx = idx_of_the_nearest(peak_idx,int(len(middle_img)/2))
+        ts_idx = middle_ini_idx+int(peak_idx[idx_of_the_nearest(peak_idx,int(len(middle_img)/2))])
         
     ini = min(energy[middle_ini_idx:ts_idx+1])
     fin = min(energy[ts_idx:middle_fin_idx+1])
@@ -0,0 +1,203 @@
+"""
+差分のHessian-ベクトル積だけを用いて,最も小さい2つの振動モードを求める.
+
+| Vibrationsはindicesの原子の全Hessian(6×len(indices)回の力の計算)を求めるが,
+| TSの確認に必要なのは最も小さい固有値の符号(虚振動の数)のみである.
+| ここでは質量加重Hessianの最も小さい2つの固有対をブロックDavidson法で求め,
+| 符号が確定した時点で計算を終了する(自由度が数十~100程度の場合,20~50回の力の計算).
+| 質量加重の有無で固有値の符号の数は変わらない(Sylvesterの慣性法則).
+
+| Ritz値は対応する固有値以上なので(Cauchyの交互性定理),Ritz値が負であれば固有値も負である.
+| 一方,Ritz値が正でも,部分空間に含まれていないより小さい固有値がある可能性は残る.
+| 初期ベクトル(NEBの接線)だけから部分空間を広げると,対称性などで最も小さいモードが部分空間に入らず,
+| 内側の固有対に収束して虚振動を見逃すため,初期ブロックには必ず2つの乱数ベクトルを加え,
+| 最も小さい3つのRitz対の残差で部分空間を広げる. また虚振動が1つ以下であることは,
+| 最も小さい2つのRitz対が共に収束し,部分空間がmin_vectors以上になるまで確定しない.
+
+Examples:
+
+    >>> modes = lowest_modes(ts, indices=[16,17], guess=tangent)
+    >>> modes.n_imag   # 虚振動の数(0,1,2:2つ以上), 判断できなかった場合None
+    >>> modes.n_calls  # 力の計算回数
+    >>> vib_images = modes.get_vib_images() # get_vib_imagesと同様の振動の構造
+"""
+from math import pi, sqrt
+import numpy as np
+import ase.units as units
+from ase.constraints import FixAtoms
+
+#: 質量加重Hessianの固有値(eV/Å^2/amu)の平方根をeVに変換する係数
+_CONVERSION = units._hbar * units.m / sqrt(units._e * units._amu)
+
+def _moving_indices(atoms):
+    fixed = {i for c in atoms.constraints if isinstance(c,FixAtoms) for i in c.get_indices()}
+    return [i for i in range(len(atoms)) if i not in fixed]
+
+def _to_frequency(eigenvalue):
+    """固有値(eV/Å^2/amu)をcm^-1にする(虚振動は負の値)"""
+    return np.sign(eigenvalue)*_CONVERSION*sqrt(abs(eigenvalue))/units.invcm
+
+class LowestModes():
+    """lowest_modesの結果
+
+    Attributes:
+
+    eigenvalues: ndarray
+        質量加重Hessianの最も小さい2つの固有値(Ritz値,eV/Å^2/amu)
+    residuals: ndarray
+        各固有値の残差のノルム(固有値の誤差の目安)
+    vectors: ndarray
+        質量加重座標での固有ベクトル(len(indices)×3の配列のリスト)
+    n_imag: int or None
+        | 虚振動の数(2は2つ以上). 力の計算回数の上限までに符号が確定しなかった場合はNone.
+    n_calls: int
+        力の計算回数
+    """
+    def __init__(self,atoms,indices,eigenvalues,residuals,vectors,n_imag,n_calls):
+        self.atoms = atoms
+        self.indices = indices
+        self.eigenvalues = eigenvalues
+        self.residuals = residuals
+        self.vectors = vectors
+        self.n_imag = n_imag
+        self.n_calls = n_calls
+
+    @property
+    def frequencies(self):
+        """振動数(cm^-1,虚振動は負の値)"""
+        return np.array([_to_frequency(e) for e in self.eigenvalues])
+
+    def get_mode(self,n=0):
+        """Vibrations.get_modeと同様の振動モード(全原子×3の配列,変位)"""
+        masses = self.atoms.get_masses()[self.indices]
+        mode = np.zeros((len(self.atoms),3))
+        mode[self.indices] = self.vectors[n]/np.sqrt(masses)[:,np.newaxis]
+        return mode
+
+    def get_vib_images(self,n=0,kT=units.kB*300,nimages=30):
+        """n番目のモードの振動の構造(VibrationsData.iter_animated_modeと同様)"""
+        energy = _CONVERSION*sqrt(abs(self.eigenvalues[n]))
+        mode = self.get_mode(n)*sqrt(kT/energy)
+        images = []
+        for phase in np.linspace(0,2*pi,nimages,endpoint=False):
+            atoms = self.atoms.copy()
+            atoms.positions += np.sin(phase)*mode
+            images.append(atoms)
+        return images
+
+    def tabulate(self):
+        """結果の表(str)"""
+        lines = ["#   cm^-1      residual",
+                 "-"*26]
+        for i,(freq,res) in enumerate(zip(self.frequencies,self.residuals)):
+            lines.append(f"{i:<2}{abs(freq):8.1f}{'i' if freq<0 else ' '}  {res:10.2e}")
+        lines += ["-"*26,
+                  f"imaginary modes: {self.n_imag}",
+                  f"force calls: {self.n_calls}"]
+        return "\n".join(lines)
+
+def lowest_modes(atoms,indices=None,guess=None,delta=0.01,threshold=10.0,tol=0.1,max_calls=60,min_vectors=8,seed=0):
+    """最も小さい2つの振動モードを求め,虚振動の数を判断する
+
+    | 2つのRitz値が共に-threshold cm^-1に相当する値より小さくなると,虚振動は2つ以上と確定する.
+    | 虚振動が0または1つであることは,最も小さい2つのRitz対の残差のノルムがtol×|Ritz値|
+    | (|Ritz値|がthreshold cm^-1に相当する値より小さい場合はその半分)以下になり,
+    | (Ritz値-残差のノルム)の符号から判断する. 部分空間がmin_vectorsより小さい間は確定しない.
+    | 力の計算は前進差分で,1回の反復で最大3回(最初は初期ブロックの数+1回)行なう.
+
+    Parameters:
+
+    atoms: Atoms
+        calculatorを付けたAtoms(TSの構造). 変更されない.
+    indices: list of int
+        動かす原子. Noneの場合,FixAtomsで固定されていない全ての原子.
+    guess: ndarray
+        | 最初のベクトル(全原子×3またはlen(indices)×3の変位).NEBの接線を与える.
+        | Noneの場合は乱数ベクトルのみから始める.
+    delta: float
+        差分の変位(Å)
+    threshold: float
+        threshold cm^-1より小さい虚振動は虚振動として数えない.
+    tol: float
+        固有値の収束条件(残差のノルム/|固有値|)
+    max_calls: int
+        | 力の計算回数の上限. 上限までに確定しない場合,n_imagはNone(Vibrationsで計算し直す).
+    min_vectors: int
+        虚振動が0または1つと確定するのに必要な部分空間の最小の次元
+    seed: int
+        初期ブロックの乱数ベクトル,および部分空間を広げられない場合の乱数のシード
+
+    Returns:
+        LowestModes: 結果
+    """
+    if indices is None:
+        indices = _moving_indices(atoms)
+    indices = list(indices)
+    work = atoms.copy()
+    work.set_constraint()
+    work.calc = atoms.calc
+    x0 = work.get_positions()
+    sqrt_m = np.sqrt(work.get_masses()[indices])[:,np.newaxis]
+    f0 = work.get_forces()[indices]
+    rng = np.random.default_rng(seed)
+    eps = (threshold*units.invcm/_CONVERSION)**2
+
+    def hessian_vector(u):
+        """質量加重Hessianとuの積"""
+        x = x0.copy()
+        x[indices] += delta*u.reshape(-1,3)/sqrt_m
+        work.set_positions(x)
+        f = work.get_forces()[indices]
+        return (-(f-f0)/sqrt_m/delta).ravel()
+
+    V,W = [],[]
+    def expand(v):
+        for _ in range(2): # 再直交化
+            for b in V:
+                v = v-np.dot(b,v)*b
+        norm = np.linalg.norm(v)
+        if norm < 1e-8:
+            return False
+        V.append(v/norm)
+        W.append(hessian_vector(V[-1]))
+        return True
+
+    if guess is not None:
+        guess = np.asarray(guess,dtype=float)
+        if len(guess) == len(atoms):
+            guess = guess[indices]
+        guess = guess*sqrt_m # 変位を質量加重座標にする
+        expand(guess.ravel())
+    n_dof = 3*len(indices)
+    for _ in range(2): # 縮退したモードや,guessと直交するモードも部分空間に含める
+        expand(rng.standard_normal(n_dof))
+    n_imag = None
+    while True:
+        Vm,Wm = np.array(V),np.array(W)
+        T = Vm@Wm.T
+        theta,y = np.linalg.eigh((T+T.T)/2)
+        ritz = y.T@Vm
+        res = y.T@Wm-theta[:,np.newaxis]*ritz
+        rnorm = np.linalg.norm(res,axis=1)
+        converged = rnorm <= np.maximum(tol*np.abs(theta),0.5*eps)
+        negative = theta < -eps # 交互性定理により,固有値も-epsより小さい
+        positive = converged & (theta-rnorm > -eps)
+        k = min(2,len(theta))
+        if k == 2 and negative[0] and negative[1]:
+            n_imag = 2
+        elif converged[:k].all() and len(V) >= min(min_vectors,n_dof):
+            if positive[0]:
+                n_imag = 0
+            elif negative[0] and k == 2 and positive[1]:
+                n_imag = 1
+        if n_imag is not None or len(V)+1 >= max_calls or len(V) >= n_dof:
+            break
+        targets = [i for i in range(min(3,len(theta))) if not converged[i]] or [0]
+        for i in targets:
+            if len(V)+1 >= max_calls or len(V) >= n_dof:
+                break
+            if not expand(res[i]):
+                expand(rng.standard_normal(n_dof))
+    k = min(2,len(theta))
+    return LowestModes(atoms.copy(),indices,theta[:k],rnorm[:k],
+                       [r.reshape(-1,3) for r in ritz[:k]],n_imag,len(V)+1)
@@ -0,0 +1,139 @@
+"""
+TSから虚振動のモードに沿ってエネルギーを調べ,IRC計算の初期構造を決める.
+
+| get_vib_imagesの30個の振動の構造の全てのエネルギーを計算する(find_ts_idx)代わりに,
+| 両方向に,曲率から予測した変位で段階的にエネルギーと力を計算し,
+| TSからdif kJ/mol以上下がった点,またはモード方向の極小値(dif kJ/mol下がらない場合)を挟み込んで求める.
+| 通常,片方向あたり2~4回の計算で済む.
+
+Examples:
+
+    >>> scan = scan_mode(ts, mode, dif=2.0, calc_func=pfp_calculator)
+    >>> scan.reverse, scan.forward                # IRC計算の初期構造
+    >>> scan.reverse_newton, scan.forward_newton  # find_ts_idxのinfoの1,2要素目と同じ
+    >>> fig = draw_graph(scan.images, energies=scan.energies, x=scan.displacements)
+"""
+import numpy as np
+from ase.units import kJ, mol
+
+# USER
+from grrmpy.calculator import pfp_calculator
+
+#: 挟み込みで変位を広げる割合
+_EXPAND = 1.618
+
+class ModeScan():
+    """scan_modeの結果
+
+    Attributes:
+
+    displacements: list of float
+        計算した変位(Å). 負がreverse,正がforward方向. 0はTS.
+    energies: list of float
+        各変位のエネルギー(eV)
+    images: list of Atoms
+        各変位の構造
+    reverse, forward: Atoms
+        IRC計算の初期構造
+    reverse_newton, forward_newton: bool
+        | TSからモード方向の極小値までのエネルギー差がdif kJ/mol以下の場合True.
+        | (Newton法(optimizer2)で計算すべきと判断する. find_ts_idxと同じ)
+    n_peak: int
+        | TSが両方向でエネルギーの極大になっていれば1,そうでなければ0(find_ts_idxの極大値の数に相当).
+    n_calls: int
+        エネルギー(と力)の計算回数
+    """
+    def __init__(self,points,starts,newtons,n_peak,n_calls):
+        points = sorted(points,key=lambda p:p[0])
+        self.displacements = [p[0] for p in points]
+        self.energies = [p[1] for p in points]
+        self.images = [p[2] for p in points]
+        self.reverse,self.forward = starts
+        self.reverse_newton,self.forward_newton = newtons
+        self.n_peak = n_peak
+        self.n_calls = n_calls
+
+    @property
+    def info(self):
+        """find_ts_idxのinfoと同じ形式のタプル"""
+        return (self.reverse_newton,self.forward_newton,self.n_peak)
+
+def scan_mode(atoms,mode,dif=2.0,calc_func=pfp_calculator,step=0.05,max_disp=1.0,max_calls=8):
+    """虚振動のモードに沿って両方向のIRC計算の初期構造を求める
+
+    Parameters:
+
+    atoms: Atoms
+        TSの構造(calculatorが付いていない場合はcalc_funcのcalculatorを付ける). 変更されない.
+    mode: ndarray
+        虚振動のモード(全原子×3). 大きさは任意.
+    dif: float
+        | TSからdif kJ/mol下がった点をIRC計算の初期構造とする.
+        | dif kJ/mol下がらない場合はモード方向の極小値を初期構造とし,Newton法で計算すべきと判断する.
+    calc_func: function object
+        calculatorを返す関数
+    step: float
+        最初の変位(Å). 2回目以降は1回目の力から求めた曲率で変位を予測する.
+    max_disp: float
+        最大の変位(Å)
+    max_calls: int
+        片方向あたりの計算回数の上限
+
+    Returns:
+        ModeScan: 結果
+    """
+    n = np.asarray(mode,dtype=float).reshape(-1,3)
+    n = n/np.linalg.norm(n)
+    drop = dif*kJ/mol
+    ts = atoms.copy()
+    ts.calc = atoms.calc if atoms.calc is not None else calc_func()
+    e0 = ts.get_potential_energy()
+    points = [(0.0,e0,ts)]
+    n_calls = 1
+
+    def evaluate(s):
+        image = atoms.copy()
+        image.positions += s*n
+        image.calc = calc_func()
+        energy = image.get_potential_energy()
+        slope = -float((image.get_forces()*n).sum()) # dE/ds
+        points.append((s,energy,image))
+        return energy,slope,image
+
+    starts,newtons = [],[]
+    descended = 0
+    for sign in (-1,1):
+        t_prev,slope_prev = 0.0,0.0
+        t = step
+        for i in range(max_calls):
+            energy,slope,image = evaluate(sign*t)
+            n_calls += 1
+            slope *= sign # dE/dt
+            start,newton = image,e0-energy < drop
+            if e0-energy >= drop:
+                break # 十分に下がった
+            if slope > 0 and energy < e0 and i+1 < max_calls:
+                # 極小値を通り過ぎた: t_prevとtの間を傾きの割線で挟み込む
+                if slope_prev < 0:
+                    t_min = t_prev-slope_prev*(t-t_prev)/(slope-slope_prev)
+                else:
+                    t_min = (t_prev+t)/2
+                energy_min,_,image_min = evaluate(sign*t_min)
+                n_calls += 1
+                if energy_min < energy:
+                    start,newton = image_min,e0-energy_min < drop
+                break
+            if t >= max_disp:
+                break
+            if slope < 0:
+                # 曲率からdif kJ/mol下がる変位を予測する(E = E0-k*t^2/2)
+                k = abs(slope-slope_prev)/(t-t_prev)
+                t_next = np.clip(np.sqrt(2*drop/k),t*1.2,t*3)
+            else:
+                t_next = t*_EXPAND # まだ上り坂
+            t_prev,slope_prev,t = t,slope,min(t_next,max_disp)
+        if start.get_potential_energy() < e0:
+            descended += 1
+        starts.append(start)
+        newtons.append(bool(newton))
+    return ModeScan(points,starts,newtons,int(descended == 2),n_calls)
@@ -1,6 +1,14 @@
-from grrmpy.visualize.by_nglview import view_with_index, view_with_coordinate
-from grrmpy.visualize.by_ase import view,view_images
-from grrmpy.visualize.ngl_display import View
+from grrmpy._lazy import lazy_attributes
+
+_attributes = {
+    "view_with_index":"grrmpy.visualize.by_nglview",
+    "view_with_coordinate":"grrmpy.visualize.by_nglview",
+    "view":"grrmpy.visualize.by_ase",
+    "view_images":"grrmpy.visualize.by_ase",
+    "View":"grrmpy.visualize.ngl_display",
+}
 
 __all__ = ["view_with_index","view_with_coordinate",
-           "view","view_images","View"]
\ No newline at end of file
+           "view","view_images","View"]
+
+__getattr__, __dir__ = lazy_attributes(__name__, _attributes)